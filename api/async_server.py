@@ -0,0 +1,658 @@
+"""
+api/async_server.py  —  DNS Resolution Service  —  asyncio API server
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+The REST API of api/server.py served from one asyncio event loop instead of
+a Flask thread per request.  A burst of slow names costs pending coroutines,
+not OS threads:
+
+  /resolve miss ──▶ async single-flight ──▶ C++ bridge
+                                              dnscore   → bounded thread pool
+                                                          (releases the GIL)
+                                              workers   → AsyncWorkerPool pipes
+                                              one-shot  → asyncio subprocess
+                                           ──▶ forwarder fallback (the shared
+                                               ForwarderPool, awaited)
+
+Response bodies are built by the same functions as the Flask routes
+(lookup_cached_json, result_response, fallback_response, …), so the JSON
+shapes, cache entries and metrics are identical.  Each /resolve miss runs
+under a per-request deadline (→ 504) and at most `max_concurrency`
+distinct names resolve at once (→ 503 + Retry-After); callers asking for
+a name already in flight share its result.
+
+Endpoints: /resolve  /resolve/batch  /cache (GET, DELETE)  /metrics  /upstreams  /zones
+           /benchmark  /health  and the web dashboard.  HTTP/1.1 keep-alive, CORS *.
+
+Run:
+  python api/async_server.py [--host 0.0.0.0] [--port 5000]
+  python api/server.py --async
+
+Environment (plus everything api/server.py reads, DNS_SNAPSHOT and
+DNS_LISTEN_PORT included):
+  DNS_REQUEST_DEADLINE=<s>   per-request resolution deadline (default 30)
+  DNS_MAX_CONCURRENCY=<n>    concurrent upstream resolutions (default 256)
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import functools
+import mimetypes
+import threading
+from http import HTTPStatus
+from urllib.parse import urlsplit, parse_qsl
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import server                                          # noqa: E402
+from worker_pool import AsyncWorkerPool, PoolBusyError  # noqa: E402
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  Configuration
+# ─────────────────────────────────────────────────────────────────────────────
+
+REQUEST_DEADLINE = float(os.environ.get("DNS_REQUEST_DEADLINE", server.RESOLVER_TIMEOUT))
+MAX_CONCURRENCY  = int(os.environ.get("DNS_MAX_CONCURRENCY", "256"))
+NATIVE_THREADS   = 64          # dnscore calls in parallel (each holds a thread)
+KEEPALIVE_IDLE   = 30.0        # seconds an idle HTTP connection is kept
+MAX_BODY         = 1 << 20     # bytes
+MAX_HEADER_LINES = 100
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  Forwarder fallback
+# ─────────────────────────────────────────────────────────────────────────────
+
+async def fallback_resolve_async(domain: str, qtype: str = "A",
+                                 server_ip: str = None, port: int = 53) -> list:
+    """server.fallback_resolve() without blocking the event loop."""
+    upstreams = [server.Upstream(server_ip, port)] if server_ip else None
+    try:
+        future = server.forwarders.submit(server.fallback_query(domain, qtype), upstreams)
+    except RuntimeError:
+        return server.FallbackAnswers()
+    return server.forwarded_answers(await asyncio.wrap_future(future), domain)
+
+
+def _discard(task: asyncio.Future):
+    """Done-callback for a raced walk nobody awaits any more (retrieves its error)."""
+    if not task.cancelled():
+        task.exception()
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  C++ bridge
+# ─────────────────────────────────────────────────────────────────────────────
+
+class AsyncBridge:
+    """server.run_cpp_resolver() for the event loop — same bridge order and errors."""
+
+    def __init__(self, native_threads: int = NATIVE_THREADS):
+        self._executor = ThreadPoolExecutor(max_workers=native_threads,
+                                            thread_name_prefix="dnscore")
+        self.pool      = None
+
+    @property
+    def name(self) -> str:
+        if server._native is not None:
+            return "native"
+        return "workers" if server.WORKER_COUNT > 0 else "subprocess"
+
+    async def resolve(self, domain: str, qtype: str = "A", trace: bool = False) -> dict:
+        loop = asyncio.get_running_loop()
+        if server._native is not None:
+            call = (functools.partial(server._native.resolve, trace=True) if trace
+                    else server._native.resolve)
+            return await loop.run_in_executor(self._executor, call, domain, qtype)
+
+        if not os.path.isfile(server.BINARY_PATH):
+            raise RuntimeError(
+                f"C++ binary not found at {server.BINARY_PATH}. "
+                "Run build.bat (Windows) or build.sh (Linux/macOS) first."
+            )
+
+        if server.WORKER_COUNT > 0:
+            if self.pool is None:
+                self.pool = AsyncWorkerPool(
+                    [server.BINARY_PATH, "--serve"],
+                    size=server.WORKER_COUNT,
+                    request_timeout=server.RESOLVER_TIMEOUT,
+                    acquire_timeout=server.WORKER_QUEUE_TIMEOUT,
+                    max_waiters=server.WORKER_MAX_WAITERS,
+                )
+            return await self.pool.resolve(domain, qtype, trace=trace)
+
+        proc = await asyncio.create_subprocess_exec(
+            server.BINARY_PATH, domain, qtype, *(["--trace"] if trace else []),
+            stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE)
+        try:
+            stdout, stderr = await asyncio.wait_for(proc.communicate(),
+                                                    server.RESOLVER_TIMEOUT)
+        except asyncio.TimeoutError:
+            proc.kill()
+            await proc.wait()
+            raise RuntimeError(f"C++ resolver timed out after {server.RESOLVER_TIMEOUT}s")
+        stdout = stdout.decode(errors="replace").strip()
+        if not stdout:
+            raise RuntimeError("C++ resolver produced no output "
+                               f"(stderr: {stderr.decode(errors='replace').strip()})")
+        try:
+            return json.loads(stdout)
+        except json.JSONDecodeError as e:
+            raise RuntimeError(f"C++ resolver returned invalid JSON: {e}")
+
+    async def upstream_stats(self) -> list:
+        """server.upstream_stats() from the processes this bridge resolves with."""
+        if server._native is not None:
+            return await asyncio.get_running_loop().run_in_executor(
+                self._executor, server._native.server_stats)
+        if self.pool is None:
+            return []             # no worker started yet, or one-shot subprocesses
+        replies = await self.pool.broadcast({"op": "servers"})
+        return server._merge_server_stats(r.get("servers", []) for r in replies)
+
+    async def zone_stats(self) -> list:
+        """server.zone_stats() from the processes this bridge resolves with."""
+        if server._native is not None:
+            return await asyncio.get_running_loop().run_in_executor(
+                self._executor, server._native.zone_stats)
+        if self.pool is None:
+            return []
+        replies = await self.pool.broadcast({"op": "zones"})
+        return server._merge_zone_stats(r.get("zones", []) for r in replies)
+
+    async def close(self):
+        if self.pool is not None:
+            await self.pool.close()
+        self._executor.shutdown(wait=False)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  HTTP plumbing
+# ─────────────────────────────────────────────────────────────────────────────
+
+class Request:
+    __slots__ = ("method", "path", "query", "headers", "body")
+
+    def __init__(self, method, path, query, headers, body):
+        self.method  = method
+        self.path    = path
+        self.query   = query
+        self.headers = headers
+        self.body    = body
+
+    def json(self):
+        try:
+            return json.loads(self.body or b"null")
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            return None
+
+
+class _BadRequest(Exception):
+    pass
+
+
+async def _read_request(reader) -> Request:
+    """Parses one HTTP/1.x request; None on a cleanly closed connection."""
+    line = await asyncio.wait_for(reader.readline(), KEEPALIVE_IDLE)
+    if not line:
+        return None
+    try:
+        method, target, _version = line.decode("latin-1").split()
+    except ValueError:
+        raise _BadRequest("malformed request line")
+    headers = {}
+    for _ in range(MAX_HEADER_LINES):
+        h = await reader.readline()
+        if h in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = h.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    else:
+        raise _BadRequest("too many headers")
+    try:
+        length = int(headers.get("content-length", "0") or 0)
+    except ValueError:
+        raise _BadRequest("bad Content-Length")
+    if length < 0:
+        raise _BadRequest("bad Content-Length")
+    if length > MAX_BODY:
+        raise _BadRequest("request body too large")
+    body = await reader.readexactly(length) if length else b""
+    url  = urlsplit(target)
+    return Request(method.upper(), url.path, dict(parse_qsl(url.query)), headers, body)
+
+
+def _head(status: int, headers: dict, keep_alive: bool) -> bytes:
+    try:
+        reason = HTTPStatus(status).phrase
+    except ValueError:
+        reason = ""
+    lines = [f"HTTP/1.1 {status} {reason}",
+             "Access-Control-Allow-Origin: *",
+             f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+    lines += [f"{k}: {v}" for k, v in headers.items()]
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+
+
+def _encode_response(status: int, payload, headers: dict, keep_alive: bool) -> bytes:
+    if isinstance(payload, (bytes, bytearray)):
+        body = bytes(payload)
+        headers.setdefault("Content-Type", "application/octet-stream")
+    else:
+        body = json.dumps(payload).encode()
+        headers["Content-Type"] = "application/json"
+    headers["Content-Length"] = len(body)
+    return _head(status, headers, keep_alive) + body
+
+
+async def _write_chunked(writer, status: int, chunks, headers: dict, keep_alive: bool):
+    """Streams an async iterator of bytes with Transfer-Encoding: chunked."""
+    headers["Transfer-Encoding"] = "chunked"
+    writer.write(_head(status, headers, keep_alive))
+    try:
+        async for chunk in chunks:
+            writer.write(b"%x\r\n%s\r\n" % (len(chunk), chunk))
+            await writer.drain()
+    finally:
+        await chunks.aclose()
+    writer.write(b"0\r\n\r\n")
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  Application
+# ─────────────────────────────────────────────────────────────────────────────
+
+class AsyncAPIServer:
+    """server.py's REST API on asyncio; see the module docstring."""
+
+    def __init__(self, host: str = "0.0.0.0", port: int = server.API_PORT,
+                 deadline: float = REQUEST_DEADLINE,
+                 max_concurrency: int = MAX_CONCURRENCY):
+        self.host            = host
+        self.port            = port
+        self.deadline        = deadline
+        self.max_concurrency = max_concurrency
+        self.bridge          = AsyncBridge()
+        self._flights        = {}          # cache key → Task resolving it
+        self._counters       = {"leaders": 0, "coalesced": 0,
+                                "shed": 0, "deadline_exceeded": 0}
+        self._server         = None
+        self._loop           = None
+        self._thread         = None
+        self._routes = {
+            ("GET",    "/resolve"):   self.resolve,
+            ("POST",   "/resolve/batch"): self.resolve_batch,
+            ("GET",    "/cache"):     self.get_cache,
+            ("DELETE", "/cache"):     self.clear_cache,
+            ("GET",    "/metrics"):   self.get_metrics,
+            ("GET",    "/upstreams"): self.get_upstreams,
+            ("GET",    "/zones"):     self.get_zones,
+            ("POST",   "/benchmark"): self.run_benchmark,
+            ("GET",    "/health"):    self.health,
+        }
+
+    # ── /resolve ──────────────────────────────────────────────────────────────
+
+    async def resolve(self, req: Request) -> tuple:
+        domain = req.query.get("domain", "").strip().lower()
+        qtype  = req.query.get("type", "A").upper()
+
+        err = server._validate_domain(domain)
+        if err:
+            return {"error": err}, 400, {}
+        if qtype not in server.VALID_TYPES:
+            return {"error": f"Unsupported record type: {qtype}. "
+                             f"Valid types: {', '.join(sorted(server.VALID_TYPES))}"}, 400, {}
+
+        t0  = time.perf_counter()
+        if server.wants_trace(req.query.get("trace", "")):
+            return await self.lookup_miss_by_deadline(domain, qtype, t0, trace=True)
+        hit = server.lookup_cached_json(domain, qtype, t0)
+        if hit is not None:
+            return hit[0], hit[1], {"Content-Type": "application/json"}
+        return await self.lookup_miss_by_deadline(domain, qtype, t0)
+
+    async def lookup_miss_by_deadline(self, domain: str, qtype: str, t0: float,
+                                      trace: bool = False) -> tuple:
+        lookup = (self.lookup_traced(domain, qtype, t0) if trace
+                  else self.lookup_miss(domain, qtype, t0))
+        try:
+            return await asyncio.wait_for(lookup, self.deadline)
+        except asyncio.TimeoutError:
+            self._counters["deadline_exceeded"] += 1
+            return {"error": f"resolution exceeded the {self.deadline:g}s deadline",
+                    "domain": domain}, 504, {}
+
+    async def lookup_miss(self, domain: str, qtype: str, t0: float) -> tuple:
+        """server.lookup_miss() for the event loop (async single-flight)."""
+        cache_key = f"{domain}/{qtype}"
+        task      = self._flights.get(cache_key)
+        shared    = task is not None
+        if shared:
+            self._counters["coalesced"] += 1
+        else:
+            if len(self._flights) >= self.max_concurrency:
+                self._counters["shed"] += 1
+                return server.busy_response(
+                    PoolBusyError(f"{self.max_concurrency} resolutions already in flight"),
+                    domain)
+            self._counters["leaders"] += 1
+            task = asyncio.ensure_future(self._resolve_miss(domain, qtype, cache_key, t0))
+            self._flights[cache_key] = task
+            task.add_done_callback(lambda _t: self._flights.pop(cache_key, None))
+        # shield(): one caller hitting its deadline must not cancel the
+        # resolution the other callers (and the cache) are waiting for.
+        result = await asyncio.shield(task)
+        return server.finish_miss(domain, qtype, t0, result, shared)
+
+    async def lookup_traced(self, domain: str, qtype: str, t0: float) -> tuple:
+        """server.lookup_traced(): a walk of its own, outside single-flight."""
+        result = await self._resolve_miss(domain, qtype, f"{domain}/{qtype}", t0, trace=True)
+        return server.finish_miss(domain, qtype, t0, result, False)
+
+    async def _resolve_miss(self, domain: str, qtype: str, cache_key: str, t0: float,
+                            trace: bool = False) -> tuple:
+        """server._resolve_miss() with awaited bridge and fallback calls."""
+        if server.RESOLVE_STRATEGY == "forward":
+            result = server.forward_response(domain, qtype, cache_key, t0,
+                                             await fallback_resolve_async(domain, qtype),
+                                             "forward")
+            return server.with_trace(result, None) if trace else result
+        if server.RESOLVE_STRATEGY == "race":
+            return await self._race_miss(domain, qtype, cache_key, t0, trace)
+        try:
+            cpp_result = await (self.bridge.resolve(domain, qtype, trace=True) if trace
+                                else self.bridge.resolve(domain, qtype))
+        except PoolBusyError as e:
+            return server.busy_response(e, domain)
+        except RuntimeError as e:
+            result = server.fallback_response(domain, qtype, cache_key, t0,
+                                              await fallback_resolve_async(domain, qtype),
+                                              error=e)
+            return server.with_trace(result, None) if trace else result
+        if server.needs_fallback(cpp_result):
+            result = server.fallback_response(domain, qtype, cache_key, t0,
+                                              await fallback_resolve_async(domain, qtype),
+                                              cpp_result=cpp_result)
+        else:
+            result = server.result_response(domain, qtype, cache_key, t0, cpp_result)
+        return server.with_trace(result, cpp_result) if trace else result
+
+    async def _race_miss(self, domain: str, qtype: str, cache_key: str, t0: float,
+                         trace: bool) -> tuple:
+        """server._race_miss() as tasks; the request deadline bounds the race."""
+        walk = asyncio.ensure_future(self.bridge.resolve(domain, qtype, trace=True) if trace
+                                     else self.bridge.resolve(domain, qtype))
+        walk.add_done_callback(_discard)
+        forward, cpp_result, error = None, None, None
+        pending = {walk}
+        try:
+            while pending:
+                grace = max(0.0, t0 + server.RACE_GRACE - time.perf_counter())
+                done, pending = await asyncio.wait(pending, timeout=None if forward else grace,
+                                                   return_when=asyncio.FIRST_COMPLETED)
+                if walk in done:
+                    try:
+                        cpp_result = walk.result()
+                    except RuntimeError as e:
+                        error = e
+                    if cpp_result is not None and not server.needs_fallback(cpp_result):
+                        result = server.race_result(server.result_response(
+                            domain, qtype, cache_key, t0, cpp_result), "walk")
+                        return server.with_trace(result, cpp_result) if trace else result
+                if forward is not None and forward in done:
+                    answers = forward.result()
+                    if answers:
+                        result = server.race_result(server.forward_response(
+                            domain, qtype, cache_key, t0, answers, "race"), "forward")
+                        return server.with_trace(result, None) if trace else result
+                if forward is None:
+                    forward = asyncio.ensure_future(fallback_resolve_async(domain, qtype))
+                    pending.add(forward)
+        finally:
+            if forward is not None:
+                forward.cancel()                  # no-op once it has finished
+        result = server.race_result(server.fallback_response(
+            domain, qtype, cache_key, t0, server.FallbackAnswers(),
+            cpp_result=cpp_result, error=error), "none")
+        return server.with_trace(result, cpp_result) if trace else result
+
+    # ── /resolve/batch ────────────────────────────────────────────────────────
+
+    async def resolve_batch(self, req: Request) -> tuple:
+        """Same contract as server.resolve_batch(); streamed with chunked encoding."""
+        try:
+            items, rejected, parallelism, total = server.batch_request(req.json())
+        except ValueError as e:
+            return {"error": str(e)}, 400, {}
+        return (self._batch_stream(items, rejected, parallelism, total), 200,
+                {"Content-Type": "application/x-ndjson"})
+
+    async def _batch_stream(self, items, rejected, parallelism, total):
+        t_start = time.perf_counter()
+        counts  = server.batch_counts(rejected)
+        for line in rejected:
+            yield server.batch_line(*line)
+
+        misses = []
+        for domain, qtype in items:
+            hit = server.lookup_cached_json(domain, qtype, time.perf_counter())
+            if hit is None:
+                misses.append((domain, qtype))
+                continue
+            yield server.batch_hit(counts, qtype, *hit)
+
+        done    = asyncio.Queue()
+        pending = iter(misses)
+
+        async def worker():
+            for domain, qtype in pending:            # shared: each miss taken once
+                try:
+                    body, status, _headers = await self.lookup_miss_by_deadline(
+                        domain, qtype, time.perf_counter())
+                except Exception as e:
+                    body, status = {"error": str(e), "domain": domain}, 500
+                done.put_nowait((domain, qtype, body, status))
+
+        workers = [asyncio.ensure_future(worker())
+                   for _ in range(min(parallelism, len(misses)))]
+        try:
+            for _ in misses:
+                line = await done.get()
+                server.batch_tally(counts, line[2], line[3])
+                yield server.batch_line(*line)
+        finally:
+            for w in workers:                        # client went away mid-stream
+                w.cancel()
+        yield server.batch_summary(counts, total, len(items) + len(rejected), t_start)
+
+    # ── other endpoints ───────────────────────────────────────────────────────
+
+    async def get_cache(self, req: Request) -> tuple:
+        return {"stats": server.cache.stats(), "entries": server.cache.all_entries()}, 200, {}
+
+    async def clear_cache(self, req: Request) -> tuple:
+        server.cache.clear()
+        return {"message": "Cache cleared successfully."}, 200, {}
+
+    def coalescing_stats(self) -> dict:
+        return {"in_flight": len(self._flights),
+                "leaders":   self._counters["leaders"],
+                "coalesced": self._counters["coalesced"]}
+
+    async def get_metrics(self, req: Request) -> tuple:
+        if server.wants_prometheus(req.query.get("format", ""), req.headers.get("accept", "")):
+            return (server.metrics.prometheus().encode(), 200,
+                    {"Content-Type": server.PROMETHEUS_CONTENT_TYPE})
+        summary = server.metrics.summary()
+        summary["coalescing"] = self.coalescing_stats()
+        summary["prefetch"]   = server.refresher.stats()
+        summary["snapshot"]   = (server.snapshotter.stats()
+                                 if server.snapshotter is not None else None)
+        return summary, 200, {}
+
+    async def get_upstreams(self, req: Request) -> tuple:
+        stats = await self.bridge.upstream_stats()
+        servers = sorted(stats, key=lambda s: s["rto_ms"], reverse=True)
+        for sv in servers:
+            for key in ("srtt_ms", "rttvar_ms", "rto_ms"):
+                sv[key] = round(sv[key], 3)
+        return {"count": len(servers), "servers": servers,
+                "forwarders": server.forwarders.stats()}, 200, {}
+
+    async def get_zones(self, req: Request) -> tuple:
+        return server.zone_summary(await self.bridge.zone_stats()), 200, {}
+
+    async def run_benchmark(self, req: Request) -> tuple:
+        import benchmark
+        try:
+            domains, qtype, runs = benchmark.parse_request(req.json() or {})
+        except ValueError as e:
+            return {"error": str(e)}, 400, {}
+        # Scratch resolvers and blocking sockets: a thread of its own, so
+        # neither the loop nor the bridge's executor waits on it.
+        results = await asyncio.to_thread(benchmark.run, domains, qtype, runs)
+        return {"results": results}, 200, {}
+
+    async def health(self, req: Request) -> tuple:
+        binary_ok = server._native is not None or os.path.isfile(server.BINARY_PATH)
+        return {
+            "status":     "ok" if binary_ok else "degraded",
+            "binary":     server.BINARY_PATH,
+            "binary_ok":  binary_ok,
+            "bridge":     self.bridge.name,
+            "cache_size": server.cache.stats()["size"],
+            "workers":    self.bridge.pool.stats() if self.bridge.pool is not None else None,
+        }, 200 if binary_ok else 503, {}
+
+    def _static(self, path: str) -> tuple:
+        name = "index.html" if path == "/" else path.lstrip("/")
+        full = os.path.realpath(os.path.join(server._WEB_DIR, name))
+        if not full.startswith(os.path.realpath(server._WEB_DIR) + os.sep) or \
+                not os.path.isfile(full):
+            return {"error": "not found"}, 404, {}
+        with open(full, "rb") as f:
+            data = f.read()
+        ctype = mimetypes.guess_type(full)[0] or "application/octet-stream"
+        return data, 200, {"Content-Type": ctype}
+
+    # ── connection handling ───────────────────────────────────────────────────
+
+    async def dispatch(self, req: Request) -> tuple:
+        if req.method == "OPTIONS":                    # CORS preflight
+            return b"", 204, {"Access-Control-Allow-Methods": "GET, POST, DELETE, OPTIONS",
+                              "Access-Control-Allow-Headers": "Content-Type"}
+        handler = self._routes.get((req.method, req.path))
+        if handler is not None:
+            return await handler(req)
+        if any(path == req.path for _method, path in self._routes):
+            return {"error": "method not allowed"}, 405, {}
+        if req.method == "GET":
+            return self._static(req.path)
+        return {"error": "not found"}, 404, {}
+
+    async def _serve_conn(self, reader, writer):
+        try:
+            while True:
+                try:
+                    req = await _read_request(reader)
+                except _BadRequest as e:
+                    writer.write(_encode_response(400, {"error": str(e)}, {}, False))
+                    break
+                if req is None:
+                    break
+                keep_alive = req.headers.get("connection", "").lower() != "close"
+                try:
+                    payload, status, headers = await self.dispatch(req)
+                except Exception as e:                 # never kill the connection loop
+                    payload, status, headers = {"error": f"internal error: {e}"}, 500, {}
+                if hasattr(payload, "__aiter__"):
+                    await _write_chunked(writer, status, payload, dict(headers), keep_alive)
+                else:
+                    writer.write(_encode_response(status, payload, dict(headers), keep_alive))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError,
+                asyncio.CancelledError):        # idle keep-alive cut at shutdown
+            pass
+        finally:
+            writer.close()
+
+    # ── lifecycle ─────────────────────────────────────────────────────────────
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._serve_conn, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+        await self.bridge.close()
+
+    def start_in_thread(self):
+        """Runs the server on its own event loop in a daemon thread (tests, embedding)."""
+        ready = threading.Event()
+
+        def run():
+            self._loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self._loop)
+            self._loop.run_until_complete(self.start())
+            ready.set()
+            self._loop.run_forever()
+            pending = asyncio.all_tasks(self._loop)
+            for task in pending:
+                task.cancel()
+            self._loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+            self._loop.run_until_complete(self.stop())
+            self._loop.close()
+
+        self._thread = threading.Thread(target=run, daemon=True, name="async-api")
+        self._thread.start()
+        ready.wait()
+        return self
+
+    def stop_thread(self):
+        if self._loop is not None and self._thread is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join(timeout=5)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  Entry point
+# ─────────────────────────────────────────────────────────────────────────────
+
+async def _serve(host: str, port: int, deadline: float, max_concurrency: int):
+    api = await AsyncAPIServer(host, port, deadline, max_concurrency).start()
+    print(f"  Listening  : http://127.0.0.1:{api.port}  (asyncio, deadline "
+          f"{deadline:g}s, max {max_concurrency} in flight)", flush=True)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await api.stop()
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="asyncio REST API for the DNS resolver.")
+    ap.add_argument("--host", default="0.0.0.0")
+    ap.add_argument("--port", type=int, default=server.API_PORT)
+    ap.add_argument("--deadline", type=float, default=REQUEST_DEADLINE,
+                    help="per-request resolution deadline in seconds")
+    ap.add_argument("--max-concurrency", type=int, default=MAX_CONCURRENCY,
+                    help="concurrent upstream resolutions before 503")
+    args = ap.parse_args(argv)
+    server.start_background()
+    try:
+        asyncio.run(_serve(args.host, args.port, args.deadline, args.max_concurrency))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+"""
+api/benchmark.py  —  DNS Resolution Service  —  Isolated resolver benchmark
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+What POST /benchmark runs: the local resolver, cold and warm, against the
+public resolvers, without touching anything the service answers from.
+
+  cold   every sample walks from the root on a scratch resolver of its own —
+         a new dnscore.Resolver with an empty cache and no delegation or
+         RTT history, or a one-shot `dns_resolver` process when the
+         extension is not loaded
+  warm   a hit in a scratch DNSCache holding the cold answer, served the
+         way /resolve serves hits (lookup + CachedResponse.json)
+  public one RD=1 UDP query to each of PUBLIC_RESOLVERS
+
+server.cache, the native resolver's caches and the worker pool are never
+read or written, so a benchmark on a live server costs its clients nothing.
+
+Each measurement is taken `runs` times and reported as the median with its
+spread (min, quartiles, max, failures).  Samples of one series run one
+after another; the series themselves — every domain's cold walks and each
+public resolver's queries — run concurrently.
+"""
+
+import os
+import time
+import socket
+import subprocess
+import json
+import statistics
+from concurrent.futures import ThreadPoolExecutor
+
+import server
+
+PUBLIC_RESOLVERS = {"google": "8.8.8.8", "cloudflare": "1.1.1.1"}
+PUBLIC_PORT      = 53
+PUBLIC_TIMEOUT   = 3.0      # seconds per public query
+DEFAULT_DOMAINS  = ["google.com", "example.com", "wikipedia.org"]
+MAX_DOMAINS      = 20
+DEFAULT_RUNS     = 5
+MAX_RUNS         = 20
+MAX_PARALLELISM  = 32       # concurrent series (threads) per benchmark
+SCRATCH_ENTRIES  = 64       # answer-cache size of each scratch resolver
+
+
+def parse_request(body: dict) -> tuple:
+    """(domains, qtype, runs) from a POST body; ValueError names the bad field."""
+    domains = body.get("domains", DEFAULT_DOMAINS)
+    qtype   = str(body.get("type", "A")).upper()
+    runs    = body.get("runs", DEFAULT_RUNS)
+    if not isinstance(domains, list) or len(domains) > MAX_DOMAINS:
+        raise ValueError(f"domains must be a list with at most {MAX_DOMAINS} entries")
+    if not all(isinstance(d, str) for d in domains):
+        raise ValueError("domains must be strings")
+    if isinstance(runs, bool) or not isinstance(runs, int) or not 1 <= runs <= MAX_RUNS:
+        raise ValueError(f"runs must be an integer from 1 to {MAX_RUNS}")
+    return domains, qtype, runs
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  Samples
+# ─────────────────────────────────────────────────────────────────────────────
+
+def cold_resolve(domain: str, qtype: str) -> dict:
+    """
+    One walk from the root that shares no state with the serving resolver.
+    Raises RuntimeError like server.run_cpp_resolver().
+    """
+    if server._native is not None:
+        scratch = server.dnscore.Resolver(server.dnscore.Cache(SCRATCH_ENTRIES))
+        return scratch.resolve(domain, qtype)
+    if not os.path.isfile(server.BINARY_PATH):
+        raise RuntimeError(f"C++ binary not found at {server.BINARY_PATH}")
+    try:
+        proc = subprocess.run([server.BINARY_PATH, domain, qtype], capture_output=True,
+                              text=True, timeout=server.RESOLVER_TIMEOUT)
+        return json.loads(proc.stdout)
+    except subprocess.TimeoutExpired:
+        raise RuntimeError(f"C++ resolver timed out after {server.RESOLVER_TIMEOUT}s")
+    except json.JSONDecodeError:
+        raise RuntimeError(f"C++ resolver produced no output (stderr: {proc.stderr.strip()})")
+
+
+def cold_series(domain: str, qtype: str, runs: int) -> tuple:
+    """([ms or None] × runs, last result dict or None, last error or None)."""
+    samples, result, error = [], None, None
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        try:
+            r = cold_resolve(domain, qtype)
+        except RuntimeError as e:
+            samples.append(None)
+            error = str(e)
+            continue
+        samples.append((time.perf_counter() - t0) * 1000)
+        if r.get("success") or result is None:
+            result = r
+    return samples, result, error
+
+
+def warm_series(domain: str, qtype: str, result: dict, runs: int) -> list:
+    """Hits on a scratch DNSCache holding `result`, timed as /resolve times them."""
+    ttl  = max(1, min(result.get("ttl") or server.DEFAULT_TTL, server.MAX_CACHE_TTL))
+    key  = f"{domain}/{qtype}"
+    body = {"domain": domain, "record_type": qtype, "cached": False, "latency_ms": 0.0,
+            "ttl": ttl, "answers": result.get("answers", [])}
+    scratch = server.DNSCache(capacity=1)
+    scratch.put(key, server.CachedResponse(body), ttl=ttl)
+    samples = []
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        resp, remaining = scratch.lookup(key)
+        resp.json(remaining, 0.0)
+        samples.append((time.perf_counter() - t0) * 1000)
+    return samples
+
+
+def public_rtt(domain: str, qtype: str, ip: str) -> float | None:
+    """Round trip of one RD=1 query to a public resolver in ms (None on failure)."""
+    pkt = server.fallback_query(domain, qtype)
+    try:
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+            sock.settimeout(PUBLIC_TIMEOUT)
+            t0 = time.perf_counter()
+            sock.sendto(pkt, (ip, PUBLIC_PORT))
+            while True:
+                reply, _ = sock.recvfrom(4096)
+                if reply[:2] == pkt[:2]:
+                    return (time.perf_counter() - t0) * 1000
+    except OSError:
+        return None
+
+
+def public_series(domain: str, qtype: str, ip: str, runs: int) -> list:
+    return [public_rtt(domain, qtype, ip) for _ in range(runs)]
+
+
+def spread(samples: list, digits: int = 3) -> dict:
+    """Median, min, quartiles and max of the successful samples."""
+    ok = sorted(s for s in samples if s is not None)
+    out = {"samples": len(samples), "failures": len(samples) - len(ok)}
+    if not ok:
+        return dict(out, median=None, min=None, q1=None, q3=None, max=None)
+    q1, _, q3 = statistics.quantiles(ok, n=4, method="inclusive") if len(ok) > 1 else ok * 3
+    return dict(out, median=round(statistics.median(ok), digits), min=round(ok[0], digits),
+                q1=round(q1, digits), q3=round(q3, digits), max=round(ok[-1], digits))
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  Benchmark
+# ─────────────────────────────────────────────────────────────────────────────
+
+def run(domains: list, qtype: str = "A", runs: int = DEFAULT_RUNS) -> list:
+    """
+    One row per domain.  The dashboard's fields (local_cold_ms,
+    local_warm_ms, <resolver>_ms, local_success) hold medians — a public
+    resolver that never answered reads -1.0 as before — and "stats" has the
+    spread of every measurement.
+    """
+    if not domains:
+        return []
+    width = min(MAX_PARALLELISM, len(domains) * (1 + len(PUBLIC_RESOLVERS)))
+    with ThreadPoolExecutor(max_workers=width, thread_name_prefix="bench") as pool:
+        cold = {d: pool.submit(cold_series, d, qtype, runs) for d in domains}
+        public = {(d, name): pool.submit(public_series, d, qtype, ip, runs)
+                  for d in domains for name, ip in PUBLIC_RESOLVERS.items()}
+
+        rows = []
+        for domain in domains:
+            row = {"domain": domain, "type": qtype, "runs": runs}
+            samples, result, error = cold[domain].result()
+            ok = result is not None and result.get("success", False)
+            warm = warm_series(domain, qtype, result, runs) if ok else []
+            stats = {"local_cold": spread(samples, 2), "local_warm": spread(warm)}
+            row["local_cold_ms"] = stats["local_cold"]["median"]
+            row["local_warm_ms"] = stats["local_warm"]["median"]
+            row["local_success"] = ok
+            if error is not None and not ok:
+                row["local_error"] = error
+            for name in PUBLIC_RESOLVERS:
+                stats[name] = spread(public[(domain, name)].result(), 2)
+                median = stats[name]["median"]
+                row[f"{name}_ms"] = median if median is not None else -1.0
+            row["stats"] = stats
+            rows.append(row)
+    return rows
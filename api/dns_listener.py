@@ -0,0 +1,327 @@
+"""
+api/dns_listener.py  —  DNS Resolution Service  —  Native DNS front end
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+Serves ordinary DNS queries (UDP and TCP, RFC 1035 §4.2) so stub resolvers
+can point /etc/resolv.conf at the service instead of the HTTP JSON API.
+
+  DNS client ──UDP/TCP──▶  this listener  (one asyncio event loop)
+                              │ cache hit: answered on the loop
+                              ▼ miss
+                           server.lookup_miss()  in a bounded thread pool
+                              (SingleFlight → C++ Resolver → forwarder fallback)
+
+Both front ends share server.py's DNSCache, metrics and single-flight
+table, so a name resolved over HTTP is a cache hit over DNS and vice versa.
+
+Replies copy the query's ID, RD bit and question (original letter case),
+set QR and RA, and map the lookup outcome to an RCODE: answers → NOERROR,
+cached/authoritative NXDOMAIN or NODATA → that RCODE with the SOA,
+anything else → SERVFAIL.  Malformed queries get FORMERR, opcodes other
+than QUERY and unsupported types NOTIMP.  A query's EDNS0 OPT record
+(RFC 6891) is answered with one of ours; UDP replies larger than the
+client's advertised size (512 bytes without EDNS0, at most EDNS_PAYLOAD)
+are truncated (TC=1) so the client retries over TCP.  TCP connections may
+pipeline queries (answered as they complete) and are closed after
+TCP_IDLE_TIMEOUT seconds of silence (RFC 7766 §6.2.3).
+
+Run:
+  python api/dns_listener.py [--host 0.0.0.0] [--port 5353]
+  or set DNS_LISTEN_PORT when starting api/server.py to run it alongside
+  the HTTP API.
+
+Environment:
+  DNS_LISTEN_HOST=<addr>   bind address (default 0.0.0.0)
+  DNS_LISTEN_PORT=<port>   UDP + TCP port (server.py: unset/0 = disabled)
+"""
+
+import os
+import sys
+import time
+import struct
+import asyncio
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import server                                                  # noqa: E402
+import dnswire                                                 # noqa: E402
+from dnswire import (FLAG_QR, FLAG_RD, FLAG_RA, FLAG_TC, CLASS_IN,   # noqa: E402
+                     RCODE_NOERROR, RCODE_FORMERR, RCODE_SERVFAIL,
+                     RCODE_NXDOMAIN, RCODE_NOTIMP, RTYPE_NAMES)
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  Configuration
+# ─────────────────────────────────────────────────────────────────────────────
+
+LISTEN_HOST      = os.environ.get("DNS_LISTEN_HOST", "0.0.0.0")
+LISTEN_PORT      = int(os.environ.get("DNS_LISTEN_PORT", "5353"))
+MAX_UDP_PAYLOAD  = dnswire.MAX_UDP_PAYLOAD   # bytes — RFC 1035 §4.2.1, without EDNS0
+EDNS_PAYLOAD     = dnswire.EDNS_PAYLOAD      # largest UDP reply to an EDNS0 query
+MAX_INFLIGHT     = 64      # concurrent upstream resolutions (pool threads)
+MAX_PENDING      = 1024    # queued misses before new ones get SERVFAIL
+TCP_IDLE_TIMEOUT = 10.0    # seconds
+
+_RCODES = {"NOERROR": RCODE_NOERROR, "NXDOMAIN": RCODE_NXDOMAIN}
+_OPCODE_MASK = 0x7800
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  Wire-format replies
+# ─────────────────────────────────────────────────────────────────────────────
+
+def _packed(records) -> list:
+    """Encodes API-shaped record dicts, skipping any dnswire can't encode."""
+    out = []
+    for r in records:
+        try:
+            out.append(dnswire.pack_rr(r["name"], r["type"], r["ttl"], r["data"]))
+        except (dnswire.WireError, KeyError):
+            continue
+    return out
+
+
+def build_reply(msg_id: int, query_flags: int, question: bytes, rcode: int,
+                answers=(), authorities=(), max_size: int = 0, edns: int = 0) -> bytes:
+    """
+    Reply to a query: its ID, RD bit and raw question section echoed back,
+    QR and RA set, and an OPT record advertising `edns` bytes if non-zero.
+    If the message would exceed `max_size` (0 = no limit) the records are
+    dropped and TC is set.
+    """
+    flags = FLAG_QR | FLAG_RA | (query_flags & FLAG_RD) | rcode
+    qd    = 1 if question else 0
+    an, ns = _packed(answers), _packed(authorities)
+    opt   = dnswire.opt_record(edns) if edns else b""
+    ar    = 1 if opt else 0
+    msg = (struct.pack("!HHHHHH", msg_id, flags, qd, len(an), len(ns), ar)
+           + question + b"".join(an) + b"".join(ns) + opt)
+    if max_size and len(msg) > max_size:
+        msg = struct.pack("!HHHHHH", msg_id, flags | FLAG_TC, qd, 0, 0, ar) + question + opt
+    return msg
+
+
+def reply_for(body: dict, status: int) -> tuple:
+    """(rcode, answers, authorities) for a lookup_cached / lookup_miss result."""
+    if status == 200:
+        return RCODE_NOERROR, body.get("answers", []), []
+    if body.get("negative"):
+        return (_RCODES.get(body.get("rcode"), RCODE_SERVFAIL),
+                body.get("answers", []), body.get("authorities", []))
+    return RCODE_SERVFAIL, [], []
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  Listener
+# ─────────────────────────────────────────────────────────────────────────────
+
+class DNSListener:
+    """UDP + TCP DNS server on one event loop, resolving through server.py."""
+
+    def __init__(self, host: str = LISTEN_HOST, port: int = LISTEN_PORT,
+                 max_inflight: int = MAX_INFLIGHT, max_pending: int = MAX_PENDING):
+        self.host         = host
+        self.port         = port
+        self.max_pending  = max_pending
+        self._executor    = ThreadPoolExecutor(max_workers=max_inflight,
+                                               thread_name_prefix="dns-listener")
+        self._pending     = 0
+        self._tasks       = set()
+        self._udp         = None
+        self._tcp         = None
+        self._loop        = None
+        self._thread      = None
+        self.counters     = {"udp": 0, "tcp": 0, "truncated": 0,
+                             "formerr": 0, "notimp": 0, "shed": 0}
+
+    # ── query handling ────────────────────────────────────────────────────────
+
+    async def handle(self, pkt: bytes, max_size: int) -> bytes:
+        """
+        Answers one wire-format query; returns b"" if there is nothing to say.
+        `max_size` is the UDP limit without EDNS0 (0 over TCP); a query's OPT
+        record raises it to the size it advertises, up to EDNS_PAYLOAD.
+        """
+        t0 = time.perf_counter()
+        try:
+            msg_id, flags, qname, qtype_id, qclass, end = dnswire.parse_question(pkt)
+        except dnswire.WireError:
+            if len(pkt) < 12 or pkt[2] & 0x80:          # unusable, or not a query
+                return b""
+            self.counters["formerr"] += 1
+            msg_id, flags = struct.unpack("!HH", pkt[:4])
+            return build_reply(msg_id, flags, b"", RCODE_FORMERR)
+        if flags & FLAG_QR:
+            return b""
+        question = pkt[12:end]
+        try:
+            payload = dnswire.edns_payload(pkt)
+        except dnswire.WireError:
+            self.counters["formerr"] += 1
+            return build_reply(msg_id, flags, question, RCODE_FORMERR)
+        edns = EDNS_PAYLOAD if payload else 0
+        if payload and max_size:
+            max_size = min(payload, EDNS_PAYLOAD)
+
+        qtype = RTYPE_NAMES.get(qtype_id)
+        if (flags & _OPCODE_MASK) or qtype is None or qclass != CLASS_IN:
+            self.counters["notimp"] += 1
+            return build_reply(msg_id, flags, question, RCODE_NOTIMP, edns=edns)
+        if server._validate_domain(qname):
+            self.counters["formerr"] += 1
+            return build_reply(msg_id, flags, question, RCODE_FORMERR, edns=edns)
+
+        hit = server.lookup_cached(qname, qtype, t0)
+        if hit is not None:
+            body, status = hit
+        elif self._pending >= self.max_pending:
+            self.counters["shed"] += 1
+            return build_reply(msg_id, flags, question, RCODE_SERVFAIL, edns=edns)
+        else:
+            self._pending += 1
+            try:
+                body, status, _headers = await asyncio.get_running_loop().run_in_executor(
+                    self._executor, server.lookup_miss, qname, qtype, t0)
+            except Exception:
+                body, status = {}, 503
+            finally:
+                self._pending -= 1
+
+        rcode, answers, authorities = reply_for(body, status)
+        reply = build_reply(msg_id, flags, question, rcode, answers, authorities, max_size,
+                            edns)
+        if reply[2] & (FLAG_TC >> 8):
+            self.counters["truncated"] += 1
+        return reply
+
+    # ── transports ────────────────────────────────────────────────────────────
+
+    def _spawn(self, coro):
+        # The loop only keeps weak references to tasks.
+        task = asyncio.ensure_future(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    class _UDP(asyncio.DatagramProtocol):
+        def __init__(self, listener):
+            self.listener  = listener
+            self.transport = None
+
+        def connection_made(self, transport):
+            self.transport = transport
+
+        def datagram_received(self, data, addr):
+            self.listener.counters["udp"] += 1
+            self.listener._spawn(self._answer(data, addr))
+
+        async def _answer(self, data, addr):
+            reply = await self.listener.handle(data, MAX_UDP_PAYLOAD)
+            if reply and not self.transport.is_closing():
+                self.transport.sendto(reply, addr)
+
+    async def _serve_tcp(self, reader, writer):
+        tasks = set()
+
+        async def answer(pkt):
+            reply = await self.handle(pkt, 0)
+            if reply and not writer.is_closing():
+                writer.write(struct.pack("!H", len(reply)) + reply)
+
+        try:
+            while True:
+                hdr = await asyncio.wait_for(reader.readexactly(2), TCP_IDLE_TIMEOUT)
+                pkt = await asyncio.wait_for(
+                    reader.readexactly(struct.unpack("!H", hdr)[0]), TCP_IDLE_TIMEOUT)
+                self.counters["tcp"] += 1
+                task = self._spawn(answer(pkt))               # pipelined queries
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+            writer.close()
+
+    # ── lifecycle ─────────────────────────────────────────────────────────────
+
+    async def start(self):
+        """Binds UDP, then TCP on the same port (the UDP port if port=0)."""
+        loop = asyncio.get_running_loop()
+        self._udp, _ = await loop.create_datagram_endpoint(
+            lambda: self._UDP(self), local_addr=(self.host, self.port))
+        self.port = self._udp.get_extra_info("sockname")[1]
+        self._tcp = await asyncio.start_server(self._serve_tcp, self.host, self.port)
+        return self
+
+    async def stop(self):
+        if self._udp is not None:
+            self._udp.close()
+        if self._tcp is not None:
+            self._tcp.close()
+            await self._tcp.wait_closed()
+
+    def start_in_thread(self):
+        """Runs the listener on its own event loop in a daemon thread."""
+        ready = threading.Event()
+        error = []
+
+        def run():
+            self._loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self._loop)
+            try:
+                self._loop.run_until_complete(self.start())
+            except Exception as e:
+                error.append(e)
+                ready.set()
+                return
+            ready.set()
+            self._loop.run_forever()
+            # Open TCP connections and in-flight answers end with the loop.
+            pending = asyncio.all_tasks(self._loop)
+            for task in pending:
+                task.cancel()
+            self._loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+            self._loop.run_until_complete(self.stop())
+            self._loop.close()
+
+        self._thread = threading.Thread(target=run, daemon=True, name="dns-listener")
+        self._thread.start()
+        ready.wait()
+        if error:
+            raise error[0]
+        return self
+
+    def stop_thread(self):
+        if self._loop is not None and self._thread is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join(timeout=5)
+        self._executor.shutdown(wait=False)
+
+    def stats(self) -> dict:
+        return dict(self.counters, pending=self._pending)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  Entry point
+# ─────────────────────────────────────────────────────────────────────────────
+
+async def _main(host: str, port: int, max_inflight: int):
+    listener = await DNSListener(host, port, max_inflight).start()
+    print(f"  DNS listener : udp+tcp {host}:{listener.port}", flush=True)
+    await asyncio.Event().wait()
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Native DNS (UDP/TCP) front end.")
+    ap.add_argument("--host", default=LISTEN_HOST)
+    ap.add_argument("--port", type=int, default=LISTEN_PORT)
+    ap.add_argument("--max-inflight", type=int, default=MAX_INFLIGHT,
+                    help="concurrent upstream resolutions")
+    args = ap.parse_args()
+    try:
+        asyncio.run(_main(args.host, args.port, args.max_inflight))
+    except KeyboardInterrupt:
+        pass
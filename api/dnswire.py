@@ -0,0 +1,241 @@
+"""
+api/dnswire.py  —  DNS wire-format helpers (RFC 1035 §4)
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+Pure-Python encoding of names, resource records and whole messages, plus
+question parsing.  Record data uses the same text form the C++ resolver
+emits in its JSON ("10 mx1.example.com" for MX, "mname rname serial=…
+minimum=…" for SOA), so answers can round-trip between the two layers.
+"""
+
+import socket
+import struct
+
+QTYPE_IDS = {"A": 1, "AAAA": 28, "NS": 2, "MX": 15,
+             "CNAME": 5, "TXT": 16, "PTR": 12, "SOA": 6}
+RTYPE_NAMES = {1: "A", 28: "AAAA", 2: "NS", 5: "CNAME",
+               15: "MX", 16: "TXT", 12: "PTR", 6: "SOA"}
+
+CLASS_IN = 1
+
+# EDNS0 (RFC 6891)
+RTYPE_OPT        = 41
+MAX_UDP_PAYLOAD  = 512         # RFC 1035 §2.3.4, without EDNS0
+EDNS_PAYLOAD     = 1232        # advertised UDP size (DNS Flag Day 2020), as the C++ core
+_OPT_SIZE        = 11          # root owner + TYPE, CLASS, TTL, RDLENGTH
+
+# Header flag bits
+FLAG_QR = 0x8000
+FLAG_AA = 0x0400
+FLAG_TC = 0x0200
+FLAG_RD = 0x0100
+FLAG_RA = 0x0080
+
+# Response codes
+RCODE_NOERROR  = 0
+RCODE_FORMERR  = 1
+RCODE_SERVFAIL = 2
+RCODE_NXDOMAIN = 3
+RCODE_NOTIMP   = 4
+RCODE_REFUSED  = 5
+
+
+class WireError(ValueError):
+    """Raised for malformed packets or unencodable record data."""
+
+
+def normalize(name: str) -> str:
+    """Lower-case, no trailing dot ("" is the root)."""
+    return name.lower().rstrip(".")
+
+
+def encode_name(name: str, table: dict = None, offset: int = 0) -> bytes:
+    """
+    Wire form of `name`.  With a `table` (suffix → offset, shared across one
+    message) the name is compressed against the names already written and
+    its own suffixes are added; `offset` is where it will sit (RFC 1035
+    §4.1.4).
+    """
+    labels = [label for label in normalize(name).split(".") if label]
+    out = bytearray()
+    for i, label in enumerate(labels):
+        if table is not None:
+            suffix = ".".join(labels[i:])
+            ptr = table.get(suffix)
+            if ptr is not None:
+                return bytes(out + struct.pack("!H", 0xC000 | ptr))
+            if offset + len(out) < 0x4000:
+                table[suffix] = offset + len(out)
+        raw = label.encode("ascii")
+        if len(raw) > 63:
+            raise WireError(f"DNS label too long: {label}")
+        out.append(len(raw))
+        out += raw
+    out.append(0)
+    return bytes(out)
+
+
+def _soa_fields(data: str) -> tuple:
+    """Accepts "mname rname serial=1 refresh=2 minimum=3" or 7 plain fields."""
+    parts = data.split()
+    if len(parts) < 2:
+        raise WireError(f"bad SOA data: {data!r}")
+    mname, rname, rest = parts[0], parts[1], parts[2:]
+    if rest and all("=" in p for p in rest):
+        kv = dict(p.split("=", 1) for p in rest)
+        nums = [int(kv.get(k, d)) for k, d in
+                (("serial", 1), ("refresh", 3600), ("retry", 600),
+                 ("expire", 86400), ("minimum", 300))]
+    else:
+        nums = [int(x) for x in rest] + [1, 3600, 600, 86400, 300][len(rest):]
+    return mname, rname, nums[:5]
+
+
+def encode_rdata(rtype: str, data: str, table: dict = None, offset: int = 0) -> bytes:
+    """RDATA of one record; names in it are compressed as encode_name() does."""
+    name = lambda n, at=0: encode_name(n, table, offset + at)      # noqa: E731
+    try:
+        if rtype == "A":
+            return socket.inet_aton(data)
+        if rtype == "AAAA":
+            return socket.inet_pton(socket.AF_INET6, data)
+        if rtype in ("NS", "CNAME", "PTR"):
+            return name(data)
+        if rtype == "MX":
+            pref, host = data.split(None, 1)
+            return struct.pack("!H", int(pref)) + name(host, 2)
+        if rtype == "TXT":
+            raw = data.encode("utf-8")
+            chunks = [raw[i:i + 255] for i in range(0, len(raw), 255)] or [b""]
+            return b"".join(bytes([len(c)]) + c for c in chunks)
+        if rtype == "SOA":
+            mname, rname, nums = _soa_fields(data)
+            m = name(mname)
+            return m + name(rname, len(m)) + struct.pack("!5I", *nums)
+    except (OSError, ValueError) as e:
+        raise WireError(f"cannot encode {rtype} data {data!r}: {e}")
+    raise WireError(f"unsupported record type: {rtype}")
+
+
+def pack_rr(name: str, rtype: str, ttl: int, data: str,
+            table: dict = None, offset: int = 0) -> bytes:
+    owner = encode_name(name, table, offset)
+    rdata = encode_rdata(rtype, data, table, offset + len(owner) + 10)
+    return (owner
+            + struct.pack("!HHIH", QTYPE_IDS[rtype], CLASS_IN, int(ttl), len(rdata))
+            + rdata)
+
+
+def build_message(msg_id: int, flags: int, qname: str = None, qtype: int = 1,
+                  answers=(), authorities=(), additionals=(),
+                  compress: bool = False) -> bytes:
+    """
+    Builds a full DNS message.  Record arguments are iterables of
+    (name, type_str, ttl, data) tuples or dicts with those keys.
+    compress=True writes repeated names as pointers, as real servers do.
+    """
+    table = {} if compress else None
+    msg = bytearray()
+    if qname is not None:
+        msg += encode_name(qname, table, 12) + struct.pack("!HH", qtype, CLASS_IN)
+    counts = []
+    for records in (answers, authorities, additionals):
+        n = 0
+        for r in records:
+            if isinstance(r, dict):
+                r = (r["name"], r["type"], r["ttl"], r["data"])
+            msg += pack_rr(*r, table=table, offset=12 + len(msg))
+            n += 1
+        counts.append(n)
+    qd = 0 if qname is None else 1
+    return struct.pack("!HHHHHH", msg_id, flags, qd, *counts) + bytes(msg)
+
+
+def build_query(qname: str, qtype: int = 1, msg_id: int = 0, rd: bool = True,
+                edns: int = 0) -> bytes:
+    """A query; `edns` > 0 appends an OPT record advertising that UDP payload size."""
+    msg = build_message(msg_id, FLAG_RD if rd else 0, qname, qtype)
+    return add_opt(msg, edns) if edns else msg
+
+
+def opt_record(payload: int) -> bytes:
+    """An OPT pseudo-record: root owner, UDP size as CLASS, version 0, no DO bit."""
+    return b"\x00" + struct.pack("!HHIH", RTYPE_OPT, max(payload, MAX_UDP_PAYLOAD), 0, 0)
+
+
+def add_opt(msg: bytes, payload: int) -> bytes:
+    """`msg` with an OPT record appended to its additional section."""
+    arcount = struct.unpack("!H", msg[10:12])[0]
+    return msg[:10] + struct.pack("!H", arcount + 1) + msg[12:] + opt_record(payload)
+
+
+def strip_opt(msg: bytes) -> bytes:
+    """`msg` without the OPT record add_opt() appended (unchanged if there is none)."""
+    if (len(msg) < 12 + _OPT_SIZE or msg[10:12] == b"\x00\x00"
+            or msg[-_OPT_SIZE:-_OPT_SIZE + 3] != b"\x00\x00" + bytes([RTYPE_OPT])):
+        return msg
+    arcount = struct.unpack("!H", msg[10:12])[0]
+    return msg[:10] + struct.pack("!H", arcount - 1) + msg[12:-_OPT_SIZE]
+
+
+def edns_payload(msg: bytes) -> int | None:
+    """
+    UDP payload size from the OPT record of a query or reply (at least 512),
+    or None without one.  Raises WireError if the records run past the end.
+    """
+    if len(msg) < 12:
+        raise WireError("packet too short (< 12 bytes)")
+    qdcount, ancount, nscount, arcount = struct.unpack("!HHHH", msg[4:12])
+    if not arcount:
+        return None
+    pos = 12
+    for _ in range(qdcount):
+        pos = skip_name(msg, pos) + 4
+    for i in range(ancount + nscount + arcount):
+        pos = skip_name(msg, pos)
+        if pos + 10 > len(msg):
+            raise WireError("record header truncated")
+        rtype, rclass, _ttl, rdlength = struct.unpack("!HHIH", msg[pos:pos + 10])
+        if rtype == RTYPE_OPT and i >= ancount + nscount:
+            return max(rclass, MAX_UDP_PAYLOAD)
+        pos += 10 + rdlength
+    return None
+
+
+def skip_name(pkt: bytes, offset: int) -> int:
+    """Returns the offset just past the (possibly compressed) name at offset."""
+    while offset < len(pkt):
+        length = pkt[offset]
+        if length == 0:
+            return offset + 1
+        if (length & 0xC0) == 0xC0:
+            return offset + 2
+        offset += length + 1
+    raise WireError("name runs past end of packet")
+
+
+def parse_question(pkt: bytes) -> tuple:
+    """
+    Parses the header and first question of a query.
+    Returns (msg_id, flags, qname, qtype, qclass, end_offset).
+    """
+    if len(pkt) < 12:
+        raise WireError("packet too short (< 12 bytes)")
+    msg_id, flags, qdcount = struct.unpack("!HHH", pkt[:6])
+    if qdcount < 1:
+        raise WireError("no question")
+    labels, pos = [], 12
+    while True:
+        if pos >= len(pkt):
+            raise WireError("QNAME runs past end of packet")
+        length = pkt[pos]
+        if length == 0:
+            pos += 1
+            break
+        if length & 0xC0:
+            raise WireError("compressed QNAME in query")
+        labels.append(pkt[pos + 1:pos + 1 + length].decode("ascii", errors="replace"))
+        pos += 1 + length
+    if pos + 4 > len(pkt):
+        raise WireError("question truncated")
+    qtype, qclass = struct.unpack("!HH", pkt[pos:pos + 4])
+    return msg_id, flags, ".".join(labels).lower(), qtype, qclass, pos + 4
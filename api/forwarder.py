@@ -0,0 +1,543 @@
+"""
+api/forwarder.py  —  DNS Resolution Service  —  Forwarding resolver pool
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+What a miss falls back to when the C++ walk cannot answer it: RD=1 queries
+to a list of recursive resolvers (DNS_FORWARDERS), sent from a handful of
+shared non-blocking UDP sockets and demultiplexed by one I/O thread.
+
+  order   healthy forwarders first, lowest RTO first.  One that has missed
+          DOWN_AFTER times in a row is held down (DOWN_BASE s, doubling up
+          to DOWN_MAX s) and only tried once the others are used up
+  hedge   if the first forwarder has not answered after `hedge_after` s the
+          query also goes to the next one; the first valid reply wins, and
+          the losers' replies only feed their RTT estimates.  SERVFAIL /
+          REFUSED / NOTIMP or a send error moves on to the next one at once
+  retry   once every forwarder has been tried, the best one is asked again
+          when its RTO has passed, up to MAX_ATTEMPTS sends per query, all
+          within `timeout` s
+  demux   every send gets a fresh random ID.  A reply is accepted only on
+          the socket the query left from, from the address it went to, with
+          that ID, QR set and the same question, before the send's RTO has
+          passed (a timeout) — anything else is counted ("mismatched") and
+          dropped
+  TCP     a truncated reply is asked again over TCP on a small thread pool
+          (RFC 7766); if that fails too the query moves on
+  EDNS0   a query carrying an OPT record is sent as is, so replies up to its
+          advertised size come back over UDP.  A forwarder that answers
+          FORMERR to it is asked again at once without the OPT record, and
+          gets plain queries for the next NO_EDNS_FOR s (RFC 6891 §7)
+
+Per forwarder it keeps a smoothed RTT and RTO the way the C++ infra cache
+does (RFC 6298, backoff doubled per miss), plus query / response / timeout /
+failure / TCP-retry counts and whether it speaks EDNS0 — GET /upstreams
+reports them under
+"forwarders".  IPv4 forwarders only, like the rest of the service.
+"""
+
+import os
+import heapq
+import random
+import socket
+import struct
+import selectors
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import dnswire
+
+DEFAULT_FORWARDERS = "8.8.8.8,1.1.1.1"
+DEFAULT_SOCKETS    = 4
+DEFAULT_HEDGE      = 0.1       # seconds before the second forwarder is asked
+MAX_ATTEMPTS       = 4         # UDP sends per query, hedges and retries included
+TCP_THREADS        = 4
+
+# Same estimator constants as the C++ InfraCache (core/dns_resolver.h)
+INITIAL_RTO = 376.0            # ms — unknown forwarder
+MIN_RTO     = 50.0
+MAX_RTO     = 12000.0
+MAX_BACKOFF = 64
+
+DOWN_AFTER  = 3                # consecutive misses before a hold-down
+DOWN_BASE   = 5.0              # seconds — first hold-down
+DOWN_MAX    = 60.0             # seconds — longest hold-down
+NO_EDNS_FOR = 900.0            # seconds — plain queries after a FORMERR (C++ INFRA_TTL_S)
+
+_RETRY_RCODES = (dnswire.RCODE_SERVFAIL, dnswire.RCODE_NOTIMP, dnswire.RCODE_REFUSED)
+
+
+def parse_forwarders(spec: str) -> list:
+    """"8.8.8.8,1.1.1.1:5353" → [("8.8.8.8", 53), ("1.1.1.1", 5353)]."""
+    out = []
+    for item in spec.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        ip, _, port = item.partition(":")
+        out.append((ip, int(port) if port else 53))
+    return out
+
+
+def tcp_exchange(pkt: bytes, addr: tuple, timeout: float) -> bytes:
+    """One query over TCP with 2-byte length framing (RFC 1035 §4.2.2); b"" on EOF."""
+    with socket.create_connection(addr, timeout=timeout) as sock:
+        sock.sendall(struct.pack("!H", len(pkt)) + pkt)
+        hdr = _recv_exact(sock, 2)
+        return _recv_exact(sock, struct.unpack("!H", hdr)[0]) if hdr else b""
+
+
+def _recv_exact(sock, n: int) -> bytes:
+    buf = b""
+    while len(buf) < n:
+        chunk = sock.recv(n - len(buf))
+        if not chunk:
+            return b""
+        buf += chunk
+    return buf
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  Per-forwarder health
+# ─────────────────────────────────────────────────────────────────────────────
+
+class Upstream:
+    """One forwarder: RFC 6298 RTT estimate, backoff, counters and hold-down."""
+
+    __slots__ = ("ip", "port", "srtt", "rttvar", "backoff", "queries", "responses",
+                 "timeouts", "failures", "tcp_retries", "streak", "down_until",
+                 "no_edns_until")
+
+    def __init__(self, ip: str, port: int = 53):
+        self.ip          = ip
+        self.port        = port
+        self.srtt        = None        # ms; None until the first reply
+        self.rttvar      = 0.0
+        self.backoff     = 1
+        self.queries     = 0
+        self.responses   = 0
+        self.timeouts    = 0
+        self.failures    = 0
+        self.tcp_retries = 0
+        self.streak      = 0           # misses since the last good reply
+        self.down_until  = 0.0         # time.monotonic()
+        self.no_edns_until = 0.0       # time.monotonic(); plain queries until then
+
+    @property
+    def addr(self) -> tuple:
+        return (self.ip, self.port)
+
+    @property
+    def rto(self) -> float:
+        """Retransmission timeout in ms: (srtt + 4·rttvar) × backoff, clamped."""
+        base = INITIAL_RTO if self.srtt is None else self.srtt + 4 * self.rttvar
+        return min(MAX_RTO, max(MIN_RTO, base * self.backoff))
+
+    def is_down(self, now: float) -> bool:
+        return now < self.down_until
+
+    def speaks_edns(self, now: float) -> bool:
+        return now >= self.no_edns_until
+
+    def record_rtt(self, ms: float):
+        if self.srtt is None:                       # RFC 6298 §2.2
+            self.srtt, self.rttvar = ms, ms / 2.0
+        else:                                       # §2.3 (α = 1/8, β = 1/4)
+            self.rttvar = 0.75 * self.rttvar + 0.25 * abs(self.srtt - ms)
+            self.srtt   = 0.875 * self.srtt + 0.125 * ms
+        self.responses += 1
+        self.backoff, self.streak, self.down_until = 1, 0, 0.0
+
+    def record_miss(self, now: float, timeout: bool):
+        """A timeout, or a reply / send that was no use (timeout=False)."""
+        if timeout:
+            self.timeouts += 1
+        else:
+            self.failures += 1
+        self.backoff = min(self.backoff * 2, MAX_BACKOFF)
+        self.streak += 1
+        if self.streak >= DOWN_AFTER:
+            self.down_until = now + min(DOWN_MAX, DOWN_BASE * 2 ** (self.streak - DOWN_AFTER))
+
+    def stats(self, now: float) -> dict:
+        """Same keys as a /upstreams server entry, plus port and health."""
+        return {"ip": self.ip, "port": self.port,
+                "srtt_ms": round(self.srtt or 0.0, 3), "rttvar_ms": round(self.rttvar, 3),
+                "rto_ms": round(self.rto, 3), "backoff": self.backoff, "queries": self.queries,
+                "responses": self.responses, "timeouts": self.timeouts,
+                "failures": self.failures, "tcp_retries": self.tcp_retries,
+                "no_edns": not self.speaks_edns(now), "down": self.is_down(now),
+                "down_for_s": round(max(0.0, self.down_until - now), 3)}
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  Pool
+# ─────────────────────────────────────────────────────────────────────────────
+
+class _Query:
+    """One submitted query: its candidates, sends in flight and outcome."""
+
+    __slots__ = ("question", "body", "plain", "future", "order", "next", "attempts", "keys",
+                 "first", "hedged", "tried", "tcp", "fallback", "deadline", "gen", "done")
+
+    def __init__(self, question: tuple, body: bytes, order: list, deadline: float):
+        self.question = question       # (qname, qtype, qclass)
+        self.body     = body           # the query minus its ID
+        self.plain    = body           # the same without its OPT record (if any)
+        self.future   = Future()
+        self.order    = order          # forwarders, best first
+        self.next     = 0              # order[next] is the next one not yet asked
+        self.attempts = 0              # UDP sends so far
+        self.keys     = []             # pending keys of this query's sends
+        self.first    = None           # forwarder of the first send
+        self.hedged   = False          # sent again while a send was pending
+        self.tried    = set()          # forwarders that answered uselessly
+        self.tcp      = 0              # TCP retries in flight
+        self.fallback = None           # best unusable reply: (reply, upstream)
+        self.deadline = deadline
+        self.gen      = 0              # bumps on every send; stale timers ignored
+        self.done     = False
+
+
+class ForwarderPool:
+    """
+    Hedged RD=1 queries to `upstreams` over `sockets` shared UDP sockets.
+    The I/O thread and sockets are created on the first submit().
+    """
+
+    def __init__(self, upstreams: list, sockets: int = DEFAULT_SOCKETS,
+                 hedge_after: float = DEFAULT_HEDGE, timeout: float = 5.0):
+        self.upstreams   = [u if isinstance(u, Upstream) else Upstream(*u) for u in upstreams]
+        self.n_sockets   = max(1, sockets)
+        self.hedge_after = hedge_after
+        self.timeout     = timeout
+        self.queries     = 0
+        self.answered    = 0
+        self.hedged      = 0           # queries sent to a second forwarder while
+        self.hedge_wins  = 0           #   the first was pending / answered by it
+        self.tcp_retries = 0
+        self.edns_fallbacks = 0        # FORMERR to an OPT record, asked again plainly
+        self.mismatched  = 0           # replies dropped by the demultiplexer
+        self._lock       = threading.Lock()
+        self._pending    = {}          # (socket, addr, id) → (query, upstream, sent, body)
+        self._timers     = []          # heap of (due, seq, query, what) — see _fire_timers
+        self._seq        = 0
+        self._socks      = None
+        self._waker_r    = None
+        self._waker_w    = None
+        self._thread     = None
+        self._tcp_pool   = None
+        self._closed     = False
+
+    @classmethod
+    def from_env(cls, timeout: float = 5.0) -> "ForwarderPool":
+        """DNS_FORWARDERS, DNS_FORWARD_HEDGE and DNS_FORWARD_SOCKETS."""
+        return cls(parse_forwarders(os.environ.get("DNS_FORWARDERS", DEFAULT_FORWARDERS)),
+                   sockets=int(os.environ.get("DNS_FORWARD_SOCKETS", str(DEFAULT_SOCKETS))),
+                   hedge_after=float(os.environ.get("DNS_FORWARD_HEDGE", str(DEFAULT_HEDGE))),
+                   timeout=timeout)
+
+    # ── public API ────────────────────────────────────────────────────────────
+
+    def submit(self, query: bytes, upstreams: list = None) -> Future:
+        """
+        Forwards a wire-format query (its ID is replaced per send).  The
+        future resolves to (reply, Upstream) — a SERVFAIL or truncated reply
+        if nothing better came back — or None when nothing answered in time.
+        `upstreams` overrides the configured forwarders for this query.
+        Cancelling the future stops further hedges and retries.
+        """
+        _id, _flags, qname, qtype, qclass, _end = dnswire.parse_question(query)
+        now = time.monotonic()
+        candidates = list(upstreams) if upstreams else self.upstreams
+        order = sorted(candidates, key=lambda u: (u.is_down(now), u.rto))
+        q = _Query((qname, qtype, qclass), query[2:], order, now + self.timeout)
+        plain = dnswire.strip_opt(query)
+        if plain is not query:
+            q.plain = plain[2:]
+        done = []
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("forwarder pool is closed")
+            self._start()
+            self.queries += 1
+            self._push(q.deadline, q, None)
+            self._advance(q, now, done)
+        self._wake()
+        _resolve(done)
+        return q.future
+
+    def query(self, query: bytes, upstreams: list = None):
+        """submit(), waited for: (reply, Upstream) or None."""
+        return self.submit(query, upstreams).result()
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        with self._lock:
+            return {"sockets": self.n_sockets, "hedge_after_ms": round(self.hedge_after * 1000, 3),
+                    "queries": self.queries, "answered": self.answered,
+                    "hedged": self.hedged, "hedge_wins": self.hedge_wins,
+                    "tcp_retries": self.tcp_retries, "edns_fallbacks": self.edns_fallbacks,
+                    "mismatched": self.mismatched,
+                    "in_flight": len(self._pending),
+                    "servers": [u.stats(now) for u in self.upstreams]}
+
+    def close(self):
+        """Stops the I/O thread; queries still in flight resolve to None."""
+        with self._lock:
+            self._closed = True
+            thread = self._thread
+        if thread is not None:
+            self._wake()
+            thread.join(timeout=2)
+            with self._lock:
+                done = [(q.future, None) for _due, _seq, q, what in self._timers
+                        if what is None and not q.done]
+                self._timers, self._pending = [], {}
+            _resolve(done)
+            self._tcp_pool.shutdown(wait=False)
+            for sock in self._socks:
+                sock.close()
+            self._waker_r.close()
+            self._waker_w.close()
+
+    # ── I/O thread ────────────────────────────────────────────────────────────
+
+    def _start(self):
+        """Sockets, selector and I/O thread, on first use (lock held)."""
+        if self._thread is not None:
+            return
+        self._sel = selectors.DefaultSelector()
+        self._socks = []
+        for i in range(self.n_sockets):
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            sock.setblocking(False)
+            sock.bind(("0.0.0.0", 0))
+            self._sel.register(sock, selectors.EVENT_READ, i)
+            self._socks.append(sock)
+        self._waker_r, self._waker_w = socket.socketpair()
+        self._waker_r.setblocking(False)
+        self._waker_w.setblocking(False)
+        self._sel.register(self._waker_r, selectors.EVENT_READ, None)
+        self._tcp_pool = ThreadPoolExecutor(max_workers=TCP_THREADS,
+                                            thread_name_prefix="forward-tcp")
+        self._thread = threading.Thread(target=self._run, name="forwarder", daemon=True)
+        self._thread.start()
+
+    def _wake(self):
+        try:
+            self._waker_w.send(b"\0")
+        except (OSError, AttributeError):
+            pass                       # buffer full (a wake-up is pending) or not started
+
+    def _run(self):
+        while True:
+            with self._lock:
+                if self._closed:
+                    break
+                wait = max(0.0, self._timers[0][0] - time.monotonic()) if self._timers else None
+            events = self._sel.select(wait)
+            done = []
+            with self._lock:
+                now = time.monotonic()
+                for key, _mask in events:
+                    if key.data is None:
+                        self._drain_waker()
+                    else:
+                        self._read(key.data, now, done)
+                self._fire_timers(now, done)
+            _resolve(done)
+        self._sel.close()
+
+    def _drain_waker(self):
+        try:
+            while self._waker_r.recv(512):
+                pass
+        except OSError:
+            pass
+
+    def _push(self, due: float, q: _Query, what):
+        self._seq += 1
+        heapq.heappush(self._timers, (due, self._seq, q, what))
+
+    def _fire_timers(self, now: float, done: list):
+        """
+        Timer kinds: None — the query's deadline; an int — hedge / retransmit,
+        stale once the query has sent again; a tuple — a send's RTO.
+        """
+        while self._timers and self._timers[0][0] <= now:
+            _due, _seq, q, what = heapq.heappop(self._timers)
+            if isinstance(what, tuple):
+                self._expire(q, what, now, done)
+            elif q.done:
+                continue
+            elif q.future.cancelled():           # the caller gave up: stop sending
+                q.done = True
+            elif what is None:
+                self._finish(q, q.fallback, now, done)
+            elif what == q.gen:
+                self._advance(q, now, done)
+
+    def _expire(self, q: _Query, key: tuple, now: float, done: list):
+        """A send unanswered after its RTO: a timeout, and a reply now is ignored."""
+        entry = self._pending.pop(key, None)
+        if entry is None:
+            return
+        entry[1].record_miss(now, timeout=True)
+        q.keys.remove(key)
+        if not q.done and not q.keys and not q.tcp:
+            self._advance(q, now, done)
+
+    # ── sending ───────────────────────────────────────────────────────────────
+
+    def _advance(self, q: _Query, now: float, done: list):
+        """Sends `q` to its next forwarder, or gives up if none is left (lock held)."""
+        while q.attempts < MAX_ATTEMPTS:
+            if q.next < len(q.order):
+                up = q.order[q.next]
+                q.next += 1
+            else:
+                left = [u for u in q.order if u not in q.tried]
+                if not left:
+                    break
+                up = min(left, key=lambda u: (u.is_down(now), u.rto))
+            if self._send(q, up, now):
+                self._schedule(q, up, now)
+                return
+        if not q.keys and not q.tcp:
+            self._finish(q, q.fallback, now, done)
+
+    def _schedule(self, q: _Query, up: Upstream, now: float):
+        """The hedge / retransmit timer after a send to `up`."""
+        more = q.next < len(q.order)
+        delay = min(self.hedge_after, up.rto / 1000) if more else up.rto / 1000
+        self._push(min(now + delay, q.deadline), q, q.gen)
+
+    def _send(self, q: _Query, up: Upstream, now: float) -> bool:
+        idx = random.randrange(self.n_sockets)
+        msg_id = random.getrandbits(16)
+        while (idx, up.addr, msg_id) in self._pending:
+            msg_id = random.getrandbits(16)
+        body = q.body if up.speaks_edns(now) else q.plain
+        try:
+            self._socks[idx].sendto(struct.pack("!H", msg_id) + body, up.addr)
+        except OSError:
+            up.queries += 1
+            up.record_miss(now, timeout=False)
+            q.tried.add(up)
+            return False
+        if q.keys and not q.hedged:
+            q.hedged = True
+            self.hedged += 1
+        if q.first is None:
+            q.first = up
+        key = (idx, up.addr, msg_id)
+        self._pending[key] = (q, up, now, body)
+        self._push(now + up.rto / 1000, q, key)
+        q.keys.append(key)
+        q.attempts += 1
+        q.gen += 1
+        up.queries += 1
+        return True
+
+    # ── receiving ─────────────────────────────────────────────────────────────
+
+    def _read(self, idx: int, now: float, done: list):
+        sock = self._socks[idx]
+        while True:
+            try:
+                reply, addr = sock.recvfrom(65535)
+            except OSError:                      # BlockingIOError: drained
+                return
+            if len(reply) < 12 or not reply[2] & 0x80:
+                self.mismatched += 1
+                continue
+            key = (idx, addr, reply[0] << 8 | reply[1])
+            entry = self._pending.get(key)
+            if entry is None or not _same_question(reply, entry[0].question):
+                self.mismatched += 1
+                continue
+            del self._pending[key]
+            q, up, sent, body = entry
+            q.keys.remove(key)
+            if q.done or q.future.cancelled():   # a hedge that lost: health only
+                q.done = True
+                up.record_rtt((now - sent) * 1000)
+                continue
+            self._on_reply(q, up, reply, body, (now - sent) * 1000, now, done)
+
+    def _on_reply(self, q: _Query, up: Upstream, reply: bytes, body: bytes, rtt_ms: float,
+                  now: float, done: list):
+        if reply[3] & 0x0F == dnswire.RCODE_FORMERR and body is not q.plain:
+            up.record_rtt(rtt_ms)                # alive, but no EDNS0: ask it plainly
+            up.no_edns_until = now + NO_EDNS_FOR
+            self.edns_fallbacks += 1
+            if self._send(q, up, now):
+                self._schedule(q, up, now)
+            else:
+                self._advance(q, now, done)
+            return
+        if reply[3] & 0x0F in _RETRY_RCODES:     # an answer, but no use
+            up.responses += 1
+            up.record_miss(now, timeout=False)
+            q.tried.add(up)
+            q.fallback = q.fallback or (reply, up)
+            self._advance(q, now, done)
+            return
+        up.record_rtt(rtt_ms)
+        if reply[2] & 0x02:                      # TC — ask again over TCP
+            up.tcp_retries += 1
+            self.tcp_retries += 1
+            q.tcp += 1
+            q.fallback = (reply, up)
+            pkt = reply[:2] + body
+            self._tcp_pool.submit(self._tcp_retry, q, up, pkt, max(0.1, q.deadline - now))
+        else:
+            if q.hedged and up is not q.first:
+                self.hedge_wins += 1
+            self._finish(q, (reply, up), now, done)
+
+    def _tcp_retry(self, q: _Query, up: Upstream, pkt: bytes, timeout: float):
+        try:
+            reply = tcp_exchange(pkt, up.addr, timeout)
+        except OSError:
+            reply = b""
+        done = []
+        with self._lock:
+            now = time.monotonic()
+            q.tcp -= 1
+            if not q.done:
+                if (len(reply) >= 12 and reply[:2] == pkt[:2] and reply[2] & 0x80
+                        and reply[3] & 0x0F not in _RETRY_RCODES
+                        and _same_question(reply, q.question)):
+                    self._finish(q, (reply, up), now, done)
+                else:
+                    up.record_miss(now, timeout=False)
+                    q.tried.add(up)
+                    self._advance(q, now, done)
+        self._wake()
+        _resolve(done)
+
+    def _finish(self, q: _Query, result, now: float, done: list):
+        """
+        Completes `q`.  Its other sends stay pending until their RTO, so a
+        late reply still counts for that forwarder's RTT.
+        """
+        q.done = True
+        if result is not None and result[0][3] & 0x0F not in _RETRY_RCODES:
+            self.answered += 1
+        done.append((q.future, result))
+
+
+def _same_question(reply: bytes, question: tuple) -> bool:
+    try:
+        _id, _flags, qname, qtype, qclass, _end = dnswire.parse_question(reply)
+    except dnswire.WireError:
+        return False
+    return (qname, qtype, qclass) == question
+
+
+def _resolve(done: list):
+    """Completes futures outside the pool lock (their callbacks may submit again)."""
+    for future, result in done:
+        if not future.done():
+            future.set_result(result)
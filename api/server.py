@@ -12,29 +12,82 @@ Architecture (PRD §8):
 
 Endpoints:
   GET  /resolve?domain=<domain>[&type=A]   → PRD-compliant JSON response
+       (&trace=1 adds the per-hop timing of a fresh walk)
+  POST /resolve/batch                      → many names, streamed back as NDJSON
   GET  /cache                              → current in-process cache state
   DELETE /cache                            → clear cache
   GET  /metrics                            → query statistics
+  GET  /upstreams                          → per-name-server RTT / timeouts
+  GET  /zones                              → per-zone hop latency / timeouts
   POST /benchmark                          → compare local vs Google vs Cloudflare
+                                             (scratch resolver, median of N runs)
   GET  /health                             → health check
 
 Run:
-  python api/server.py
+  python api/server.py            (Flask, one thread per request)
+  python api/server.py --async    (same API on one asyncio loop — async_server.py)
+
+Environment:
+  DNS_NATIVE=0      ignore the in-process `dnscore` extension even if built
+  DNS_WORKERS=<n>   persistent C++ worker processes (default 4, 0 = one
+                    subprocess per lookup); used when dnscore is unavailable
+  DNS_LISTEN_PORT=<port>  also serve plain DNS over UDP + TCP on this port
+                    (api/dns_listener.py; default off)
+  DNS_BATCH_PARALLELISM=<n>  default concurrent misses per /resolve/batch (16)
+  DNS_CACHE_ENTRIES=<n>      API cache capacity in entries (default 1000)
+  DNS_CACHE_BYTES=<n>        API cache capacity in approximate bytes (default 64 MiB)
+  DNS_SHARED_CACHE=<path>    keep the API cache in this memory-mapped file, shared by
+                             every server process on the host that sets it (e.g.
+                             /dev/shm/dns-cache; api/shm_cache.py; default off).  Sized
+                             by DNS_CACHE_ENTRIES; DNS_SHARED_CACHE_SLOT=<bytes> is the
+                             largest entry it holds (default 4096)
+  DNS_PREFETCH_AT=<f>        re-resolve hot entries after this fraction of their
+                             TTL (default 0.9, 1 = off); DNS_PREFETCH_MIN_HITS=<n>
+                             hits that make an entry hot (default 3)
+  DNS_SERVE_STALE=<s>        serve expired answers for up to this long while
+                             refreshing them (default 86400, 0 = off)
+  DNS_SNAPSHOT=<path>        save the caches here every DNS_SNAPSHOT_EVERY
+                             seconds (default 300) and on exit; reload them at
+                             startup (api/snapshot.py; default off)
+  DNS_FORWARDERS=<ip[:port],…>  recursive resolvers a failed walk falls back to
+                             (default 8.8.8.8,1.1.1.1; api/forwarder.py);
+                             DNS_FORWARD_HEDGE=<s> asks the next one after this
+                             long without a reply (default 0.1),
+                             DNS_FORWARD_SOCKETS=<n> shared UDP sockets (default 4)
+  DNS_STRATEGY=walk|forward|race  how a miss is resolved (default walk):
+                             walk — C++ walk, forwarders only if it fails;
+                             forward — forwarders only; race — the walk, and
+                             the forwarders too once DNS_RACE_GRACE=<s> has
+                             passed without an answer (default 0.2)
+  DNS_RESOLVE_DEADLINE=<s>   budget of one C++ walk, CNAMEs and glue-less NS
+                             lookups included (default 10); DNS_MAX_UPSTREAM_QUERIES=<n>
+                             caps the queries it may send (default 64)
+  DNS_EDNS_PAYLOAD=<bytes>   UDP payload size advertised in an EDNS0 OPT record,
+                             by the C++ walk and the forwarded queries alike
+                             (default 1232, 0 = plain DNS, 512-byte replies)
 """
 
 import os
 import sys
 import json
+import math
 import time
 import random
+import re
 import subprocess
 import threading
-import socket
 import struct
 from collections import OrderedDict, deque
-from flask import Flask, request, jsonify, send_from_directory
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait, FIRST_COMPLETED
+from flask import Flask, Response, request, jsonify, send_from_directory
 from flask_cors import CORS
 
+import dnswire
+from dnswire import QTYPE_IDS, RTYPE_NAMES
+from worker_pool import WorkerPool, PoolBusyError
+from forwarder import ForwarderPool, Upstream
+from shm_cache import SharedDNSCache
+
 # ─────────────────────────────────────────────────────────────────────────────
 #  Configuration
 # ─────────────────────────────────────────────────────────────────────────────
@@ -48,148 +101,885 @@ _BINARY_NIX = os.path.join(_ROOT, "core", "dns_resolver")
 
 BINARY_PATH = _BINARY_WIN if os.path.exists(_BINARY_WIN) else _BINARY_NIX
 
-CACHE_CAPACITY  = 1000
+# In-process extension built by build.sh (core/dnscore*.so / .pyd).
+# Preferred over the worker pool: no subprocess, no JSON round-trip.
+dnscore = None
+if os.environ.get("DNS_NATIVE", "1") != "0":
+    sys.path.insert(0, os.path.join(_ROOT, "core"))
+    try:
+        import dnscore
+    except ImportError:
+        dnscore = None
+
+CACHE_CAPACITY  = int(os.environ.get("DNS_CACHE_ENTRIES", "1000"))
+CACHE_MAX_BYTES = int(os.environ.get("DNS_CACHE_BYTES", str(64 << 20)))
+SHARED_CACHE_PATH = os.environ.get("DNS_SHARED_CACHE", "")
+SHARED_CACHE_SLOT = int(os.environ.get("DNS_SHARED_CACHE_SLOT", "4096"))
+CACHE_SHARDS    = 16     # lock stripes in DNSCache
+CACHE_ENTRY_OVERHEAD = 200   # bytes of Python objects per entry beyond its JSON
 DEFAULT_TTL     = 300    # seconds
+MAX_CACHE_TTL    = 604800  # 7 days  — cap on positive answers (RFC 8767 §4)
+MAX_NEGATIVE_TTL = 10800   # 3 hours — cap on NXDOMAIN / NODATA (RFC 2308 §5)
 API_PORT        = 5000
 RESOLVER_TIMEOUT = 30    # seconds — CNAME chains need extra time
+FALLBACK_TIMEOUT = 5.0   # seconds — one forwarded query, hedges and retries included
+EDNS_PAYLOAD    = int(os.environ.get("DNS_EDNS_PAYLOAD", str(dnswire.EDNS_PAYLOAD)))
+
+# Miss strategy (see _resolve_miss)
+STRATEGIES        = ("walk", "forward", "race")
+RESOLVE_STRATEGY  = os.environ.get("DNS_STRATEGY", "walk")
+RACE_GRACE        = float(os.environ.get("DNS_RACE_GRACE", "0.2"))   # s before forwarding
+RACE_THREADS      = 64          # walks in flight for races (losers finish in the background)
+if RESOLVE_STRATEGY not in STRATEGIES:
+    raise ValueError(f"DNS_STRATEGY must be one of {', '.join(STRATEGIES)}")
+
+# Persistent `dns_resolver --serve` workers (see worker_pool.py)
+WORKER_COUNT         = int(os.environ.get("DNS_WORKERS", "4"))
+WORKER_QUEUE_TIMEOUT = 2.0    # seconds a miss may wait for a free worker
+WORKER_MAX_WAITERS   = 64     # callers allowed to wait before rejecting
+WORKER_HEALTH_EVERY  = 10.0   # seconds between idle-worker pings
+
+# Prefetch and serve-stale (see Refresher)
+PREFETCH_AT          = float(os.environ.get("DNS_PREFETCH_AT", "0.9"))   # fraction of TTL
+PREFETCH_MIN_HITS    = int(os.environ.get("DNS_PREFETCH_MIN_HITS", "3"))
+PREFETCH_WORKERS     = 4
+PREFETCH_MAX_PENDING = 256
+SERVE_STALE_FOR      = int(os.environ.get("DNS_SERVE_STALE", "86400"))  # s past expiry, 0 = off
+STALE_ANSWER_TTL     = 30       # seconds — TTL on stale answers (RFC 8767 §4)
+
+# POST /resolve/batch
+BATCH_MAX_ITEMS       = 100_000
+BATCH_PARALLELISM     = int(os.environ.get("DNS_BATCH_PARALLELISM", "16"))
+BATCH_MAX_PARALLELISM = 64      # = WORKER_MAX_WAITERS: more would only be shed
+
+# /metrics latency histograms (see Metrics)
+METRICS_SLOT        = 5            # seconds per rolling-window slot
+METRICS_WINDOWS     = {"1m": 60, "5m": 300}
+METRICS_PERCENTILES = (50, 90, 99, 99.9)
+METRICS_SUB_BUCKETS = 16           # linear buckets per power of two (≤ 3 % error)
+METRICS_STRIPES     = 8
+PROMETHEUS_BUCKETS  = tuple(2.0 ** k for k in range(-14, 6))   # 61 µs … 32 s, exact
+
+# Warm-restart snapshots (api/snapshot.py)
+SNAPSHOT_PATH  = os.environ.get("DNS_SNAPSHOT", "")
+SNAPSHOT_EVERY = float(os.environ.get("DNS_SNAPSHOT_EVERY", "300"))   # seconds
 
 # ─────────────────────────────────────────────────────────────────────────────
 #  In-process Python-side LRU + TTL cache
 #  (supplements the C++ resolver's own cache so repeated HTTP hits are O(1))
 # ─────────────────────────────────────────────────────────────────────────────
 
+_monotonic = time.monotonic
+
+
+class _Entry:
+    """One cached value: expiry as a monotonic deadline, size for the byte budget."""
+    __slots__ = ("value", "expires", "size", "ref", "hits")
+
+    def __init__(self, value, expires: float, size: int):
+        self.value   = value
+        self.expires = expires
+        self.size    = size
+        self.ref     = False         # read since it last reached the LRU head
+        self.hits    = 0             # popularity since this value was stored
+
+
+class _Shard:
+    __slots__ = ("store", "lock", "bytes", "hits", "misses", "evictions")
+
+    def __init__(self):
+        self.store     = OrderedDict()   # key → _Entry, oldest insertion first
+        self.lock      = threading.Lock()
+        self.bytes     = 0
+        self.hits      = 0
+        self.misses    = 0
+        self.evictions = 0
+
+
+def _approx_size(key: str, value) -> int:
+    """Rough bytes held by an entry: serialised value + key + bookkeeping."""
+    try:
+        if isinstance(value, CachedResponse):
+            body = value.nbytes
+        elif isinstance(value, (bytes, str)):
+            body = len(value)
+        else:
+            body = len(json.dumps(value))
+    except (TypeError, ValueError):
+        body = 512
+    return body + len(key) + CACHE_ENTRY_OVERHEAD
+
+
 class DNSCache:
-    """Thread-safe LRU + TTL cache backed by an OrderedDict."""
+    """
+    Thread-safe LRU + TTL cache, lock-striped over `shards` OrderedDicts
+    keyed by hash(key), so concurrent hits on different names rarely wait
+    for each other.  Bounded by entry count and approximate bytes: an
+    insert that takes the cache over either limit evicts from its own
+    shard, and no shard may hold more than twice its fair share.
+
+    Recency is tracked CLOCK-style: a hit only sets the entry's `ref` bit;
+    eviction pops the oldest entry and gives it a second chance (moved to
+    the tail, bit cleared) if it was read since it got there.  Hits
+    therefore never reorder the dict.
+
+    Expired entries are kept for `stale_window` seconds so lookup(stale=True)
+    can still return them (RFC 8767 serve-stale).
+    """
 
-    def __init__(self, capacity: int = CACHE_CAPACITY):
-        self._cap    = capacity
-        self._store  = OrderedDict()   # key → (value, stored_at, ttl)
-        self._hits   = 0
-        self._misses = 0
-        self._lock   = threading.Lock()
+    def __init__(self, capacity: int = CACHE_CAPACITY, max_bytes: int = CACHE_MAX_BYTES,
+                 shards: int = CACHE_SHARDS, stale_window: float = 0):
+        # Power of two, and at least 64 entries a shard so uneven hashing
+        # costs little capacity (small caches get exact LRU in one shard).
+        shards = 1 << max(0, min(shards, capacity // 64).bit_length() - 1)
+        self._cap         = capacity
+        self._max_bytes   = max_bytes
+        self._shard_cap   = -(-2 * capacity // shards)     # 2 × fair share, ceil
+        self._shard_bytes = -(-2 * max_bytes // shards)
+        self._shards      = tuple(_Shard() for _ in range(shards))
+        self._mask        = shards - 1
+        self.stale_window = stale_window
+
+    def _shard(self, key: str) -> _Shard:
+        return self._shards[hash(key) & self._mask]
 
     # ── public API ────────────────────────────────────────────────────────────
 
     def get(self, key: str):
-        with self._lock:
-            if key not in self._store:
-                self._misses += 1
-                return None
-            value, stored_at, ttl = self._store[key]
-            age = time.time() - stored_at
-            if age >= ttl:
-                del self._store[key]
-                self._misses += 1
-                return None
-            self._store.move_to_end(key)
-            self._hits += 1
-            return value
+        entry = self.lookup(key)
+        return None if entry is None else entry[0]
+
+    def lookup(self, key: str, stale: bool = False):
+        """
+        Like get(), but returns (value, remaining_ttl_seconds) or None.  With
+        stale=True an entry that expired less than `stale_window` seconds ago
+        is returned too, with remaining ≤ 0.
+        """
+        now   = _monotonic()
+        shard = self._shards[hash(key) & self._mask]     # _shard(), inlined: hot path
+        with shard.lock:
+            entry = shard.store.get(key)
+            if entry is not None:
+                if now < entry.expires or (stale and now < entry.expires + self.stale_window):
+                    entry.ref   = True
+                    entry.hits += 1
+                    shard.hits += 1
+                    return entry.value, entry.expires - now
+                if now >= entry.expires + self.stale_window:
+                    del shard.store[key]
+                    shard.bytes -= entry.size
+            shard.misses += 1
+            return None
+
+    def popularity(self, key: str) -> int:
+        """Hits on the entry for `key` since it was last stored (0 if absent)."""
+        entry = self._shard(key).store.get(key)     # a racy read is fine here
+        return entry.hits if entry is not None else 0
 
     def put(self, key: str, value, ttl: int = DEFAULT_TTL):
-        with self._lock:
-            if key in self._store:
-                self._store.move_to_end(key)
-            self._store[key] = (value, time.time(), ttl)
-            if len(self._store) > self._cap:
-                self._store.popitem(last=False)   # evict oldest
+        if ttl <= 0:
+            return                          # TTL 0: use once, never cache
+        entry = _Entry(value, _monotonic() + ttl, _approx_size(key, value))
+        shard = self._shard(key)
+        with shard.lock:
+            old = shard.store.pop(key, None)
+            if old is not None:
+                shard.bytes -= old.size
+            shard.store[key] = entry
+            shard.bytes += entry.size
+            self._evict(shard)
+
+    def _evict(self, shard: _Shard):
+        store = shard.store
+        now   = _monotonic()
+        # Each pass either evicts or clears one ref bit, so this ends within
+        # two laps of the shard even if every entry was recently read.
+        while len(store) > 1 and (len(store) > self._shard_cap or
+                                  shard.bytes > self._shard_bytes or self._over_budget()):
+            key, entry = store.popitem(last=False)
+            if entry.ref and entry.expires > now:
+                entry.ref = False
+                store[key] = entry              # second chance
+                continue
+            shard.bytes -= entry.size
+            shard.evictions += 1
+
+    def _over_budget(self) -> bool:
+        # Other shards are read without their locks: a racing put can make
+        # the total briefly off by a few entries, never unbounded.
+        return (sum(len(sh.store) for sh in self._shards) > self._cap or
+                sum(sh.bytes for sh in self._shards) > self._max_bytes)
+
+    def export(self) -> list:
+        """
+        (key, value, remaining_ttl) for every unexpired entry, each shard
+        oldest first — what a snapshot needs to rebuild the cache.
+        """
+        now = _monotonic()
+        out = []
+        for shard in self._shards:
+            with shard.lock:
+                items = list(shard.store.items())
+            out.extend((k, e.value, e.expires - now) for k, e in items if e.expires > now)
+        return out
+
+    def restore(self, items) -> int:
+        """
+        Bulk put() for a warm start from an iterable of (key, value, ttl),
+        oldest first.  Never replaces an entry already present (it is newer
+        than anything restored), and skips the per-insert budget scan while
+        the cache is under its limits.  Returns the number of entries stored.
+        """
+        now    = _monotonic()
+        size   = sum(len(sh.store) for sh in self._shards)
+        nbytes = sum(sh.bytes for sh in self._shards)
+        stored = 0
+        for key, value, ttl in items:
+            if ttl <= 0:
+                continue
+            entry = _Entry(value, now + ttl, _approx_size(key, value))
+            shard = self._shards[hash(key) & self._mask]
+            with shard.lock:
+                if key in shard.store:
+                    continue
+                shard.store[key] = entry
+                shard.bytes += entry.size
+                size        += 1
+                nbytes      += entry.size
+                if (size > self._cap or nbytes > self._max_bytes or
+                        len(shard.store) > self._shard_cap or shard.bytes > self._shard_bytes):
+                    self._evict(shard)
+                    size   = sum(len(sh.store) for sh in self._shards)
+                    nbytes = sum(sh.bytes for sh in self._shards)
+            stored += 1
+        return stored
 
     def clear(self):
-        with self._lock:
-            self._store.clear()
-            self._hits = self._misses = 0
+        for shard in self._shards:
+            with shard.lock:
+                shard.store.clear()
+                shard.bytes = shard.hits = shard.misses = shard.evictions = 0
 
     def all_entries(self):
-        with self._lock:
-            now = time.time()
-            out = []
-            for k, (v, stored_at, ttl) in list(self._store.items()):
-                remaining = max(0, ttl - (now - stored_at))
+        now = _monotonic()
+        out = []
+        for shard in self._shards:
+            with shard.lock:
+                items = list(shard.store.items())
+            for k, entry in items:
+                v = getattr(entry.value, "body", entry.value)
+                remaining = max(0, entry.expires - now)
+                stale     = now < entry.expires + self.stale_window
                 out.append({
                     "key":           k,
                     "domain":        v.get("domain", ""),
                     "type":          v.get("qtype",  "A"),
                     "ip":            v.get("ip",     ""),
+                    "rcode":         v.get("rcode",  "NOERROR"),
                     "remaining_ttl": int(remaining),
-                    "status":        "valid" if remaining > 0 else "expired",
+                    "status":        (("stale" if stale else "expired") if remaining <= 0 else
+                                      "negative" if v.get("negative") else "valid"),
                 })
-            return out
+        return out
 
     def stats(self):
-        with self._lock:
-            return {
-                "size":     len(self._store),
-                "capacity": self._cap,
-                "hits":     self._hits,
-                "misses":   self._misses,
-                "hit_rate": (
-                    round(self._hits / (self._hits + self._misses) * 100, 1)
-                    if (self._hits + self._misses) > 0 else 0.0
-                ),
-            }
+        size = nbytes = hits = misses = evictions = 0
+        for shard in self._shards:
+            with shard.lock:
+                size      += len(shard.store)
+                nbytes    += shard.bytes
+                hits      += shard.hits
+                misses    += shard.misses
+                evictions += shard.evictions
+        return {
+            "size":      size,
+            "capacity":  self._cap,
+            "bytes":     nbytes,
+            "max_bytes": self._max_bytes,
+            "shards":    len(self._shards),
+            "evictions": evictions,
+            "hits":      hits,
+            "misses":    misses,
+            "hit_rate":  (
+                round(hits / (hits + misses) * 100, 1)
+                if (hits + misses) > 0 else 0.0
+            ),
+        }
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  Pre-encoded cached responses
+#  A hit serves the JSON encoded once at put() time, with the few per-hit
+#  values (cached flag, latency, TTLs counted down) spliced into it.
+# ─────────────────────────────────────────────────────────────────────────────
+
+_SLOT_TOKEN = "slot-" + os.urandom(8).hex() + "-"
+_SLOT_RE    = re.compile(rb'"' + _SLOT_TOKEN.encode() + rb'(-?\d+)"')
+_SLOT_CACHED, _SLOT_LATENCY, _SLOT_TTL = -1, -2, -3      # ≥ 0: a record's own TTL
+
+
+def _encode(body) -> bytes:
+    """JSON exactly as Flask's jsonify() writes it (sorted keys, compact)."""
+    return json.dumps(body, sort_keys=True, separators=(",", ":")).encode()
+
+
+class CachedResponse:
+    """
+    Immutable cache value for one /resolve body.  `body` is shared by every
+    hit and must not be modified; json() and render() build per-hit output
+    without copying it (json) or encoding it (either).
+    """
+    __slots__ = ("body", "status", "nbytes", "_frags", "_slots", "_raw")
+
+    def __init__(self, body: dict, status: int = None):
+        self.body   = body
+        self.status = status if status is not None else (404 if body.get("negative") else 200)
+        slot = lambda n: _SLOT_TOKEN + str(n)                        # noqa: E731
+        template = dict(body, cached=slot(_SLOT_CACHED),
+                        latency_ms=slot(_SLOT_LATENCY), ttl=slot(_SLOT_TTL))
+        for key in ("answers", "authorities"):
+            if key in body:
+                template[key] = [dict(r, ttl=slot(max(0, int(r.get("ttl", 0)))))
+                                 for r in body[key]]
+        parts        = _SLOT_RE.split(_encode(template))
+        self._frags  = parts[0::2]
+        self._slots  = [int(n) for n in parts[1::2]]
+        self.nbytes  = sum(map(len, self._frags)) + 16 * len(self._slots)
+
+    @classmethod
+    def from_json(cls, raw: bytes, status: int) -> "CachedResponse":
+        """
+        A response restored from its encoded body (snapshot load).  Decoding
+        and templating wait for the first hit, so a large snapshot loads at
+        the cost of reading it.
+        """
+        self = cls.__new__(cls)
+        self._raw   = raw
+        self.status = status
+        self.nbytes = len(raw)
+        return self
+
+    def __getattr__(self, name):
+        # Reached only for unset slots, i.e. a from_json() response that has
+        # not been used yet: build it now.  Racing threads build it twice
+        # with the same result.
+        if name not in CachedResponse.__slots__ or name == "_raw":
+            raise AttributeError(name)
+        raw = self._raw
+        if raw is not None:
+            self.__init__(json.loads(raw), self.status)
+            self._raw = None
+        return object.__getattribute__(self, name)
+
+    def encoded(self) -> bytes:
+        """The stored body as JSON (what from_json() takes back)."""
+        raw = getattr(self, "_raw", None)
+        return raw if raw is not None else _encode(self.body)
+
+    def json(self, remaining: float, latency_ms: float) -> bytes:
+        """
+        The body as served on a hit `remaining` seconds before expiry.  An
+        expired entry (remaining ≤ 0) is served stale: "stale": true and
+        TTLs as if STALE_ANSWER_TTL seconds remained (RFC 8767 §4).
+        """
+        if remaining <= 0:
+            return self.json(STALE_ANSWER_TTL, latency_ms)[:-1] + b',"stale":true}'
+        age  = int(self.body.get("ttl", 0) - remaining)
+        frags = self._frags
+        out  = [frags[0]]
+        for i, kind in enumerate(self._slots, 1):
+            if kind >= 0:
+                out.append(b"%d" % (kind - age if kind > age else 0))
+            elif kind == _SLOT_TTL:
+                out.append(b"%d" % int(remaining))
+            elif kind == _SLOT_LATENCY:
+                out.append(repr(latency_ms).encode())
+            else:
+                out.append(b"true")
+            out.append(frags[i])
+        return b"".join(out)
+
+    def render(self, remaining: float, latency_ms: float) -> dict:
+        """The same hit as a fresh dict, for callers that need fields, not bytes."""
+        out = _aged(self.body, remaining if remaining > 0 else STALE_ANSWER_TTL)
+        out["cached"]     = True
+        out["latency_ms"] = latency_ms
+        if remaining <= 0:
+            out["stale"] = True
+        return out
 
 
 # ─────────────────────────────────────────────────────────────────────────────
 #  Metrics tracker
 # ─────────────────────────────────────────────────────────────────────────────
 
+class LatencyHistogram:
+    """
+    Log-linear latency histogram: each power-of-two range of seconds is
+    split into METRICS_SUB_BUCKETS equal buckets, so any percentile is
+    within ~3 % of the true value at every scale.  Buckets are a sparse
+    dict (bucket index → count), so memory is bounded by the spread of
+    latencies seen, never by the number of samples.  Not thread-safe on
+    its own — Metrics serialises writers.
+    """
+    __slots__ = ("counts", "n", "sum", "min", "max")
+
+    def __init__(self):
+        self.counts = {}
+        self.n      = 0
+        self.sum    = 0.0
+        self.min    = float("inf")
+        self.max    = 0.0
+
+    @staticmethod
+    def index(seconds: float) -> int:
+        m, e = math.frexp(seconds if seconds > 1e-6 else 1e-6)      # m in [0.5, 1)
+        return e * METRICS_SUB_BUCKETS + int((m - 0.5) * 2 * METRICS_SUB_BUCKETS)
+
+    @staticmethod
+    def bounds(index: int) -> tuple:
+        e, sub = divmod(index, METRICS_SUB_BUCKETS)
+        step = 0.5 / METRICS_SUB_BUCKETS
+        return math.ldexp(0.5 + sub * step, e), math.ldexp(0.5 + (sub + 1) * step, e)
+
+    def record(self, seconds: float):
+        i = self.index(seconds)
+        self.counts[i] = self.counts.get(i, 0) + 1
+        self.n   += 1
+        self.sum += seconds
+        if seconds < self.min:
+            self.min = seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def merge(self, other: "LatencyHistogram") -> "LatencyHistogram":
+        counts = self.counts
+        for i, c in other.counts.items():
+            counts[i] = counts.get(i, 0) + c
+        self.n   += other.n
+        self.sum += other.sum
+        self.min  = min(self.min, other.min)
+        self.max  = max(self.max, other.max)
+        return self
+
+    def percentile(self, p: float) -> float:
+        """Seconds below which `p` % of samples fall (bucket midpoint), 0 if empty."""
+        if not self.n:
+            return 0.0
+        rank = p / 100 * self.n
+        seen = 0
+        for i in sorted(self.counts):
+            seen += self.counts[i]
+            if seen >= rank:
+                lo, hi = self.bounds(i)
+                return min(max((lo + hi) / 2, self.min), self.max)
+        return self.max
+
+    def count_le(self, seconds: float) -> int:
+        """
+        Samples below `seconds` — exact when `seconds` is a power of two, which
+        is a bucket boundary (a sample landing exactly on it counts above).
+        """
+        limit = self.index(seconds)                 # first bucket starting at `seconds`
+        return sum(c for i, c in self.counts.items() if i < limit)
+
+    def summary(self) -> dict:
+        out = {"count": self.n}
+        for p in METRICS_PERCENTILES:
+            out[f"p{p:g}".replace(".", "")] = round(self.percentile(p) * 1000, 3)
+        return out
+
+
+class _MetricsStripe:
+    __slots__ = ("lock", "slots", "total", "failures")
+
+    def __init__(self):
+        self.lock     = threading.Lock()
+        self.slots    = {}     # slot number → {labels: LatencyHistogram}
+        self.total    = {}     # labels → LatencyHistogram since start
+        self.failures = {}     # labels → failed lookups since start
+
+
 class Metrics:
-    def __init__(self, maxlen: int = 1000):
-        self._history = deque(maxlen=maxlen)
-        self._lock    = threading.Lock()
+    """
+    Streaming query metrics.  Every lookup lands in a LatencyHistogram keyed
+    by its labels — (cache hit/miss, source, qtype, transport) — once in a
+    METRICS_SLOT-second time slot and once in a since-start total.  Rolling
+    windows (METRICS_WINDOWS) merge the slots they cover at read time; slots
+    older than the longest window are dropped as new ones open, so memory
+    stays fixed.
+
+    Writers take one of a few lock stripes picked by thread id, so
+    concurrent recorders rarely meet; readers visit every stripe.
+    """
+
+    LABELS = ("cache", "source", "qtype", "transport")
+
+    RACE_WINNERS = ("walk", "forward", "none")
+
+    def __init__(self, stripes: int = METRICS_STRIPES, recent: int = 20):
+        self._stripes = tuple(_MetricsStripe() for _ in range(stripes))
+        self._keep    = max(METRICS_WINDOWS.values()) // METRICS_SLOT + 1
+        self._recent  = deque(maxlen=recent)       # append is atomic: no lock
+        self._races   = dict.fromkeys(self.RACE_WINNERS, 0)
+        self._race_lock = threading.Lock()
+
+    def record_race(self, winner: str):
+        """One DNS_STRATEGY=race resolution: "walk", "forward" or "none"."""
+        with self._race_lock:
+            self._races[winner] += 1
+
+    def races(self) -> dict:
+        with self._race_lock:
+            return dict(self._races)
 
     def record(self, domain: str, qtype: str, latency_ms: float,
-               success: bool, cached: bool, used_tcp: bool):
-        with self._lock:
-            self._history.append({
-                "ts":         time.time(),
-                "domain":     domain,
-                "qtype":      qtype,
-                "latency_ms": latency_ms,
-                "success":    success,
-                "cached":     cached,
-                "used_tcp":   used_tcp,
-            })
+               success: bool, cached: bool, used_tcp: bool, source: str = "walk"):
+        labels = (("hit", "cache", qtype, "none") if cached else
+                  ("miss", source, qtype, "tcp" if used_tcp else "udp"))
+        seconds = latency_ms / 1000
+        slot    = int(_monotonic() // METRICS_SLOT)
+        stripe  = self._stripes[threading.get_native_id() % len(self._stripes)]
+        with stripe.lock:
+            window = stripe.slots.get(slot)
+            if window is None:
+                window = stripe.slots[slot] = {}
+                for old in [n for n in stripe.slots if n <= slot - self._keep]:
+                    del stripe.slots[old]
+            hist = window.get(labels)
+            if hist is None:
+                hist = window[labels] = LatencyHistogram()
+            hist.record(seconds)
+            hist = stripe.total.get(labels)
+            if hist is None:
+                hist = stripe.total[labels] = LatencyHistogram()
+            hist.record(seconds)
+            if not success:
+                stripe.failures[labels] = stripe.failures.get(labels, 0) + 1
+        self._recent.append({
+            "ts":         time.time(),
+            "domain":     domain,
+            "qtype":      qtype,
+            "latency_ms": latency_ms,
+            "success":    success,
+            "cached":     cached,
+            "used_tcp":   used_tcp,
+        })
+
+    # ── readers ───────────────────────────────────────────────────────────────
+
+    def totals(self) -> tuple:
+        """({labels: LatencyHistogram}, {labels: failures}) since start."""
+        hists, failures = {}, {}
+        for stripe in self._stripes:
+            with stripe.lock:
+                for labels, h in stripe.total.items():
+                    hists.setdefault(labels, LatencyHistogram()).merge(h)
+                for labels, n in stripe.failures.items():
+                    failures[labels] = failures.get(labels, 0) + n
+        return hists, failures
+
+    def window(self, seconds: int) -> dict:
+        """{labels: LatencyHistogram} over the last `seconds` seconds."""
+        first = int(_monotonic() // METRICS_SLOT) - seconds // METRICS_SLOT + 1
+        out = {}
+        for stripe in self._stripes:
+            with stripe.lock:
+                for slot, hists in stripe.slots.items():
+                    if slot >= first:
+                        for labels, h in hists.items():
+                            out.setdefault(labels, LatencyHistogram()).merge(h)
+        return out
+
+    @classmethod
+    def breakdown(cls, hists: dict) -> dict:
+        """Percentiles overall and per value of each label."""
+        everything = LatencyHistogram()
+        by = {name: {} for name in cls.LABELS}
+        for labels, h in hists.items():
+            everything.merge(h)
+            for name, value in zip(cls.LABELS, labels):
+                by[name].setdefault(value, LatencyHistogram()).merge(h)
+        out = everything.summary()
+        for name, values in by.items():
+            out[f"by_{name}"] = {v: h.summary() for v, h in sorted(values.items())}
+        return out
 
     def summary(self):
-        with self._lock:
-            h = list(self._history)
-        if not h:
+        hists, failures = self.totals()
+        total = sum(h.n for h in hists.values())
+        if not total:
             return {"total": 0}
-        total   = len(h)
-        cached  = sum(1 for e in h if e["cached"])
-        success = sum(1 for e in h if e["success"])
-        tcp     = sum(1 for e in h if e["used_tcp"])
-        lats    = [e["latency_ms"] for e in h]
+        overall = LatencyHistogram()
+        for h in hists.values():
+            overall.merge(h)
+        failed = sum(failures.values())
+        cached = sum(h.n for labels, h in hists.items() if labels[0] == "hit")
+        tcp    = sum(h.n for labels, h in hists.items() if labels[3] == "tcp")
+        missed = total - cached
         return {
             "total":            total,
-            "success":          success,
-            "failures":         total - success,
+            "success":          total - failed,
+            "failures":         failed,
             "cached_hits":      cached,
             "cache_hit_rate":   round(cached / total * 100, 1),
             "tcp_fallbacks":    tcp,
-            "avg_latency_ms":   round(sum(lats) / len(lats), 2),
-            "min_latency_ms":   round(min(lats), 2),
-            "max_latency_ms":   round(max(lats), 2),
-            "recent_queries":   h[-20:],
+            "tcp_fallback_rate": round(tcp / missed * 100, 1) if missed else 0.0,
+            "avg_latency_ms":   round(overall.sum / total * 1000, 2),
+            "min_latency_ms":   round(overall.min * 1000, 2),
+            "max_latency_ms":   round(overall.max * 1000, 2),
+            "percentiles":      {name: self.breakdown(self.window(secs))
+                                 for name, secs in METRICS_WINDOWS.items()},
+            "strategy":         RESOLVE_STRATEGY,
+            "race_wins":        self.races(),
+            "recent_queries":   list(self._recent),
         }
 
+    def prometheus(self) -> str:
+        """Text exposition format (version 0.0.4) of the since-start counters and histograms."""
+        hists, failures = self.totals()
+        out = ["# HELP dns_requests_total Lookups answered, by cache result, source, "
+               "qtype, transport and outcome.",
+               "# TYPE dns_requests_total counter"]
+        for labels, h in sorted(hists.items()):
+            failed = failures.get(labels, 0)
+            for outcome, n in (("ok", h.n - failed), ("fail", failed)):
+                out.append(f"dns_requests_total{{{_prom_labels(labels, outcome=outcome)}}} {n}")
+        out += ["# HELP dns_request_duration_seconds Lookup latency as seen by the API.",
+                "# TYPE dns_request_duration_seconds histogram"]
+        for labels, h in sorted(hists.items()):
+            for le in PROMETHEUS_BUCKETS:
+                out.append(f"dns_request_duration_seconds_bucket"
+                           f"{{{_prom_labels(labels, le=repr(le))}}} {h.count_le(le)}")
+            out.append(f"dns_request_duration_seconds_bucket"
+                       f"{{{_prom_labels(labels, le='+Inf')}}} {h.n}")
+            out.append(f"dns_request_duration_seconds_sum{{{_prom_labels(labels)}}} {h.sum!r}")
+            out.append(f"dns_request_duration_seconds_count{{{_prom_labels(labels)}}} {h.n}")
+        out += ["# HELP dns_request_latency_seconds Latency percentiles over rolling windows.",
+                "# TYPE dns_request_latency_seconds gauge"]
+        for name, secs in METRICS_WINDOWS.items():
+            overall = LatencyHistogram()
+            for h in self.window(secs).values():
+                overall.merge(h)
+            for p in METRICS_PERCENTILES:
+                out.append(f'dns_request_latency_seconds{{window="{name}",'
+                           f'quantile="{p / 100:g}"}} {overall.percentile(p)!r}')
+        out += ["# HELP dns_race_wins_total Raced misses (DNS_STRATEGY=race) by the path "
+                "that answered first.",
+                "# TYPE dns_race_wins_total counter"]
+        for winner, n in self.races().items():
+            out.append(f'dns_race_wins_total{{winner="{winner}"}} {n}')
+        return "\n".join(out) + "\n"
+
+
+def _prom_labels(labels: tuple, **extra) -> str:
+    pairs = list(zip(Metrics.LABELS, labels)) + list(extra.items())
+    return ",".join(f'{k}="{v}"' for k, v in pairs)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  Request coalescing (single-flight)
+#  When a popular key expires, every concurrent miss would otherwise launch
+#  its own recursive walk.  The first caller (leader) resolves; callers that
+#  arrive while it is in flight wait for and share its result.
+# ─────────────────────────────────────────────────────────────────────────────
+
+class SingleFlight:
+    """Runs at most one call per key at a time; concurrent callers share it."""
+
+    class _Call:
+        __slots__ = ("done", "result", "error")
+
+        def __init__(self):
+            self.done   = threading.Event()
+            self.result = None
+            self.error  = None
+
+    def __init__(self):
+        self._calls     = {}             # key → _Call in flight
+        self._leaders   = 0
+        self._coalesced = 0
+        self._lock      = threading.Lock()
+
+    def do(self, key: str, fn):
+        """
+        Returns (result, shared).  `shared` is True when this caller waited on
+        another caller's execution instead of running `fn` itself.  Exceptions
+        raised by `fn` propagate to every waiter.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = self._calls[key] = self._Call()
+                self._leaders += 1
+                leader = True
+            else:
+                self._coalesced += 1
+                leader = False
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result, False
+
+    def stats(self):
+        with self._lock:
+            return {
+                "in_flight": len(self._calls),
+                "leaders":   self._leaders,
+                "coalesced": self._coalesced,
+            }
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  Prefetch and serve-stale
+#  A hit on a popular entry in the last (1 - PREFETCH_AT) of its TTL
+#  re-resolves it in the background, so hot names never expire under load.
+#  A hit on an entry that has expired (but by less than SERVE_STALE_FOR) is
+#  answered from the stale entry at once and refreshed the same way
+#  (RFC 8767, with a client response timer of zero).
+# ─────────────────────────────────────────────────────────────────────────────
+
+class Refresher:
+    """Background re-resolution of cache entries, at most one per key."""
+
+    def __init__(self, workers: int = PREFETCH_WORKERS,
+                 max_pending: int = PREFETCH_MAX_PENDING):
+        self._workers     = workers
+        self._max_pending = max_pending
+        self._executor    = None                # started on first use
+        self._pending     = set()               # cache keys being refreshed
+        self._lock        = threading.Lock()
+        self._counters    = {
+            "prefetches":     0,    # refreshes started ahead of expiry
+            "stale_served":   0,    # hits answered from an expired entry
+            "stale_refreshes": 0,   # refreshes started by a stale hit
+            "refreshed":      0,    # refreshes that stored a new answer
+            "refresh_failed": 0,    # … that didn't (stale entry kept)
+            "dropped":        0,    # not started: too many pending
+        }
+
+    def on_hit(self, domain: str, qtype: str, remaining: float, ttl: float):
+        """Called for every cache hit; schedules a refresh when one is due."""
+        cache_key = f"{domain}/{qtype}"
+        if remaining <= 0:
+            with self._lock:
+                self._counters["stale_served"] += 1
+            self._schedule(domain, qtype, cache_key, "stale_refreshes")
+        elif (PREFETCH_AT < 1 and remaining <= ttl * (1 - PREFETCH_AT)
+              and cache.popularity(cache_key) >= PREFETCH_MIN_HITS):
+            self._schedule(domain, qtype, cache_key, "prefetches")
+
+    def _schedule(self, domain: str, qtype: str, cache_key: str, reason: str):
+        with self._lock:
+            if cache_key in self._pending:
+                return
+            if len(self._pending) >= self._max_pending:
+                self._counters["dropped"] += 1
+                return
+            self._pending.add(cache_key)
+            self._counters[reason] += 1
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self._workers,
+                                                    thread_name_prefix="prefetch")
+        self._executor.submit(self._refresh, domain, qtype, cache_key)
+
+    def _refresh(self, domain: str, qtype: str, cache_key: str):
+        ok = False
+        try:
+            # Through the single-flight table, so a client miss for the same
+            # key at the same moment shares this walk.  No client metrics.
+            (body, status, _headers), _shared = inflight.do(
+                cache_key, lambda: _resolve_miss(domain, qtype, cache_key, time.perf_counter()))
+            ok = status == 200 or bool(body.get("negative"))
+        except Exception:
+            ok = False
+        finally:
+            with self._lock:
+                self._pending.discard(cache_key)
+                self._counters["refreshed" if ok else "refresh_failed"] += 1
+
+    def drain(self, timeout: float = 10.0) -> bool:
+        """Waits until no refresh is pending (tests, shutdown)."""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            with self._lock:
+                if not self._pending:
+                    return True
+            time.sleep(0.01)
+        return False
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self._counters, in_flight=len(self._pending))
+
 
 # ─────────────────────────────────────────────────────────────────────────────
 #  C++ resolver bridge
 # ─────────────────────────────────────────────────────────────────────────────
 
-def run_cpp_resolver(domain: str, qtype: str = "A") -> dict:
+_pool      = None
+_pool_lock = threading.Lock()
+
+# One shared native resolver: thread-safe, and dnscore releases the GIL while
+# walking, so concurrent Flask threads resolve in parallel.
+_native = dnscore.Resolver(dnscore.Cache(CACHE_CAPACITY)) if dnscore else None
+
+
+def get_worker_pool():
+    """Lazily starts the persistent worker pool (None when disabled)."""
+    global _pool
+    if WORKER_COUNT <= 0:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            _pool = WorkerPool(
+                [BINARY_PATH, "--serve"],
+                size=WORKER_COUNT,
+                request_timeout=RESOLVER_TIMEOUT,
+                acquire_timeout=WORKER_QUEUE_TIMEOUT,
+                max_waiters=WORKER_MAX_WAITERS,
+                health_interval=WORKER_HEALTH_EVERY,
+            )
+        return _pool
+
+
+def run_cpp_resolver(domain: str, qtype: str = "A", trace: bool = False) -> dict:
     """
-    Calls the compiled C++ binary and returns its parsed JSON output.
-    Raises RuntimeError if the binary is missing or returns an error.
+    Resolves through the C++ engine and returns its result dict.
+    Bridge order: in-process dnscore extension → persistent worker pool →
+    one-shot subprocess.  Raises RuntimeError if the binary is missing or
+    returns an error, and PoolBusyError (a RuntimeError) when every worker
+    is busy.  trace=True skips the C++ answer cache and adds the per-hop
+    "trace" list to the result.
     """
+    if _native is not None:
+        return _native.resolve(domain, qtype, trace=True) if trace else \
+            _native.resolve(domain, qtype)
+
     if not os.path.isfile(BINARY_PATH):
         raise RuntimeError(
             f"C++ binary not found at {BINARY_PATH}. "
             "Run build.bat (Windows) or build.sh (Linux/macOS) first."
         )
 
-    cmd = [BINARY_PATH, domain, qtype]
+    pool = get_worker_pool()
+    if pool is not None:
+        return pool.resolve(domain, qtype, trace=trace)
+
+    cmd = [BINARY_PATH, domain, qtype] + (["--trace"] if trace else [])
     try:
         proc = subprocess.run(
             cmd,
@@ -207,40 +997,106 @@ def run_cpp_resolver(domain: str, qtype: str = "A") -> dict:
         raise RuntimeError(f"C++ resolver returned invalid JSON: {e}")
 
 
+def _merge_server_stats(per_worker) -> list:
+    """
+    Folds the per-process infra-cache snapshots of several workers into one
+    entry per upstream IP: counters are summed, smoothed RTTs are averaged
+    weighted by responses, and the worst RTO / backoff is kept.
+    """
+    merged = {}
+    for servers in per_worker:
+        for sv in servers:
+            m = merged.get(sv["ip"])
+            if m is None:
+                merged[sv["ip"]] = dict(sv)
+                continue
+            total = m["responses"] + sv["responses"]
+            for key in ("srtt_ms", "rttvar_ms"):
+                m[key] = ((m[key] * m["responses"] + sv[key] * sv["responses"]) / total
+                          if total else max(m[key], sv[key]))
+            for key in ("queries", "responses", "timeouts", "failures"):
+                m[key] += sv[key]
+            m["rto_ms"]  = max(m["rto_ms"], sv["rto_ms"])
+            m["backoff"] = max(m["backoff"], sv["backoff"])
+            m["no_edns"] = m.get("no_edns", False) or sv.get("no_edns", False)
+    return list(merged.values())
+
+
+def upstream_stats() -> list:
+    """Per-upstream-server RTT / failure statistics from the C++ infra cache."""
+    if _native is not None:
+        return _native.server_stats()
+    if not os.path.isfile(BINARY_PATH):
+        return []
+    pool = get_worker_pool()
+    if pool is None:
+        return []                 # one-shot subprocesses keep no history
+    replies = pool.broadcast({"op": "servers"})
+    return _merge_server_stats(r.get("servers", []) for r in replies)
+
+
+def _merge_zone_stats(per_worker) -> list:
+    """Folds per-process zone statistics into one entry per zone (sums, worst max)."""
+    merged = {}
+    for zones in per_worker:
+        for z in zones:
+            m = merged.get(z["zone"])
+            if m is None:
+                merged[z["zone"]] = dict(z)
+                continue
+            for key, value in z.items():
+                if key == "max_ms":
+                    m[key] = max(m[key], value)
+                elif key != "zone":
+                    m[key] += value
+    return list(merged.values())
+
+
+def zone_stats() -> list:
+    """Per-zone hop counts and RTTs aggregated from every C++ walk."""
+    if _native is not None:
+        return _native.zone_stats()
+    if not os.path.isfile(BINARY_PATH):
+        return []
+    pool = get_worker_pool()
+    if pool is None:
+        return []
+    replies = pool.broadcast({"op": "zones"})
+    return _merge_zone_stats(r.get("zones", []) for r in replies)
+
 
-def send_udp_query(domain: str, server_ip: str, qtype_id: int = 1) -> float:
+def zone_summary(zones: list) -> dict:
     """
-    Quick UDP query helper for benchmark comparisons.
-    Returns round-trip time in ms, or -1.0 on failure.
+    /zones body: per zone the hop counts, mean RTT over the hops that got a
+    reply and the timeout rate, slowest mean first.
     """
-    try:
-        # Build a minimal DNS query for the domain
-        tid = 0xABCD
-        flags = 0x0100   # RD=1
-        qname = b''.join(bytes([len(l)]) + l.encode() for l in domain.split('.')) + b'\x00'
-        pkt   = struct.pack('!HHHHHH', tid, flags, 1, 0, 0, 0) + qname + struct.pack('!HH', qtype_id, 1)
-
-        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        sock.settimeout(3.0)
-        t0 = time.perf_counter()
-        sock.sendto(pkt, (server_ip, 53))
-        sock.recvfrom(4096)
-        rtt = (time.perf_counter() - t0) * 1000
-        sock.close()
-        return round(rtt, 2)
-    except Exception:
-        return -1.0
+    out = []
+    for z in zones:
+        replied = z["queries"] - z["timeouts"]
+        z = dict(z, avg_ms=round(z["total_ms"] / replied, 3) if replied else None,
+                 max_ms=round(z["max_ms"], 3),
+                 timeout_rate=round(z["timeouts"] / z["queries"], 4) if z["queries"] else 0.0)
+        del z["total_ms"]
+        out.append(z)
+    out.sort(key=lambda z: (z["avg_ms"] is not None, z["avg_ms"] or 0), reverse=True)
+    return {"count": len(out), "zones": out}
 
 
 # ─────────────────────────────────────────────────────────────────────────────
-#  Fallback resolver — queries 8.8.8.8 directly when C++ walk fails
+#  Fallback resolver — forwards to DNS_FORWARDERS when the C++ walk fails
 #  Handles pointer-compressed DNS responses and all common record types.
 # ─────────────────────────────────────────────────────────────────────────────
 
-QTYPE_IDS = {"A": 1, "AAAA": 28, "NS": 2, "MX": 15,
-             "CNAME": 5, "TXT": 16, "PTR": 12, "SOA": 6}
-RTYPE_NAMES = {1: "A", 28: "AAAA", 2: "NS", 5: "CNAME",
-               15: "MX", 16: "TXT", 12: "PTR", 6: "SOA"}
+# Shared by the Flask and asyncio servers; sockets and I/O thread start lazily.
+forwarders = ForwarderPool.from_env(timeout=FALLBACK_TIMEOUT)
+
+
+class FallbackAnswers(list):
+    """fallback_resolve()'s answer dicts, plus the forwarder that gave them."""
+
+    def __init__(self, answers=(), via: str = None):
+        super().__init__(answers)
+        self.via = via
 
 
 def _fb_parse_name(pkt: bytes, offset: int) -> tuple:
@@ -301,33 +1157,24 @@ def _fb_parse_rdata(pkt: bytes, offset: int, rdlength: int, rtype: int) -> str:
         return ""
 
 
-def fallback_resolve(domain: str, qtype: str = "A",
-                     server: str = "8.8.8.8") -> list:
-    """
-    Direct UDP DNS query with RD=1 to a public resolver (default: Google 8.8.8.8).
-    Returns a list of answer dicts matching the C++ resolver answer format.
-    Called when the recursive C++ walk times out or fails for complex domains
-    (e.g. instagram.com, facebook.com which have deep CNAME chains via CDN).
-    """
+def fallback_query(domain: str, qtype: str = "A") -> bytes:
+    """Wire-format RD=1 query for the fallback resolver (random ID, EDNS0 OPT)."""
     qtype_id = QTYPE_IDS.get(qtype.upper(), 1)
-    try:
-        tid    = random.randint(1, 65535)
-        flags  = 0x0100   # RD=1
-        parts  = domain.rstrip('.').split('.')
-        qname  = b''.join(bytes([len(p)]) + p.encode() for p in parts) + b'\x00'
-        pkt    = struct.pack('!HHHHHH', tid, flags, 1, 0, 0, 0)
-        pkt   += qname + struct.pack('!HH', qtype_id, 1)
-
-        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        sock.settimeout(5.0)
-        sock.sendto(pkt, (server, 53))
-        resp, _ = sock.recvfrom(4096)
-        sock.close()
+    tid    = random.randint(1, 65535)
+    flags  = 0x0100   # RD=1
+    parts  = domain.rstrip('.').split('.')
+    qname  = b''.join(bytes([len(p)]) + p.encode() for p in parts) + b'\x00'
+    pkt    = struct.pack('!HHHHHH', tid, flags, 1, 0, 0, 0)
+    pkt   += qname + struct.pack('!HH', qtype_id, 1)
+    return dnswire.add_opt(pkt, EDNS_PAYLOAD) if EDNS_PAYLOAD > 0 else pkt
+
 
+def fallback_answers(resp: bytes, domain: str) -> list:
+    """Answer section of a fallback reply as C++-style answer dicts ([] on error)."""
+    try:
         if len(resp) < 12:
             return []
 
-        resp_id  = (resp[0] << 8) | resp[1]
         rcode    = resp[3] & 0x0F
         ancount  = (resp[6] << 8) | resp[7]
         if rcode != 0 or ancount == 0:
@@ -372,6 +1219,31 @@ def fallback_resolve(domain: str, qtype: str = "A",
         return []
 
 
+def forwarded_answers(got, domain: str) -> FallbackAnswers:
+    """ForwarderPool's (reply, Upstream) or None → FallbackAnswers."""
+    if got is None:
+        return FallbackAnswers()
+    reply, upstream = got
+    return FallbackAnswers(fallback_answers(reply, domain), upstream.ip)
+
+
+def fallback_resolve(domain: str, qtype: str = "A", server: str = None,
+                     port: int = 53) -> list:
+    """
+    RD=1 query through the forwarder pool (hedged across DNS_FORWARDERS, or
+    to `server` alone).  Returns a list of answer dicts matching the C++
+    resolver answer format; its `.via` is the forwarder that answered.
+    Called when the recursive C++ walk times out or fails for complex domains
+    (e.g. instagram.com, facebook.com which have deep CNAME chains via CDN).
+    """
+    upstreams = [Upstream(server, port)] if server else None
+    try:
+        got = forwarders.query(fallback_query(domain, qtype), upstreams)
+    except RuntimeError:                        # pool closed at shutdown
+        got = None
+    return forwarded_answers(got, domain)
+
+
 
 
 # ─────────────────────────────────────────────────────────────────────────────
@@ -381,8 +1253,15 @@ def fallback_resolve(domain: str, qtype: str = "A",
 app     = Flask(__name__, static_folder=_WEB_DIR, static_url_path="/static")
 CORS(app)
 
-cache   = DNSCache()
-metrics = Metrics()
+if SHARED_CACHE_PATH:
+    cache = SharedDNSCache(SHARED_CACHE_PATH, CACHE_CAPACITY, CachedResponse,
+                           stale_window=SERVE_STALE_FOR, slot_size=SHARED_CACHE_SLOT)
+else:
+    cache = DNSCache(stale_window=SERVE_STALE_FOR)
+metrics   = Metrics()
+inflight  = SingleFlight()
+refresher = Refresher()
+snapshotter = None      # snapshot.Snapshotter when DNS_SNAPSHOT is set (see start_background)
 
 VALID_TYPES = {"A", "AAAA", "NS", "MX", "CNAME", "TXT", "PTR", "SOA"}
 
@@ -415,7 +1294,7 @@ def _validate_domain(domain: str) -> str | None:
 @app.route("/resolve", methods=["GET"])
 def resolve():
     """
-    GET /resolve?domain=<domain>[&type=A]
+    GET /resolve?domain=<domain>[&type=A][&trace=1]
 
     PRD §5.4 compliant response:
     {
@@ -428,6 +1307,11 @@ def resolve():
       "resolution_path": [...],
       "used_tcp":   false
     }
+
+    trace=1 resolves afresh (see lookup_traced) and adds "trace": one entry
+    per upstream query — server, zone, qname, start_ms, rtt_ms, outcome
+    (answer / cname / referral / nxdomain / nodata / truncated / timeout /
+    superseded / error), tcp, and ns_lookup for glue-less NS resolution.
     """
     domain = request.args.get("domain", "").strip().lower()
     qtype  = request.args.get("type", "A").upper()
@@ -441,74 +1325,339 @@ def resolve():
         return jsonify({"error": f"Unsupported record type: {qtype}. "
                                   f"Valid types: {', '.join(sorted(VALID_TYPES))}"}), 400
 
+    t0 = time.perf_counter()
+    if wants_trace(request.args.get("trace", "")):
+        body, status, headers = lookup_traced(domain, qtype, t0)
+        return jsonify(body), status, headers
+    hit = lookup_cached_json(domain, qtype, t0)
+    if hit is not None:
+        raw, status = hit
+        return Response(raw, status=status, mimetype="application/json")
+    body, status, headers = lookup_miss(domain, qtype, t0)
+    return jsonify(body), status, headers
+
+
+def wants_trace(value: str) -> bool:
+    return value.lower() in ("1", "true", "yes")
+
+
+def lookup_cached(domain: str, qtype: str, t0: float):
+    """
+    Cache half of a lookup: (body, status) for a fresh cache entry — 404 for
+    cached negative answers — or None on a miss.  Records metrics on a hit.
+    Never blocks on the network, so event-loop front ends call it inline.
+    """
+    hit = _cache_hit(domain, qtype, t0)
+    if hit is None:
+        return None
+    resp, remaining, latency_ms = hit
+    return resp.render(remaining, latency_ms), resp.status
+
+
+def lookup_cached_json(domain: str, qtype: str, t0: float):
+    """lookup_cached() for HTTP front ends: (encoded JSON body, status) or None."""
+    hit = _cache_hit(domain, qtype, t0)
+    if hit is None:
+        return None
+    resp, remaining, latency_ms = hit
+    return resp.json(remaining, latency_ms), resp.status
+
+
+def _cache_hit(domain: str, qtype: str, t0: float):
+    entry = cache.lookup(f"{domain}/{qtype}", stale=True)
+    if entry is None:
+        return None
+    resp, remaining = entry
+    refresher.on_hit(domain, qtype, remaining, resp.body.get("ttl", 0))
+    latency_ms = round((time.perf_counter() - t0) * 1000, 3)
+    metrics.record(domain, qtype, latency_ms, resp.status == 200, True, False)
+    return resp, remaining, latency_ms
+
+
+def lookup_miss(domain: str, qtype: str, t0: float) -> tuple:
+    """
+    Upstream half of a lookup: one resolution per key, shared by concurrent
+    callers (see SingleFlight).  Returns (body, status, headers) and records
+    metrics.  Blocks for the whole walk.
+    """
     cache_key = f"{domain}/{qtype}"
+    result, shared = inflight.do(
+        cache_key, lambda: _resolve_miss(domain, qtype, cache_key, t0))
+    return finish_miss(domain, qtype, t0, result, shared)
+
+
+def lookup_traced(domain: str, qtype: str, t0: float) -> tuple:
+    """
+    lookup_miss() for /resolve?trace=1: always walks — no cache read on
+    either side, no sharing with a concurrent lookup — so the trace is this
+    request's own.  The answer is cached as usual; the trace is not.
+    """
+    cache_key = f"{domain}/{qtype}"
+    result    = _resolve_miss(domain, qtype, cache_key, t0, trace=True)
+    return finish_miss(domain, qtype, t0, result, False)
+
+
+def finish_miss(domain: str, qtype: str, t0: float, result: tuple, shared: bool) -> tuple:
+    """Marks a coalesced result with this caller's latency and records metrics."""
+    body, status, headers = result
+    if shared:
+        body = dict(body)
+        body["coalesced"] = True
+        if "latency_ms" in body:
+            body["latency_ms"] = round((time.perf_counter() - t0) * 1000, 3)
+    if status == 200 or body.get("negative"):
+        metrics.record(domain, qtype, body["latency_ms"], status == 200, False,
+                       body.get("used_tcp", False), _source(body))
+    return body, status, headers
+
+
+def _source(body: dict) -> str:
+    """
+    Where a miss was answered: "walk", "fallback" (a forwarder, after the
+    walk failed) or "forward" (a forwarder, by DNS_STRATEGY=forward or race).
+    """
+    if "forwarder" not in body:
+        return "walk"
+    return "forward" if "strategy" in body else "fallback"
+
 
-    # ── Cache check ───────────────────────────────────────────────────────────
-    t0     = time.perf_counter()
-    cached = cache.get(cache_key)
-    if cached is not None:
-        cached["cached"]     = True
-        cached["latency_ms"] = round((time.perf_counter() - t0) * 1000, 3)
-        metrics.record(domain, qtype, cached["latency_ms"], True, True, False)
-        return jsonify(cached)
+def _answer_ttl(answers: list) -> int:
+    """Cache lifetime of an answer set: its smallest TTL (RFC 2181 §5.2)."""
+    ttls = [a.get("ttl", 0) for a in answers]
+    return min(min(ttls), MAX_CACHE_TTL) if ttls else 0
 
-    # ── Call C++ resolver ─────────────────────────────────────────────────────
+
+def _cache_chain(qtype: str, body: dict):
+    """
+    Caches every CNAME target in body["answers"] as an answer in its own
+    right: the rest of the chain plus the final RRset, for their min TTL.
+    """
+    answers = body["answers"]
+    for i, rec in enumerate(answers[:-1]):
+        if rec.get("type") != "CNAME":
+            break
+        rest   = answers[i + 1:]
+        target = rec["data"].lower().rstrip(".")
+        ttl    = _answer_ttl(rest)
+        cache.put(f"{target}/{qtype}",
+                  CachedResponse(dict(body, domain=target, answers=rest, ttl=ttl)), ttl=ttl)
+
+
+def _aged(body: dict, remaining: float) -> dict:
+    """Copy of a cached body with TTLs counted down by its time in the cache."""
+    out       = dict(body)
+    age       = int(body.get("ttl", 0) - remaining)
+    out["ttl"] = int(remaining)
+    for key in ("answers", "authorities"):
+        if key in body:
+            out[key] = [dict(r, ttl=max(0, r.get("ttl", 0) - age)) for r in body[key]]
+    return out
+
+
+def _resolve_miss(domain: str, qtype: str, cache_key: str, t0: float,
+                  trace: bool = False) -> tuple:
+    """
+    Resolves a cache miss upstream by RESOLVE_STRATEGY — the C++ walk then
+    the forwarders, the forwarders alone, or both raced — and caches the
+    answer for its real TTL — NXDOMAIN / NODATA included, for the
+    SOA-derived negative TTL (RFC 2308).  Returns (body, status, headers).
+    Runs once per key at a time — see SingleFlight.
+    """
+    if RESOLVE_STRATEGY == "forward":
+        result = forward_response(domain, qtype, cache_key, t0,
+                                  fallback_resolve(domain, qtype), "forward")
+        return with_trace(result, None) if trace else result
+    if RESOLVE_STRATEGY == "race":
+        return _race_miss(domain, qtype, cache_key, t0, trace)
     try:
-        cpp_result = run_cpp_resolver(domain, qtype)
+        cpp_result = (run_cpp_resolver(domain, qtype, trace=True) if trace
+                      else run_cpp_resolver(domain, qtype))
+    except PoolBusyError as e:
+        return busy_response(e, domain)
     except RuntimeError as e:
-        # C++ resolver timed-out or errored — try fallback to 8.8.8.8
-        fallback_answers = fallback_resolve(domain, qtype)
-        latency_ms = round((time.perf_counter() - t0) * 1000, 3)
-        if fallback_answers:
-            ip = next((a["data"] for a in fallback_answers if a["type"] == qtype), "")
-            if not ip and fallback_answers:
-                ip = fallback_answers[0]["data"]
-            response_body = {
-                "domain":          domain,
-                "ip":              ip,
-                "record_type":     qtype,
-                "cached":          False,
-                "latency_ms":      latency_ms,
-                "answers":         fallback_answers,
-                "resolution_path": ["8.8.8.8"],
-                "used_tcp":        False,
-                "note":            "resolved via 8.8.8.8 fallback (recursive walk timed out)",
-            }
-            ttl = next((a["ttl"] for a in fallback_answers if a.get("ttl", 0) > 0), 300)
-            cache.put(cache_key, dict(response_body), ttl=ttl)
-            metrics.record(domain, qtype, latency_ms, True, False, False)
-            return jsonify(response_body)
-        return jsonify({"error": str(e)}), 503
+        # C++ resolver timed-out or errored — try the forwarders
+        result = fallback_response(domain, qtype, cache_key, t0,
+                                   fallback_resolve(domain, qtype), error=e)
+        return with_trace(result, None) if trace else result
+    if needs_fallback(cpp_result):
+        # C++ walk returned failure — try Python fallback before giving up
+        result = fallback_response(domain, qtype, cache_key, t0,
+                                   fallback_resolve(domain, qtype), cpp_result=cpp_result)
+    else:
+        result = result_response(domain, qtype, cache_key, t0, cpp_result)
+    return with_trace(result, cpp_result) if trace else result
+
+
+_race_pool = ThreadPoolExecutor(max_workers=RACE_THREADS, thread_name_prefix="race")
+
 
+def _race_miss(domain: str, qtype: str, cache_key: str, t0: float, trace: bool) -> tuple:
+    """
+    DNS_STRATEGY=race: the walk starts at once and the forwarders join after
+    RACE_GRACE s (or as soon as the walk fails); the first usable answer is
+    returned.  A losing forwarder query is cancelled; a losing walk cannot
+    be interrupted, so it finishes on its race thread and is discarded
+    (its delegations still warm the C++ cache).
+    """
+    walk = (_race_pool.submit(run_cpp_resolver, domain, qtype, trace=True) if trace
+            else _race_pool.submit(run_cpp_resolver, domain, qtype))
+    forward, cpp_result, error = None, None, None
+    deadline = t0 + RESOLVER_TIMEOUT
+    pending = {walk}
+    try:
+        while pending:
+            until = t0 + RACE_GRACE if forward is None else deadline
+            done, pending = wait(pending, timeout=max(0.0, until - time.perf_counter()),
+                                 return_when=FIRST_COMPLETED)
+            if walk in done:
+                try:
+                    cpp_result = walk.result()
+                except RuntimeError as e:         # PoolBusyError included
+                    error = e
+                if cpp_result is not None and not needs_fallback(cpp_result):
+                    result = race_result(result_response(domain, qtype, cache_key, t0,
+                                                         cpp_result), "walk")
+                    return with_trace(result, cpp_result) if trace else result
+            if forward is not None and forward in done:
+                answers = forwarded_answers(forward.result(), domain)
+                if answers:
+                    result = race_result(forward_response(domain, qtype, cache_key, t0,
+                                                          answers, "race"), "forward")
+                    return with_trace(result, None) if trace else result
+            if forward is None:
+                forward = forwarders.submit(fallback_query(domain, qtype))
+                pending.add(forward)
+            elif not done:
+                break                             # RESOLVER_TIMEOUT
+    finally:
+        if forward is not None:
+            forward.cancel()                      # no-op once it has finished
+    if cpp_result is None and error is None:
+        error = RuntimeError(f"resolution timed out after {RESOLVER_TIMEOUT}s")
+    result = race_result(fallback_response(domain, qtype, cache_key, t0, FallbackAnswers(),
+                                           cpp_result=cpp_result, error=error), "none")
+    return with_trace(result, cpp_result) if trace else result
+
+
+# The response builders below are shared with api/async_server.py, which
+# gets `cpp_result` / fallback answers without blocking and then builds the
+# same bodies (and caches them the same way).
+
+def with_trace(result: tuple, cpp_result: dict | None) -> tuple:
+    """Adds the walk's per-hop trace to a response body (never to its cached copy)."""
+    result[0]["trace"] = (cpp_result or {}).get("trace", [])
+    return result
+
+
+def race_result(result: tuple, winner: str) -> tuple:
+    """Marks a raced miss with the path that answered first and counts it."""
+    metrics.record_race(winner)
+    result[0]["strategy"] = "race"
+    result[0]["winner"]   = winner
+    return result
+
+
+def busy_response(err: Exception, domain: str) -> tuple:
+    # Every worker is busy — shed load instead of queueing unboundedly
+    return {"error": str(err), "domain": domain}, 503, {"Retry-After": "1"}
+
+
+def needs_fallback(cpp_result: dict) -> bool:
+    """A failed walk that is not an authoritative NXDOMAIN / NODATA."""
+    return (not cpp_result.get("success")
+            and cpp_result.get("rcode") not in ("NXDOMAIN", "NOERROR"))
+
+
+def forward_response(domain: str, qtype: str, cache_key: str, t0: float,
+                     answers: list, strategy: str) -> tuple:
+    """
+    Response for a miss sent to the forwarders without waiting for the
+    walk to fail: DNS_STRATEGY=forward, or a race the forwarders won.
+    """
+    why = "forward-only" if strategy == "forward" else "answered before the walk"
+    result = fallback_response(domain, qtype, cache_key, t0, answers,
+                               cpp_result={"error": "no forwarder answered with records"},
+                               why=why)
+    if strategy == "forward":
+        result[0]["strategy"] = "forward"
+    return result
+
+
+def fallback_response(domain: str, qtype: str, cache_key: str, t0: float,
+                      fallback_answers: list, cpp_result: dict = None,
+                      error: Exception = None, why: str = None) -> tuple:
+    """
+    Response for a miss the C++ walk could not answer: `cpp_result` is its
+    failed result, or None when the bridge itself raised `error`.  `why`
+    overrides the reason given in the note.
+    """
+    latency_ms = round((time.perf_counter() - t0) * 1000, 3)
+    if fallback_answers:
+        ip = next((a["data"] for a in fallback_answers if a["type"] == qtype), "")
+        if not ip and fallback_answers:
+            ip = fallback_answers[0]["data"]
+        via = getattr(fallback_answers, "via", None) or forwarders.upstreams[0].ip
+        if cpp_result is None:
+            path, why = [via], why or "recursive walk timed out"
+        else:
+            path = cpp_result.get("resolution_path", []) + [via]
+            why  = why or "recursive walk incomplete"
+        response_body = {
+            "domain":          domain,
+            "ip":              ip,
+            "record_type":     qtype,
+            "cached":          False,
+            "latency_ms":      latency_ms,
+            "answers":         fallback_answers,
+            "resolution_path": path,
+            "used_tcp":        False,
+            "forwarder":       via,
+            "note":            f"resolved via {via} fallback ({why})",
+        }
+        ttl = _answer_ttl(fallback_answers)
+        response_body["ttl"] = ttl
+        cache.put(cache_key, CachedResponse(dict(response_body)), ttl=ttl)
+        return response_body, 200, {}
+    if cpp_result is None:
+        return {"error": str(error)}, 503, {}
+    body = {
+        "error":      cpp_result.get("error", "Resolution failed"),
+        "domain":     domain,
+        "latency_ms": latency_ms,
+    }
+    if "exhausted" in cpp_result:
+        # The walk ran out of its deadline or query budget: SERVFAIL, plus
+        # the hops it got through.
+        body.update(rcode="SERVFAIL", exhausted=cpp_result["exhausted"],
+                    upstream_queries=cpp_result.get("upstream_queries", 0),
+                    trace=cpp_result.get("trace", []))
+    return body, 404, {}
+
+
+def result_response(domain: str, qtype: str, cache_key: str, t0: float,
+                    cpp_result: dict) -> tuple:
+    """Response (and cache entries) for a successful or authoritative-negative walk."""
     latency_ms = round((time.perf_counter() - t0) * 1000, 3)
 
     if not cpp_result.get("success"):
-        # C++ walk returned failure — try Python fallback before giving up
-        fallback_answers = fallback_resolve(domain, qtype)
-        if fallback_answers:
-            ip = next((a["data"] for a in fallback_answers if a["type"] == qtype), "")
-            if not ip and fallback_answers:
-                ip = fallback_answers[0]["data"]
-            response_body = {
-                "domain":          domain,
-                "ip":              ip,
-                "record_type":     qtype,
-                "cached":          False,
-                "latency_ms":      latency_ms,
-                "answers":         fallback_answers,
-                "resolution_path": cpp_result.get("resolution_path", []) + ["8.8.8.8"],
-                "used_tcp":        False,
-                "note":            "resolved via 8.8.8.8 fallback (recursive walk incomplete)",
-            }
-            ttl = next((a["ttl"] for a in fallback_answers if a.get("ttl", 0) > 0), 300)
-            cache.put(cache_key, dict(response_body), ttl=ttl)
-            metrics.record(domain, qtype, latency_ms, True, False, False)
-            return jsonify(response_body)
-        return jsonify({
-            "error":      cpp_result.get("error", "Resolution failed"),
-            "domain":     domain,
-            "latency_ms": latency_ms,
-        }), 404
+        # Authoritative negative answer — final, so no public-resolver
+        # fallback; cache it so repeated typos don't trigger new walks.
+        ttl = min(cpp_result.get("ttl", 0), MAX_NEGATIVE_TTL)
+        response_body = {
+            "domain":          domain,
+            "record_type":     qtype,
+            "rcode":           cpp_result["rcode"],
+            "negative":        True,
+            "error":           cpp_result.get("error", "no such record"),
+            "cached":          False,
+            "latency_ms":      latency_ms,
+            "ttl":             ttl,
+            "answers":         [],
+            "authorities":     cpp_result.get("authorities", []),
+            "resolution_path": cpp_result.get("resolution_path", []),
+        }
+        cache.put(cache_key, CachedResponse(dict(response_body)), ttl=ttl)
+        return response_body, 404, {}
 
     # Extract the primary IP from the first A/AAAA answer
     ip = ""
@@ -519,12 +1668,12 @@ def resolve():
     if not ip and cpp_result.get("answers"):
         ip = cpp_result["answers"][0].get("data", "")
 
-    # Build PRD-compliant response
-    ttl = 300
-    for ans in cpp_result.get("answers", []):
-        if ans.get("ttl", 0) > 0:
-            ttl = ans["ttl"]
-            break
+    # Build PRD-compliant response; the C++ side reports the RRset minimum
+    # (older binaries don't, so derive it from the answers).
+    ttl = cpp_result.get("ttl")
+    if ttl is None:
+        ttl = _answer_ttl(cpp_result.get("answers", []))
+    ttl = min(ttl, MAX_CACHE_TTL)
 
     response_body = {
         "domain":          domain,
@@ -532,21 +1681,153 @@ def resolve():
         "record_type":     qtype,
         "cached":          False,
         "latency_ms":      latency_ms,
+        "ttl":             ttl,
         "answers":         cpp_result.get("answers", []),
         "resolution_path": cpp_result.get("resolution_path", []),
+        "start_zone":      cpp_result.get("start_zone", "."),
+        "hops_saved":      cpp_result.get("hops_saved", 0),
         "used_tcp":        cpp_result.get("used_tcp", False),
     }
 
-    # Store in Python-side cache
-    cache.put(cache_key, dict(response_body), ttl=ttl)
+    # Store in Python-side cache, plus each intermediate CNAME target
+    cache.put(cache_key, CachedResponse(dict(response_body)), ttl=ttl)
+    if qtype != "CNAME":
+        _cache_chain(qtype, response_body)
+
+    return response_body, 200, {}
+
 
-    metrics.record(domain, qtype,
-                   latency_ms,
-                   True,
-                   False,
-                   cpp_result.get("used_tcp", False))
+# ── /resolve/batch ─────────────────────────────────────────────────────────────
+
+@app.route("/resolve/batch", methods=["POST"])
+def resolve_batch():
+    """
+    POST /resolve/batch
+    {"items": [{"domain": "a.com", "type": "A"}, "b.com", ...],
+     "type": "A", "parallelism": 16}
+
+    Streams NDJSON, one line per distinct (domain, type) as it completes —
+    invalid items first, then cache hits, then misses resolved up to
+    `parallelism` at a time — followed by a {"summary": {...}} line.  Each
+    line is the /resolve body plus "type" and the HTTP "status" it would
+    have had.
+    """
+    try:
+        items, rejected, parallelism, total = batch_request(request.get_json(silent=True))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    def stream():
+        t_start = time.perf_counter()
+        counts  = batch_counts(rejected)
+        for line in rejected:
+            yield batch_line(*line)
+
+        misses = []
+        for domain, qtype in items:
+            hit = lookup_cached_json(domain, qtype, time.perf_counter())
+            if hit is None:
+                misses.append((domain, qtype))
+                continue
+            yield batch_hit(counts, qtype, *hit)
+
+        executor = ThreadPoolExecutor(max_workers=parallelism, thread_name_prefix="batch")
+        try:
+            futures = {executor.submit(lambda d, q: lookup_miss(d, q, time.perf_counter()),
+                                       domain, qtype): (domain, qtype)
+                       for domain, qtype in misses}
+            for future in as_completed(futures):
+                domain, qtype = futures[future]
+                try:
+                    body, status, _headers = future.result()
+                except Exception as e:
+                    body, status = {"error": str(e), "domain": domain}, 500
+                batch_tally(counts, body, status)
+                yield batch_line(domain, qtype, body, status)
+        finally:
+            # Client went away mid-stream: drop the misses not yet started.
+            executor.shutdown(wait=False, cancel_futures=True)
+        yield batch_summary(counts, total, len(items) + len(rejected), t_start)
+
+    return Response(stream(), mimetype="application/x-ndjson")
+
+
+def batch_request(payload) -> tuple:
+    """
+    Validates and dedupes a /resolve/batch body.  Returns (items, rejected,
+    parallelism, total): unique (domain, qtype) pairs in first-seen order,
+    (domain, qtype, body, 400) tuples for invalid items, and the clamped
+    parallelism.  Raises ValueError if the body itself is unusable.
+    """
+    if isinstance(payload, list):
+        payload = {"items": payload}
+    if not isinstance(payload, dict) or not isinstance(payload.get("items"), list):
+        raise ValueError('body must be {"items": [...]} or a JSON list')
+    raw = payload["items"]
+    if len(raw) > BATCH_MAX_ITEMS:
+        raise ValueError(f"at most {BATCH_MAX_ITEMS} items per batch")
+    default_type = str(payload.get("type", "A")).upper()
+    try:
+        parallelism = int(payload.get("parallelism", BATCH_PARALLELISM))
+    except (TypeError, ValueError):
+        raise ValueError("parallelism must be an integer")
+    parallelism = max(1, min(parallelism, BATCH_MAX_PARALLELISM))
+
+    seen, items, rejected = set(), [], []
+    for item in raw:
+        if isinstance(item, str):
+            domain, qtype = item, default_type
+        elif isinstance(item, dict):
+            domain, qtype = item.get("domain", ""), item.get("type", default_type)
+        else:
+            domain, qtype = "", default_type
+        domain = str(domain).strip().lower().rstrip(".")   # "a.com." and "A.com" are one name
+        qtype  = str(qtype).upper()
+        if (domain, qtype) in seen:
+            continue
+        seen.add((domain, qtype))
+        err = _validate_domain(domain)
+        if not err and qtype not in VALID_TYPES:
+            err = f"Unsupported record type: {qtype}"
+        if err:
+            rejected.append((domain, qtype, {"error": err}, 400))
+        else:
+            items.append((domain, qtype))
+    return items, rejected, parallelism, len(raw)
 
-    return jsonify(response_body)
+
+def batch_line(domain: str, qtype: str, body: dict, status: int) -> bytes:
+    return (json.dumps({**body, "domain": domain, "type": qtype, "status": status})
+            + "\n").encode()
+
+
+def batch_hit(counts: dict, qtype: str, raw: bytes, status: int) -> bytes:
+    """batch_line() for a cache hit: splices type/status into the pre-encoded body."""
+    counts["cache_hits"] += 1
+    counts["ok" if status == 200 else "negative"] += 1     # cached 404s are negative
+    return raw[:-1] + b',"status":%d,"type":"%s"}\n' % (status, qtype.encode())
+
+
+def batch_counts(rejected: list) -> dict:
+    return {"cache_hits": 0, "ok": 0, "negative": 0, "failed": len(rejected)}
+
+
+def batch_tally(counts: dict, body: dict, status: int):
+    if status == 200:
+        counts["ok"] += 1
+    elif body.get("negative"):
+        counts["negative"] += 1
+    else:
+        counts["failed"] += 1
+
+
+def batch_summary(counts: dict, total: int, unique: int, t_start: float) -> bytes:
+    return (json.dumps({"summary": {
+        "items":      total,
+        "unique":     unique,
+        **counts,
+        "elapsed_ms": round((time.perf_counter() - t_start) * 1000, 3),
+    }}) + "\n").encode()
 
 
 # ── /cache ─────────────────────────────────────────────────────────────────────
@@ -569,73 +1850,122 @@ def clear_cache():
 
 @app.route("/metrics", methods=["GET"])
 def get_metrics():
-    return jsonify(metrics.summary())
+    if wants_prometheus(request.args.get("format", ""), request.headers.get("Accept", "")):
+        return Response(metrics.prometheus(), content_type=PROMETHEUS_CONTENT_TYPE)
+    summary = metrics.summary()
+    summary["coalescing"] = inflight.stats()
+    summary["prefetch"]   = refresher.stats()
+    summary["snapshot"]   = snapshotter.stats() if snapshotter is not None else None
+    return jsonify(summary)
 
 
-# ── /benchmark ─────────────────────────────────────────────────────────────────
+def wants_prometheus(fmt: str, accept: str) -> bool:
+    """?format=prometheus, or a scraper's Accept: text/plain / OpenMetrics."""
+    if fmt:
+        return fmt == "prometheus"
+    return accept.startswith(("text/plain", "application/openmetrics-text"))
 
-@app.route("/benchmark", methods=["POST"])
-def run_benchmark():
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+# ── /upstreams ─────────────────────────────────────────────────────────────────
+
+@app.route("/upstreams", methods=["GET"])
+def get_upstreams():
     """
-    POST /benchmark
-    Body: { "domains": ["google.com", "example.com"], "type": "A" }
-    Compares: Local resolver vs Google (8.8.8.8) vs Cloudflare (1.1.1.1)
+    GET /upstreams — smoothed RTT, RTO and timeout / failure counts per
+    upstream name server, slowest first, and the forwarder pool's health.
     """
-    body    = request.get_json(silent=True) or {}
-    domains = body.get("domains", ["google.com", "example.com", "wikipedia.org"])
-    qtype   = body.get("type", "A").upper()
+    servers = sorted(upstream_stats(), key=lambda s: s["rto_ms"], reverse=True)
+    for sv in servers:
+        for key in ("srtt_ms", "rttvar_ms", "rto_ms"):
+            sv[key] = round(sv[key], 3)
+    return jsonify({"count": len(servers), "servers": servers,
+                    "forwarders": forwarders.stats()})
 
-    if not isinstance(domains, list) or len(domains) > 20:
-        return jsonify({"error": "domains must be a list with at most 20 entries"}), 400
 
-    results = []
-    for domain in domains:
-        row = {"domain": domain, "type": qtype}
+# ── /zones ─────────────────────────────────────────────────────────────────────
 
-        # 1. Local resolver (cold cache) — clear first to force resolution
-        cache.clear()
-        t0 = time.perf_counter()
-        try:
-            cpp_result = run_cpp_resolver(domain, qtype)
-            row["local_cold_ms"] = round((time.perf_counter() - t0) * 1000, 2)
-            row["local_success"] = cpp_result.get("success", False)
-        except RuntimeError as e:
-            row["local_cold_ms"] = None
-            row["local_success"] = False
-            row["local_error"]   = str(e)
-
-        # 2. Local resolver (warm cache)
-        t0 = time.perf_counter()
-        cached_hit = cache.get(f"{domain}/{qtype}")
-        if cached_hit:
-            row["local_warm_ms"] = round((time.perf_counter() - t0) * 1000, 3)
-        else:
-            row["local_warm_ms"] = None
+@app.route("/zones", methods=["GET"])
+def get_zones():
+    """
+    GET /zones — per-zone query, referral, timeout and error counts and
+    mean / max RTT, from every hop the C++ walks have made.
+    """
+    return jsonify(zone_summary(zone_stats()))
 
-        # 3. Google DNS (8.8.8.8)
-        type_id_map = {"A": 1, "AAAA": 28, "NS": 2, "MX": 15}
-        type_id = type_id_map.get(qtype, 1)
-        row["google_ms"]     = send_udp_query(domain, "8.8.8.8", type_id)
-        row["cloudflare_ms"] = send_udp_query(domain, "1.1.1.1", type_id)
 
-        results.append(row)
+# ── /benchmark ─────────────────────────────────────────────────────────────────
 
-    return jsonify({"results": results})
+@app.route("/benchmark", methods=["POST"])
+def run_benchmark():
+    """
+    POST /benchmark
+    Body: { "domains": ["google.com", "example.com"], "type": "A", "runs": 5 }
+    Compares: Local resolver (cold + warm) vs Google (8.8.8.8) vs Cloudflare
+    (1.1.1.1), median and spread over `runs` samples each.  Runs on scratch
+    resolvers and caches (api/benchmark.py): the serving cache is untouched.
+    """
+    import benchmark
+    try:
+        domains, qtype, runs = benchmark.parse_request(request.get_json(silent=True) or {})
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"results": benchmark.run(domains, qtype, runs)})
 
 
 # ── /health ────────────────────────────────────────────────────────────────────
 
 @app.route("/health", methods=["GET"])
 def health():
-    binary_ok = os.path.isfile(BINARY_PATH)
+    binary_ok = _native is not None or os.path.isfile(BINARY_PATH)
     return jsonify({
         "status":     "ok" if binary_ok else "degraded",
         "binary":     BINARY_PATH,
         "binary_ok":  binary_ok,
+        "bridge":     "native" if _native is not None else
+                      ("workers" if WORKER_COUNT > 0 else "subprocess"),
         "cache_size": cache.stats()["size"],
+        "workers":    _pool.stats() if _pool is not None else None,
     }), 200 if binary_ok else 503
 
 
+# ─────────────────────────────────────────────────────────────────────────────
+#  Background services
+# ─────────────────────────────────────────────────────────────────────────────
+
+_background_started = False
+
+
+def start_background():
+    """
+    Loads DNS_SNAPSHOT and starts its Snapshotter, and starts the DNS
+    listener on DNS_LISTEN_PORT.  Called by both entry points (this module's
+    __main__ and async_server.main()); only the first call does anything.
+    """
+    global _background_started, snapshotter
+    if _background_started:
+        return
+    _background_started = True
+
+    if SNAPSHOT_PATH:
+        import atexit
+        import snapshot
+        loaded = snapshot.load(SNAPSHOT_PATH)
+        print(f"  Snapshot   : {SNAPSHOT_PATH} — {loaded['entries']} answers, "
+              f"{loaded['zones']} zone cuts loaded in {loaded['seconds']}s "
+              f"({loaded['expired']} expired)")
+        snapshotter = snapshot.Snapshotter(SNAPSHOT_PATH, SNAPSHOT_EVERY).start()
+        atexit.register(snapshotter.stop)
+
+    listen_port = int(os.environ.get("DNS_LISTEN_PORT", "0"))
+    if listen_port:
+        from dns_listener import DNSListener
+        dns = DNSListener(port=listen_port).start_in_thread()
+        print(f"  DNS        : udp+tcp {dns.host}:{dns.port}")
+
+
 # ─────────────────────────────────────────────────────────────────────────────
 #  Entry point
 # ─────────────────────────────────────────────────────────────────────────────
@@ -646,6 +1976,7 @@ if __name__ == "__main__":
     print("=" * 60)
     print(f"  C++ binary : {BINARY_PATH}")
     print(f"  Binary OK  : {os.path.isfile(BINARY_PATH)}")
+    print(f"  Extension  : {'dnscore (in-process)' if _native else 'not built — using subprocess bridge'}")
     print(f"  Listening  : http://127.0.0.1:{API_PORT}")
     print(f"  Dashboard  : http://127.0.0.1:{API_PORT}/")
     print("=" * 60)
@@ -654,6 +1985,16 @@ if __name__ == "__main__":
         print("\n⚠  WARNING: C++ binary not found!")
         print("  Run `build.bat` first to compile the resolver.\n")
 
+    # dns_listener / async_server do `import server`; make that this module,
+    # not a second copy with its own cache.
+    sys.modules.setdefault("server", sys.modules[__name__])
+    start_background()
+
+    if "--async" in sys.argv[1:]:
+        import async_server
+        async_server.main([a for a in sys.argv[1:] if a != "--async"])
+        sys.exit(0)
+
     import webbrowser
     import threading
     threading.Timer(1.5, lambda: webbrowser.open(f"http://127.0.0.1:{API_PORT}/")).start()
@@ -0,0 +1,554 @@
+"""
+api/shm_cache.py  —  DNS Resolution Service  —  Cross-process answer cache
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+SharedDNSCache: the same interface as server.py's DNSCache, kept in one
+memory-mapped file, so several `api/server.py` processes on a host (behind a
+load balancer, or forked by a pre-fork server) answer from one warm cache
+instead of one cold cache each.  Chosen by DNS_SHARED_CACHE=<path>;
+/dev/shm/<name> keeps it in memory.
+
+File layout (native byte order, fixed when the file is created):
+
+  header    magic, geometry (buckets, ways, slot size, stripes, process rows)
+            and the creation epoch (wall − monotonic clock)
+  stripes   per lock stripe: live entries, bytes held
+  rows      per process: pid, hits, misses, evictions, too-large puts
+  heads     per bucket (64 bytes): a sequence counter (seqlock) and the key
+            hash of each way, so a lookup finds its slot from one read
+  slots     buckets × ways fixed-size slots:
+              state ref tag · status keylen vlen · hash crc hits · expires stored
+              key (UTF-8)  value (CachedResponse JSON, or any JSON value)
+
+A key lives in bucket crc32(key) mod buckets, in any of its `ways` slots —
+open addressing with the probe bounded to one bucket, so no tombstones and
+no probe sequence crosses a lock.  Writers take the bucket's stripe lock (a
+threading.Lock within the process, an fcntl byte-range lock across them) and
+bump the bucket's sequence counter to odd before writing and to even after.
+Readers take no lock: they read the counter, the slot and the counter again,
+retry if a write overlapped, and check the crc32 of key + value; after
+READ_RETRIES collisions they read under the lock.  A hit sets the slot's
+ref bit and bumps its hit count in place — hints, deliberately unlocked.
+
+Semantics follow DNSCache: monotonic expiry (CLOCK_MONOTONIC is host-wide,
+and a file from before a reboot is wiped on open), a `stale_window` for
+serve-stale, and second-chance eviction within the bucket (an expired slot
+first, then the oldest not read since it was last passed over).  Each
+process keeps the values it has decoded, keyed by slot and checksum, so a
+hit on an unchanged entry only reads the slot header and key.  Values
+larger than a slot are not cached (`too_large`).  POSIX only (fcntl).
+"""
+
+import os
+import json
+import mmap
+import time
+import zlib
+import struct
+import weakref
+import threading
+
+try:
+    import fcntl
+except ImportError:            # Windows: no shared cache, server.py keeps DNSCache
+    fcntl = None
+
+MAGIC        = b"DNSSHM\x00\x01"
+WAYS         = 8               # slots per bucket
+SLOT_SIZE    = 4096            # bytes per slot, header included
+MAX_STRIPES  = 64              # write locks
+MAX_PROCS    = 64              # per-process counter rows
+READ_RETRIES = 4               # lock-free attempts before reading under the lock
+EPOCH_SLACK  = 60.0            # seconds the wall − monotonic offset may drift
+
+_HEADER  = struct.Struct("=8sIIIIId")          # magic buckets ways slot stripes procs epoch
+_STRIPE  = struct.Struct("=QQ")                # entries, bytes
+_ROW     = struct.Struct("=QQQQQ")             # pid, hits, misses, evictions, too_large
+_SEQ     = struct.Struct("=Q")
+_HEAD    = struct.Struct(f"=Q{WAYS}I")         # seq, hash of each way
+_HEAD_STRIDE = 64
+_SLOT    = struct.Struct("=BBBxHHIIIIdd")      # see the module docstring
+_U32     = struct.Struct("=I")
+_U8      = struct.Struct("=B")
+
+# Fields of an unpacked slot header, and byte offsets written in place
+_STATE, _REF, _TAG, _STATUS, _KEYLEN, _VLEN, _HASH, _CRC, _HITS_F, _EXPIRES, _STORED = range(11)
+_REF_AT, _HITS_AT = 1, 20
+
+_HITS, _MISSES, _EVICTIONS, _TOO_LARGE = range(4)
+_TAG_JSON, _TAG_RESPONSE = 0, 1
+
+_monotonic = time.monotonic
+
+
+def _align(n: int, to: int = 64) -> int:
+    return -(-n // to) * to
+
+
+class SharedDNSCache:
+    """
+    DNSCache in a memory-mapped file shared by every process that opens
+    `path` with the same geometry.  `value_type` is the class stored as
+    encoded JSON plus status (server.CachedResponse: `.encoded()`,
+    `.status`, `from_json(raw, status)`); other values go through json.
+    """
+
+    def __init__(self, path: str, capacity: int, value_type=None, stale_window: float = 0,
+                 slot_size: int = SLOT_SIZE):
+        if fcntl is None:
+            raise RuntimeError("the shared cache needs POSIX fcntl locks")
+        buckets = 1 << max(0, (-(-capacity // WAYS) - 1).bit_length())
+        self.path         = path
+        self.stale_window = stale_window
+        self._value_type  = value_type
+        self._buckets     = buckets
+        self._slot        = slot_size
+        self._stripes     = min(buckets, MAX_STRIPES)
+        self._stripe_at   = _align(_HEADER.size)
+        self._rows_at     = _align(self._stripe_at + self._stripes * _STRIPE.size)
+        self._heads_at    = _align(self._rows_at + MAX_PROCS * _ROW.size)
+        self._slots_at    = _align(self._heads_at + buckets * _HEAD_STRIDE, 4096)
+        self._size        = self._slots_at + buckets * WAYS * slot_size
+        self._locks       = tuple(threading.Lock() for _ in range(self._stripes))
+        self._count_lock  = threading.Lock()
+        self._memo        = {}             # slot index → (crc, stored, key, value)
+        self._mask        = buckets - 1
+        self._row         = None             # offset of this process's counter row
+
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            with self._file_lock(0):
+                self._open()
+        except BaseException:
+            os.close(self._fd)
+            raise
+        self._claim_row()
+        ref = weakref.ref(self)
+        os.register_at_fork(after_in_child=lambda: ref() and ref()._claim_row())
+
+    def _open(self):
+        """Maps the file, creating or checking its header (header lock held)."""
+        epoch = time.time() - _monotonic()
+        header = (MAGIC, self._buckets, WAYS, self._slot, self._stripes, MAX_PROCS)
+        size = os.fstat(self._fd).st_size
+        if size == 0:
+            os.ftruncate(self._fd, self._size)
+            self._mm = mmap.mmap(self._fd, self._size)
+            _HEADER.pack_into(self._mm, 0, *header, epoch)
+            return
+        raw = os.pread(self._fd, _HEADER.size, 0)
+        found = _HEADER.unpack(raw) if len(raw) == _HEADER.size else (b"",) + (0,) * 6
+        if size != self._size or found[:6] != header:
+            raise ValueError(f"{self.path} holds a shared cache of another geometry "
+                             f"({found[1]} buckets × {found[2]} ways of {found[3]} bytes); "
+                             f"remove it or open it with the same settings")
+        self._mm = mmap.mmap(self._fd, self._size)
+        if abs(found[6] - epoch) > EPOCH_SLACK:         # written before a reboot
+            self._wipe()
+            _HEADER.pack_into(self._mm, 0, *header, epoch)
+
+    def close(self):
+        self._mm.close()
+        os.close(self._fd)
+
+    # ── locking ───────────────────────────────────────────────────────────────
+
+    def _file_lock(self, offset: int):
+        return _FileLock(self._fd, offset)
+
+    def _stripe_lock(self, bucket: int):
+        stripe = bucket % self._stripes
+        return _StripeLock(self._locks[stripe], self._fd, 1 + stripe)
+
+    def _seq(self, bucket: int) -> int:
+        return _SEQ.unpack_from(self._mm, self._heads_at + bucket * _HEAD_STRIDE)[0]
+
+    def _write_begin(self, bucket: int):
+        """Sequence to odd (from an odd one too: a writer that died mid-write)."""
+        off = self._heads_at + bucket * _HEAD_STRIDE
+        _SEQ.pack_into(self._mm, off, (_SEQ.unpack_from(self._mm, off)[0] + 1) | 1)
+
+    def _write_end(self, bucket: int):
+        off = self._heads_at + bucket * _HEAD_STRIDE
+        _SEQ.pack_into(self._mm, off, _SEQ.unpack_from(self._mm, off)[0] + 1)
+
+    # ── counters ──────────────────────────────────────────────────────────────
+
+    def _count(self, field: int, n: int = 1):
+        """Adds to this process's row; never called under a stripe lock."""
+        with self._count_lock:
+            if self._row is not None:
+                off = self._row + 8 + field * 8
+                _SEQ.pack_into(self._mm, off, _SEQ.unpack_from(self._mm, off)[0] + n)
+
+    def _claim_row(self):
+        """
+        This process's counter row: its own, a free one, or a dead process's
+        — at open, and again in a forked child.
+        """
+        pid = os.getpid()
+        self._row = None
+        with self._file_lock(0):
+            free = None
+            for i in range(MAX_PROCS):
+                off = self._rows_at + i * _ROW.size
+                owner = _SEQ.unpack_from(self._mm, off)[0]
+                if owner == pid:
+                    self._row = off
+                    return
+                if free is None and (owner == 0 or not _alive(owner)):
+                    free = off
+            if free is not None:                    # a dead owner's counts stay in
+                _SEQ.pack_into(self._mm, free, pid)
+                self._row = free
+
+    # ── slots ─────────────────────────────────────────────────────────────────
+
+    def _slot_at(self, bucket: int, way: int) -> int:
+        return self._slots_at + (bucket * WAYS + way) * self._slot
+
+    def _find(self, bucket: int, h: int, kb: bytes, head: tuple = None):
+        """
+        (way, slot header) of `kb` in `bucket`, or None — under a seqlock or
+        the lock.  `head` is the bucket head already read.
+        """
+        mm = self._mm
+        if head is None:
+            head = _HEAD.unpack_from(mm, self._heads_at + bucket * _HEAD_STRIDE)
+        i = 1
+        while h in head[i:]:
+            i = head.index(h, i)
+            off = self._slot_at(bucket, i - 1)
+            slot = _SLOT.unpack_from(mm, off)
+            if (slot[_STATE] and slot[_KEYLEN] == len(kb)
+                    and mm[off + _SLOT.size:off + _SLOT.size + len(kb)] == kb):
+                return i - 1, slot
+            i += 1
+        return None
+
+    def _read(self, bucket: int, h: int, kb: bytes, locked: bool = False):
+        """
+        (slot index, slot header, value) for `kb`, or None.  Lock-free unless
+        `locked` (the stripe lock is held): a read that a write overlapped is
+        retried, READ_RETRIES times and then under the lock.
+        """
+        at = self._heads_at + bucket * _HEAD_STRIDE
+        for _ in range(1 if locked else READ_RETRIES):
+            head = _HEAD.unpack_from(self._mm, at)
+            if head[0] & 1 and not locked:
+                time.sleep(0)
+                continue
+            found = self._find(bucket, h, kb, head)
+            result = None if found is None else self._value(bucket, kb, *found)
+            if locked or _SEQ.unpack_from(self._mm, at)[0] == head[0]:
+                if found is None or result is not None:
+                    return result
+        if locked:
+            return None
+        with self._stripe_lock(bucket):
+            return self._read(bucket, h, kb, locked=True)
+
+    def _value(self, bucket: int, kb: bytes, way: int, slot: tuple):
+        """(slot index, slot header, value), or None if the value fails its checksum."""
+        index = bucket * WAYS + way
+        memo  = self._memo.get(index)
+        if (memo is not None and memo[0] == slot[_CRC] and memo[1] == slot[_STORED]
+                and memo[2] == kb):
+            return index, slot, memo[3]
+        off = self._slot_at(bucket, way) + _SLOT.size + len(kb)
+        raw = self._mm[off:off + slot[_VLEN]]
+        if zlib.crc32(raw, zlib.crc32(kb)) != slot[_CRC]:
+            return None
+        value = self._decode(slot[_TAG], slot[_STATUS], raw)
+        self._memo[index] = (slot[_CRC], slot[_STORED], kb, value)
+        return index, slot, value
+
+    def _decode(self, tag: int, status: int, raw: bytes):
+        if tag == _TAG_RESPONSE:
+            return self._value_type.from_json(raw, status)
+        return json.loads(raw)
+
+    def _encode(self, value) -> tuple:
+        if self._value_type is not None and isinstance(value, self._value_type):
+            return _TAG_RESPONSE, value.status, value.encoded()
+        return _TAG_JSON, 0, json.dumps(value, separators=(",", ":")).encode()
+
+    def _clear_slot(self, bucket: int, way: int, slot: tuple):
+        """Empties a used slot (stripe lock and seqlock held)."""
+        _U8.pack_into(self._mm, self._slot_at(bucket, way), 0)
+        self._stripe_add(bucket, -1, -(_SLOT.size + slot[_KEYLEN] + slot[_VLEN]))
+
+    def _stripe_add(self, bucket: int, entries: int, nbytes: int):
+        off = self._stripe_at + (bucket % self._stripes) * _STRIPE.size
+        n, b = _STRIPE.unpack_from(self._mm, off)
+        _STRIPE.pack_into(self._mm, off, n + entries, b + nbytes)
+
+    # ── public API ────────────────────────────────────────────────────────────
+
+    def get(self, key: str):
+        entry = self.lookup(key)
+        return None if entry is None else entry[0]
+
+    def lookup(self, key: str, stale: bool = False):
+        """
+        (value, remaining_ttl_seconds) or None, as DNSCache.lookup(): with
+        stale=True an entry that expired less than `stale_window` seconds
+        ago is returned too, with remaining ≤ 0.
+        """
+        now = _monotonic()
+        kb  = key.encode()
+        h   = zlib.crc32(kb)
+        bucket = h & self._mask
+        # Fast path, _read() inlined for its usual case: no write under way,
+        # the first way with this hash holds a value this process decoded.
+        mm   = self._mm
+        at   = self._heads_at + bucket * _HEAD_STRIDE
+        head = _HEAD.unpack_from(mm, at)
+        found = None
+        if not head[0] & 1:
+            if h not in head[1:]:
+                found = False
+            else:
+                index = bucket * WAYS + head.index(h, 1) - 1
+                slot  = _SLOT.unpack_from(mm, self._slots_at + index * self._slot)
+                memo  = self._memo.get(index)
+                if (memo is not None and slot[_STATE] and memo[0] == slot[_CRC]
+                        and memo[1] == slot[_STORED] and memo[2] == kb
+                        and _SEQ.unpack_from(mm, at)[0] == head[0]):
+                    found = index, slot, memo[3]
+        if found is None:
+            found = self._read(bucket, h, kb)
+        if found:
+            index, slot, value = found
+            expires = slot[_EXPIRES]
+            if now < expires or (stale and now < expires + self.stale_window):
+                off = self._slots_at + index * self._slot
+                if not slot[_REF]:
+                    self._mm[off + _REF_AT] = 1
+                _U32.pack_into(self._mm, off + _HITS_AT, min(slot[_HITS_F] + 1, 0xFFFFFFFF))
+                self._count(_HITS)
+                return value, expires - now
+            if now >= expires + self.stale_window:
+                with self._stripe_lock(bucket):
+                    again = self._find(bucket, h, kb)
+                    if again is not None and again[1][_EXPIRES] == expires:
+                        self._write_begin(bucket)
+                        self._clear_slot(bucket, again[0], again[1])
+                        self._write_end(bucket)
+        self._count(_MISSES)
+        return None
+
+    def popularity(self, key: str) -> int:
+        """Hits on the entry for `key` since it was last stored (0 if absent)."""
+        kb = key.encode()
+        h  = zlib.crc32(kb)
+        found = self._find(h & self._mask, h, kb)     # a racy read is fine here
+        return found[1][_HITS_F] if found is not None else 0
+
+    def put(self, key: str, value, ttl: int = 300):
+        if ttl <= 0:
+            return                          # TTL 0: use once, never cache
+        self._store(key, value, ttl, replace=True)
+
+    def _store(self, key: str, value, ttl: float, replace: bool) -> bool:
+        kb = key.encode()
+        h  = zlib.crc32(kb)
+        bucket = h & self._mask
+        tag, status, raw = self._encode(value)
+        fits = _SLOT.size + len(kb) + len(raw) <= self._slot
+        now  = _monotonic()
+        evicted = False
+        with self._stripe_lock(bucket):
+            found = self._find(bucket, h, kb)
+            if found is not None and not replace:
+                return False
+            if not fits:
+                if found is not None:           # never serve the older value instead
+                    self._write_begin(bucket)
+                    self._clear_slot(bucket, *found)
+                    self._write_end(bucket)
+            else:
+                way = found[0] if found is not None else self._victim(bucket, now)
+                old = _SLOT.unpack_from(self._mm, self._slot_at(bucket, way))
+                self._write_begin(bucket)
+                if old[_STATE]:
+                    evicted = found is None and now < old[_EXPIRES] + self.stale_window
+                    self._clear_slot(bucket, way, old)
+                self._write_slot(bucket, way, kb, h, tag, status, raw, now + ttl, now)
+                self._write_end(bucket)
+                self._memo[bucket * WAYS + way] = (zlib.crc32(raw, zlib.crc32(kb)), now, kb,
+                                                   value)
+        if not fits:
+            self._count(_TOO_LARGE)
+        elif evicted:
+            self._count(_EVICTIONS)
+        return fits
+
+    def _write_slot(self, bucket: int, way: int, kb: bytes, h: int, tag: int, status: int,
+                    raw: bytes, expires: float, stored: float):
+        """Fills an empty slot (stripe lock held, sequence odd)."""
+        off = self._slot_at(bucket, way)
+        self._mm[off + _SLOT.size:off + _SLOT.size + len(kb) + len(raw)] = kb + raw
+        _SLOT.pack_into(self._mm, off, 1, 0, tag, status, len(kb), len(raw), h,
+                        zlib.crc32(raw, zlib.crc32(kb)), 0, expires, stored)
+        _U32.pack_into(self._mm, self._heads_at + bucket * _HEAD_STRIDE + 8 + 4 * way, h)
+        self._stripe_add(bucket, 1, _SLOT.size + len(kb) + len(raw))
+
+    def _victim(self, bucket: int, now: float) -> int:
+        """
+        The way a new key goes to: an empty slot, else one past its stale
+        window, else CLOCK — the oldest slot not read since it was last
+        passed over; the read ones passed on the way lose their ref bit.
+        """
+        slots = [_SLOT.unpack_from(self._mm, self._slot_at(bucket, w)) for w in range(WAYS)]
+        for way, slot in enumerate(slots):
+            if not slot[_STATE] or now >= slot[_EXPIRES] + self.stale_window:
+                return way
+        oldest_first = sorted(range(WAYS), key=lambda w: slots[w][_STORED])
+        for way in oldest_first:
+            if not slots[way][_REF] or now >= slots[way][_EXPIRES]:
+                return way
+            self._mm[self._slot_at(bucket, way) + _REF_AT] = 0     # second chance used up
+        return oldest_first[0]
+
+    def _entries(self):
+        """(key, slot header, value) of every used slot, one bucket at a time under its lock."""
+        for bucket in range(self._buckets):
+            with self._stripe_lock(bucket):
+                for way in range(WAYS):
+                    off  = self._slot_at(bucket, way)
+                    slot = _SLOT.unpack_from(self._mm, off)
+                    if not slot[_STATE]:
+                        continue
+                    kb = self._mm[off + _SLOT.size:off + _SLOT.size + slot[_KEYLEN]]
+                    found = self._value(bucket, kb, way, slot)
+                    if found is not None:
+                        yield kb.decode(), slot, found[2]
+
+    def export(self) -> list:
+        """(key, value, remaining_ttl) for every unexpired entry — for snapshots."""
+        now = _monotonic()
+        return [(k, value, slot[_EXPIRES] - now) for k, slot, value in self._entries()
+                if slot[_EXPIRES] > now]
+
+    def restore(self, items) -> int:
+        """
+        Bulk put() for a warm start from (key, value, ttl), never replacing
+        an entry already present.  Returns the number of entries stored.
+        """
+        return sum(self._store(key, value, ttl, replace=False)
+                   for key, value, ttl in items if ttl > 0)
+
+    def clear(self):
+        """Empties the table and zeroes every process's counters."""
+        with self._file_lock(0):
+            self._wipe()
+
+    def _wipe(self):
+        for bucket in range(self._buckets):
+            with self._stripe_lock(bucket):
+                self._write_begin(bucket)
+                start = self._slot_at(bucket, 0)
+                self._mm[start:start + WAYS * self._slot] = bytes(WAYS * self._slot)
+                self._write_end(bucket)
+        self._mm[self._stripe_at:self._stripe_at + self._stripes * _STRIPE.size] = \
+            bytes(self._stripes * _STRIPE.size)
+        for i in range(MAX_PROCS):
+            off = self._rows_at + i * _ROW.size + 8
+            self._mm[off:off + _ROW.size - 8] = bytes(_ROW.size - 8)
+        self._memo.clear()
+
+    def all_entries(self):
+        now = _monotonic()
+        out = []
+        for k, slot, value in self._entries():
+            v = getattr(value, "body", value)
+            remaining = max(0, slot[_EXPIRES] - now)
+            stale     = now < slot[_EXPIRES] + self.stale_window
+            out.append({
+                "key":           k,
+                "domain":        v.get("domain", ""),
+                "type":          v.get("qtype",  "A"),
+                "ip":            v.get("ip",     ""),
+                "rcode":         v.get("rcode",  "NOERROR"),
+                "remaining_ttl": int(remaining),
+                "status":        (("stale" if stale else "expired") if remaining <= 0 else
+                                  "negative" if v.get("negative") else "valid"),
+            })
+        return out
+
+    def stats(self):
+        size = nbytes = 0
+        for i in range(self._stripes):
+            n, b = _STRIPE.unpack_from(self._mm, self._stripe_at + i * _STRIPE.size)
+            size, nbytes = size + n, nbytes + b
+        counts, processes = [0, 0, 0, 0], 0
+        for i in range(MAX_PROCS):
+            pid, *row = _ROW.unpack_from(self._mm, self._rows_at + i * _ROW.size)
+            counts = [a + b for a, b in zip(counts, row)]
+            processes += bool(pid) and _alive(pid)
+        hits, misses, evictions, too_large = counts
+        return {
+            "size":      size,
+            "capacity":  self._buckets * WAYS,
+            "bytes":     nbytes,
+            "max_bytes": self._buckets * WAYS * self._slot,
+            "shards":    self._stripes,
+            "evictions": evictions,
+            "hits":      hits,
+            "misses":    misses,
+            "hit_rate":  (
+                round(hits / (hits + misses) * 100, 1)
+                if (hits + misses) > 0 else 0.0
+            ),
+            "shared":    {"path": self.path, "processes": processes, "buckets": self._buckets,
+                          "ways": WAYS, "slot_bytes": self._slot, "too_large": too_large},
+        }
+
+
+class _FileLock:
+    """fcntl lock on one byte of the cache file: excludes other processes only."""
+
+    __slots__ = ("fd", "offset")
+
+    def __init__(self, fd: int, offset: int):
+        self.fd, self.offset = fd, offset
+
+    def __enter__(self):
+        fcntl.lockf(self.fd, fcntl.LOCK_EX, 1, self.offset)
+
+    def __exit__(self, *exc):
+        fcntl.lockf(self.fd, fcntl.LOCK_UN, 1, self.offset)
+
+
+class _StripeLock(_FileLock):
+    """A stripe's threading.Lock (this process's threads), then its file lock (others)."""
+
+    __slots__ = ("lock",)
+
+    def __init__(self, lock: threading.Lock, fd: int, offset: int):
+        super().__init__(fd, offset)
+        self.lock = lock
+
+    def __enter__(self):
+        self.lock.acquire()
+        try:
+            super().__enter__()
+        except BaseException:
+            self.lock.release()
+            raise
+
+    def __exit__(self, *exc):
+        try:
+            super().__exit__()
+        finally:
+            self.lock.release()
+
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
@@ -0,0 +1,216 @@
+"""
+api/snapshot.py  —  DNS Resolution Service  —  Warm-restart cache snapshots
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+Periodically writes server.py's DNSCache — and the native resolver's
+delegation (zone-cut) cache when dnscore is loaded — to one compact file,
+and reads it back at startup so a restarted service answers from a warm
+cache instead of walking from the root for every name.
+
+File format (little-endian):
+
+  header   b"DNSSNAP" + version byte, then the wall-clock save time (f64)
+  records  kind (u8)  ttl_ms (u32)  status (u16)  key_len (u16)  data_len (u32)
+           key (UTF-8)  data
+             kind 0  answer      key = cache key, data = body JSON
+             kind 1  zone cut    key = zone, data = NS names, comma-joined
+             kind 2  NS address  key = NS name, data = IPv4 address
+  trailer  kind 255 with the record count in ttl_ms
+
+TTLs are stored as remaining at save time; load() subtracts the wall time
+that has passed since, and drops whatever has run out.  The file is
+memory-mapped and walked record by record, and answer bodies stay encoded
+until their first hit (CachedResponse.from_json), so loading costs about
+one dict insert per entry.  Saves go to a temporary file that replaces the
+old snapshot only once complete.
+
+Environment (read by server.py):
+  DNS_SNAPSHOT=<path>        snapshot file (default unset = no snapshots)
+  DNS_SNAPSHOT_EVERY=<s>     seconds between saves (default 300)
+"""
+
+import os
+import mmap
+import time
+import struct
+import threading
+
+import server
+
+MAGIC    = b"DNSSNAP\x01"
+_HEADER  = struct.Struct("<8sd")
+_RECORD  = struct.Struct("<BIHHI")
+_MAX_TTL_MS = 0xFFFFFFFF
+
+KIND_ANSWER, KIND_ZONE, KIND_ADDRESS, KIND_END = 0, 1, 2, 255
+
+
+class SnapshotError(Exception):
+    """The file is not a snapshot, or is cut short."""
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  Save
+# ─────────────────────────────────────────────────────────────────────────────
+
+def _record(kind: int, ttl: float, key: str, data: bytes, status: int = 0) -> bytes:
+    k = key.encode()
+    return _RECORD.pack(kind, min(int(ttl * 1000), _MAX_TTL_MS), status,
+                        len(k), len(data)) + k + data
+
+
+def save(path: str, cache=None, resolver=None) -> dict:
+    """
+    Writes every live entry of `cache` (default server.cache) and of
+    `resolver`'s delegation cache (default server._native; False or no
+    extension skips it) to `path`, atomically.  Returns counts, size and time taken.
+    """
+    cache    = server.cache if cache is None else cache
+    resolver = server._native if resolver is None else resolver
+    t0       = time.perf_counter()
+    counts   = {"entries": 0, "zones": 0, "addresses": 0}
+
+    tmp = f"{path}.tmp.{os.getpid()}"
+    with open(tmp, "wb") as f:
+        f.write(_HEADER.pack(MAGIC, time.time()))
+        for key, value, remaining in cache.export():
+            if isinstance(value, server.CachedResponse):
+                f.write(_record(KIND_ANSWER, remaining, key, value.encoded(), value.status))
+                counts["entries"] += 1
+        if resolver:
+            deleg = resolver.export_delegations()
+            for zone, ns_names, ttl in deleg["zones"]:
+                f.write(_record(KIND_ZONE, ttl, zone, ",".join(ns_names).encode()))
+            for ns_name, ip, ttl in deleg["addresses"]:
+                f.write(_record(KIND_ADDRESS, ttl, ns_name, ip.encode()))
+            counts["zones"], counts["addresses"] = len(deleg["zones"]), len(deleg["addresses"])
+        f.write(_RECORD.pack(KIND_END, sum(counts.values()), 0, 0, 0))
+        f.flush()
+        os.fsync(f.fileno())
+        nbytes = f.tell()
+    os.replace(tmp, path)
+    counts.update(bytes=nbytes, seconds=round(time.perf_counter() - t0, 3))
+    return counts
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  Load
+# ─────────────────────────────────────────────────────────────────────────────
+
+def read(path: str):
+    """
+    Yields (kind, remaining_seconds, status, key, data) for every record, with
+    TTLs already aged by the time since the save (may be ≤ 0).  Raises
+    SnapshotError if the file is not a snapshot or ends early.
+    """
+    with open(path, "rb") as f, \
+            mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        if len(mm) < _HEADER.size:
+            raise SnapshotError(f"{path}: too short for a snapshot header")
+        magic, saved_at = _HEADER.unpack_from(mm, 0)
+        if magic != MAGIC:
+            raise SnapshotError(f"{path}: not a DNS cache snapshot")
+        elapsed = max(0.0, time.time() - saved_at)
+        unpack, rsize, end = _RECORD.unpack_from, _RECORD.size, len(mm)
+        pos = _HEADER.size
+        while pos + rsize <= end:
+            kind, ttl_ms, status, klen, dlen = unpack(mm, pos)
+            if kind == KIND_END:
+                return
+            pos += rsize
+            if pos + klen + dlen > end:
+                break
+            key  = mm[pos:pos + klen].decode()
+            data = mm[pos + klen:pos + klen + dlen]
+            pos += klen + dlen
+            yield kind, ttl_ms / 1000 - elapsed, status, key, data
+        raise SnapshotError(f"{path}: truncated at byte {pos}")
+
+
+def load(path: str, cache=None, resolver=None) -> dict:
+    """
+    Restores a snapshot written by save() into `cache` (default server.cache)
+    and `resolver`'s delegation cache (default server._native).  Entries that
+    expired since the save are dropped.  A missing file loads nothing; a
+    damaged one keeps whatever was read before the damage.
+    """
+    cache    = server.cache if cache is None else cache
+    resolver = server._native if resolver is None else resolver
+    t0       = time.perf_counter()
+    stats    = {"entries": 0, "expired": 0, "zones": 0, "addresses": 0, "error": None}
+    zones, addresses = [], []
+
+    def answers(records):
+        from_json = server.CachedResponse.from_json
+        for kind, ttl, status, key, data in records:
+            if ttl <= 0:
+                stats["expired"] += 1
+            elif kind == KIND_ANSWER:
+                stats["entries"] += 1
+                yield key, from_json(data, status), ttl
+            elif kind == KIND_ZONE:
+                zones.append((key, data.decode().split(","), int(ttl)))
+            elif kind == KIND_ADDRESS:
+                addresses.append((key, data.decode(), int(ttl)))
+
+    if os.path.exists(path):
+        try:
+            cache.restore(answers(read(path)))
+        except (SnapshotError, OSError, ValueError) as e:
+            stats["error"] = str(e)
+        if resolver and (zones or addresses):
+            resolver.load_delegations(zones, addresses)
+            stats["zones"], stats["addresses"] = len(zones), len(addresses)
+    stats["seconds"] = round(time.perf_counter() - t0, 3)
+    return stats
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  Periodic saver
+# ─────────────────────────────────────────────────────────────────────────────
+
+class Snapshotter:
+    """Saves a snapshot every `interval` seconds on a daemon thread, and once more on stop()."""
+
+    def __init__(self, path: str, interval: float = 300.0, cache=None, resolver=None):
+        self.path      = path
+        self.interval  = interval
+        self._cache    = cache
+        self._resolver = resolver
+        self._stop     = threading.Event()
+        self._thread   = None
+        self._lock     = threading.Lock()
+        self._saves    = 0
+        self._failures = 0
+        self._last     = None
+
+    def start(self) -> "Snapshotter":
+        self._thread = threading.Thread(target=self._run, name="dns-snapshot", daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.save_now()
+
+    def save_now(self) -> dict | None:
+        with self._lock:               # the timer and stop() never write at once
+            try:
+                self._last = save(self.path, self._cache, self._resolver)
+                self._saves += 1
+                return self._last
+            except OSError as e:
+                self._failures += 1
+                self._last = {"error": str(e)}
+                return None
+
+    def stop(self):
+        if self._stop.is_set():
+            return
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        self.save_now()
+
+    def stats(self) -> dict:
+        return {"path": self.path, "interval": self.interval, "saves": self._saves,
+                "failures": self._failures, "last": self._last}
@@ -0,0 +1,471 @@
+"""
+api/worker_pool.py  —  Persistent C++ resolver worker pool
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+Keeps N long-lived `dns_resolver --serve` processes running so that a cache
+miss in the API no longer pays fork/exec + process start-up, and the C++
+dns::Cache stays warm across requests.
+
+Wire protocol (one JSON object per line, see serve_stdio() in the C++ core):
+  → {"id": 7, "domain": "example.com", "qtype": "A"}
+  ← {"id": 7, "result": {...same shape as the one-shot CLI output...}}
+  → {"id": 8, "op": "ping"}
+  ← {"id": 8, "pong": true, "cache_size": 42, "delegations": {...}}
+  → {"id": 9, "op": "servers"}
+  ← {"id": 9, "servers": [{"ip": "192.5.6.30", "srtt_ms": 21.4, ...}, ...]}
+  → {"id": 10, "op": "zones"}
+  ← {"id": 10, "zones": [{"zone": "com", "queries": 12, "total_ms": 240.5, ...}, ...]}
+  → {"id": 11, "domain": "example.com", "qtype": "A", "trace": 1}
+  ← {"id": 11, "result": {..., "trace": [{"server": ..., "rtt_ms": ...}, ...]}}
+
+Pool behaviour:
+  - one request in flight per worker; idle workers sit in a queue
+  - acquire waits at most `acquire_timeout` s, and at most `max_waiters`
+    callers may wait at once → PoolBusyError (backpressure)
+  - a request that exceeds `request_timeout` kills and replaces its worker
+  - a worker that dies mid-request is replaced; the request raises
+  - a background thread pings idle workers every `health_interval` s
+
+AsyncWorkerPool is the same pool for an asyncio event loop (async pipes,
+no reader threads); used by api/async_server.py.
+"""
+
+import json
+import asyncio
+import itertools
+import queue
+import subprocess
+import threading
+import time
+
+
+REPLY_LINE_LIMIT = 16 << 20    # bytes; one reply line (a traced walk, a big RRset)
+
+
+class PoolBusyError(RuntimeError):
+    """Raised when every worker is busy and the wait queue is full / timed out."""
+
+
+def _resolve_request(domain: str, qtype: str, trace: bool) -> dict:
+    payload = {"domain": domain, "qtype": qtype}
+    if trace:
+        payload["trace"] = 1
+    return payload
+
+
+class ResolverWorker:
+    """One `dns_resolver --serve` child process plus its stdout reader thread."""
+
+    def __init__(self, cmd: list):
+        self.cmd      = list(cmd)
+        self.served   = 0
+        self.started  = time.time()
+        self._ids     = itertools.count(1)
+        self._lines   = queue.Queue()
+        self._proc    = subprocess.Popen(
+            self.cmd,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True,
+            bufsize=1,
+        )
+        self._reader  = threading.Thread(target=self._read_loop, daemon=True)
+        self._reader.start()
+
+    # ── internals ─────────────────────────────────────────────────────────────
+
+    def _read_loop(self):
+        for line in self._proc.stdout:
+            self._lines.put(line)
+        self._lines.put(None)        # EOF sentinel — process exited
+
+    # ── public API ────────────────────────────────────────────────────────────
+
+    @property
+    def pid(self) -> int:
+        return self._proc.pid
+
+    def alive(self) -> bool:
+        return self._proc.poll() is None
+
+    def request(self, payload: dict, timeout: float) -> dict:
+        """
+        Sends one request and waits for the response with the matching id.
+        Raises RuntimeError on timeout, crash or a malformed reply; the caller
+        must discard the worker in that case.
+        """
+        req_id   = next(self._ids)
+        deadline = time.monotonic() + timeout
+        try:
+            self._proc.stdin.write(json.dumps({"id": req_id, **payload}) + "\n")
+            self._proc.stdin.flush()
+        except (OSError, ValueError) as e:
+            raise RuntimeError(f"C++ worker {self.pid} not accepting input: {e}")
+
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise RuntimeError(f"C++ resolver timed out after {timeout}s")
+            try:
+                line = self._lines.get(timeout=remaining)
+            except queue.Empty:
+                raise RuntimeError(f"C++ resolver timed out after {timeout}s")
+            if line is None:
+                raise RuntimeError(
+                    f"C++ worker {self.pid} exited (code {self._proc.poll()})")
+            try:
+                reply = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise RuntimeError(f"C++ resolver returned invalid JSON: {e}")
+            if reply.get("id") == req_id:
+                self.served += 1
+                return reply
+            # A reply for an earlier, abandoned request — skip it.
+
+    def ping(self, timeout: float = 2.0) -> bool:
+        try:
+            return bool(self.request({"op": "ping"}, timeout).get("pong"))
+        except RuntimeError:
+            return False
+
+    def kill(self):
+        try:
+            self._proc.stdin.close()
+        except OSError:
+            pass
+        if self.alive():
+            self._proc.kill()
+        try:
+            self._proc.wait(timeout=2)
+        except subprocess.TimeoutExpired:
+            pass
+
+
+class WorkerPool:
+    """Fixed-size pool of ResolverWorker processes with health checks."""
+
+    def __init__(self, cmd: list, size: int = 4,
+                 request_timeout: float = 30.0,
+                 acquire_timeout: float = 2.0,
+                 max_waiters: int = 64,
+                 health_interval: float = 10.0):
+        self._cmd             = list(cmd)
+        self._size            = size
+        self._request_timeout = request_timeout
+        self._acquire_timeout = acquire_timeout
+        self._max_waiters     = max_waiters
+        self._idle            = queue.Queue()
+        self._lock            = threading.Lock()
+        self._waiters         = 0
+        self._closed          = threading.Event()
+        self._counters        = {
+            "requests":  0,
+            "rejected":  0,
+            "timeouts":  0,
+            "crashes":   0,
+            "restarts":  0,
+        }
+
+        for _ in range(size):
+            self._idle.put(ResolverWorker(self._cmd))
+
+        self._health = None
+        if health_interval > 0:
+            self._health = threading.Thread(
+                target=self._health_loop, args=(health_interval,), daemon=True)
+            self._health.start()
+
+    # ── internals ─────────────────────────────────────────────────────────────
+
+    def _bump(self, counter: str):
+        with self._lock:
+            self._counters[counter] += 1
+
+    def _replace(self, worker: ResolverWorker) -> ResolverWorker:
+        worker.kill()
+        self._bump("restarts")
+        return ResolverWorker(self._cmd)
+
+    def _acquire(self) -> ResolverWorker:
+        with self._lock:
+            if self._waiters >= self._max_waiters:
+                self._counters["rejected"] += 1
+                raise PoolBusyError("all resolver workers busy (wait queue full)")
+            self._waiters += 1
+        try:
+            return self._idle.get(timeout=self._acquire_timeout)
+        except queue.Empty:
+            self._bump("rejected")
+            raise PoolBusyError(
+                f"all resolver workers busy for {self._acquire_timeout}s")
+        finally:
+            with self._lock:
+                self._waiters -= 1
+
+    def _health_loop(self, interval: float):
+        while not self._closed.wait(interval):
+            # Only idle workers are checked; busy ones prove themselves alive.
+            for _ in range(self._idle.qsize()):
+                try:
+                    worker = self._idle.get_nowait()
+                except queue.Empty:
+                    break
+                if not (worker.alive() and worker.ping()):
+                    worker = self._replace(worker)
+                self._idle.put(worker)
+
+    # ── public API ────────────────────────────────────────────────────────────
+
+    def request(self, payload: dict) -> dict:
+        if self._closed.is_set():
+            raise RuntimeError("resolver worker pool is closed")
+        worker = self._acquire()
+        self._bump("requests")
+        try:
+            reply = worker.request(payload, self._request_timeout)
+        except RuntimeError as e:
+            self._bump("timeouts" if "timed out" in str(e) else "crashes")
+            self._idle.put(self._replace(worker))
+            raise
+        if self._closed.is_set():
+            worker.kill()
+        else:
+            self._idle.put(worker)
+        return reply
+
+    def resolve(self, domain: str, qtype: str = "A", trace: bool = False) -> dict:
+        """Returns the C++ result dict for one lookup (same shape as the CLI)."""
+        reply = self.request(_resolve_request(domain, qtype, trace))
+        if "result" not in reply:
+            raise RuntimeError(f"C++ worker reply missing result: {reply}")
+        return reply["result"]
+
+    def broadcast(self, payload: dict, timeout: float = 2.0) -> list:
+        """
+        Sends `payload` to every currently idle worker (busy ones are skipped)
+        and returns their replies — used to gather per-process statistics.
+        """
+        replies = []
+        for _ in range(self._idle.qsize()):
+            try:
+                worker = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                replies.append(worker.request(payload, timeout))
+            except RuntimeError:
+                worker = self._replace(worker)
+            self._idle.put(worker)
+        return replies
+
+    def stats(self) -> dict:
+        with self._lock:
+            out = dict(self._counters)
+            out["waiting"] = self._waiters
+        out["size"] = self._size
+        out["idle"] = self._idle.qsize()
+        out["busy"] = self._size - out["idle"]
+        return out
+
+    def close(self):
+        self._closed.set()
+        while True:
+            try:
+                self._idle.get_nowait().kill()
+            except queue.Empty:
+                break
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  asyncio variant — same protocol, no threads (api/async_server.py)
+# ─────────────────────────────────────────────────────────────────────────────
+
+class AsyncResolverWorker:
+    """One `dns_resolver --serve` child driven through asyncio pipes."""
+
+    def __init__(self, proc):
+        self.served   = 0
+        self.started  = time.time()
+        self._ids     = itertools.count(1)
+        self._proc    = proc
+
+    @classmethod
+    async def spawn(cls, cmd: list) -> "AsyncResolverWorker":
+        proc = await asyncio.create_subprocess_exec(
+            *cmd,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL,
+            limit=REPLY_LINE_LIMIT,
+        )
+        return cls(proc)
+
+    @property
+    def pid(self) -> int:
+        return self._proc.pid
+
+    def alive(self) -> bool:
+        return self._proc.returncode is None
+
+    async def request(self, payload: dict, timeout: float) -> dict:
+        """Same contract as ResolverWorker.request(); awaits instead of blocking."""
+        req_id   = next(self._ids)
+        loop     = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        try:
+            self._proc.stdin.write((json.dumps({"id": req_id, **payload}) + "\n").encode())
+            await self._proc.stdin.drain()
+        except (OSError, ValueError) as e:
+            raise RuntimeError(f"C++ worker {self.pid} not accepting input: {e}")
+
+        while True:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                raise RuntimeError(f"C++ resolver timed out after {timeout}s")
+            try:
+                line = await asyncio.wait_for(self._proc.stdout.readline(), remaining)
+            except asyncio.TimeoutError:
+                raise RuntimeError(f"C++ resolver timed out after {timeout}s")
+            except ValueError as e:            # longer than REPLY_LINE_LIMIT
+                raise RuntimeError(f"C++ resolver reply line too long: {e}")
+            if not line:
+                raise RuntimeError(
+                    f"C++ worker {self.pid} exited (code {self._proc.returncode})")
+            try:
+                reply = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise RuntimeError(f"C++ resolver returned invalid JSON: {e}")
+            if reply.get("id") == req_id:
+                self.served += 1
+                return reply
+            # A reply for an earlier, abandoned request — skip it.
+
+    async def kill(self):
+        if self.alive():
+            self._proc.kill()
+        try:
+            # Drain stdout first: a reader paused on a full buffer (after an
+            # over-long line) never sees EOF, and wait() waits for the pipe.
+            await asyncio.wait_for(self._proc.stdout.read(), 2)
+            await asyncio.wait_for(self._proc.wait(), 2)
+        except asyncio.TimeoutError:
+            pass
+
+
+class AsyncWorkerPool:
+    """
+    WorkerPool for an asyncio event loop: the same backpressure rules
+    (`acquire_timeout`, `max_waiters` → PoolBusyError) and replacement of
+    workers that time out or crash.  Workers are spawned on first use; a
+    worker is health-checked by its next request rather than by pings.
+    """
+
+    def __init__(self, cmd: list, size: int = 4,
+                 request_timeout: float = 30.0,
+                 acquire_timeout: float = 2.0,
+                 max_waiters: int = 64):
+        self._cmd             = list(cmd)
+        self._size            = size
+        self._request_timeout = request_timeout
+        self._acquire_timeout = acquire_timeout
+        self._max_waiters     = max_waiters
+        self._idle            = None          # asyncio.Queue, created on the loop
+        self._waiters         = 0
+        self._closed          = False
+        self._counters        = {
+            "requests":  0,
+            "rejected":  0,
+            "timeouts":  0,
+            "crashes":   0,
+            "restarts":  0,
+        }
+
+    async def _ensure_started(self):
+        if self._idle is None:
+            self._idle = asyncio.Queue()
+            for _ in range(self._size):
+                self._idle.put_nowait(await AsyncResolverWorker.spawn(self._cmd))
+
+    async def _replace(self, worker: AsyncResolverWorker) -> AsyncResolverWorker:
+        await worker.kill()
+        self._counters["restarts"] += 1
+        return await AsyncResolverWorker.spawn(self._cmd)
+
+    async def _acquire(self) -> AsyncResolverWorker:
+        await self._ensure_started()
+        if self._waiters >= self._max_waiters:
+            self._counters["rejected"] += 1
+            raise PoolBusyError("all resolver workers busy (wait queue full)")
+        self._waiters += 1
+        try:
+            return await asyncio.wait_for(self._idle.get(), self._acquire_timeout)
+        except asyncio.TimeoutError:
+            self._counters["rejected"] += 1
+            raise PoolBusyError(
+                f"all resolver workers busy for {self._acquire_timeout}s")
+        finally:
+            self._waiters -= 1
+
+    async def request(self, payload: dict) -> dict:
+        if self._closed:
+            raise RuntimeError("resolver worker pool is closed")
+        worker = await self._acquire()
+        self._counters["requests"] += 1
+        try:
+            reply = await worker.request(payload, self._request_timeout)
+        except RuntimeError as e:
+            self._counters["timeouts" if "timed out" in str(e) else "crashes"] += 1
+            self._idle.put_nowait(await self._replace(worker))
+            raise
+        except asyncio.CancelledError:
+            # Caller gave up mid-request; the reply may still arrive, so the
+            # worker can't be trusted to be in sync — replace it.
+            self._idle.put_nowait(await self._replace(worker))
+            raise
+        if self._closed:
+            await worker.kill()
+        else:
+            self._idle.put_nowait(worker)
+        return reply
+
+    async def resolve(self, domain: str, qtype: str = "A", trace: bool = False) -> dict:
+        reply = await self.request(_resolve_request(domain, qtype, trace))
+        if "result" not in reply:
+            raise RuntimeError(f"C++ worker reply missing result: {reply}")
+        return reply["result"]
+
+    async def broadcast(self, payload: dict, timeout: float = 2.0) -> list:
+        """
+        WorkerPool.broadcast() for the event loop: `payload` to every idle
+        worker (busy ones are skipped, none are spawned) and their replies.
+        """
+        replies = []
+        if self._idle is None:
+            return replies
+        for _ in range(self._idle.qsize()):
+            try:
+                worker = self._idle.get_nowait()
+            except asyncio.QueueEmpty:
+                break
+            try:
+                replies.append(await worker.request(payload, timeout))
+            except RuntimeError:
+                worker = await self._replace(worker)
+            except asyncio.CancelledError:
+                self._idle.put_nowait(await self._replace(worker))
+                raise
+            self._idle.put_nowait(worker)
+        return replies
+
+    def stats(self) -> dict:
+        out = dict(self._counters)
+        out["waiting"] = self._waiters
+        out["size"]    = self._size
+        out["idle"]    = self._idle.qsize() if self._idle is not None else self._size
+        out["busy"]    = self._size - out["idle"]
+        return out
+
+    async def close(self):
+        self._closed = True
+        while self._idle is not None and not self._idle.empty():
+            await self._idle.get_nowait().kill()
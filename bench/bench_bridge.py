@@ -0,0 +1,99 @@
+"""
+bench/bench_bridge.py
+─────────────────────
+Per-call overhead of the three C++ bridges used by api/server.py:
+
+  subprocess  one `dns_resolver <domain> <type>` process per lookup
+  workers     persistent `dns_resolver --serve` pool (api/worker_pool.py)
+  native      in-process `dnscore` extension (core/dns_module.cpp)
+
+Overhead = wall-clock time of the call minus the `latency_ms` the C++
+resolver reports for its own work, so the figure isolates process start-up,
+pipes and JSON (de)serialisation from network time and is meaningful even
+when upstream servers are unreachable.
+
+Run:  python bench/bench_bridge.py [-n 200] [--domain example.com] [--type A]
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(_ROOT, "api"))
+sys.path.insert(0, os.path.join(_ROOT, "core"))
+
+from worker_pool import WorkerPool   # noqa: E402
+
+_BINARY_WIN = os.path.join(_ROOT, "core", "dns_resolver.exe")
+_BINARY_NIX = os.path.join(_ROOT, "core", "dns_resolver")
+BINARY_PATH = _BINARY_WIN if os.path.exists(_BINARY_WIN) else _BINARY_NIX
+
+
+def via_subprocess(domain, qtype):
+    proc = subprocess.run([BINARY_PATH, domain, qtype],
+                          capture_output=True, text=True, timeout=30)
+    return json.loads(proc.stdout)
+
+
+def measure(call, n, domain, qtype):
+    overheads, walls = [], []
+    for _ in range(n):
+        t0 = time.perf_counter()
+        result = call(domain, qtype)
+        wall = (time.perf_counter() - t0) * 1000
+        walls.append(wall)
+        overheads.append(wall - float(result.get("latency_ms", 0.0)))
+    overheads.sort()
+    return {
+        "calls":           n,
+        "wall_median_ms":  round(statistics.median(walls), 3),
+        "overhead_p50_ms": round(statistics.median(overheads), 3),
+        "overhead_p99_ms": round(overheads[min(n - 1, int(n * 0.99))], 3),
+        "calls_per_sec":   round(n / (sum(walls) / 1000), 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("-n", type=int, default=200, help="calls per bridge")
+    parser.add_argument("--domain", default="example.com")
+    parser.add_argument("--type", default="A")
+    args = parser.parse_args()
+
+    if not os.path.isfile(BINARY_PATH):
+        sys.exit(f"C++ binary not found at {BINARY_PATH} — run build.sh first")
+
+    results = {}
+    results["subprocess"] = measure(via_subprocess, args.n, args.domain, args.type)
+
+    pool = WorkerPool([BINARY_PATH, "--serve"], size=1, health_interval=0)
+    try:
+        results["workers"] = measure(pool.resolve, args.n, args.domain, args.type)
+    finally:
+        pool.close()
+
+    try:
+        import dnscore
+        native = dnscore.Resolver(dnscore.Cache(1000))
+        results["native"] = measure(native.resolve, args.n, args.domain, args.type)
+    except ImportError:
+        results["native"] = None
+        print("dnscore extension not built — skipping native bridge")
+
+    print(f"\n{'bridge':<12}{'wall p50':>12}{'ovh p50':>12}{'ovh p99':>12}{'calls/s':>12}")
+    for name, r in results.items():
+        if r is None:
+            continue
+        print(f"{name:<12}{r['wall_median_ms']:>10.3f}ms{r['overhead_p50_ms']:>10.3f}ms"
+              f"{r['overhead_p99_ms']:>10.3f}ms{r['calls_per_sec']:>12.1f}")
+    print()
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
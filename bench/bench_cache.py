@@ -0,0 +1,127 @@
+"""
+bench/bench_cache.py
+────────────────────
+Hit throughput of the API's DNSCache under concurrent readers: the
+lock-striped cache in api/server.py versus the single-lock OrderedDict
+cache it replaced (kept below as LegacyDNSCache).
+
+Every thread loops lookup() over a preloaded set of hot keys (plus a small
+fraction of misses), so the figure is dominated by the hit path: lock
+acquisition, clock read and LRU bookkeeping.  Under the GIL extra threads
+cannot add CPU, so the interesting number is how much throughput is lost
+to lock hand-offs as threads are added.
+
+Run:  python bench/bench_cache.py [--keys 1000] [--ops 200000] [--threads 1 2 4 8] [--repeat 5]
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+import statistics
+import threading
+from collections import OrderedDict
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(_ROOT, "api"))
+
+from server import DNSCache   # noqa: E402
+
+
+class LegacyDNSCache:
+    """The pre-sharding DNSCache: one lock, time.time(), move_to_end on hits."""
+
+    def __init__(self, capacity: int = 1000):
+        self._cap    = capacity
+        self._store  = OrderedDict()   # key → (value, stored_at, ttl)
+        self._hits   = 0
+        self._misses = 0
+        self._lock   = threading.Lock()
+
+    def lookup(self, key: str):
+        with self._lock:
+            if key not in self._store:
+                self._misses += 1
+                return None
+            value, stored_at, ttl = self._store[key]
+            age = time.time() - stored_at
+            if age >= ttl:
+                del self._store[key]
+                self._misses += 1
+                return None
+            self._store.move_to_end(key)
+            self._hits += 1
+            return value, ttl - age
+
+    def put(self, key: str, value, ttl: int = 300):
+        with self._lock:
+            if key in self._store:
+                self._store.move_to_end(key)
+            self._store[key] = (value, time.time(), ttl)
+            if len(self._store) > self._cap:
+                self._store.popitem(last=False)
+
+
+def _body(i: int) -> dict:
+    return {"domain": f"host{i}.example.com", "ip": f"10.0.{i >> 8 & 255}.{i & 255}",
+            "record_type": "A", "cached": False, "latency_ms": 12.5, "ttl": 300,
+            "answers": [{"name": f"host{i}.example.com", "type": "A", "ttl": 300,
+                         "data": f"10.0.{i >> 8 & 255}.{i & 255}"}],
+            "resolution_path": ["198.41.0.4", "192.12.94.30"]}
+
+
+def run(cache, keys: list, threads: int, ops: int) -> float:
+    """Total lookups per second across `threads` threads doing `ops` each."""
+    # 5 % misses: names that were never stored.
+    plans = [[random.choice(keys) if random.random() < 0.95 else f"miss{j}.test/A"
+              for j in range(ops)] for _ in range(threads)]
+    barrier = threading.Barrier(threads + 1)
+
+    def worker(plan):
+        lookup = cache.lookup
+        barrier.wait()
+        for key in plan:
+            lookup(key)
+
+    pool = [threading.Thread(target=worker, args=(p,)) for p in plans]
+    for t in pool:
+        t.start()
+    barrier.wait()
+    t0 = time.perf_counter()
+    for t in pool:
+        t.join()
+    return threads * ops / (time.perf_counter() - t0)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__,
+                                 formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--keys", type=int, default=1000, help="hot entries")
+    ap.add_argument("--ops", type=int, default=200_000, help="lookups per thread")
+    ap.add_argument("--threads", type=int, nargs="+", default=[1, 2, 4, 8])
+    ap.add_argument("--repeat", type=int, default=5, help="runs per cell (median)")
+    args = ap.parse_args()
+
+    keys   = [f"host{i}.example.com/A" for i in range(args.keys)]
+    caches = {"legacy (1 lock)": LegacyDNSCache(args.keys),
+              "sharded":         DNSCache(capacity=args.keys)}
+    for cache in caches.values():
+        for i, k in enumerate(keys):
+            cache.put(k, _body(i), ttl=3600)
+
+    print(f"keys: {args.keys}   lookups/thread: {args.ops}   "
+          f"python {sys.version.split()[0]}")
+    print(f"{'threads':>7}  " + "  ".join(f"{name:>18}" for name in caches) + "   speedup")
+    for n in args.threads:
+        samples = {name: [] for name in caches}
+        for _ in range(args.repeat):                 # interleaved: same noise for both
+            for name, cache in caches.items():
+                samples[name].append(run(cache, keys, n, args.ops))
+        rates = [statistics.median(samples[name]) for name in caches]
+        print(f"{n:>7}  " + "  ".join(f"{r / 1e6:>12.3f} Mop/s" for r in rates)
+              + f"   {rates[1] / rates[0]:>6.2f}x")
+
+
+if __name__ == "__main__":
+    main()
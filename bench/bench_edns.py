@@ -0,0 +1,149 @@
+"""
+bench/bench_edns.py
+───────────────────
+Miss latency and the /metrics TCP-fallback rate with EDNS0 off and on, on
+the loopback stub hierarchy of bench/bench_load.py.  A fraction of the names
+(`--big`) hold a CDN-style RRset of `--rrset` addresses, which does not fit in
+a 512-byte reply: without EDNS0 every one of them comes back truncated and is
+asked again over TCP; advertising 1232 bytes (DNS_EDNS_PAYLOAD) brings it
+back in one UDP round trip.  The stubs delay only UDP replies, so the TCP
+retry here costs just its connection set-up and exchange — a lower bound on
+what it costs against a real server.
+
+Every name is asked once through server.lookup_miss(), so each lookup is a
+miss; `--concurrency` lookups are in flight at a time, and each run starts
+with an empty C++ cache.
+
+Reported per run: latency percentiles (p50 … p99.9, max) for all misses and
+for the big names alone, the tcp_fallbacks / tcp_fallback_rate of
+server.metrics.summary(), and UDP replies the stubs truncated.
+
+Run:  python bench/bench_edns.py [--names 2000] [--big 0.2] [--rrset 24]
+                                 [--concurrency 8] [--latency 2] [--edns 0,1232]
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+import threading
+from unittest import mock
+
+_HERE = os.path.dirname(os.path.abspath(__file__))
+_ROOT = os.path.dirname(_HERE)
+sys.path.insert(0, _HERE)
+sys.path.insert(0, os.path.join(_ROOT, "api"))
+sys.path.insert(0, os.path.join(_ROOT, "core"))
+
+from stub_dns import StubHierarchy                                        # noqa: E402
+from bench_load import load_zones, host_name, zone_name, percentile, dnscore   # noqa: E402
+
+PERCENTILES = (50, 90, 99, 99.9)
+
+
+def edns_zones(names: int, zones: int, big: set, rrset: int) -> dict:
+    """load_zones(), with `rrset` addresses for each host index in `big`."""
+    spec = load_zones(names, zones)
+    for i in big:
+        records = spec[f"{zone_name(i % zones)}."]["records"]
+        records += [(f"{host_name(i, zones)}.", "A", 300, f"172.16.{i & 255}.{k}")
+                    for k in range(1, rrset)]
+    return spec
+
+
+def run(server, edns: int, names: list, big: set, args, stub: StubHierarchy) -> dict:
+    """Resolves every name once with EDNS0 advertising `edns` bytes (0 = off)."""
+    native = dnscore.Resolver(dnscore.Cache(len(names) * 2), roots=stub.root_ips,
+                              port=stub.port, edns=edns)
+    patches = [
+        mock.patch.object(server, "_native", native),
+        mock.patch.object(server, "cache", server.DNSCache(capacity=len(names) * 2)),
+        mock.patch.object(server, "metrics", server.Metrics()),
+    ]
+    for p in patches:
+        p.start()
+    stub.reset_counters()
+    latency, lock = [], threading.Lock()
+    todo = iter(names)
+
+    def worker():
+        mine = []
+        while True:
+            with lock:
+                name = next(todo, None)
+            if name is None:
+                break
+            t0 = time.perf_counter()
+            _body, status, _h = server.lookup_miss(name[0], "A", t0)
+            mine.append(((time.perf_counter() - t0) * 1000, name[1], status != 200))
+        with lock:
+            latency.extend(mine)
+
+    try:
+        threads = [threading.Thread(target=worker) for _ in range(args.concurrency)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        summary = server.metrics.summary()
+    finally:
+        for p in reversed(patches):
+            p.stop()
+    every = sorted(ms for ms, _big, _f in latency)
+    large = sorted(ms for ms, is_big, _f in latency if is_big)
+    return {
+        "edns":        edns,
+        "lookups":     len(every),
+        "failures":    sum(f for _ms, _big, f in latency),
+        "latency_ms":  {f"p{p:g}": round(percentile(every, p), 2) for p in PERCENTILES}
+                       | {"max": round(every[-1], 2)},
+        "big_ms":      {f"p{p:g}": round(percentile(large, p), 2) for p in PERCENTILES}
+                       | {"max": round(large[-1], 2) if large else 0.0},
+        "tcp_fallbacks":     summary["tcp_fallbacks"],
+        "tcp_fallback_rate": summary["tcp_fallback_rate"],
+        "truncated":   sum(s.truncated for s in stub.servers.values()),
+        "queries_per_lookup": round(stub.total_queries / len(every), 3),
+    }
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__,
+                                 formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--names", type=int, default=2000, help="distinct names, each asked once")
+    ap.add_argument("--zones", type=int, default=100, help="authoritative zones")
+    ap.add_argument("--big", type=float, default=0.2, help="fraction of names with a big RRset")
+    ap.add_argument("--rrset", type=int, default=24, help="addresses in a big RRset (≤ 256)")
+    ap.add_argument("--concurrency", type=int, default=8, help="lookups in flight")
+    ap.add_argument("--latency", type=float, default=2.0, help="per-reply delay, ms")
+    ap.add_argument("--jitter", type=float, default=1.0, help="extra uniform delay up to, ms")
+    ap.add_argument("--edns", default="0,1232", help="advertised UDP sizes to compare")
+    ap.add_argument("--seed", type=int, default=1)
+    args = ap.parse_args(argv)
+    if dnscore is None:
+        raise SystemExit("bench_edns needs the dnscore extension (bash build.sh)")
+
+    import server
+    rng = random.Random(args.seed)
+    big = set(rng.sample(range(args.names), int(args.names * args.big)))
+    names = [(host_name(i, args.zones), i in big) for i in range(args.names)]
+    rng.shuffle(names)
+    with StubHierarchy(edns_zones(args.names, args.zones, big, args.rrset)) as stub:
+        stub.seed(args.seed).configure(delay=args.latency / 1000, jitter=args.jitter / 1000)
+        rows = [run(server, int(e), names, big, args, stub) for e in args.edns.split(",")]
+
+    print(f"{args.names} misses, {len(big)} with {args.rrset} addresses, "
+          f"{args.concurrency} in flight, {args.latency:g} ms/reply ± {args.jitter:g}")
+    head = "".join(f"{k:>9}" for k in rows[0]["latency_ms"])
+    print(f"{'edns':<6}{head}   │{head.replace('  p', ' bp')}"
+          f"{'tcp':>7}{'tcp %':>7}{'trunc':>7}{'q/lookup':>10}{'failed':>8}")
+    for r in rows:
+        print(f"{r['edns'] or 'off':<6}"
+              + "".join(f"{v:>9.2f}" for v in r["latency_ms"].values()) + "   │"
+              + "".join(f"{v:>9.2f}" for v in r["big_ms"].values())
+              + f"{r['tcp_fallbacks']:>7}{r['tcp_fallback_rate']:>7.1f}{r['truncated']:>7}"
+              f"{r['queries_per_lookup']:>10.3f}{r['failures']:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+bench/bench_hitpath.py
+──────────────────────
+Cost of a /resolve cache hit before and after pre-encoded cache entries.
+
+  legacy   cache holds the response dict; every hit copies it (TTL aging),
+           sets cached/latency_ms and JSON-encodes the whole body
+  encoded  cache holds a CachedResponse; every hit splices the per-hit
+           values into JSON encoded once at put() time
+
+Two levels are timed for a small answer (one A record) and a large one
+(CNAME + 12 A records):
+  function   lookup → bytes, what either front end does per hit
+  flask      GET /resolve through Flask's test client (routing, request
+             parsing and Response objects included)
+
+No network: both caches are filled directly.
+
+Run:  python bench/bench_hitpath.py [-n 20000]
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(_ROOT, "api"))
+
+import server                       # noqa: E402
+from flask import jsonify, request  # noqa: E402
+
+
+def make_body(domain: str, n_a: int, chain: bool) -> dict:
+    answers = []
+    if chain:
+        answers.append({"name": domain, "type": "CNAME", "ttl": 300,
+                        "data": f"edge.{domain}"})
+    owner = f"edge.{domain}" if chain else domain
+    answers += [{"name": owner, "type": "A", "ttl": 60, "data": f"192.0.2.{i + 1}"}
+                for i in range(n_a)]
+    return {"domain": domain, "ip": "192.0.2.1", "record_type": "A", "cached": False,
+            "latency_ms": 38.4, "ttl": 60, "answers": answers,
+            "resolution_path": ["198.41.0.4", "192.12.94.30", "199.43.135.53"],
+            "start_zone": ".", "hops_saved": 0, "used_tcp": False}
+
+
+legacy_cache = server.DNSCache()
+
+
+def legacy_hit(domain: str, qtype: str) -> bytes:
+    """The hit path as it was: copy + mutate + full encode."""
+    t0 = time.perf_counter()
+    entry = legacy_cache.lookup(f"{domain}/{qtype}")
+    cached = server._aged(*entry)
+    cached["cached"]     = True
+    cached["latency_ms"] = round((time.perf_counter() - t0) * 1000, 3)
+    server.metrics.record(domain, qtype, cached["latency_ms"], True, True, False)
+    return server._encode(cached)
+
+
+def encoded_hit(domain: str, qtype: str) -> bytes:
+    return server.lookup_cached_json(domain, qtype, time.perf_counter())[0]
+
+
+@server.app.route("/resolve_legacy")
+def resolve_legacy():
+    domain, qtype = request.args["domain"], request.args.get("type", "A")
+    t0 = time.perf_counter()
+    entry = legacy_cache.lookup(f"{domain}/{qtype}")
+    cached = server._aged(*entry)
+    cached["cached"]     = True
+    cached["latency_ms"] = round((time.perf_counter() - t0) * 1000, 3)
+    server.metrics.record(domain, qtype, cached["latency_ms"], True, True, False)
+    return jsonify(cached), 200
+
+
+def timed(fn, n: int) -> tuple:
+    samples = []
+    for _ in range(n):
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1e6)
+    samples.sort()
+    return statistics.median(samples), samples[int(len(samples) * 0.99)]
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__,
+                                 formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("-n", type=int, default=20000, help="hits per measurement")
+    args = ap.parse_args()
+
+    client = server.app.test_client()
+    cases  = {"small (1 A)": ("small.example.com", 1, False),
+              "large (CNAME + 12 A)": ("large.example.com", 12, True)}
+    for domain, n_a, chain in cases.values():
+        body = make_body(domain, n_a, chain)
+        legacy_cache.put(f"{domain}/A", dict(body), ttl=3600)
+        server.cache.put(f"{domain}/A", server.CachedResponse(dict(body)), ttl=3600)
+        assert set(json.loads(legacy_hit(domain, "A"))) == \
+            set(json.loads(encoded_hit(domain, "A")))
+
+    print(f"hits per cell: {args.n}   (µs per hit, median / p99)")
+    print(f"{'body':<22} {'level':<9} {'legacy':>16} {'encoded':>16} {'speedup':>8}")
+    for label, (domain, _n, _c) in cases.items():
+        rows = {
+            "function": (lambda: legacy_hit(domain, "A"),
+                         lambda: encoded_hit(domain, "A")),
+            "flask":    (lambda: client.get(f"/resolve_legacy?domain={domain}"),
+                         lambda: client.get(f"/resolve?domain={domain}")),
+        }
+        for level, (old, new) in rows.items():
+            n = args.n if level == "function" else max(1, args.n // 10)
+            timed(old, n // 10 or 1), timed(new, n // 10 or 1)          # warm-up
+            (om, o99), (nm, n99) = timed(old, n), timed(new, n)
+            print(f"{label:<22} {level:<9} {om:>7.2f} / {o99:>6.2f} "
+                  f"{nm:>7.2f} / {n99:>6.2f} {om / nm:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+"""
+bench/bench_listener.py
+───────────────────────
+Load test for the native DNS front end (api/dns_listener.py) with a
+wire-level query generator: `--concurrency` coroutines each keep one UDP
+query outstanding against the listener, drawing names from a zone of
+`--names` hosts.  The first pass over the names is made of cache misses
+(full walk of the loopback stub hierarchy); after that most queries are
+cache hits answered on the listener's event loop.
+
+By default the listener runs in a child process, with its C++ resolver
+pointed at bench/stub_dns.py, so nothing leaves the machine.  Use
+`--target host:port` to load an already running listener instead.
+
+Reports queries/s, latency percentiles, timeouts and RCODE counts.
+
+Run:  python bench/bench_listener.py [--duration 10] [--concurrency 64] [--names 1000]
+"""
+
+import os
+import sys
+import time
+import random
+import socket
+import struct
+import asyncio
+import argparse
+import subprocess
+from collections import Counter
+
+_HERE = os.path.dirname(os.path.abspath(__file__))
+_ROOT = os.path.dirname(_HERE)
+sys.path.insert(0, _HERE)
+sys.path.insert(0, os.path.join(_ROOT, "api"))
+
+import dnswire                                      # noqa: E402
+from stub_dns import StubHierarchy, DEFAULT_ZONES   # noqa: E402
+
+RCODE_NAMES = {0: "NOERROR", 1: "FORMERR", 2: "SERVFAIL", 3: "NXDOMAIN",
+               4: "NOTIMP", 5: "REFUSED"}
+
+
+def bench_zones(n: int) -> dict:
+    zones = {k: dict(v) for k, v in DEFAULT_ZONES.items()}
+    zones["example.com."]["records"] = [
+        (f"host{i}.example.com.", "A", 3600, f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}")
+        for i in range(n)
+    ]
+    return zones
+
+
+def _free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_listener(port: int, env: dict) -> subprocess.Popen:
+    proc = subprocess.Popen(
+        [sys.executable, os.path.join(_ROOT, "api", "dns_listener.py"),
+         "--host", "127.0.0.1", "--port", str(port)],
+        env=dict(os.environ, **env), stdout=subprocess.PIPE, text=True)
+    proc.stdout.readline()                         # "DNS listener : ..." once bound
+    return proc
+
+
+# ── generator ────────────────────────────────────────────────────────────────
+
+class _Client(asyncio.DatagramProtocol):
+    def __init__(self):
+        self.waiting = {}                          # msg id → future
+
+    def datagram_received(self, data, addr):
+        if len(data) >= 4:
+            fut = self.waiting.pop(struct.unpack("!H", data[:2])[0], None)
+            if fut is not None and not fut.done():
+                fut.set_result(data[3] & 0x0F)
+
+
+async def generate(host: str, port: int, names: list, duration: float,
+                   concurrency: int, timeout: float) -> dict:
+    loop = asyncio.get_running_loop()
+    transport, client = await loop.create_datagram_endpoint(
+        _Client, remote_addr=(host, port))
+    latencies, rcodes, timeouts = [], Counter(), 0
+    ids = iter(range(1 << 62))
+    order = list(names)
+    random.shuffle(order)
+    cursor = 0
+    deadline = loop.time() + duration
+
+    async def worker():
+        nonlocal timeouts, cursor
+        while loop.time() < deadline:
+            msg_id = next(ids) & 0xFFFF
+            while msg_id in client.waiting:
+                msg_id = next(ids) & 0xFFFF
+            # Every name once (misses), then uniformly random (mostly hits).
+            if cursor < len(order):
+                name, cursor = order[cursor], cursor + 1
+            else:
+                name = random.choice(names)
+            fut = loop.create_future()
+            client.waiting[msg_id] = fut
+            t0 = time.perf_counter()
+            transport.sendto(dnswire.build_query(name, 1, msg_id))
+            try:
+                rcodes[await asyncio.wait_for(fut, timeout)] += 1
+                latencies.append((time.perf_counter() - t0) * 1000)
+            except asyncio.TimeoutError:
+                client.waiting.pop(msg_id, None)
+                timeouts += 1
+
+    t_start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - t_start
+    transport.close()
+
+    latencies.sort()
+
+    def pct(p):
+        return round(latencies[min(len(latencies) - 1, int(len(latencies) * p))], 3) \
+            if latencies else None
+
+    return {
+        "queries":  len(latencies) + timeouts,
+        "answered": len(latencies),
+        "timeouts": timeouts,
+        "qps":      round(len(latencies) / elapsed, 1),
+        "p50_ms":   pct(0.50),
+        "p90_ms":   pct(0.90),
+        "p99_ms":   pct(0.99),
+        "max_ms":   round(latencies[-1], 3) if latencies else None,
+        "rcodes":   {RCODE_NAMES.get(k, str(k)): v for k, v in sorted(rcodes.items())},
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__,
+                                 formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--duration", type=float, default=10.0, help="seconds of load")
+    ap.add_argument("--concurrency", type=int, default=64, help="outstanding queries")
+    ap.add_argument("--names", type=int, default=1000, help="distinct names")
+    ap.add_argument("--timeout", type=float, default=2.0, help="per-query timeout (s)")
+    ap.add_argument("--target", help="host:port of a running listener")
+    args = ap.parse_args()
+
+    names = [f"host{i}.example.com" for i in range(args.names)]
+    stub = proc = None
+    if args.target:
+        host, port = args.target.rsplit(":", 1)
+        port = int(port)
+    else:
+        stub = StubHierarchy(bench_zones(args.names)).start()
+        host, port = "127.0.0.1", _free_port()
+        proc = start_listener(port, stub.env())
+    try:
+        result = asyncio.run(generate(host, port, names, args.duration,
+                                      args.concurrency, args.timeout))
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait()
+        if stub is not None:
+            stub.stop()
+
+    print(f"target       : udp {host}:{port}")
+    print(f"concurrency  : {args.concurrency}   names: {args.names}   "
+          f"duration: {args.duration:g} s")
+    for key in ("queries", "answered", "timeouts", "qps",
+                "p50_ms", "p90_ms", "p99_ms", "max_ms", "rcodes"):
+        print(f"{key:<13}: {result[key]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,428 @@
+"""
+bench/bench_load.py
+───────────────────
+Repeatable offline load test: a synthetic root → TLD → authoritative
+hierarchy on loopback (bench/stub_dns.py) with configurable latency,
+jitter, loss and truncation, driven at a fixed rate with Zipf-distributed
+name popularity.  Nothing leaves the machine, and with the same arguments
+and seed every run asks the same names in the same order, so results are
+comparable across commits.
+
+Targets (what the queries go through):
+  native   dnscore.Resolver with its own dnscore.Cache — the C++ engine alone
+  api      server.py's /resolve path in-process (DNSCache, single-flight,
+           prefetch, C++ bridge) without HTTP
+  http     api/async_server.py on a loopback port, keep-alive connections
+
+The load is open-loop: request i is due at start + i / qps whatever happened
+to earlier ones, and its latency is measured from when it was due — a stall
+shows up in the percentiles instead of silently lowering the offered rate.
+
+Reported: achieved throughput, latency percentiles, cache hit ratio,
+failures, upstream queries (per level, per lookup, TCP connections, lost
+UDP queries) and how far the driver itself fell behind schedule.
+`--json` saves the run (with the git commit); `--compare` prints the change
+against a saved run.
+
+Run:  python bench/bench_load.py [--target api] [--qps 500] [--duration 20]
+                                 [--names 10000] [--zipf 1.1] [--latency 5]
+                                 [--jitter 2] [--loss 0] [--truncate 0]
+                                 [--json out.json] [--compare base.json]
+"""
+
+import os
+import sys
+import json
+import time
+import bisect
+import random
+import argparse
+import platform
+import threading
+import subprocess
+import http.client
+from unittest import mock
+from urllib.parse import quote
+
+_HERE = os.path.dirname(os.path.abspath(__file__))
+_ROOT = os.path.dirname(_HERE)
+sys.path.insert(0, _HERE)
+sys.path.insert(0, os.path.join(_ROOT, "api"))
+sys.path.insert(0, os.path.join(_ROOT, "core"))
+
+from stub_dns import StubHierarchy   # noqa: E402
+
+try:
+    import dnscore
+except ImportError:
+    dnscore = None
+
+ROOT_IP, TLD_IP = "127.0.0.2", "127.0.0.3"
+TLDS            = ("com", "net", "org")
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  Workload
+# ─────────────────────────────────────────────────────────────────────────────
+
+def load_zones(names: int, zones: int, servers: int = 4, ttl: int = 300) -> dict:
+    """
+    `names` hosts spread over `zones` zones under three TLDs.  Each zone has
+    two name servers out of `servers` authoritative IPs (127.0.1.x), so a
+    lost query can be retried elsewhere.
+    """
+    spec = {
+        ".": {"servers": {"a.root.test.": ROOT_IP}},
+        **{f"{tld}.": {"servers": {"a.gtld.test.": TLD_IP}, "ns_ttl": 172800}
+           for tld in TLDS},
+    }
+    for j in range(zones):
+        zone = zone_name(j)
+        a, b = j % servers, (j + 1) % servers
+        spec[f"{zone}."] = {
+            "servers": {f"ns1.{zone}.": f"127.0.1.{a + 1}",
+                        f"ns2.{zone}.": f"127.0.1.{b + 1}"},
+            "ns_ttl":  86400,
+            "records": [],
+        }
+    for i in range(names):
+        spec[f"{zone_name(i % zones)}."]["records"].append(
+            (f"{host_name(i, zones)}.", "A", ttl, f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}"))
+    return spec
+
+
+def zone_name(j: int) -> str:
+    return f"zone{j}.{TLDS[j % len(TLDS)]}"
+
+
+def host_name(i: int, zones: int) -> str:
+    return f"host{i}.{zone_name(i % zones)}"
+
+
+class Zipf:
+    """Draws ranks 0..n-1 with P(k) ∝ 1 / (k + 1)^s."""
+
+    def __init__(self, n: int, s: float, rng: random.Random):
+        self.rng = rng
+        self.cum = []
+        total = 0.0
+        for k in range(n):
+            total += 1.0 / (k + 1) ** s
+            self.cum.append(total)
+
+    def __call__(self) -> int:
+        return bisect.bisect_left(self.cum, self.rng.random() * self.cum[-1])
+
+
+def query_names(args) -> list:
+    """The whole run's query sequence — a pure function of the arguments."""
+    rng  = random.Random(args.seed)
+    zipf = Zipf(args.names, args.zipf, rng)
+    out  = []
+    for _ in range(int(args.qps * args.duration)):
+        i = zipf()
+        if args.nxdomain and rng.random() < args.nxdomain:
+            out.append(f"missing{i}.{zone_name(i % args.zones)}")
+        else:
+            out.append(host_name(i, args.zones))
+    return out
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  Targets — query(name) → (answered, cache_hit)
+#  "answered" means an answer or an authoritative NXDOMAIN / NODATA.
+# ─────────────────────────────────────────────────────────────────────────────
+
+class NativeTarget:
+    def __init__(self, stub: StubHierarchy, cache_entries: int):
+        if dnscore is None:
+            raise SystemExit("--target native needs the dnscore extension (bash build.sh)")
+        self.resolver = dnscore.Resolver(dnscore.Cache(cache_entries),
+                                         roots=stub.root_ips, port=stub.port)
+
+    def query(self, name: str) -> tuple:
+        r = self.resolver.resolve(name, "A")
+        return r["success"] or r["rcode"] in ("NXDOMAIN", "NOERROR"), r["cached"]
+
+    def close(self):
+        pass
+
+
+class ApiTarget:
+    """server.py's lookup path, with both caches fresh and the resolver on the stub."""
+
+    def __init__(self, stub: StubHierarchy, cache_entries: int):
+        os.environ.update(stub.env())            # worker pool, if dnscore is not built
+        import server
+        self.server  = server
+        native       = (dnscore.Resolver(dnscore.Cache(cache_entries),
+                                         roots=stub.root_ips, port=stub.port)
+                        if dnscore is not None and server._native is not None else None)
+        self._patches = [
+            mock.patch.object(server, "_native", native),
+            mock.patch.object(server, "cache", server.DNSCache(capacity=cache_entries)),
+            mock.patch.object(server, "metrics", server.Metrics()),
+            mock.patch.object(server, "fallback_resolve", return_value=[]),   # no 8.8.8.8
+        ]
+        for p in self._patches:
+            p.start()
+
+    def query(self, name: str) -> tuple:
+        t0  = time.perf_counter()
+        hit = self.server.lookup_cached_json(name, "A", t0)
+        if hit is not None:
+            return hit[1] < 500, True
+        _body, status, _headers = self.server.lookup_miss(name, "A", t0)
+        return status < 500, False
+
+    def close(self):
+        for p in reversed(self._patches):
+            p.stop()
+
+
+class HttpTarget(ApiTarget):
+    """The asyncio API server on loopback; one keep-alive connection per driver thread."""
+
+    def __init__(self, stub: StubHierarchy, cache_entries: int):
+        super().__init__(stub, cache_entries)
+        from async_server import AsyncAPIServer
+        self.api   = AsyncAPIServer("127.0.0.1", 0).start_in_thread()
+        self.local = threading.local()
+
+    def query(self, name: str) -> tuple:
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = self.local.conn = http.client.HTTPConnection("127.0.0.1", self.api.port,
+                                                                timeout=30)
+        try:
+            conn.request("GET", f"/resolve?domain={quote(name)}&type=A")
+            resp = conn.getresponse()
+            body = json.loads(resp.read())
+        except (OSError, http.client.HTTPException, ValueError):
+            conn.close()
+            self.local.conn = None
+            return False, False
+        return resp.status < 500, bool(body.get("cached"))
+
+    def close(self):
+        self.api.stop_thread()
+        super().close()
+
+
+TARGETS = {"native": NativeTarget, "api": ApiTarget, "http": HttpTarget}
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  Open-loop driver
+# ─────────────────────────────────────────────────────────────────────────────
+
+def drive(target, names: list, qps: float, concurrency: int) -> dict:
+    """
+    Issues names[i] at start + i / qps from `concurrency` threads.  Returns
+    raw samples: per-request latency from the due time (ms), send lag (ms),
+    and answered / hit / failure counts.
+    """
+    lock    = threading.Lock()
+    counter = iter(range(len(names)))
+    start   = time.perf_counter() + 0.05
+    out     = {"latency": [], "lag": [], "answered": 0, "hits": 0, "failures": 0}
+
+    def worker():
+        latency, lag = [], []
+        answered = hits = failures = 0
+        while True:
+            with lock:
+                i = next(counter, None)
+            if i is None:
+                break
+            due  = start + i / qps
+            wait = due - time.perf_counter()
+            if wait > 0:
+                time.sleep(wait)
+            lag.append(max(0.0, time.perf_counter() - due) * 1000)
+            try:
+                ok, hit = target.query(names[i])
+            except Exception:                     # a failed lookup is a result, not a crash
+                ok, hit = False, False
+            latency.append((time.perf_counter() - due) * 1000)
+            answered += ok
+            failures += not ok
+            hits     += hit
+        with lock:
+            out["latency"] += latency
+            out["lag"]     += lag
+            out["answered"] += answered
+            out["hits"]    += hits
+            out["failures"] += failures
+
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    out["seconds"] = time.perf_counter() - start
+    return out
+
+
+def percentile(sorted_ms: list, p: float) -> float:
+    if not sorted_ms:
+        return 0.0
+    return sorted_ms[min(len(sorted_ms) - 1, int(p / 100 * len(sorted_ms)))]
+
+
+def summarise(raw: dict, stub: StubHierarchy) -> dict:
+    lat, lag = sorted(raw["latency"]), sorted(raw["lag"])
+    sent     = len(lat)
+    tld_ips  = {TLD_IP}
+    per_ip   = dict(stub.per_ip)
+    upstream = sum(per_ip.values())
+    return {
+        "sent":           sent,
+        "answered":       raw["answered"],
+        "failures":       raw["failures"],
+        "throughput_qps": round(sent / raw["seconds"], 1),
+        "latency_ms":     {f"p{p:g}": round(percentile(lat, p), 3)
+                           for p in (50, 90, 99, 99.9)} | {"max": round(lat[-1], 3)
+                                                           if lat else 0.0},
+        "hit_ratio":      round(raw["hits"] / sent, 4) if sent else 0.0,
+        "upstream": {
+            "queries":    upstream,
+            "per_lookup": round(upstream / sent, 4) if sent else 0.0,
+            "root":       sum(n for ip, n in per_ip.items() if ip in stub.root_ips),
+            "tld":        sum(n for ip, n in per_ip.items() if ip in tld_ips),
+            "auth":       sum(n for ip, n in per_ip.items()
+                              if ip not in tld_ips and ip not in stub.root_ips),
+            "lost":       sum(s.lost for s in stub.servers.values()),
+            "tcp_connections": sum(s.tcp_connections for s in stub.servers.values()),
+        },
+        "send_lag_ms":    {"p99": round(percentile(lag, 99), 3),
+                           "max": round(lag[-1], 3) if lag else 0.0},
+    }
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  Reporting
+# ─────────────────────────────────────────────────────────────────────────────
+
+def commit() -> str:
+    try:
+        rev = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=_ROOT,
+                             capture_output=True, text=True, timeout=10).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"],
+                               cwd=_ROOT, capture_output=True, text=True,
+                               timeout=30).stdout.strip()
+        return f"{rev}{'-dirty' if dirty else ''}" if rev else "unknown"
+    except (OSError, subprocess.SubprocessError):
+        return "unknown"
+
+
+def print_report(run: dict):
+    a, r = run["args"], run["result"]
+    lat, up = r["latency_ms"], r["upstream"]
+    print(f"commit {run['commit']}   target {a['target']}   {a['qps']:g} q/s × {a['duration']:g} s"
+          f"   names {a['names']} / zones {a['zones']}   zipf {a['zipf']:g}   seed {a['seed']}")
+    print(f"upstream: latency {a['latency']:g} ms ± {a['jitter']:g}   loss {a['loss']:.1%}"
+          f"   truncate {a['truncate']:.1%}   ttl {a['ttl']} s")
+    print(f"sent {r['sent']}   answered {r['answered']}   failed {r['failures']}"
+          f"   throughput {r['throughput_qps']:.1f} q/s")
+    print("latency ms  " + "  ".join(f"{k} {v:.3f}" for k, v in lat.items()))
+    print(f"cache hit ratio {r['hit_ratio']:.1%}")
+    print(f"upstream queries {up['queries']} ({up['per_lookup']:.3f} per lookup)"
+          f"   root {up['root']}  tld {up['tld']}  auth {up['auth']}"
+          f"   lost {up['lost']}   tcp connections {up['tcp_connections']}")
+    lag = r["send_lag_ms"]
+    note = "   ← driver saturated, raise --concurrency" if lag["p99"] > 10 else ""
+    print(f"send lag ms  p99 {lag['p99']:.3f}  max {lag['max']:.3f}{note}")
+
+
+def _flatten(d: dict, prefix: str = "") -> dict:
+    out = {}
+    for k, v in d.items():
+        if isinstance(v, dict):
+            out.update(_flatten(v, f"{prefix}{k}."))
+        else:
+            out[f"{prefix}{k}"] = v
+    return out
+
+
+def print_comparison(base: dict, run: dict):
+    different = {k: (base["args"].get(k), v) for k, v in run["args"].items()
+                 if base["args"].get(k) != v and k not in ("json", "compare")}
+    print(f"\nvs {base['commit']}" +
+          ("   (different arguments: " + ", ".join(f"{k} {b} → {n}"
+                                                  for k, (b, n) in different.items()) + ")"
+           if different else ""))
+    old, new = _flatten(base["result"]), _flatten(run["result"])
+    for key, value in new.items():
+        before = old.get(key)
+        if not isinstance(value, (int, float)) or not isinstance(before, (int, float)):
+            continue
+        change = f"{(value - before) / before:+.1%}" if before else "—"
+        print(f"  {key:<28} {before:>12g} → {value:<12g} {change:>8}")
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  main
+# ─────────────────────────────────────────────────────────────────────────────
+
+def parse_args(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__,
+                                 formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--target", choices=sorted(TARGETS), default="api")
+    ap.add_argument("--qps", type=float, default=500, help="offered load, queries/s")
+    ap.add_argument("--duration", type=float, default=20, help="seconds of load")
+    ap.add_argument("--warmup", type=float, default=0,
+                    help="seconds of the same load first, not measured")
+    ap.add_argument("--concurrency", type=int, default=64, help="driver threads")
+    ap.add_argument("--names", type=int, default=10_000, help="distinct host names")
+    ap.add_argument("--zones", type=int, default=100, help="authoritative zones")
+    ap.add_argument("--zipf", type=float, default=1.1, help="popularity skew exponent")
+    ap.add_argument("--nxdomain", type=float, default=0.0,
+                    help="fraction of queries for names that do not exist")
+    ap.add_argument("--ttl", type=int, default=300, help="record TTL, seconds")
+    ap.add_argument("--cache-entries", type=int, default=100_000)
+    ap.add_argument("--latency", type=float, default=5.0, help="upstream reply delay, ms")
+    ap.add_argument("--jitter", type=float, default=2.0, help="extra uniform delay up to, ms")
+    ap.add_argument("--loss", type=float, default=0.0, help="UDP query loss probability")
+    ap.add_argument("--truncate", type=float, default=0.0,
+                    help="probability of a TC=1 UDP reply (→ TCP retry)")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--json", help="save the run here")
+    ap.add_argument("--compare", help="a run saved with --json to compare against")
+    return ap.parse_args(argv)
+
+
+def run(args) -> dict:
+    """One full load test; returns {"commit", "args", "result"}."""
+    stub = StubHierarchy(load_zones(args.names, args.zones, ttl=args.ttl)).start()
+    stub.seed(args.seed).configure(delay=args.latency / 1000, jitter=args.jitter / 1000,
+                                   loss=args.loss, truncate=args.truncate)
+    target = TARGETS[args.target](stub, args.cache_entries)
+    try:
+        names = query_names(args)
+        if args.warmup:
+            drive(target, names[:int(args.qps * args.warmup)], args.qps, args.concurrency)
+            stub.reset_counters()
+        result = summarise(drive(target, names, args.qps, args.concurrency), stub)
+    finally:
+        target.close()
+        stub.stop()
+    return {"commit": commit(), "python": platform.python_version(),
+            "args": vars(args), "result": result}
+
+
+def main(argv=None):
+    args   = parse_args(argv)
+    result = run(args)
+    print_report(result)
+    if args.compare:
+        with open(args.compare) as f:
+            print_comparison(json.load(f), result)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(result, f, indent=2)
+        print(f"\nsaved to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,381 @@
+// ─────────────────────────────────────────────────────────────────────────────
+//  bench/bench_parse.cpp
+//  Parse throughput of dns::PacketView against the record-building parser
+//  it replaced (kept below as `legacy`), on a corpus of captured responses.
+//  Driven by bench/bench_parse.py, which captures the corpus from the
+//  loopback stub hierarchy (or takes one from a file).
+//
+//  Each mode does what walk() needs from one reply: the answers owned by the
+//  query name as records, and for a referral the glue address of every NS.
+//    legacy      parse every record to text, then a std::map of glue
+//    view        PacketView: names compared in place, glue found in place,
+//                only the answers and the used glue addresses formatted
+//    view-full   PacketView::response() — every record to text, as
+//                parse_response() and the JSON boundary need
+//    check       no timing: legacy and view-full must agree on every packet
+//
+//  Build:
+//    g++ -std=c++17 -O2 -DDNS_RESOLVER_NO_MAIN -Icore
+//        bench/bench_parse.cpp core/dns_resolver.cpp -o bench_parse
+//  Run:
+//    bench_parse <legacy|view|view-full|check> <corpus> [min-seconds]
+//
+//  Corpus: DNS messages, each preceded by its 16-bit big-endian length
+//  (DNS-over-TCP framing).  Output: one JSON object on stdout.
+// ─────────────────────────────────────────────────────────────────────────────
+
+#include "dns_resolver.h"
+
+#include <algorithm>
+#include <atomic>
+#include <chrono>
+#include <cstdio>
+#include <cstdlib>
+#include <fstream>
+#include <iomanip>
+#include <iterator>
+#include <map>
+#include <new>
+#include <sstream>
+#include <string>
+#include <vector>
+
+// ── allocation counter ────────────────────────────────────────────────────────
+static std::atomic<size_t> g_allocs{0};
+
+void* operator new(std::size_t n) {
+    g_allocs.fetch_add(1, std::memory_order_relaxed);
+    if (void* p = std::malloc(n ? n : 1)) return p;
+    throw std::bad_alloc();
+}
+void operator delete(void* p) noexcept              { std::free(p); }
+void operator delete(void* p, std::size_t) noexcept { std::free(p); }
+
+// ═════════════════════════════════════════════════════════════════════════════
+//  The previous parser (parse_response() before PacketView), unchanged
+// ═════════════════════════════════════════════════════════════════════════════
+namespace legacy {
+
+using namespace dns;
+
+static inline uint16_t rd16(const uint8_t* p) {
+    return static_cast<uint16_t>((p[0] << 8) | p[1]);
+}
+static inline uint32_t rd32(const uint8_t* p) {
+    return (static_cast<uint32_t>(p[0]) << 24) |
+           (static_cast<uint32_t>(p[1]) << 16) |
+           (static_cast<uint32_t>(p[2]) <<  8) |
+            static_cast<uint32_t>(p[3]);
+}
+
+
+// ─────────────────────────────────────────────────────────────────────────────
+//  Name decoder  (RFC 1035 §4.1.4 — with pointer compression)
+// ─────────────────────────────────────────────────────────────────────────────
+static std::string decode_name(const std::vector<uint8_t>& pkt, size_t& pos) {
+    std::string name;
+    bool   jumped    = false;
+    size_t saved_pos = 0;
+    int    jumps     = 0;
+
+    while (pos < pkt.size()) {
+        uint8_t len = pkt[pos];
+
+        if ((len & 0xC0) == 0xC0) {
+            // Compression pointer
+            if (pos + 1 >= pkt.size())
+                throw std::runtime_error("DNS: truncated compression pointer");
+            uint16_t offset = static_cast<uint16_t>((len & 0x3F) << 8) | pkt[pos + 1];
+            if (!jumped) { saved_pos = pos + 2; jumped = true; }
+            pos = offset;
+            if (++jumps > MAX_JUMPS)
+                throw std::runtime_error("DNS: compression pointer loop");
+        } else if (len == 0) {
+            if (!jumped) ++pos;
+            else         pos = saved_pos;
+            break;
+        } else {
+            ++pos;
+            if (pos + len > pkt.size())
+                throw std::runtime_error("DNS: label out of bounds");
+            if (!name.empty()) name += '.';
+            name.append(reinterpret_cast<const char*>(&pkt[pos]), len);
+            pos += len;
+        }
+    }
+    return name;
+}
+
+// ─────────────────────────────────────────────────────────────────────────────
+//  RDATA parser
+// ─────────────────────────────────────────────────────────────────────────────
+static std::string parse_rdata(const std::vector<uint8_t>& pkt,
+                                size_t rdata_start, uint16_t rdlen,
+                                uint16_t rtype) {
+    if (rdata_start + rdlen > pkt.size())
+        throw std::runtime_error("DNS: RDATA extends past end of packet");
+
+    size_t pos = rdata_start;
+
+    switch (rtype) {
+
+    case TYPE_A: {
+        if (rdlen != 4) throw std::runtime_error("DNS: A record bad RDLENGTH");
+        char buf[16];
+        std::snprintf(buf, sizeof(buf), "%u.%u.%u.%u",
+            pkt[pos], pkt[pos+1], pkt[pos+2], pkt[pos+3]);
+        return buf;
+    }
+
+    case TYPE_AAAA: {
+        if (rdlen != 16) throw std::runtime_error("DNS: AAAA record bad RDLENGTH");
+        char buf[40];
+        std::snprintf(buf, sizeof(buf),
+            "%04x:%04x:%04x:%04x:%04x:%04x:%04x:%04x",
+            rd16(&pkt[pos+ 0]), rd16(&pkt[pos+ 2]),
+            rd16(&pkt[pos+ 4]), rd16(&pkt[pos+ 6]),
+            rd16(&pkt[pos+ 8]), rd16(&pkt[pos+10]),
+            rd16(&pkt[pos+12]), rd16(&pkt[pos+14]));
+        return buf;
+    }
+
+    case TYPE_NS:
+    case TYPE_CNAME:
+    case TYPE_PTR:
+        return decode_name(pkt, pos);
+
+    case TYPE_MX: {
+        uint16_t pref = rd16(&pkt[pos]); pos += 2;
+        return std::to_string(pref) + " " + decode_name(pkt, pos);
+    }
+
+    case TYPE_TXT: {
+        std::string txt;
+        size_t end = rdata_start + rdlen;
+        while (pos < end) {
+            uint8_t slen = pkt[pos++];
+            if (pos + slen > end) break;
+            txt.append(reinterpret_cast<const char*>(&pkt[pos]), slen);
+            pos += slen;
+        }
+        return txt;
+    }
+
+    case TYPE_SOA: {
+        std::string mname = decode_name(pkt, pos);
+        std::string rname = decode_name(pkt, pos);
+        if (pos + 20 > pkt.size()) return mname + " " + rname;
+        uint32_t serial  = rd32(&pkt[pos]); pos += 4;
+        uint32_t refresh = rd32(&pkt[pos]); pos += 4;
+        /* retry  */ rd32(&pkt[pos]); pos += 4;
+        /* expire */ rd32(&pkt[pos]); pos += 4;
+        uint32_t minimum = rd32(&pkt[pos]); pos += 4;
+        return mname + " " + rname +
+               " serial=" + std::to_string(serial) +
+               " refresh=" + std::to_string(refresh) +
+               " minimum=" + std::to_string(minimum);
+    }
+
+    default: {
+        // Unknown type — hex-encode first 32 bytes of RDATA
+        std::ostringstream oss;
+        oss << "0x";
+        for (size_t i = 0; i < std::min<size_t>(rdlen, 32); ++i)
+            oss << std::hex << std::setw(2) << std::setfill('0')
+                << static_cast<int>(pkt[rdata_start + i]);
+        return oss.str();
+    }
+    }
+}
+
+// ─────────────────────────────────────────────────────────────────────────────
+//  Response parser  (RFC 1035 §4.1)
+// ─────────────────────────────────────────────────────────────────────────────
+static Record parse_record(const std::vector<uint8_t>& pkt, size_t& pos) {
+    Record rec;
+    rec.name = decode_name(pkt, pos);
+    if (pos + 10 > pkt.size())
+        throw std::runtime_error("DNS: record header truncated");
+    rec.type = rd16(&pkt[pos]); pos += 2;
+    rec.cls  = rd16(&pkt[pos]); pos += 2;
+    rec.ttl  = rd32(&pkt[pos]); pos += 4;
+    uint16_t rdlen = rd16(&pkt[pos]); pos += 2;
+    rec.data = parse_rdata(pkt, pos, rdlen, rec.type);
+    pos += rdlen;
+    return rec;
+}
+
+static Response parse_response(const std::vector<uint8_t>& data) {
+    if (data.size() < 12)
+        throw std::runtime_error("DNS: packet too short (< 12 bytes)");
+
+    Response resp;
+    resp.id    = rd16(&data[0]);
+    resp.flags = rd16(&data[2]);
+    resp.rcode = static_cast<uint8_t>(resp.flags & RCODE_MASK);
+    resp.truncated     = (resp.flags & FLAG_TC) != 0;
+    resp.authoritative = (resp.flags & FLAG_AA) != 0;
+
+    uint16_t qdcount = rd16(&data[4]);
+    uint16_t ancount = rd16(&data[6]);
+    uint16_t nscount = rd16(&data[8]);
+    uint16_t arcount = rd16(&data[10]);
+
+    size_t pos = 12;
+
+    // Skip question section
+    for (int i = 0; i < qdcount; ++i) {
+        decode_name(data, pos);   // QNAME
+        pos += 4;                 // QTYPE + QCLASS
+    }
+
+    // Answer section
+    for (int i = 0; i < ancount; ++i)
+        resp.answers.push_back(parse_record(data, pos));
+
+    // Authority section
+    for (int i = 0; i < nscount; ++i)
+        resp.authorities.push_back(parse_record(data, pos));
+
+    // Additional section
+    for (int i = 0; i < arcount; ++i)
+        resp.additionals.push_back(parse_record(data, pos));
+
+    // Compute min TTL across all answers (used as cache TTL).
+    resp.min_ttl = 300;
+    if (!resp.answers.empty()) {
+        resp.min_ttl = resp.answers[0].ttl;
+        for (const auto& a : resp.answers)
+            resp.min_ttl = std::min(resp.min_ttl, a.ttl);
+    }
+
+    return resp;
+}
+
+}  // namespace legacy
+
+// ═════════════════════════════════════════════════════════════════════════════
+//  What walk() takes from one reply
+// ═════════════════════════════════════════════════════════════════════════════
+using Packet = std::vector<uint8_t>;
+
+static std::string question(const Packet& pkt) {
+    dns::PacketView v(pkt);
+    return dns::normalize_name(v.name(12));
+}
+
+// Returns answers + glue addresses found, so the work cannot be optimised away.
+static size_t walk_legacy(const Packet& pkt, const std::string& qname) {
+    dns::Response resp = legacy::parse_response(pkt);
+    std::vector<dns::Record> answers;
+    for (const auto& ans : resp.answers)
+        if (dns::normalize_name(ans.name) == qname) answers.push_back(ans);
+    std::map<std::string, std::string> glue;
+    for (const auto& add : resp.additionals)
+        if (add.type == dns::TYPE_A) glue[add.name] = add.data;
+    std::vector<std::string> next_ips;
+    for (const auto& auth : resp.authorities) {
+        if (auth.type != dns::TYPE_NS) continue;
+        auto g = glue.find(auth.data);
+        if (g != glue.end()) next_ips.push_back(g->second);
+    }
+    return answers.size() + next_ips.size();
+}
+
+static size_t walk_view(const Packet& pkt, const std::string& qname) {
+    dns::PacketView resp(pkt);
+    std::vector<dns::Record> answers;
+    for (const auto& ans : resp.answers())
+        if (resp.name_is(ans.name, qname)) answers.push_back(resp.record(ans));
+    std::vector<std::string> next_ips;
+    for (const auto& auth : resp.authorities()) {
+        if (auth.type != dns::TYPE_NS) continue;
+        if (auto g = resp.find(resp.additionals(), dns::TYPE_A, resp.target(auth)))
+            next_ips.push_back(resp.data(*g));
+    }
+    return answers.size() + next_ips.size();
+}
+
+static size_t walk_full(const Packet& pkt, const std::string&) {
+    dns::Response resp = dns::PacketView(pkt).response();
+    return resp.answers.size() + resp.authorities.size() + resp.additionals.size();
+}
+
+static bool same(const dns::Response& a, const dns::Response& b) {
+    auto recs = [](const std::vector<dns::Record>& x, const std::vector<dns::Record>& y) {
+        return std::equal(x.begin(), x.end(), y.begin(), y.end(),
+                          [](const dns::Record& r, const dns::Record& s) {
+                              return r.name == s.name && r.type == s.type && r.cls == s.cls &&
+                                     r.ttl == s.ttl && r.data == s.data;
+                          });
+    };
+    return a.id == b.id && a.flags == b.flags && a.min_ttl == b.min_ttl &&
+           recs(a.answers, b.answers) && recs(a.authorities, b.authorities) &&
+           recs(a.additionals, b.additionals);
+}
+
+static std::vector<Packet> load(const char* path) {
+    std::ifstream in(path, std::ios::binary);
+    std::vector<uint8_t> raw((std::istreambuf_iterator<char>(in)),
+                             std::istreambuf_iterator<char>());
+    std::vector<Packet> out;
+    for (size_t pos = 0; pos + 2 <= raw.size();) {
+        size_t len = static_cast<size_t>(raw[pos] << 8 | raw[pos + 1]);
+        pos += 2;
+        if (pos + len > raw.size()) break;
+        out.emplace_back(raw.begin() + pos, raw.begin() + pos + len);
+        pos += len;
+    }
+    return out;
+}
+
+int main(int argc, char** argv) {
+    if (argc < 3) {
+        std::fprintf(stderr, "usage: %s <legacy|view|view-full|check> <corpus> [min-seconds]\n",
+                     argv[0]);
+        return 1;
+    }
+    std::string mode     = argv[1];
+    auto        corpus   = load(argv[2]);
+    double      min_secs = argc > 3 ? std::atof(argv[3]) : 1.0;
+    if (corpus.empty()) { std::fprintf(stderr, "empty corpus\n"); return 1; }
+
+    std::vector<std::string> qnames;
+    size_t bytes = 0;
+    for (const auto& p : corpus) { qnames.push_back(question(p)); bytes += p.size(); }
+
+    if (mode == "check") {
+        size_t mismatches = 0;
+        for (const auto& p : corpus)
+            mismatches += !same(legacy::parse_response(p), dns::PacketView(p).response());
+        std::printf("{\"mode\": \"check\", \"packets\": %zu, \"mismatches\": %zu}\n",
+                    corpus.size(), mismatches);
+        return mismatches ? 2 : 0;
+    }
+
+    size_t (*work)(const Packet&, const std::string&) =
+        mode == "legacy" ? walk_legacy : mode == "view" ? walk_view :
+        mode == "view-full" ? walk_full : nullptr;
+    if (!work) { std::fprintf(stderr, "unknown mode %s\n", mode.c_str()); return 1; }
+
+    // Whole passes over the corpus until min_secs have gone by.
+    using Clock = std::chrono::steady_clock;
+    size_t sink = 0, packets = 0;
+    for (size_t i = 0; i < corpus.size(); ++i) sink += work(corpus[i], qnames[i]);   // warm-up
+    size_t allocs0 = g_allocs.load();
+    auto   t0      = Clock::now();
+    double secs    = 0;
+    do {
+        for (size_t i = 0; i < corpus.size(); ++i) sink += work(corpus[i], qnames[i]);
+        packets += corpus.size();
+        secs = std::chrono::duration<double>(Clock::now() - t0).count();
+    } while (secs < min_secs);
+    size_t allocs = g_allocs.load() - allocs0;
+
+    std::printf("{\"mode\": \"%s\", \"packets\": %zu, \"corpus\": %zu, \"avg_bytes\": %.1f, "
+                "\"packets_per_sec\": %.0f, \"ns_per_packet\": %.1f, "
+                "\"allocs_per_packet\": %.2f, \"sink\": %zu}\n",
+                mode.c_str(), packets, corpus.size(), double(bytes) / corpus.size(),
+                packets / secs, secs * 1e9 / packets, double(allocs) / packets, sink);
+    return 0;
+}
@@ -0,0 +1,182 @@
+"""
+bench/bench_parse.py
+────────────────────
+Packets/sec of the C++ reply parser: dns::PacketView (parsed in place,
+text only for what leaves the walk) against the record-building parser it
+replaced, on a corpus of responses captured from the loopback stub
+hierarchy (bench/stub_dns.py) — or from a file of real ones.
+
+The default corpus is every reply of a cold walk for a mix of names and
+types against a hierarchy shaped like the real one: a root that refers to
+13 TLD servers with glue, TLD referrals to 2–4 name servers, answers,
+CNAMEs, MX / TXT / AAAA, NXDOMAIN and NODATA, with name compression on
+(`--uncompressed` to turn it off).  bench/bench_parse.cpp, compiled here
+with g++, runs each parser over the corpus:
+
+  legacy     previous parser: every record to text, then a std::map of glue
+  view       PacketView as walk() uses it
+  view-full  PacketView::response(), every record to text
+
+and first checks that legacy and view-full agree on every packet.
+
+Run:  python bench/bench_parse.py [--seconds 2] [--uncompressed]
+                                  [--save corpus.bin] [--corpus corpus.bin]
+"""
+
+import os
+import sys
+import json
+import socket
+import struct
+import argparse
+import tempfile
+import subprocess
+
+_HERE = os.path.dirname(os.path.abspath(__file__))
+_ROOT = os.path.dirname(_HERE)
+sys.path.insert(0, _HERE)
+sys.path.insert(0, os.path.join(_ROOT, "api"))
+
+import dnswire                      # noqa: E402
+from stub_dns import StubHierarchy  # noqa: E402
+
+MODES    = ("legacy", "view", "view-full")
+ROOT_IP  = "127.0.0.2"
+TLDS     = ("com", "net", "org")
+ZONES    = 8                         # second-level zones per TLD
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  Corpus
+# ─────────────────────────────────────────────────────────────────────────────
+
+def corpus_zones() -> dict:
+    """Root → 13 TLD servers (with glue) → zones with 2–4 name servers each."""
+    tld_servers = {f"{c}.gtld-servers.net.": f"127.0.2.{i + 1}"
+                   for i, c in enumerate("abcdefghijklm")}
+    spec = {".": {"servers": {"a.root-servers.net.": ROOT_IP}, "ns_ttl": 518400}}
+    for tld in TLDS:
+        spec[f"{tld}."] = {"servers": tld_servers, "ns_ttl": 172800}
+    for t, tld in enumerate(TLDS):
+        for j in range(ZONES):
+            zone = f"site{j}.{tld}."
+            n    = 2 + j % 3
+            spec[zone] = {
+                "servers": {f"ns{k + 1}.{zone}": f"127.0.{10 + t}.{j * 4 + k + 1}"
+                            for k in range(n)},
+                "ns_ttl":  86400,
+                "records": [
+                    (f"{zone}",      "A",     300, f"192.0.2.{j + 1}"),
+                    (f"www.{zone}",  "A",     300, f"192.0.2.{j + 1}"),
+                    (f"www.{zone}",  "A",     300, f"192.0.2.{j + 101}"),
+                    (f"www.{zone}",  "AAAA",  300, f"2001:db8::{j + 1:x}"),
+                    (f"shop.{zone}", "CNAME", 300, f"www.{zone}"),
+                    (f"{zone}",      "MX",    300, f"10 mail.{zone}"),
+                    (f"mail.{zone}", "A",     300, f"192.0.2.{j + 201}"),
+                    (f"{zone}",      "TXT",   300, "v=spf1 include:_spf.example.net ~all"),
+                ],
+            }
+    return spec
+
+
+QUERIES = (("www", "A"), ("www", "AAAA"), ("shop", "A"), ("", "MX"), ("", "TXT"),
+           ("nope", "A"), ("mail", "MX"))
+
+
+def capture(compress: bool = True) -> list:
+    """Every reply a cold walk of each QUERIES name gets, captured off UDP."""
+    zones = corpus_zones()
+    out = []
+    with StubHierarchy(zones) as stub, \
+            socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        stub.configure(compress=compress)
+        sock.settimeout(2.0)
+        for zone, spec in zones.items():
+            if zone.count(".") != 2:
+                continue
+            tld_ip  = next(iter(zones[zone.split(".", 1)[1]]["servers"].values()))
+            auth_ip = next(iter(spec["servers"].values()))
+            for label, qtype in QUERIES:
+                qname = f"{label}.{zone}" if label else zone
+                for ip in (ROOT_IP, tld_ip, auth_ip):
+                    qid = len(out) % 0xFFFF + 1
+                    sock.sendto(dnswire.build_query(qname, dnswire.QTYPE_IDS[qtype],
+                                                    qid, rd=False), (ip, stub.port))
+                    out.append(sock.recvfrom(65535)[0])
+    return out
+
+
+def save(path: str, packets: list):
+    with open(path, "wb") as f:
+        for p in packets:
+            f.write(struct.pack("!H", len(p)) + p)
+
+
+def load(path: str) -> list:
+    with open(path, "rb") as f:
+        raw = f.read()
+    out, pos = [], 0
+    while pos + 2 <= len(raw):
+        (n,) = struct.unpack_from("!H", raw, pos)
+        out.append(raw[pos + 2:pos + 2 + n])
+        pos += 2 + n
+    return out
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  Harness
+# ─────────────────────────────────────────────────────────────────────────────
+
+def build(out_path: str):
+    subprocess.run(
+        ["g++", "-std=c++17", "-O2", "-DDNS_RESOLVER_NO_MAIN",
+         "-I", os.path.join(_ROOT, "core"),
+         os.path.join(_HERE, "bench_parse.cpp"),
+         os.path.join(_ROOT, "core", "dns_resolver.cpp"),
+         "-o", out_path],
+        check=True)
+
+
+def run(binary: str, mode: str, corpus: str, seconds: float = 2.0) -> dict:
+    proc = subprocess.run([binary, mode, corpus, str(seconds)], text=True,
+                          capture_output=True, timeout=600)
+    if not proc.stdout:
+        raise RuntimeError(f"bench_parse {mode} failed: {proc.stderr.strip()}")
+    return json.loads(proc.stdout)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__,
+                                 formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--seconds", type=float, default=2.0, help="minimum time per mode")
+    ap.add_argument("--uncompressed", action="store_true",
+                    help="capture replies without name compression")
+    ap.add_argument("--corpus", help="read the corpus from this file instead "
+                                     "(16-bit length-prefixed DNS messages)")
+    ap.add_argument("--save", help="write the captured corpus to this file")
+    args = ap.parse_args()
+
+    packets = load(args.corpus) if args.corpus else capture(not args.uncompressed)
+    if args.save:
+        save(args.save, packets)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        binary = os.path.join(tmp, "bench_parse")
+        corpus = os.path.join(tmp, "corpus.bin")
+        save(corpus, packets)
+        build(binary)
+        check = run(binary, "check", corpus)
+        rows  = [run(binary, mode, corpus, args.seconds) for mode in MODES]
+
+    print(f"corpus: {check['packets']} replies, {rows[0]['avg_bytes']:.0f} bytes on average, "
+          f"{check['mismatches']} parser mismatches")
+    base = rows[0]["packets_per_sec"]
+    print(f"{'mode':<10} {'packets/s':>12} {'ns/packet':>10} {'allocs/packet':>14} "
+          f"{'speed-up':>9}")
+    for r in rows:
+        print(f"{r['mode']:<10} {r['packets_per_sec']:>12,.0f} {r['ns_per_packet']:>10.1f} "
+              f"{r['allocs_per_packet']:>14.2f} {r['packets_per_sec'] / base:>8.2f}x")
+
+
+if __name__ == "__main__":
+    main()
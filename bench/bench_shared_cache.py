@@ -0,0 +1,166 @@
+"""
+bench/bench_shared_cache.py
+───────────────────────────
+Hit rate, throughput and upstream traffic of several API worker processes,
+each with a private DNSCache or all sharing one SharedDNSCache
+(api/shm_cache.py, DNS_SHARED_CACHE), with 1, 4 and 8 workers.
+
+One Zipf request stream (`--requests` lookups over `--names` hosts of the
+bench/bench_load.py hierarchy) is dealt round-robin to the workers, as a
+load balancer would.  Each worker is a fresh process running server.py's
+/resolve path in-process — lookup_cached_json(), then lookup_miss() on a
+miss — with `--threads` threads, against the loopback stub hierarchy run by
+this process.  The workers' C++ resolvers keep no answer cache of their own
+(dnscore.Resolver(None)), so every API-cache miss walks and costs upstream
+queries; their delegation caches still start cold in every process.
+
+Reported per mode and worker count: lookups/s over the whole stream (first
+worker start to last worker done), the API-cache hit rate, misses, and the
+queries the stub hierarchy received.
+
+Run:  python bench/bench_shared_cache.py [--workers 1,4,8] [--requests 40000]
+                                         [--names 5000] [--zipf 1.1] [--latency 1]
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+import multiprocessing
+from unittest import mock
+
+_HERE = os.path.dirname(os.path.abspath(__file__))
+_ROOT = os.path.dirname(_HERE)
+sys.path.insert(0, _HERE)
+sys.path.insert(0, os.path.join(_ROOT, "api"))
+sys.path.insert(0, os.path.join(_ROOT, "core"))
+
+from stub_dns import StubHierarchy                               # noqa: E402
+from bench_load import Zipf, load_zones, host_name, dnscore     # noqa: E402
+
+MODES = ("private", "shared")
+
+
+def worker(names: list, path: str, capacity: int, threads: int, stub: tuple,
+           start, out):
+    """One API process: resolves `names` with `threads` threads, puts (hits, misses, s)."""
+    import threading
+    import server
+    root_ips, port = stub
+    if path:
+        cache = server.SharedDNSCache(path, capacity, server.CachedResponse)
+    else:
+        cache = server.DNSCache(capacity=capacity)
+    native = dnscore.Resolver(None, roots=root_ips, port=port)
+    counts, lock = [0, 0], threading.Lock()
+    todo = iter(names)
+
+    def run():
+        hits = misses = 0
+        while True:
+            with lock:
+                name = next(todo, None)
+            if name is None:
+                break
+            t0 = time.perf_counter()
+            if server.lookup_cached_json(name, "A", t0) is not None:
+                hits += 1
+            else:
+                server.lookup_miss(name, "A", t0)
+                misses += 1
+        with lock:
+            counts[0] += hits
+            counts[1] += misses
+
+    with mock.patch.object(server, "cache", cache), \
+            mock.patch.object(server, "_native", native), \
+            mock.patch.object(server, "PREFETCH_AT", 1.0):
+        start.wait()
+        t0 = time.perf_counter()
+        pool = [threading.Thread(target=run) for _ in range(threads)]
+        for t in pool:
+            t.start()
+        for t in pool:
+            t.join()
+        out.put((counts[0], counts[1], time.perf_counter() - t0))
+
+
+def run(mode: str, workers: int, stream: list, args, stub: StubHierarchy) -> dict:
+    """The whole stream through `workers` processes with `mode` caches."""
+    ctx   = multiprocessing.get_context("spawn")
+    start = ctx.Barrier(workers + 1)
+    out   = ctx.Queue()
+    shm   = "/dev/shm" if os.path.isdir("/dev/shm") else None
+    path  = ""
+    if mode == "shared":
+        fd, path = tempfile.mkstemp(prefix="dns-bench-", dir=shm)
+        os.close(fd)
+        os.unlink(path)                         # the first worker creates it
+    procs = [ctx.Process(target=worker,
+                         args=(stream[w::workers], path, args.cache_entries, args.threads,
+                               (stub.root_ips, stub.port), start, out))
+             for w in range(workers)]
+    try:
+        for p in procs:
+            p.start()
+        start.wait()                            # every worker imported and ready
+        stub.reset_counters()
+        t0 = time.perf_counter()
+        results = [out.get() for _ in procs]
+        elapsed = time.perf_counter() - t0
+        for p in procs:
+            p.join()
+    finally:
+        if path and os.path.exists(path):
+            os.unlink(path)
+    hits, misses = sum(r[0] for r in results), sum(r[1] for r in results)
+    return {
+        "mode":      mode,
+        "workers":   workers,
+        "lookups":   hits + misses,
+        "qps":       round((hits + misses) / elapsed),
+        "hit_rate":  round(hits / (hits + misses) * 100, 1),
+        "misses":    misses,
+        "upstream":  stub.total_queries,
+    }
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__,
+                                 formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--workers", default="1,4,8", help="worker process counts")
+    ap.add_argument("--modes", default=",".join(MODES))
+    ap.add_argument("--requests", type=int, default=40000, help="lookups in the stream")
+    ap.add_argument("--names", type=int, default=5000, help="distinct names")
+    ap.add_argument("--zones", type=int, default=100, help="authoritative zones")
+    ap.add_argument("--zipf", type=float, default=1.1, help="popularity skew")
+    ap.add_argument("--threads", type=int, default=4, help="threads per worker")
+    ap.add_argument("--cache-entries", type=int, default=10000, help="per cache")
+    ap.add_argument("--latency", type=float, default=1.0, help="per-reply delay, ms")
+    ap.add_argument("--seed", type=int, default=1)
+    args = ap.parse_args(argv)
+    if dnscore is None:
+        raise SystemExit("bench_shared_cache needs the dnscore extension (bash build.sh)")
+
+    rng    = random.Random(args.seed)
+    zipf   = Zipf(args.names, args.zipf, rng)
+    stream = [host_name(zipf(), args.zones) for _ in range(args.requests)]
+    with StubHierarchy(load_zones(args.names, args.zones)) as stub:
+        stub.configure(delay=args.latency / 1000)
+        rows = [run(mode, int(w), stream, args, stub)
+                for w in args.workers.split(",") for mode in args.modes.split(",")]
+
+    print(f"{args.requests} lookups over {args.names} names (Zipf {args.zipf:g}), "
+          f"{args.threads} threads per worker, {args.latency:g} ms/reply, "
+          f"{os.cpu_count()} CPUs")
+    print(f"{'cache':<9}{'workers':>8}{'lookups/s':>11}{'hit %':>8}{'misses':>8}"
+          f"{'upstream q':>12}")
+    for r in rows:
+        print(f"{r['mode']:<9}{r['workers']:>8}{r['qps']:>11}{r['hit_rate']:>8.1f}"
+              f"{r['misses']:>8}{r['upstream']:>12}")
+
+
+if __name__ == "__main__":
+    main()
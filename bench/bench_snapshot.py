@@ -0,0 +1,113 @@
+"""
+bench/bench_snapshot.py
+───────────────────────
+Startup cost of a warm restart: how long api/snapshot.py takes to put a
+large cache back (1M entries by default), against the obvious alternative
+of dumping the cache as one JSON document and json.load()-ing it.
+
+  snapshot   binary records read through mmap, bodies restored encoded
+             (CachedResponse.from_json) and decoded on their first hit
+  json       one JSON array of [key, body, ttl], json.load() then a
+             CachedResponse built per entry — the whole file and every
+             body are materialised before the first request is served
+
+Reported per format: save time, file size, time to ready (load into an
+empty cache sized for every entry), and the median first / later hit on
+1000 restored entries.  No network: the cache is filled directly.
+
+Run:  python bench/bench_snapshot.py [-n 1000000] [--skip-json]
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import statistics
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(_ROOT, "api"))
+
+import server     # noqa: E402
+import snapshot   # noqa: E402
+
+
+def _body(i: int) -> dict:
+    ip = f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}"
+    return {"domain": f"host{i}.example.com", "ip": ip, "record_type": "A",
+            "cached": False, "latency_ms": 12.5, "ttl": 3600,
+            "answers": [{"name": f"host{i}.example.com", "type": "A", "ttl": 3600,
+                         "data": ip}],
+            "resolution_path": ["198.41.0.4", "192.12.94.30"],
+            "start_zone": "example.com", "hops_saved": 2, "used_tcp": False}
+
+
+def fresh_cache(n: int) -> server.DNSCache:
+    return server.DNSCache(capacity=n, max_bytes=n * 2048)
+
+
+def save_json(path: str, cache: server.DNSCache):
+    with open(path, "w") as f:
+        json.dump([[k, v.body, ttl] for k, v, ttl in cache.export()], f)
+
+
+def load_json(path: str, cache: server.DNSCache):
+    with open(path) as f:
+        items = json.load(f)
+    cache.restore((k, server.CachedResponse(body), ttl) for k, body, ttl in items)
+
+
+def hit_us(cache: server.DNSCache, keys: list) -> float:
+    """Median µs for lookup + encode over `keys`."""
+    samples = []
+    for key in keys:
+        t0 = time.perf_counter()
+        resp, remaining = cache.lookup(key)
+        resp.json(remaining, 0.0)
+        samples.append((time.perf_counter() - t0) * 1e6)
+    return statistics.median(samples)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__,
+                                 formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("-n", type=int, default=1_000_000, help="cache entries")
+    ap.add_argument("--skip-json", action="store_true", help="only time the snapshot format")
+    args = ap.parse_args()
+
+    t0  = time.perf_counter()
+    src = fresh_cache(args.n)
+    src.restore((f"host{i}.example.com/A", server.CachedResponse(_body(i)), 3600)
+                for i in range(args.n))
+    print(f"entries: {args.n}   (filled in {time.perf_counter() - t0:.1f}s)")
+    probes = [f"host{i}.example.com/A" for i in range(0, args.n, max(1, args.n // 1000))]
+
+    formats = {"snapshot": (lambda p, c: snapshot.save(p, c, resolver=False),
+                            lambda p, c: snapshot.load(p, c, resolver=False))}
+    if not args.skip_json:
+        formats["json"] = (save_json, load_json)
+
+    print(f"{'format':<10} {'save s':>8} {'size MB':>8} {'ready s':>8} "
+          f"{'1st hit µs':>11} {'hit µs':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, (save, load) in formats.items():
+            path = os.path.join(tmp, name)
+            t0 = time.perf_counter()
+            save(path, src)
+            t_save = time.perf_counter() - t0
+            size = os.path.getsize(path) / 1e6
+
+            dst = fresh_cache(args.n)
+            t0 = time.perf_counter()
+            load(path, dst)
+            t_ready = time.perf_counter() - t0
+            assert dst.stats()["size"] == args.n, dst.stats()
+            first, later = hit_us(dst, probes), hit_us(dst, probes)
+            print(f"{name:<10} {t_save:>8.2f} {size:>8.1f} {t_ready:>8.2f} "
+                  f"{first:>11.1f} {later:>8.1f}")
+            del dst
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""
+bench/bench_strategy.py
+───────────────────────
+Miss latency under each DNS_STRATEGY (walk, forward, race) on loopback: the
+recursive walk goes to the stub hierarchy of bench/bench_load.py, and the
+forwarders are a stub "recursive resolver" that answers every name itself
+after its own delay.
+
+Some of the hierarchy's authoritative servers are slow (`--slow-servers` of
+the four, `--slow-latency` ms), so the zones served only by them cost every
+walk that long — the CDN-style names the race is meant for.  Every name is
+asked once, so each lookup is a miss; `--concurrency` lookups are in flight
+at a time.  The walk starts each strategy with an empty C++ cache.
+
+Reported per strategy: latency percentiles (p50 … p99.9, max), failures,
+which path answered the raced lookups, and upstream queries per lookup on
+each side.
+
+Run:  python bench/bench_strategy.py [--names 2000] [--concurrency 8]
+                                     [--latency 2] [--slow-servers 2]
+                                     [--slow-latency 250] [--fwd-latency 20]
+                                     [--grace 50] [--strategies walk,forward,race]
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+import threading
+from unittest import mock
+
+_HERE = os.path.dirname(os.path.abspath(__file__))
+_ROOT = os.path.dirname(_HERE)
+sys.path.insert(0, _HERE)
+sys.path.insert(0, os.path.join(_ROOT, "api"))
+sys.path.insert(0, os.path.join(_ROOT, "core"))
+
+from stub_dns import StubHierarchy                                # noqa: E402
+from bench_load import load_zones, host_name, percentile, dnscore  # noqa: E402
+
+FORWARDER_IP = "127.0.0.53"
+AUTH_SERVERS = 4               # 127.0.1.1 … 127.0.1.4, as load_zones() lays them out
+PERCENTILES  = (50, 90, 99, 99.9)
+
+
+def forwarder_zones(zones: dict) -> dict:
+    """One server answering every host of `zones` from its root zone."""
+    records = [r for spec in zones.values() for r in spec.get("records", [])]
+    return {".": {"servers": {"resolver.test.": FORWARDER_IP}, "records": records}}
+
+
+def run_strategy(server, forwarder, strategy: str, names: list, args,
+                 walk_stub: StubHierarchy, fwd_stub: StubHierarchy) -> dict:
+    """Resolves every name once under `strategy` with fresh caches and counters."""
+    native = dnscore.Resolver(dnscore.Cache(len(names) * 2), roots=walk_stub.root_ips,
+                              port=walk_stub.port)
+    pool = forwarder.ForwarderPool([(FORWARDER_IP, fwd_stub.port)], timeout=5.0)
+    patches = [
+        mock.patch.object(server, "_native", native),
+        mock.patch.object(server, "cache", server.DNSCache(capacity=len(names) * 2)),
+        mock.patch.object(server, "metrics", server.Metrics()),
+        mock.patch.object(server, "forwarders", pool),
+        mock.patch.object(server, "RESOLVE_STRATEGY", strategy),
+        mock.patch.object(server, "RACE_GRACE", args.grace / 1000),
+    ]
+    for p in patches:
+        p.start()
+    walk_stub.reset_counters()
+    fwd_stub.reset_counters()
+    latency, failures, lock = [], [0], threading.Lock()
+    todo = iter(names)
+
+    def worker():
+        mine, failed = [], 0
+        while True:
+            with lock:
+                name = next(todo, None)
+            if name is None:
+                break
+            t0 = time.perf_counter()
+            _body, status, _h = server.lookup_miss(name, "A", t0)
+            mine.append((time.perf_counter() - t0) * 1000)
+            failed += status != 200
+        with lock:
+            latency.extend(mine)
+            failures[0] += failed
+
+    try:
+        threads = [threading.Thread(target=worker) for _ in range(args.concurrency)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        races = server.metrics.races()
+    finally:
+        for p in reversed(patches):
+            p.stop()
+        pool.close()
+    lat = sorted(latency)
+    return {
+        "strategy":   strategy,
+        "lookups":    len(lat),
+        "failures":   failures[0],
+        "latency_ms": {f"p{p:g}": round(percentile(lat, p), 2) for p in PERCENTILES}
+                      | {"max": round(lat[-1], 2)},
+        "winners":    races if strategy == "race" else {},
+        "walk_queries_per_lookup": round(walk_stub.total_queries / len(lat), 3),
+        "fwd_queries_per_lookup":  round(fwd_stub.total_queries / len(lat), 3),
+    }
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__,
+                                 formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--names", type=int, default=2000, help="distinct names, each asked once")
+    ap.add_argument("--zones", type=int, default=100, help="authoritative zones")
+    ap.add_argument("--concurrency", type=int, default=8, help="lookups in flight")
+    ap.add_argument("--latency", type=float, default=2.0, help="per-hop reply delay, ms")
+    ap.add_argument("--jitter", type=float, default=2.0, help="extra uniform delay up to, ms")
+    ap.add_argument("--loss", type=float, default=0.01, help="UDP loss on every server")
+    ap.add_argument("--slow-servers", type=int, default=2,
+                    help=f"how many of the {AUTH_SERVERS} authoritative servers are slow")
+    ap.add_argument("--slow-latency", type=float, default=250.0, help="their delay, ms")
+    ap.add_argument("--fwd-latency", type=float, default=20.0, help="forwarder delay, ms")
+    ap.add_argument("--fwd-jitter", type=float, default=10.0)
+    ap.add_argument("--grace", type=float, default=50.0,
+                    help="race: ms before the forwarders join (DNS_RACE_GRACE)")
+    ap.add_argument("--strategies", default="walk,forward,race")
+    ap.add_argument("--seed", type=int, default=1)
+    args = ap.parse_args(argv)
+    if dnscore is None:
+        raise SystemExit("bench_strategy needs the dnscore extension (bash build.sh)")
+
+    import server
+    import forwarder
+    zones = load_zones(args.names, args.zones)
+    names = [host_name(i, args.zones) for i in range(args.names)]
+    random.Random(args.seed).shuffle(names)
+    with StubHierarchy(zones) as walk_stub, StubHierarchy(forwarder_zones(zones)) as fwd_stub:
+        walk_stub.seed(args.seed).configure(delay=args.latency / 1000,
+                                            jitter=args.jitter / 1000, loss=args.loss)
+        for k in range(args.slow_servers):
+            walk_stub.servers[f"127.0.1.{k + 1}"].delay = args.slow_latency / 1000
+        fwd_stub.seed(args.seed).configure(delay=args.fwd_latency / 1000,
+                                           jitter=args.fwd_jitter / 1000, loss=args.loss)
+        rows = [run_strategy(server, forwarder, s.strip(), names, args, walk_stub, fwd_stub)
+                for s in args.strategies.split(",")]
+
+    print(f"{args.names} misses, {args.concurrency} in flight   walk: {args.latency:g} ms/hop "
+          f"± {args.jitter:g}, {args.slow_servers}/{AUTH_SERVERS} auth servers "
+          f"+{args.slow_latency:g} ms   forwarder: {args.fwd_latency:g} ms "
+          f"± {args.fwd_jitter:g}   loss {args.loss:.1%}   grace {args.grace:g} ms")
+    print(f"{'strategy':<9}" + "".join(f"{k:>9}" for k in rows[0]["latency_ms"])
+          + f"{'failed':>8}{'walk q/lookup':>15}{'fwd q/lookup':>14}   winners")
+    for r in rows:
+        winners = "  ".join(f"{k} {v}" for k, v in r["winners"].items()) or "—"
+        print(f"{r['strategy']:<9}" + "".join(f"{v:>9.2f}" for v in r["latency_ms"].values())
+              + f"{r['failures']:>8}{r['walk_queries_per_lookup']:>15.3f}"
+              f"{r['fwd_queries_per_lookup']:>14.3f}   {winners}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+// ─────────────────────────────────────────────────────────────────────────────
+//  bench/bench_transport.cpp
+//  Syscalls and heap allocations per resolution for dns::Transport, pooled
+//  vs. open-per-exchange, plus kept-alive/pipelined TCP vs. the one-shot
+//  send_tcp().  Driven by bench/bench_transport.py, which starts the loopback
+//  stub hierarchy and passes DNS_ROOT_HINTS / DNS_UPSTREAM_PORT.
+//
+//  Build:
+//    g++ -std=c++17 -O2 -DDNS_RESOLVER_NO_MAIN -Icore
+//        bench/bench_transport.cpp core/dns_resolver.cpp -o bench_transport
+//  Run:
+//    bench_transport <udp|udp-unpooled|tcp|tcp-oneshot> <n> <domain> [tcp-server-ip]
+//
+//  Output: one JSON object on stdout.
+// ─────────────────────────────────────────────────────────────────────────────
+
+#include "dns_resolver.h"
+
+#include <atomic>
+#include <chrono>
+#include <cstdio>
+#include <cstdlib>
+#include <new>
+#include <string>
+
+// ── allocation counter ────────────────────────────────────────────────────────
+static std::atomic<size_t> g_allocs{0};
+
+void* operator new(std::size_t n) {
+    g_allocs.fetch_add(1, std::memory_order_relaxed);
+    if (void* p = std::malloc(n ? n : 1)) return p;
+    throw std::bad_alloc();
+}
+void operator delete(void* p) noexcept              { std::free(p); }
+void operator delete(void* p, std::size_t) noexcept { std::free(p); }
+
+struct Counters {
+    size_t syscalls, allocs;
+    static Counters now() { return {dns::net_syscalls(), g_allocs.load()}; }
+};
+
+static void report(const char* mode, int n, int ok, const Counters& a,
+                   const Counters& b, double secs, const dns::Transport::Stats& ts) {
+    std::printf("{\"mode\": \"%s\", \"n\": %d, \"ok\": %d, "
+                "\"syscalls_per_op\": %.2f, \"allocs_per_op\": %.2f, "
+                "\"us_per_op\": %.1f, \"udp_opened\": %zu, "
+                "\"tcp_connects\": %zu, \"tcp_reused\": %zu}\n",
+                mode, n, ok,
+                double(b.syscalls - a.syscalls) / n, double(b.allocs - a.allocs) / n,
+                secs * 1e6 / n, ts.udp_opened, ts.tcp_connects, ts.tcp_reused);
+}
+
+int main(int argc, char** argv) {
+    if (argc < 4) {
+        std::fprintf(stderr, "usage: %s <udp|udp-unpooled|tcp|tcp-oneshot> <n> <domain> [ip]\n",
+                     argv[0]);
+        return 1;
+    }
+    std::string mode   = argv[1];
+    int         n      = std::atoi(argv[2]);
+    std::string domain = argv[3];
+    dns::net_init();
+
+    dns::Resolver resolver(nullptr);
+    resolver.configure_from_env();
+    using Clock = std::chrono::steady_clock;
+    int ok = 0;
+
+    if (mode == "udp" || mode == "udp-unpooled") {
+        // Full cold walk every time: no answer cache, delegations dropped.
+        if (mode == "udp-unpooled") resolver.transport().set_udp_pool(0);
+        resolver.resolve(domain, dns::TYPE_A);               // warm infra cache
+        Counters a = Counters::now();
+        auto t0 = Clock::now();
+        for (int i = 0; i < n; ++i) {
+            resolver.delegations().clear();
+            ok += resolver.resolve(domain, dns::TYPE_A).success;
+        }
+        double secs = std::chrono::duration<double>(Clock::now() - t0).count();
+        report(mode.c_str(), n, ok, a, Counters::now(), secs, resolver.transport().stats());
+    } else if (mode == "tcp" || mode == "tcp-oneshot") {
+        // One TCP query per op against a single server, `batch` at a time.
+        if (argc < 5) { std::fprintf(stderr, "tcp modes need a server ip\n"); return 1; }
+        std::string ip    = argv[4];
+        const int   batch = 8;
+        std::vector<std::vector<uint8_t>> queries;
+        for (int i = 0; i < batch; ++i)
+            queries.push_back(dns::build_query(domain, dns::TYPE_A, 0, false));
+        dns::Transport& tr = resolver.transport();
+        uint16_t port = tr.port();
+
+        Counters a = Counters::now();
+        auto t0 = Clock::now();
+        for (int done = 0; done < n; done += batch) {
+            if (mode == "tcp") {
+                for (const auto& r : tr.tcp_pipeline(queries, ip)) ok += r.ok;
+            } else {
+                for (const auto& q : queries) ok += dns::send_tcp(q, ip, port).ok;
+            }
+        }
+        double secs = std::chrono::duration<double>(Clock::now() - t0).count();
+        int ops = ((n + batch - 1) / batch) * batch;
+        report(mode.c_str(), ops, ok, a, Counters::now(), secs, tr.stats());
+    } else {
+        std::fprintf(stderr, "unknown mode %s\n", mode.c_str());
+        return 1;
+    }
+    dns::net_cleanup();
+    return 0;
+}
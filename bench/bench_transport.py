@@ -0,0 +1,76 @@
+"""
+bench/bench_transport.py
+────────────────────────
+Syscalls and heap allocations per resolution for the C++ transport, against
+the loopback stub hierarchy (bench/stub_dns.py) so no internet is needed.
+
+  udp            pooled UDP sockets (Resolver default)
+  udp-unpooled   a new socket + receive buffer for every exchange
+  tcp            kept-alive connection, 8 queries pipelined per write
+  tcp-oneshot    send_tcp(): connect / query / close for every query
+
+UDP modes run a full cold walk (root → com → example.com) per resolution.
+Syscalls are counted in-process around every socket call (NET_CALL in
+dns_resolver.cpp); allocations by an operator new override in
+bench/bench_transport.cpp, which this script compiles with g++.
+
+Run:  python bench/bench_transport.py [-n 2000] [--domain www.example.com]
+"""
+
+import os
+import sys
+import json
+import argparse
+import tempfile
+import subprocess
+
+_HERE = os.path.dirname(os.path.abspath(__file__))
+_ROOT = os.path.dirname(_HERE)
+sys.path.insert(0, _HERE)
+
+from stub_dns import StubHierarchy   # noqa: E402
+
+MODES = ("udp-unpooled", "udp", "tcp-oneshot", "tcp")
+AUTH_IP = "127.0.0.4"                # ns1.example.com in the default stub
+
+
+def build(out_path: str):
+    subprocess.run(
+        ["g++", "-std=c++17", "-O2", "-DDNS_RESOLVER_NO_MAIN",
+         "-I", os.path.join(_ROOT, "core"),
+         os.path.join(_HERE, "bench_transport.cpp"),
+         os.path.join(_ROOT, "core", "dns_resolver.cpp"),
+         "-o", out_path],
+        check=True)
+
+
+def run(binary: str, mode: str, n: int, domain: str, env: dict) -> dict:
+    proc = subprocess.run([binary, mode, str(n), domain, AUTH_IP],
+                          env=dict(os.environ, **env), text=True,
+                          capture_output=True, timeout=600, check=True)
+    return json.loads(proc.stdout)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__,
+                                 formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("-n", type=int, default=2000, help="resolutions per mode")
+    ap.add_argument("--domain", default="www.example.com")
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        binary = os.path.join(tmp, "bench_transport")
+        build(binary)
+        with StubHierarchy() as stub:
+            rows = [run(binary, mode, args.n, args.domain, stub.env()) for mode in MODES]
+
+    print(f"{'mode':<14} {'ok':>6} {'syscalls/op':>12} {'allocs/op':>10} "
+          f"{'µs/op':>8} {'udp socks':>10} {'tcp conns':>10}")
+    for r in rows:
+        print(f"{r['mode']:<14} {r['ok']:>6} {r['syscalls_per_op']:>12.2f} "
+              f"{r['allocs_per_op']:>10.2f} {r['us_per_op']:>8.1f} "
+              f"{r['udp_opened']:>10} {r['tcp_connects']:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,481 @@
+"""
+bench/stub_dns.py
+─────────────────
+A fake root → TLD → authoritative DNS hierarchy on loopback, for tests and
+benchmarks that must not depend on the real internet.
+
+Every server binds its own 127.0.0.x address on one shared port, so the C++
+resolver can be pointed at it with
+    DNS_ROOT_HINTS=127.0.0.2  DNS_UPSTREAM_PORT=<port>
+(or dnscore.Resolver(roots=[...], port=...)).
+
+Zones are described as a dict:
+
+    {
+      ".":            {"servers": {"a.root.test.": "127.0.0.2"}},
+      "com.":         {"servers": {"a.gtld.test.": "127.0.0.3"}},
+      "example.com.": {"servers": {"ns1.example.com.": "127.0.0.4"},
+                       "records": [("www.example.com.", "A", 300, "192.0.2.1")]},
+    }
+
+Per zone:  servers (NS name → IP), records, glueless (omit glue in the
+referral), ns_ttl, soa_ttl, soa_minimum.  Per server (h.servers[ip]):
+`drop = True` makes it silent, `delay = 0.3` answers UDP 300 ms late
+(`jitter = 0.1` adds up to 100 ms more, uniformly), `truncate = True`
+answers UDP with an empty TC=1 reply (forcing TCP).  `loss` and `truncate`
+also take a probability (0.05 = 5 % of UDP queries), and `compress = True`
+writes replies with name compression, as real servers do.  A server speaks
+EDNS0: a UDP reply larger than the query's OPT payload size (512 bytes
+without one) comes back empty with TC=1, and OPT is echoed; `edns = False`
+makes it an old server that answers FORMERR to any query carrying OPT.
+h.configure() sets all of these on every server at once.  A server answers authoritatively
+for the deepest zone it serves, refers downwards to child zone cuts, and
+returns NXDOMAIN / NODATA with the zone SOA otherwise.
+"""
+
+import os
+import sys
+import heapq
+import random
+import socket
+import struct
+import threading
+import time
+import socketserver
+from collections import Counter
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(_ROOT, "api"))
+
+import dnswire   # noqa: E402
+from dnswire import (FLAG_QR, FLAG_AA, FLAG_TC, FLAG_RD, RCODE_NXDOMAIN,   # noqa: E402
+                     RCODE_REFUSED, RCODE_FORMERR, RTYPE_NAMES)
+
+
+def _in_zone(name: str, zone: str) -> bool:
+    n, z = dnswire.normalize(name), dnswire.normalize(zone)
+    return z == "" or n == z or n.endswith("." + z)
+
+
+def _depth(zone: str) -> int:
+    z = dnswire.normalize(zone)
+    return 0 if z == "" else z.count(".") + 1
+
+
+# Default three-level hierarchy used by the tests.
+DEFAULT_ZONES = {
+    ".": {
+        "servers": {"a.root.test.": "127.0.0.2"},
+    },
+    "com.": {
+        "servers": {"a.gtld.test.": "127.0.0.3"},
+        "ns_ttl":  172800,
+    },
+    "example.com.": {
+        "servers": {"ns1.example.com.": "127.0.0.4"},
+        "ns_ttl":  86400,
+        "records": [
+            ("example.com.",      "A",     300, "192.0.2.10"),
+            ("www.example.com.",  "A",     300, "192.0.2.1"),
+            ("api.example.com.",  "A",     300, "192.0.2.2"),
+            ("mail.example.com.", "A",     300, "192.0.2.3"),
+            ("example.com.",      "MX",    300, "10 mail.example.com."),
+        ],
+    },
+    "glueless.com.": {
+        "servers":   {"ns1.example.com.": "127.0.0.4"},
+        "glueless":  True,
+        "records": [
+            ("www.glueless.com.", "A", 300, "192.0.2.50"),
+            ("api.glueless.com.", "A", 300, "192.0.2.51"),
+        ],
+    },
+}
+
+
+class Zone:
+    def __init__(self, name: str, spec: dict):
+        self.name        = dnswire.normalize(name)
+        self.servers     = {dnswire.normalize(k): v for k, v in spec["servers"].items()}
+        self.glueless    = spec.get("glueless", False)
+        self.ns_ttl      = spec.get("ns_ttl", 3600)
+        self.soa_ttl     = spec.get("soa_ttl", 3600)
+        self.soa_minimum = spec.get("soa_minimum", 60)
+        self.records     = {}          # name → [(name, type, ttl, data)]
+        for rec in spec.get("records", []):
+            key = dnswire.normalize(rec[0])
+            self.records.setdefault(key, []).append((key, rec[1], rec[2], rec[3]))
+        # In-bailiwick name servers are answerable like any other A record.
+        for ns, ip in self.servers.items():
+            if _in_zone(ns, self.name) and not any(
+                    r[1] == "A" for r in self.records.get(ns, [])):
+                self.records.setdefault(ns, []).append((ns, "A", self.ns_ttl, ip))
+
+    def soa(self):
+        apex = self.name or "."
+        first_ns = next(iter(self.servers))
+        return (apex, "SOA", self.soa_ttl,
+                f"{first_ns} hostmaster.{apex} 1 3600 600 86400 {self.soa_minimum}")
+
+    def ns_records(self):
+        return [(self.name or ".", "NS", self.ns_ttl, ns) for ns in self.servers]
+
+
+class StubServer:
+    """One fake name server (UDP + TCP) on ip:port serving a set of zones."""
+
+    def __init__(self, hierarchy, ip: str, port: int):
+        self.hierarchy = hierarchy
+        self.ip        = ip
+        self.drop      = False         # swallow every query (dead server)
+        self.loss      = 0.0           # probability of swallowing a UDP query
+        self.delay     = 0.0           # seconds before each UDP reply
+        self.jitter    = 0.0           # up to this many seconds more, uniformly
+        self.truncate  = False         # UDP replies carry TC=1 and no records
+                                       # (True, or the probability of doing so)
+        self.compress  = False         # name compression in replies
+        self.edns      = True          # False: FORMERR to queries with an OPT record
+        self.rng       = random.Random()
+        self.queries   = 0
+        self.lost      = 0
+        self.truncated = 0             # UDP replies cut to TC=1 for their size
+        self.tcp_connections = 0
+        self._tcp_socks = set()        # open client connections
+        self.by_qname  = Counter()
+        self._lock     = threading.Lock()
+        self._later    = []            # heap of (due, seq, reply, addr)
+        self._later_cv = threading.Condition()
+        self._seq      = 0
+
+        self.udp = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.udp.bind((ip, port))
+        self.port = self.udp.getsockname()[1]
+
+        server = self
+
+        class _TCPHandler(socketserver.BaseRequestHandler):
+            def handle(self):
+                sock = self.request
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)   # pipelined replies
+                with server._lock:
+                    server.tcp_connections += 1
+                    server._tcp_socks.add(sock)
+                try:
+                    self._serve(sock)
+                finally:
+                    with server._lock:
+                        server._tcp_socks.discard(sock)
+
+            def _serve(self, sock):
+                while True:
+                    hdr = _recv_exact(sock, 2)
+                    if not hdr:
+                        return
+                    pkt = _recv_exact(sock, struct.unpack("!H", hdr)[0])
+                    if not pkt:
+                        return
+                    reply = server.answer(pkt, tcp=True)
+                    if reply:
+                        sock.sendall(struct.pack("!H", len(reply)) + reply)
+
+        socketserver.ThreadingTCPServer.allow_reuse_address = True
+        self.tcp = socketserver.ThreadingTCPServer((ip, self.port), _TCPHandler)
+        self.tcp.daemon_threads = True
+        self._threads = [
+            threading.Thread(target=self._udp_loop, daemon=True),
+            threading.Thread(target=self.tcp.serve_forever, daemon=True,
+                             kwargs={"poll_interval": 0.05}),     # fast stop()
+            threading.Thread(target=self._delayed_loop, daemon=True),
+        ]
+
+    def start(self):
+        for t in self._threads:
+            t.start()
+
+    def stop(self):
+        self.tcp.shutdown()
+        self.tcp.server_close()
+        self.udp.close()
+        with self._later_cv:
+            self._later = None
+            self._later_cv.notify()
+
+    def drop_tcp_connections(self):
+        """Closes every open TCP connection, as a server's idle timeout would."""
+        with self._lock:
+            socks = list(self._tcp_socks)
+        for sock in socks:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def _udp_loop(self):
+        while True:
+            try:
+                pkt, addr = self.udp.recvfrom(4096)
+            except OSError:
+                return
+            reply = self.answer(pkt, tcp=False)
+            if not reply or self.drop:
+                continue
+            if self.loss and self.rng.random() < self.loss:
+                with self._lock:
+                    self.lost += 1
+                continue
+            wait = self.delay + (self.rng.uniform(0, self.jitter) if self.jitter else 0.0)
+            if wait > 0:
+                self._send_later(time.monotonic() + wait, reply, addr)
+            elif not self._send(reply, addr):
+                return
+
+    def _send_later(self, due: float, reply: bytes, addr):
+        with self._later_cv:
+            if self._later is None:
+                return
+            self._seq += 1
+            heapq.heappush(self._later, (due, self._seq, reply, addr))
+            self._later_cv.notify()
+
+    def _delayed_loop(self):
+        """Sends delayed replies when due — one thread, however many are pending."""
+        with self._later_cv:
+            while self._later is not None:
+                if not self._later:
+                    self._later_cv.wait()
+                    continue
+                due = self._later[0][0]
+                now = time.monotonic()
+                if now < due:
+                    self._later_cv.wait(due - now)
+                    continue
+                _due, _seq, reply, addr = heapq.heappop(self._later)
+                self._send(reply, addr)
+
+    def _send(self, reply: bytes, addr) -> bool:
+        try:
+            self.udp.sendto(reply, addr)
+            return True
+        except OSError:
+            return False
+
+    # ── query handling ────────────────────────────────────────────────────────
+
+    def answer(self, pkt: bytes, tcp: bool) -> bytes:
+        try:
+            msg_id, flags, qname, qtype, _qclass, _ = dnswire.parse_question(pkt)
+        except dnswire.WireError:
+            if len(pkt) >= 2:
+                return struct.pack("!HHHHHH", pkt[0] << 8 | pkt[1],
+                                   FLAG_QR | RCODE_FORMERR, 0, 0, 0, 0)
+            return b""
+        with self._lock:
+            self.queries += 1
+            self.by_qname[(qname, RTYPE_NAMES.get(qtype, str(qtype)))] += 1
+        self.hierarchy._count(self.ip)
+
+        rd = flags & FLAG_RD
+        try:
+            payload = dnswire.edns_payload(pkt)
+        except dnswire.WireError:
+            payload = None
+        if payload is not None and not self.edns:
+            return dnswire.build_message(msg_id, FLAG_QR | rd | RCODE_FORMERR, qname, qtype)
+        limit = dnswire.MAX_UDP_PAYLOAD if payload is None else payload
+
+        def reply(msg: bytes) -> bytes:
+            return msg if payload is None else dnswire.add_opt(msg, dnswire.EDNS_PAYLOAD)
+
+        if self.truncate and not tcp and self.rng.random() < self.truncate:
+            return reply(dnswire.build_message(msg_id, FLAG_QR | FLAG_TC | rd, qname, qtype))
+        rcode, aa, an, ns, ar = self.hierarchy.lookup(self.ip, qname, qtype)
+        flags = FLAG_QR | rd | (FLAG_AA if aa else 0) | rcode
+        msg = reply(dnswire.build_message(msg_id, flags, qname, qtype, an, ns, ar,
+                                          compress=self.compress))
+        if not tcp and len(msg) > limit:
+            with self._lock:
+                self.truncated += 1
+            return reply(dnswire.build_message(msg_id, flags | FLAG_TC, qname, qtype))
+        return msg
+
+
+def _recv_exact(sock, n: int) -> bytes:
+    buf = b""
+    while len(buf) < n:
+        chunk = sock.recv(n - len(buf))
+        if not chunk:
+            return b""
+        buf += chunk
+    return buf
+
+
+class StubHierarchy:
+    """Starts one StubServer per distinct server IP found in `zones`."""
+
+    def __init__(self, zones: dict = None, port: int = 0):
+        self.zones   = {dnswire.normalize(k): Zone(k, v)
+                        for k, v in (zones or DEFAULT_ZONES).items()}
+        self.servers = {}
+        self.per_ip  = Counter()
+        self._lock   = threading.Lock()
+
+        ips = []
+        for z in self.zones.values():
+            for ip in z.servers.values():
+                if ip not in ips:
+                    ips.append(ip)
+        for ip in ips:
+            srv = StubServer(self, ip, port)
+            port = srv.port                    # first bind picks the shared port
+            self.servers[ip] = srv
+        self.port = port
+
+    # ── lifecycle ─────────────────────────────────────────────────────────────
+
+    def start(self):
+        for srv in self.servers.values():
+            srv.start()
+        return self
+
+    def stop(self):
+        for srv in self.servers.values():
+            srv.stop()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    @property
+    def root_ips(self) -> list:
+        return list(self.zones[""].servers.values())
+
+    def configure(self, **knobs) -> "StubHierarchy":
+        """
+        Sets server knobs (loss=, delay=, jitter=, truncate=, drop=,
+        compress=, edns=) on every server.
+        """
+        for srv in self.servers.values():
+            for name, value in knobs.items():
+                if not hasattr(srv, name):
+                    raise AttributeError(f"unknown stub server knob: {name}")
+                setattr(srv, name, value)
+        return self
+
+    def seed(self, seed: int) -> "StubHierarchy":
+        """Makes loss / jitter / truncation draws repeatable."""
+        for i, srv in enumerate(self.servers.values()):
+            srv.rng.seed(seed * 1000 + i)
+        return self
+
+    def env(self) -> dict:
+        """Environment for pointing the C++ resolver at this hierarchy."""
+        return {"DNS_ROOT_HINTS": ",".join(self.root_ips),
+                "DNS_UPSTREAM_PORT": str(self.port)}
+
+    # ── counters ──────────────────────────────────────────────────────────────
+
+    def _count(self, ip: str):
+        with self._lock:
+            self.per_ip[ip] += 1
+
+    @property
+    def total_queries(self) -> int:
+        with self._lock:
+            return sum(self.per_ip.values())
+
+    def reset_counters(self):
+        with self._lock:
+            self.per_ip.clear()
+        for srv in self.servers.values():
+            with srv._lock:
+                srv.queries = 0
+                srv.lost = 0
+                srv.truncated = 0
+                srv.tcp_connections = 0
+                srv.by_qname.clear()
+
+    # ── resolution logic ──────────────────────────────────────────────────────
+
+    def _address_of(self, ns_name: str):
+        for z in self.zones.values():
+            for rec in z.records.get(dnswire.normalize(ns_name), []):
+                if rec[1] == "A":
+                    return rec[3]
+        for z in self.zones.values():
+            if dnswire.normalize(ns_name) in z.servers:
+                return z.servers[dnswire.normalize(ns_name)]
+        return None
+
+    def lookup(self, server_ip: str, qname: str, qtype: int) -> tuple:
+        """Returns (rcode, authoritative, answers, authorities, additionals)."""
+        served = [z for z in self.zones.values()
+                  if server_ip in z.servers.values() and _in_zone(qname, z.name)]
+        if not served:
+            return RCODE_REFUSED, False, [], [], []
+        zone = max(served, key=lambda z: _depth(z.name))
+
+        # Referral to the nearest child zone cut below `zone`, if any.
+        below = [z for z in self.zones.values()
+                 if _depth(z.name) > _depth(zone.name) and _in_zone(qname, z.name)
+                 and _in_zone(z.name, zone.name)]
+        if below:
+            child = min(below, key=lambda z: _depth(z.name))
+            glue = []
+            if not child.glueless:
+                for ns in child.servers:
+                    ip = self._address_of(ns)
+                    if ip:
+                        glue.append((ns, "A", child.ns_ttl, ip))
+            return 0, False, [], child.ns_records(), glue
+
+        type_str = RTYPE_NAMES.get(qtype, str(qtype))
+        records  = zone.records.get(dnswire.normalize(qname), [])
+        if type_str == "NS" and dnswire.normalize(qname) == zone.name:
+            return 0, True, zone.ns_records(), [], []
+        matching = [r for r in records if r[1] == type_str]
+        if matching:
+            return 0, True, matching, [], []
+
+        # CNAME at the name — return it and chase in-zone targets.  A chain
+        # that dead-ends inside the zone gets the negative answer for its
+        # last name (RFC 2308 §2.1); one that leaves the zone stops there.
+        cnames = [r for r in records if r[1] == "CNAME"]
+        if cnames and type_str != "CNAME":
+            answers, target = list(cnames[:1]), cnames[0][3]
+            for _ in range(8):
+                if not _in_zone(target, zone.name):
+                    return 0, True, answers, [], []
+                nxt = zone.records.get(dnswire.normalize(target), [])
+                hit = [r for r in nxt if r[1] == type_str]
+                if hit:
+                    return 0, True, answers + hit, [], []
+                more = [r for r in nxt if r[1] == "CNAME"]
+                if not more:
+                    break
+                answers.append(more[0])
+                target = more[0][3]
+            return self._negative(zone, target), True, answers, [zone.soa()], []
+
+        return self._negative(zone, qname), True, [], [zone.soa()], []
+
+    @staticmethod
+    def _negative(zone: Zone, qname: str) -> int:
+        """NOERROR (NODATA) if the name exists in the zone, else NXDOMAIN."""
+        name   = dnswire.normalize(qname)
+        exists = (name in zone.records or name == zone.name or
+                  any(n.endswith("." + name) for n in zone.records))
+        return 0 if exists else RCODE_NXDOMAIN
+
+
+if __name__ == "__main__":
+    import time
+    with StubHierarchy() as h:
+        print(f"stub hierarchy on port {h.port}; roots {h.root_ips}")
+        print("  export " + " ".join(f"{k}={v}" for k, v in h.env().items()))
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
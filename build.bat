@@ -9,23 +9,33 @@ set SRC=core\dns_resolver.cpp
 set OUT=core\dns_resolver.exe
 set FLAGS=-std=c++17 -O2 -Wall -Wextra
 
-echo [1/2] Checking for g++...
+echo [1/3] Checking for g++...
 where g++ >nul 2>&1
 if %errorlevel% neq 0 (
     echo ERROR: g++ not found.  Install MSYS2 and run: pacman -S mingw-w64-ucrt-x86_64-gcc
     exit /b 1
 )
 
-echo [2/2] Compiling %SRC% ...
+echo [2/3] Compiling %SRC% ...
 g++ %FLAGS% %SRC% -o %OUT% -lws2_32
 
-if %errorlevel% equ 0 (
-    echo.
-    echo Build SUCCESS: %OUT%
-    echo.
-    echo Test it:
-    echo   %OUT% google.com A
-) else (
+if %errorlevel% neq 0 (
     echo Build FAILED.
     exit /b 1
 )
+
+REM Optional: in-process Python extension (api\server.py prefers it when present)
+echo [3/3] Compiling Python extension core\dnscore.pyd ...
+for /f "delims=" %%i in ('python -c "import sysconfig;print(sysconfig.get_paths()['include'])"') do set PYINC=%%i
+for /f "delims=" %%i in ('python -c "import sys,os;print(os.path.join(sys.base_prefix,'libs'))"') do set PYLIB=%%i
+for /f "delims=" %%i in ('python -c "import sys;print('python%%d%%d' %% sys.version_info[:2])"') do set PYVER=%%i
+g++ %FLAGS% -shared -DDNS_RESOLVER_NO_MAIN -I"%PYINC%" %SRC% core\dns_module.cpp -o core\dnscore.pyd -L"%PYLIB%" -l%PYVER% -lws2_32
+if %errorlevel% neq 0 (
+    echo        skipped — the API will use the subprocess worker pool instead.
+)
+
+echo.
+echo Build SUCCESS: %OUT%
+echo.
+echo Test it:
+echo   %OUT% google.com A
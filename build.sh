@@ -6,15 +6,28 @@ SRC="core/dns_resolver.cpp"
 OUT="core/dns_resolver"
 FLAGS="-std=c++17 -O2 -Wall -Wextra"
 
-echo "[1/2] Checking for g++..."
+echo "[1/3] Checking for g++..."
 if ! command -v g++ &> /dev/null; then
     echo "ERROR: g++ not found.  Install with: sudo apt install g++ (Debian/Ubuntu)"
     exit 1
 fi
 
-echo "[2/2] Compiling $SRC ..."
+echo "[2/3] Compiling $SRC ..."
 g++ $FLAGS "$SRC" -o "$OUT"
 
+# Optional: in-process Python extension (api/server.py prefers it when present)
+echo "[3/3] Compiling Python extension core/dnscore ..."
+PYCFG="$(command -v python3-config || true)"
+if [ -n "$PYCFG" ]; then
+    EXT="core/dnscore$($PYCFG --extension-suffix)"
+    g++ $FLAGS -shared -fPIC -DDNS_RESOLVER_NO_MAIN $($PYCFG --includes) \
+        "$SRC" core/dns_module.cpp -o "$EXT"
+    echo "       $EXT"
+else
+    echo "       skipped (python3-config not found — install python3-dev);"
+    echo "       the API will use the subprocess worker pool instead."
+fi
+
 echo ""
 echo "Build SUCCESS: $OUT"
 echo ""
@@ -30,6 +30,58 @@ def resolve_domain(domain, qtype="A"):
     except Exception as e:
         return {"error": str(e), "domain": domain}
 
+def read_batch_names(stream, default_type="A"):
+    """Names for --batch: one per line, optionally followed by a record type.
+    Blank lines and lines starting with '#' are skipped."""
+    items = []
+    for line in stream:
+        fields = line.split("#", 1)[0].split()
+        if not fields:
+            continue
+        qtype = fields[1].upper() if len(fields) > 1 else default_type
+        items.append({"domain": fields[0], "type": qtype})
+    return items
+
+def resolve_batch(items, parallelism=None, qtype="A"):
+    """POSTs to /resolve/batch and yields each NDJSON line as it arrives."""
+    payload = {"items": items, "type": qtype}
+    if parallelism:
+        payload["parallelism"] = parallelism
+    req = urllib.request.Request(f"{API_URL}/batch", data=json.dumps(payload).encode(),
+                                 headers={"Content-Type": "application/json"})
+    try:
+        resp = urllib.request.urlopen(req, timeout=35)
+    except urllib.error.HTTPError as e:
+        try:
+            yield json.loads(e.read())
+        except:
+            yield {"error": f"HTTP Error {e.code}"}
+        return
+    except urllib.error.URLError as e:
+        yield {"error": f"Failed to connect to API: {e.reason}"}
+        return
+    with resp:
+        for line in resp:
+            if line.strip():
+                yield json.loads(line)
+
+def print_batch_line(data):
+    C_GN, C_RD, C_YL, C_R = "\033[92m", "\033[91m", "\033[93m", "\033[0m"
+    if "summary" in data:
+        s = data["summary"]
+        print(f"\n{C_GN}Completed {s['unique']} unique names ({s['items']} requested) "
+              f"in {s['elapsed_ms'] / 1000:.2f} s: {s['ok']} ok, {s['negative']} negative, "
+              f"{s['failed']} failed, {s['cache_hits']} from cache.{C_R}")
+        return
+    name = f"{data.get('domain', '?'):<40} {data.get('type', ''):<5}"
+    if data.get("status") == 200:
+        tag = " [CACHED]" if data.get("cached") else ""
+        print(f"{name} {C_GN}{data.get('ip', '')}{C_R}  {C_YL}{data.get('latency_ms', 0)} ms{C_R}{tag}")
+    elif data.get("negative"):
+        print(f"{name} {C_YL}{data.get('rcode')}{C_R}")
+    else:
+        print(f"{name} {C_RD}{data.get('error', 'failed')}{C_R}")
+
 def print_results(data, show_debug=False):
     if "error" in data:
         print(f"\033[91m[ERROR] Resolution failed for {data.get('domain', 'Unknown')}: {data['error']}\033[0m\n")
@@ -80,12 +132,34 @@ def print_results(data, show_debug=False):
 
 def main():
     parser = argparse.ArgumentParser(description="CCN-DNS Terminal Client")
-    parser.add_argument("domains", nargs="+", help="One or more domains to resolve")
+    parser.add_argument("domains", nargs="*", help="One or more domains to resolve")
     parser.add_argument("-t", "--type", default="A", help="DNS Record Type (A, AAAA, MX, NS, etc.)")
     parser.add_argument("--json", action="store_true", help="Output raw JSON instead of formatted text")
     parser.add_argument("--debug", action="store_true", help="Show full debug info including all answer records and TCP status")
     
+    parser.add_argument("-b", "--batch", metavar="FILE", help="Resolve the names in FILE ('-' for stdin) with one /resolve/batch request")
+    parser.add_argument("-p", "--parallelism", type=int, help="Concurrent upstream lookups for --batch (server default 16)")
+    
     args = parser.parse_args()
+    if not args.domains and not args.batch:
+        parser.error("give one or more domains or --batch FILE")
+
+    if args.batch:
+        if args.batch == "-":
+            items = read_batch_names(sys.stdin, args.type.upper())
+        else:
+            with open(args.batch) as f:
+                items = read_batch_names(f, args.type.upper())
+        items += [{"domain": d, "type": args.type.upper()} for d in args.domains]
+        if not args.json:
+            print_banner()
+            print(f"Resolving {len(items)} names via {C_YL}{API_URL}/batch{C_R}...\n")
+        for line in resolve_batch(items, args.parallelism, args.type.upper()):
+            if args.json:
+                print(json.dumps(line), flush=True)
+            else:
+                print_batch_line(line)
+        return
 
     if not args.json:
         print_banner()
@@ -0,0 +1,640 @@
+// ─────────────────────────────────────────────────────────────────────────────
+//  dns_module.cpp
+//  CPython extension `dnscore` — in-process binding for the C++ resolver.
+//  Removes the subprocess + JSON round-trip from the API hot path: results
+//  come back as native dicts and the GIL is released during network I/O.
+//
+//  Build (Linux / macOS — done by build.sh):
+//    g++ -std=c++17 -O2 -shared -fPIC -DDNS_RESOLVER_NO_MAIN
+//        $(python3-config --includes) core/dns_resolver.cpp core/dns_module.cpp
+//        -o core/dnscore$(python3-config --extension-suffix)
+//
+//  Python API:
+//    dnscore.Cache(max_entries=1000)          .stats()  .clear()
+//    dnscore.Resolver(cache=None, roots=None, port=0, deadline=0, max_queries=0,
+//                     edns=None)
+//                                             .resolve(domain, qtype="A", trace=False)
+//                                             .delegation_stats()
+//                                             .export_delegations()
+//                                             .load_delegations(zones, addresses)
+//                                             .server_stats()
+//                                             .zone_stats()
+//                                             .transport_stats()
+//    dnscore.build_query(domain, qtype="A", id=0, rd=False, edns=0)  → bytes
+//    dnscore.parse_response(packet: bytes)                    → dict
+// ─────────────────────────────────────────────────────────────────────────────
+
+#define PY_SSIZE_T_CLEAN
+#include <Python.h>
+
+#include "dns_resolver.h"
+
+// CPython's static type objects and PyCFunction casts are idiomatic but trip
+// -Wextra; keep the build output clean.
+#if defined(__GNUC__)
+  #pragma GCC diagnostic ignored "-Wmissing-field-initializers"
+  #pragma GCC diagnostic ignored "-Wcast-function-type"
+#endif
+
+// ── dict builders ─────────────────────────────────────────────────────────────
+
+// Decodes as UTF-8, replacing invalid bytes (TXT RDATA is arbitrary octets).
+static PyObject* py_str(const std::string& s) {
+    return PyUnicode_DecodeUTF8(s.data(), static_cast<Py_ssize_t>(s.size()), "replace");
+}
+
+// Steals a reference to `value`; returns false (with exception set) on error.
+static bool set_item(PyObject* dict, const char* key, PyObject* value) {
+    if (!value) return false;
+    int rc = PyDict_SetItemString(dict, key, value);
+    Py_DECREF(value);
+    return rc == 0;
+}
+
+static PyObject* record_to_dict(const dns::Record& r) {
+    PyObject* d = PyDict_New();
+    if (!d) return nullptr;
+    if (!set_item(d, "name", py_str(r.name)) ||
+        !set_item(d, "type", py_str(dns::type_to_str(r.type))) ||
+        !set_item(d, "ttl",  PyLong_FromUnsignedLong(r.ttl)) ||
+        !set_item(d, "data", py_str(r.data))) {
+        Py_DECREF(d);
+        return nullptr;
+    }
+    return d;
+}
+
+static PyObject* records_to_list(const std::vector<dns::Record>& recs) {
+    PyObject* lst = PyList_New(static_cast<Py_ssize_t>(recs.size()));
+    if (!lst) return nullptr;
+    for (size_t i = 0; i < recs.size(); ++i) {
+        PyObject* d = record_to_dict(recs[i]);
+        if (!d) { Py_DECREF(lst); return nullptr; }
+        PyList_SET_ITEM(lst, static_cast<Py_ssize_t>(i), d);
+    }
+    return lst;
+}
+
+static PyObject* strings_to_list(const std::vector<std::string>& v) {
+    PyObject* lst = PyList_New(static_cast<Py_ssize_t>(v.size()));
+    if (!lst) return nullptr;
+    for (size_t i = 0; i < v.size(); ++i) {
+        PyObject* s = py_str(v[i]);
+        if (!s) { Py_DECREF(lst); return nullptr; }
+        PyList_SET_ITEM(lst, static_cast<Py_ssize_t>(i), s);
+    }
+    return lst;
+}
+
+static PyObject* trace_to_list(const std::vector<dns::TraceHop>& hops) {
+    PyObject* lst = PyList_New(static_cast<Py_ssize_t>(hops.size()));
+    if (!lst) return nullptr;
+    for (size_t i = 0; i < hops.size(); ++i) {
+        const auto& h = hops[i];
+        PyObject* d = PyDict_New();
+        if (!d ||
+            !set_item(d, "server",    py_str(h.server)) ||
+            !set_item(d, "zone",      py_str(h.zone)) ||
+            !set_item(d, "qname",     py_str(h.qname)) ||
+            !set_item(d, "qtype",     py_str(h.qtype)) ||
+            !set_item(d, "start_ms",  PyFloat_FromDouble(h.start_ms)) ||
+            !set_item(d, "rtt_ms",    PyFloat_FromDouble(h.rtt_ms)) ||
+            !set_item(d, "outcome",   py_str(h.outcome)) ||
+            !set_item(d, "detail",    py_str(h.detail)) ||
+            !set_item(d, "tcp",       PyBool_FromLong(h.tcp)) ||
+            !set_item(d, "ns_lookup", PyBool_FromLong(h.ns_lookup))) {
+            Py_XDECREF(d);
+            Py_DECREF(lst);
+            return nullptr;
+        }
+        PyList_SET_ITEM(lst, static_cast<Py_ssize_t>(i), d);
+    }
+    return lst;
+}
+
+// Same keys as result_to_json(), so callers can swap bridges freely.
+static PyObject* result_to_dict(const dns::ResolveResult& r, bool with_trace = false) {
+    PyObject* d = PyDict_New();
+    if (!d) return nullptr;
+    bool ok =
+        set_item(d, "success",         PyBool_FromLong(r.success)) &&
+        set_item(d, "domain",          py_str(r.domain)) &&
+        set_item(d, "qtype",           py_str(r.qtype_str)) &&
+        set_item(d, "rcode",           py_str(dns::rcode_to_str(r.rcode))) &&
+        set_item(d, "ttl",             PyLong_FromUnsignedLong(r.ttl)) &&
+        set_item(d, "cached",          PyBool_FromLong(r.cached)) &&
+        set_item(d, "used_tcp",        PyBool_FromLong(r.used_tcp)) &&
+        set_item(d, "latency_ms",      PyFloat_FromDouble(r.latency_ms)) &&
+        set_item(d, "answers",         records_to_list(r.answers)) &&
+        set_item(d, "authorities",     records_to_list(r.authorities)) &&
+        set_item(d, "additionals",     records_to_list(r.additionals)) &&
+        set_item(d, "resolution_path", strings_to_list(r.resolution_path)) &&
+        set_item(d, "start_zone",      py_str(r.start_zone)) &&
+        set_item(d, "hops_saved",      PyLong_FromLong(r.hops_saved));
+    if (ok && !r.exhausted.empty())
+        ok = set_item(d, "exhausted",        py_str(r.exhausted)) &&
+             set_item(d, "upstream_queries", PyLong_FromLong(r.queries));
+    if (ok && (with_trace || !r.exhausted.empty()))
+        ok = set_item(d, "trace", trace_to_list(r.trace));
+    if (ok && !r.error.empty())
+        ok = set_item(d, "error", py_str(r.error));
+    if (!ok) { Py_DECREF(d); return nullptr; }
+    return d;
+}
+
+static PyObject* response_to_dict(const dns::Response& r) {
+    PyObject* d = PyDict_New();
+    if (!d) return nullptr;
+    bool ok =
+        set_item(d, "id",            PyLong_FromLong(r.id)) &&
+        set_item(d, "flags",         PyLong_FromLong(r.flags)) &&
+        set_item(d, "rcode",         PyLong_FromLong(r.rcode)) &&
+        set_item(d, "truncated",     PyBool_FromLong(r.truncated)) &&
+        set_item(d, "authoritative", PyBool_FromLong(r.authoritative)) &&
+        set_item(d, "answers",       records_to_list(r.answers)) &&
+        set_item(d, "authorities",   records_to_list(r.authorities)) &&
+        set_item(d, "additionals",   records_to_list(r.additionals)) &&
+        set_item(d, "min_ttl",       PyLong_FromUnsignedLong(r.min_ttl)) &&
+        set_item(d, "edns_payload",  PyLong_FromLong(r.edns_payload));
+    if (!ok) { Py_DECREF(d); return nullptr; }
+    return d;
+}
+
+// ═════════════════════════════════════════════════════════════════════════════
+//  dnscore.Cache
+// ═════════════════════════════════════════════════════════════════════════════
+
+struct CacheObject {
+    PyObject_HEAD
+    dns::Cache* cache;
+};
+
+static int Cache_init(CacheObject* self, PyObject* args, PyObject* kwds) {
+    static const char* kwlist[] = {"max_entries", nullptr};
+    Py_ssize_t max_entries = 1000;
+    if (!PyArg_ParseTupleAndKeywords(args, kwds, "|n",
+            const_cast<char**>(kwlist), &max_entries))
+        return -1;
+    if (max_entries <= 0) {
+        PyErr_SetString(PyExc_ValueError, "max_entries must be positive");
+        return -1;
+    }
+    delete self->cache;
+    self->cache = new dns::Cache(static_cast<size_t>(max_entries));
+    return 0;
+}
+
+static void Cache_dealloc(CacheObject* self) {
+    delete self->cache;
+    Py_TYPE(self)->tp_free(reinterpret_cast<PyObject*>(self));
+}
+
+static bool cache_ready(CacheObject* self) {
+    if (self->cache) return true;
+    PyErr_SetString(PyExc_RuntimeError, "Cache not initialised");
+    return false;
+}
+
+static PyObject* Cache_stats(CacheObject* self, PyObject*) {
+    if (!cache_ready(self)) return nullptr;
+    auto s = self->cache->stats();
+    return Py_BuildValue("{s:n,s:n,s:n}",
+        "size",   static_cast<Py_ssize_t>(s.size),
+        "hits",   static_cast<Py_ssize_t>(s.hits),
+        "misses", static_cast<Py_ssize_t>(s.misses));
+}
+
+static PyObject* Cache_clear(CacheObject* self, PyObject*) {
+    if (!cache_ready(self)) return nullptr;
+    self->cache->clear();
+    Py_RETURN_NONE;
+}
+
+static PyMethodDef Cache_methods[] = {
+    {"stats", reinterpret_cast<PyCFunction>(Cache_stats), METH_NOARGS,
+     "stats() -> {'size', 'hits', 'misses'}"},
+    {"clear", reinterpret_cast<PyCFunction>(Cache_clear), METH_NOARGS,
+     "clear() -> None"},
+    {nullptr, nullptr, 0, nullptr}
+};
+
+static PyTypeObject CacheType = { PyVarObject_HEAD_INIT(nullptr, 0) };
+
+// ═════════════════════════════════════════════════════════════════════════════
+//  dnscore.Resolver
+// ═════════════════════════════════════════════════════════════════════════════
+
+struct ResolverObject {
+    PyObject_HEAD
+    dns::Resolver* resolver;
+    PyObject*      cache;      // owning reference to a CacheObject (or NULL)
+};
+
+static int Resolver_init(ResolverObject* self, PyObject* args, PyObject* kwds) {
+    static const char* kwlist[] = {"cache", "roots", "port", "deadline", "max_queries",
+                                   "edns", nullptr};
+    PyObject* cache       = Py_None;
+    PyObject* roots       = Py_None;
+    int       port        = 0;
+    double    deadline    = 0.0;
+    int       max_queries = 0;
+    PyObject* edns        = Py_None;
+    if (!PyArg_ParseTupleAndKeywords(args, kwds, "|OOidiO",
+            const_cast<char**>(kwlist), &cache, &roots, &port, &deadline, &max_queries,
+            &edns))
+        return -1;
+    long edns_payload = -1;                  // None: DNS_EDNS_PAYLOAD or the default
+    if (edns != Py_None) {
+        edns_payload = PyLong_AsLong(edns);
+        if (edns_payload == -1 && PyErr_Occurred()) return -1;
+    }
+
+    std::vector<std::string> root_ips;
+    if (roots != Py_None) {
+        PyObject* seq = PySequence_Fast(roots, "roots must be a sequence of IP strings");
+        if (!seq) return -1;
+        for (Py_ssize_t i = 0; i < PySequence_Fast_GET_SIZE(seq); ++i) {
+            const char* ip = PyUnicode_AsUTF8(PySequence_Fast_GET_ITEM(seq, i));
+            if (!ip) { Py_DECREF(seq); return -1; }
+            root_ips.emplace_back(ip);
+        }
+        Py_DECREF(seq);
+    }
+    if (port < 0 || port > 0xFFFF) {
+        PyErr_SetString(PyExc_ValueError, "port must be in 0..65535");
+        return -1;
+    }
+
+    dns::Cache* native_cache = nullptr;
+    if (cache != Py_None) {
+        if (!PyObject_TypeCheck(cache, &CacheType)) {
+            PyErr_SetString(PyExc_TypeError, "cache must be a dnscore.Cache or None");
+            return -1;
+        }
+        if (!cache_ready(reinterpret_cast<CacheObject*>(cache))) return -1;
+        native_cache = reinterpret_cast<CacheObject*>(cache)->cache;
+        Py_INCREF(cache);
+    } else {
+        cache = nullptr;
+    }
+
+    Py_XDECREF(self->cache);
+    delete self->resolver;
+    self->cache    = cache;
+    self->resolver = new dns::Resolver(native_cache);
+    // Environment first (DNS_ROOT_HINTS / DNS_UPSTREAM_PORT / DNS_RESOLVE_DEADLINE /
+    // DNS_MAX_UPSTREAM_QUERIES / DNS_EDNS_PAYLOAD), then kwargs.
+    self->resolver->configure_from_env();
+    self->resolver->set_root_hints(root_ips);
+    self->resolver->set_upstream_port(static_cast<uint16_t>(port));
+    self->resolver->set_limits(deadline, max_queries);
+    if (edns_payload >= 0) self->resolver->set_edns_payload(static_cast<int>(edns_payload));
+    return 0;
+}
+
+static void Resolver_dealloc(ResolverObject* self) {
+    delete self->resolver;
+    Py_XDECREF(self->cache);
+    Py_TYPE(self)->tp_free(reinterpret_cast<PyObject*>(self));
+}
+
+static PyObject* Resolver_resolve(ResolverObject* self, PyObject* args, PyObject* kwds) {
+    static const char* kwlist[] = {"domain", "qtype", "trace", nullptr};
+    const char* domain = nullptr;
+    const char* qtype  = "A";
+    int         traced = 0;
+    if (!PyArg_ParseTupleAndKeywords(args, kwds, "s|sp",
+            const_cast<char**>(kwlist), &domain, &qtype, &traced))
+        return nullptr;
+    if (!self->resolver) {
+        PyErr_SetString(PyExc_RuntimeError, "Resolver not initialised");
+        return nullptr;
+    }
+
+    std::string d(domain);
+    uint16_t    t = dns::str_to_type(qtype);
+    dns::ResolveResult res;
+    std::string err;
+
+    // The walk is pure network I/O — let other Python threads run meanwhile.
+    Py_BEGIN_ALLOW_THREADS
+    try {
+        res = self->resolver->resolve(d, t, traced != 0);
+    } catch (const std::exception& e) {
+        err = e.what();
+    }
+    Py_END_ALLOW_THREADS
+
+    if (!err.empty()) {
+        PyErr_SetString(PyExc_RuntimeError, err.c_str());
+        return nullptr;
+    }
+    return result_to_dict(res, traced != 0);
+}
+
+static PyObject* Resolver_delegation_stats(ResolverObject* self, PyObject*) {
+    if (!self->resolver) {
+        PyErr_SetString(PyExc_RuntimeError, "Resolver not initialised");
+        return nullptr;
+    }
+    auto s = self->resolver->delegations().stats();
+    return Py_BuildValue("{s:n,s:n,s:n,s:n}",
+        "zones",     static_cast<Py_ssize_t>(s.zones),
+        "addresses", static_cast<Py_ssize_t>(s.addresses),
+        "hits",      static_cast<Py_ssize_t>(s.hits),
+        "misses",    static_cast<Py_ssize_t>(s.misses));
+}
+
+static PyObject* Resolver_export_delegations(ResolverObject* self, PyObject*) {
+    if (!self->resolver) {
+        PyErr_SetString(PyExc_RuntimeError, "Resolver not initialised");
+        return nullptr;
+    }
+    std::vector<dns::DelegationCache::ZoneRecord>    zones;
+    std::vector<dns::DelegationCache::AddressRecord> addrs;
+    self->resolver->delegations().export_live(zones, addrs);
+
+    PyObject* zl = PyList_New(static_cast<Py_ssize_t>(zones.size()));
+    PyObject* al = PyList_New(static_cast<Py_ssize_t>(addrs.size()));
+    if (!zl || !al) { Py_XDECREF(zl); Py_XDECREF(al); return nullptr; }
+    for (size_t i = 0; i < zones.size(); ++i) {
+        PyObject* t = Py_BuildValue("(NNI)", py_str(zones[i].zone),
+                                    strings_to_list(zones[i].ns_names), zones[i].ttl);
+        if (!t) { Py_DECREF(zl); Py_DECREF(al); return nullptr; }
+        PyList_SET_ITEM(zl, static_cast<Py_ssize_t>(i), t);
+    }
+    for (size_t i = 0; i < addrs.size(); ++i) {
+        PyObject* t = Py_BuildValue("(NNI)", py_str(addrs[i].ns_name),
+                                    py_str(addrs[i].ip), addrs[i].ttl);
+        if (!t) { Py_DECREF(zl); Py_DECREF(al); return nullptr; }
+        PyList_SET_ITEM(al, static_cast<Py_ssize_t>(i), t);
+    }
+    return Py_BuildValue("{s:N,s:N}", "zones", zl, "addresses", al);
+}
+
+// load_delegations(zones, addresses): the inverse of export_delegations().
+// Entries with a TTL of 0 are skipped; returns the number loaded.
+static PyObject* Resolver_load_delegations(ResolverObject* self, PyObject* args) {
+    if (!self->resolver) {
+        PyErr_SetString(PyExc_RuntimeError, "Resolver not initialised");
+        return nullptr;
+    }
+    PyObject* zones_obj = nullptr;
+    PyObject* addrs_obj = nullptr;
+    if (!PyArg_ParseTuple(args, "OO", &zones_obj, &addrs_obj)) return nullptr;
+
+    auto& deleg  = self->resolver->delegations();
+    size_t loaded = 0;
+    PyObject* zones = PySequence_Fast(zones_obj, "zones must be a sequence of (zone, [ns], ttl)");
+    if (!zones) return nullptr;
+    for (Py_ssize_t i = 0; i < PySequence_Fast_GET_SIZE(zones); ++i) {
+        const char*   zone = nullptr;
+        PyObject*     ns   = nullptr;
+        unsigned long ttl  = 0;
+        if (!PyArg_ParseTuple(PySequence_Fast_GET_ITEM(zones, i), "sOk", &zone, &ns, &ttl)) {
+            Py_DECREF(zones);
+            return nullptr;
+        }
+        PyObject* ns_seq = PySequence_Fast(ns, "ns names must be a sequence of strings");
+        if (!ns_seq) { Py_DECREF(zones); return nullptr; }
+        std::vector<std::string> ns_names;
+        for (Py_ssize_t j = 0; j < PySequence_Fast_GET_SIZE(ns_seq); ++j) {
+            const char* name = PyUnicode_AsUTF8(PySequence_Fast_GET_ITEM(ns_seq, j));
+            if (!name) { Py_DECREF(ns_seq); Py_DECREF(zones); return nullptr; }
+            ns_names.emplace_back(name);
+        }
+        Py_DECREF(ns_seq);
+        if (ttl == 0 || ns_names.empty()) continue;
+        deleg.put_zone(zone, ns_names, static_cast<uint32_t>(ttl));
+        ++loaded;
+    }
+    Py_DECREF(zones);
+
+    PyObject* addrs = PySequence_Fast(addrs_obj, "addresses must be a sequence of (ns, ip, ttl)");
+    if (!addrs) return nullptr;
+    for (Py_ssize_t i = 0; i < PySequence_Fast_GET_SIZE(addrs); ++i) {
+        const char*   ns  = nullptr;
+        const char*   ip  = nullptr;
+        unsigned long ttl = 0;
+        if (!PyArg_ParseTuple(PySequence_Fast_GET_ITEM(addrs, i), "ssk", &ns, &ip, &ttl)) {
+            Py_DECREF(addrs);
+            return nullptr;
+        }
+        if (ttl == 0) continue;
+        deleg.put_address(ns, ip, static_cast<uint32_t>(ttl));
+        ++loaded;
+    }
+    Py_DECREF(addrs);
+    return PyLong_FromSize_t(loaded);
+}
+
+static PyObject* Resolver_server_stats(ResolverObject* self, PyObject*) {
+    if (!self->resolver) {
+        PyErr_SetString(PyExc_RuntimeError, "Resolver not initialised");
+        return nullptr;
+    }
+    auto servers = self->resolver->infra().snapshot();
+    PyObject* list = PyList_New(static_cast<Py_ssize_t>(servers.size()));
+    if (!list) return nullptr;
+    for (size_t i = 0; i < servers.size(); ++i) {
+        const auto& s = servers[i];
+        PyObject* d = Py_BuildValue("{s:s,s:d,s:d,s:d,s:I,s:n,s:n,s:n,s:n,s:O}",
+            "ip",        s.ip.c_str(),
+            "srtt_ms",   s.srtt_ms,
+            "rttvar_ms", s.rttvar_ms,
+            "rto_ms",    s.rto_ms,
+            "backoff",   s.backoff,
+            "queries",   static_cast<Py_ssize_t>(s.queries),
+            "responses", static_cast<Py_ssize_t>(s.responses),
+            "timeouts",  static_cast<Py_ssize_t>(s.timeouts),
+            "failures",  static_cast<Py_ssize_t>(s.failures),
+            "no_edns",   s.no_edns ? Py_True : Py_False);
+        if (!d) { Py_DECREF(list); return nullptr; }
+        PyList_SET_ITEM(list, static_cast<Py_ssize_t>(i), d);
+    }
+    return list;
+}
+
+static PyObject* Resolver_transport_stats(ResolverObject* self, PyObject*) {
+    if (!self->resolver) {
+        PyErr_SetString(PyExc_RuntimeError, "Resolver not initialised");
+        return nullptr;
+    }
+    auto s = self->resolver->transport().stats();
+    return Py_BuildValue("{s:n,s:n,s:n,s:n,s:n}",
+        "udp_opened",   static_cast<Py_ssize_t>(s.udp_opened),
+        "udp_leases",   static_cast<Py_ssize_t>(s.udp_leases),
+        "tcp_connects", static_cast<Py_ssize_t>(s.tcp_connects),
+        "tcp_reused",   static_cast<Py_ssize_t>(s.tcp_reused),
+        "syscalls",     static_cast<Py_ssize_t>(dns::net_syscalls()));
+}
+
+static PyObject* Resolver_zone_stats(ResolverObject* self, PyObject*) {
+    if (!self->resolver) {
+        PyErr_SetString(PyExc_RuntimeError, "Resolver not initialised");
+        return nullptr;
+    }
+    auto zones = self->resolver->zones().snapshot();
+    PyObject* list = PyList_New(static_cast<Py_ssize_t>(zones.size()));
+    if (!list) return nullptr;
+    for (size_t i = 0; i < zones.size(); ++i) {
+        const auto& z = zones[i];
+        PyObject* d = Py_BuildValue("{s:s,s:n,s:n,s:n,s:n,s:n,s:n,s:n,s:d,s:d}",
+            "zone",       z.zone.c_str(),
+            "queries",    static_cast<Py_ssize_t>(z.queries),
+            "answers",    static_cast<Py_ssize_t>(z.answers),
+            "referrals",  static_cast<Py_ssize_t>(z.referrals),
+            "truncated",  static_cast<Py_ssize_t>(z.truncated),
+            "timeouts",   static_cast<Py_ssize_t>(z.timeouts),
+            "errors",     static_cast<Py_ssize_t>(z.errors),
+            "ns_lookups", static_cast<Py_ssize_t>(z.ns_lookups),
+            "total_ms",   z.total_ms,
+            "max_ms",     z.max_ms);
+        if (!d) { Py_DECREF(list); return nullptr; }
+        PyList_SET_ITEM(list, static_cast<Py_ssize_t>(i), d);
+    }
+    return list;
+}
+
+static PyMethodDef Resolver_methods[] = {
+    {"resolve", reinterpret_cast<PyCFunction>(Resolver_resolve),
+     METH_VARARGS | METH_KEYWORDS,
+     "resolve(domain, qtype='A', trace=False) -> dict  (same keys as the CLI JSON"
+     " output; trace=True skips the answer cache and adds the per-hop 'trace')"},
+    {"delegation_stats", reinterpret_cast<PyCFunction>(Resolver_delegation_stats),
+     METH_NOARGS,
+     "delegation_stats() -> {'zones', 'addresses', 'hits', 'misses'}"},
+    {"export_delegations", reinterpret_cast<PyCFunction>(Resolver_export_delegations),
+     METH_NOARGS,
+     "export_delegations() -> {'zones': [(zone, [ns, ...], ttl)], 'addresses': [(ns, ip, ttl)]}"},
+    {"load_delegations", reinterpret_cast<PyCFunction>(Resolver_load_delegations),
+     METH_VARARGS,
+     "load_delegations(zones, addresses) -> int  (inverse of export_delegations)"},
+    {"server_stats", reinterpret_cast<PyCFunction>(Resolver_server_stats),
+     METH_NOARGS,
+     "server_stats() -> [{'ip', 'srtt_ms', 'rttvar_ms', 'rto_ms', 'backoff',"
+     " 'queries', 'responses', 'timeouts', 'failures', 'no_edns'}, ...]"},
+    {"zone_stats", reinterpret_cast<PyCFunction>(Resolver_zone_stats),
+     METH_NOARGS,
+     "zone_stats() -> [{'zone', 'queries', 'answers', 'referrals', 'truncated',"
+     " 'timeouts', 'errors', 'ns_lookups', 'total_ms', 'max_ms'}, ...]"},
+    {"transport_stats", reinterpret_cast<PyCFunction>(Resolver_transport_stats),
+     METH_NOARGS,
+     "transport_stats() -> {'udp_opened', 'udp_leases', 'tcp_connects',"
+     " 'tcp_reused', 'syscalls'}  (syscalls: process-wide socket calls)"},
+    {nullptr, nullptr, 0, nullptr}
+};
+
+static PyTypeObject ResolverType = { PyVarObject_HEAD_INIT(nullptr, 0) };
+
+// ═════════════════════════════════════════════════════════════════════════════
+//  Module-level functions
+// ═════════════════════════════════════════════════════════════════════════════
+
+static PyObject* mod_build_query(PyObject*, PyObject* args, PyObject* kwds) {
+    static const char* kwlist[] = {"domain", "qtype", "id", "rd", "edns", nullptr};
+    const char* domain = nullptr;
+    const char* qtype  = "A";
+    int         id     = 0;
+    int         rd     = 0;
+    int         edns   = 0;
+    if (!PyArg_ParseTupleAndKeywords(args, kwds, "s|sipi",
+            const_cast<char**>(kwlist), &domain, &qtype, &id, &rd, &edns))
+        return nullptr;
+    if (id < 0 || id > 0xFFFF) {
+        PyErr_SetString(PyExc_ValueError, "id must be in 0..65535");
+        return nullptr;
+    }
+    if (edns < 0 || edns > 0xFFFF) {
+        PyErr_SetString(PyExc_ValueError, "edns must be in 0..65535");
+        return nullptr;
+    }
+    try {
+        auto pkt = dns::build_query(domain, dns::str_to_type(qtype),
+                                    static_cast<uint16_t>(id), rd != 0,
+                                    static_cast<uint16_t>(edns));
+        return PyBytes_FromStringAndSize(
+            reinterpret_cast<const char*>(pkt.data()),
+            static_cast<Py_ssize_t>(pkt.size()));
+    } catch (const std::exception& e) {
+        PyErr_SetString(PyExc_ValueError, e.what());
+        return nullptr;
+    }
+}
+
+static PyObject* mod_parse_response(PyObject*, PyObject* args) {
+    Py_buffer buf;
+    if (!PyArg_ParseTuple(args, "y*", &buf))
+        return nullptr;
+    const auto* p = static_cast<const uint8_t*>(buf.buf);
+    std::vector<uint8_t> data(p, p + buf.len);
+    PyBuffer_Release(&buf);
+    try {
+        return response_to_dict(dns::parse_response(data));
+    } catch (const std::exception& e) {
+        PyErr_SetString(PyExc_ValueError, e.what());
+        return nullptr;
+    }
+}
+
+static PyMethodDef module_methods[] = {
+    {"build_query", reinterpret_cast<PyCFunction>(mod_build_query),
+     METH_VARARGS | METH_KEYWORDS,
+     "build_query(domain, qtype='A', id=0, rd=False, edns=0) -> bytes  (edns: OPT UDP size)"},
+    {"parse_response", mod_parse_response, METH_VARARGS,
+     "parse_response(packet: bytes) -> dict"},
+    {nullptr, nullptr, 0, nullptr}
+};
+
+static PyModuleDef dnscore_module = {
+    PyModuleDef_HEAD_INIT,
+    "dnscore",
+    "In-process binding for the C++ recursive DNS resolver.",
+    -1,
+    module_methods,
+    nullptr, nullptr, nullptr, nullptr
+};
+
+PyMODINIT_FUNC PyInit_dnscore(void) {
+    CacheType.tp_name      = "dnscore.Cache";
+    CacheType.tp_basicsize = sizeof(CacheObject);
+    CacheType.tp_flags     = Py_TPFLAGS_DEFAULT;
+    CacheType.tp_doc       = "Thread-safe LRU + TTL cache (dns::Cache).";
+    CacheType.tp_new       = PyType_GenericNew;
+    CacheType.tp_init      = reinterpret_cast<initproc>(Cache_init);
+    CacheType.tp_dealloc   = reinterpret_cast<destructor>(Cache_dealloc);
+    CacheType.tp_methods   = Cache_methods;
+
+    ResolverType.tp_name      = "dnscore.Resolver";
+    ResolverType.tp_basicsize = sizeof(ResolverObject);
+    ResolverType.tp_flags     = Py_TPFLAGS_DEFAULT;
+    ResolverType.tp_doc       = "Recursive resolver (dns::Resolver); GIL released while resolving.";
+    ResolverType.tp_new       = PyType_GenericNew;
+    ResolverType.tp_init      = reinterpret_cast<initproc>(Resolver_init);
+    ResolverType.tp_dealloc   = reinterpret_cast<destructor>(Resolver_dealloc);
+    ResolverType.tp_methods   = Resolver_methods;
+
+    if (PyType_Ready(&CacheType) < 0 || PyType_Ready(&ResolverType) < 0)
+        return nullptr;
+
+    try {
+        dns::net_init();
+    } catch (const std::exception& e) {
+        PyErr_SetString(PyExc_ImportError, e.what());
+        return nullptr;
+    }
+
+    PyObject* m = PyModule_Create(&dnscore_module);
+    if (!m) return nullptr;
+
+    Py_INCREF(&CacheType);
+    Py_INCREF(&ResolverType);
+    if (PyModule_AddObject(m, "Cache",    reinterpret_cast<PyObject*>(&CacheType))    < 0 ||
+        PyModule_AddObject(m, "Resolver", reinterpret_cast<PyObject*>(&ResolverType)) < 0) {
+        Py_DECREF(&CacheType);
+        Py_DECREF(&ResolverType);
+        Py_DECREF(m);
+        return nullptr;
+    }
+    return m;
+}
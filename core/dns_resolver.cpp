@@ -9,6 +9,7 @@
 //
 //  Usage:
 //    dns_resolver <domain> [A|AAAA|NS|MX|CNAME|TXT]
+//    dns_resolver --serve          (NDJSON worker mode on stdin/stdout)
 //
 //  Output: JSON to stdout.
 // ─────────────────────────────────────────────────────────────────────────────
@@ -51,6 +52,11 @@
 #include <random>
 #include <algorithm>
 #include <chrono>
+#include <cctype>
+#include <cstdlib>
+#include <cmath>
+#include <atomic>
+#include <optional>
 
 namespace dns {
 
@@ -116,6 +122,14 @@ static uint16_t random_id() {
     return dist(rng);
 }
 
+// Uniform index in [0, n) — thread-local engine, safe from resolver threads.
+static size_t random_index(size_t n) {
+    thread_local std::mt19937 rng(
+        static_cast<unsigned>(
+            std::chrono::steady_clock::now().time_since_epoch().count()));
+    return std::uniform_int_distribution<size_t>(0, n - 1)(rng);
+}
+
 // ─────────────────────────────────────────────────────────────────────────────
 //  Utility
 // ─────────────────────────────────────────────────────────────────────────────
@@ -133,6 +147,27 @@ std::string type_to_str(uint16_t t) {
     }
 }
 
+std::string rcode_to_str(uint8_t rcode) {
+    switch (rcode) {
+        case 0:  return "NOERROR";
+        case 1:  return "FORMERR";
+        case 2:  return "SERVFAIL";
+        case 3:  return "NXDOMAIN";
+        case 4:  return "NOTIMP";
+        case 5:  return "REFUSED";
+        default: return "RCODE" + std::to_string(rcode);
+    }
+}
+
+uint32_t negative_ttl(const Record& soa) {
+    // parse_rdata() renders SOA as "mname rname serial=… refresh=… minimum=N"
+    uint32_t minimum = soa.ttl;
+    auto pos = soa.data.find("minimum=");
+    if (pos != std::string::npos)
+        minimum = static_cast<uint32_t>(std::strtoul(soa.data.c_str() + pos + 8, nullptr, 10));
+    return std::min({soa.ttl, minimum, MAX_NEGATIVE_TTL});
+}
+
 // JSON-escape a string (handles quotes and backslashes).
 static std::string json_str(const std::string& s) {
     std::string out;
@@ -174,8 +209,12 @@ std::vector<uint8_t> encode_name(const std::string& domain) {
 // ─────────────────────────────────────────────────────────────────────────────
 //  Packet builder  (RFC 1035 §4)
 // ─────────────────────────────────────────────────────────────────────────────
+// An OPT record is the root name, TYPE 41, the UDP size as CLASS, a zero
+// TTL (extended RCODE, version 0, no DO bit) and no RDATA: 11 bytes.
+static constexpr size_t OPT_RR_SIZE = 11;
+
 std::vector<uint8_t> build_query(const std::string& domain,
-                                  uint16_t qtype, uint16_t id, bool rd) {
+                                  uint16_t qtype, uint16_t id, bool rd, uint16_t edns) {
     if (id == 0) id = random_id();
 
     std::vector<uint8_t> pkt;
@@ -187,7 +226,7 @@ std::vector<uint8_t> build_query(const std::string& domain,
     wr16(pkt, 1);                          // QDCOUNT = 1
     wr16(pkt, 0);                          // ANCOUNT = 0
     wr16(pkt, 0);                          // NSCOUNT = 0
-    wr16(pkt, 0);                          // ARCOUNT = 0
+    wr16(pkt, edns ? 1 : 0);               // ARCOUNT = the OPT record, if any
 
     // Question section
     auto qname = encode_name(domain);
@@ -195,53 +234,114 @@ std::vector<uint8_t> build_query(const std::string& domain,
     wr16(pkt, qtype);                      // QTYPE
     wr16(pkt, CLASS_IN);                   // QCLASS
 
+    // Additional section: OPT (RFC 6891 §6.1.2)
+    if (edns) {
+        pkt.push_back(0x00);               // owner: root
+        wr16(pkt, TYPE_OPT);
+        wr16(pkt, std::max<uint16_t>(edns, MAX_UDP_PAYLOAD));
+        wr16(pkt, 0);                      // extended RCODE + version
+        wr16(pkt, 0);                      // DO = 0, Z = 0
+        wr16(pkt, 0);                      // RDLENGTH
+    }
     return pkt;
 }
 
+std::vector<uint8_t> strip_edns(const std::vector<uint8_t>& query) {
+    std::vector<uint8_t> plain(query);
+    if (plain.size() < 12 + OPT_RR_SIZE || rd16(&plain[10]) != 1) return plain;
+    const uint8_t* opt = plain.data() + plain.size() - OPT_RR_SIZE;
+    if (opt[0] != 0 || rd16(opt + 1) != TYPE_OPT) return plain;
+    plain.resize(plain.size() - OPT_RR_SIZE);
+    plain[10] = plain[11] = 0;             // ARCOUNT = 0
+    return plain;
+}
+
 // ─────────────────────────────────────────────────────────────────────────────
-//  Name decoder  (RFC 1035 §4.1.4 — with pointer compression)
+//  Name cursor  (RFC 1035 §4.1.4 — with pointer compression)
 // ─────────────────────────────────────────────────────────────────────────────
-static std::string decode_name(const std::vector<uint8_t>& pkt, size_t& pos) {
-    std::string name;
-    bool   jumped    = false;
-    size_t saved_pos = 0;
-    int    jumps     = 0;
-
-    while (pos < pkt.size()) {
-        uint8_t len = pkt[pos];
-
-        if ((len & 0xC0) == 0xC0) {
-            // Compression pointer
-            if (pos + 1 >= pkt.size())
-                throw std::runtime_error("DNS: truncated compression pointer");
-            uint16_t offset = static_cast<uint16_t>((len & 0x3F) << 8) | pkt[pos + 1];
-            if (!jumped) { saved_pos = pos + 2; jumped = true; }
-            pos = offset;
-            if (++jumps > MAX_JUMPS)
-                throw std::runtime_error("DNS: compression pointer loop");
-        } else if (len == 0) {
-            if (!jumped) ++pos;
-            else         pos = saved_pos;
-            break;
-        } else {
-            ++pos;
-            if (pos + len > pkt.size())
+// Steps through the labels of a name inside a packet, following
+// compression pointers, without copying them.
+class LabelCursor {
+public:
+    LabelCursor(const uint8_t* p, size_t n, size_t pos) : p_(p), n_(n), pos_(pos) {}
+
+    // Next label → true; the end of the name → false.
+    // Throws std::runtime_error on a malformed name.
+    bool next(const uint8_t*& label, uint8_t& len) {
+        for (;;) {
+            if (pos_ >= n_)
+                throw std::runtime_error("DNS: name runs past end of packet");
+            uint8_t b = p_[pos_];
+            if ((b & 0xC0) == 0xC0) {
+                // Compression pointer
+                if (pos_ + 1 >= n_)
+                    throw std::runtime_error("DNS: truncated compression pointer");
+                if (!jumped_) { after_ = pos_ + 2; jumped_ = true; }
+                if (++jumps_ > MAX_JUMPS)
+                    throw std::runtime_error("DNS: compression pointer loop");
+                pos_ = static_cast<size_t>((b & 0x3F) << 8) | p_[pos_ + 1];
+                continue;
+            }
+            if (b & 0xC0)
+                throw std::runtime_error("DNS: unknown label type");
+            if (b == 0) {
+                if (!jumped_) after_ = pos_ + 1;
+                return false;
+            }
+            if (pos_ + 1 + b > n_)
                 throw std::runtime_error("DNS: label out of bounds");
-            if (!name.empty()) name += '.';
-            name.append(reinterpret_cast<const char*>(&pkt[pos]), len);
-            pos += len;
+            label = p_ + pos_ + 1;
+            len   = b;
+            pos_ += 1 + b;
+            return true;
         }
     }
+
+    // Offset just past the name where it started (once next() returned false).
+    size_t end() const { return after_; }
+
+private:
+    const uint8_t* p_;
+    size_t         n_;
+    size_t         pos_;
+    size_t         after_  = 0;
+    bool           jumped_ = false;
+    int            jumps_  = 0;
+};
+
+static inline uint8_t fold(uint8_t c) {
+    return (c >= 'A' && c <= 'Z') ? static_cast<uint8_t>(c + ('a' - 'A')) : c;
+}
+
+static std::string decode_name(const uint8_t* p, size_t n, size_t& pos) {
+    std::string    name;
+    LabelCursor    cur(p, n, pos);
+    const uint8_t* label;
+    uint8_t        len;
+    while (cur.next(label, len)) {
+        if (!name.empty()) name += '.';
+        name.append(reinterpret_cast<const char*>(label), len);
+    }
+    pos = cur.end();
     return name;
 }
 
+// Checks a name as decode_name() would and returns the offset past it.
+static size_t skip_name(const uint8_t* p, size_t n, size_t pos) {
+    LabelCursor    cur(p, n, pos);
+    const uint8_t* label;
+    uint8_t        len;
+    while (cur.next(label, len)) {}
+    return cur.end();
+}
+
 // ─────────────────────────────────────────────────────────────────────────────
-//  RDATA parser
+//  RDATA formatter  (text only for records that leave the resolver)
 // ─────────────────────────────────────────────────────────────────────────────
-static std::string parse_rdata(const std::vector<uint8_t>& pkt,
+static std::string parse_rdata(const uint8_t* pkt, size_t n,
                                 size_t rdata_start, uint16_t rdlen,
                                 uint16_t rtype) {
-    if (rdata_start + rdlen > pkt.size())
+    if (rdata_start + rdlen > n)
         throw std::runtime_error("DNS: RDATA extends past end of packet");
 
     size_t pos = rdata_start;
@@ -250,10 +350,16 @@ static std::string parse_rdata(const std::vector<uint8_t>& pkt,
 
     case TYPE_A: {
         if (rdlen != 4) throw std::runtime_error("DNS: A record bad RDLENGTH");
-        char buf[16];
-        std::snprintf(buf, sizeof(buf), "%u.%u.%u.%u",
-            pkt[pos], pkt[pos+1], pkt[pos+2], pkt[pos+3]);
-        return buf;
+        // Dotted quad by hand: the one RDATA every referral formats.
+        char buf[16], *out = buf;
+        for (int i = 0; i < 4; ++i) {
+            unsigned v = pkt[pos + i];
+            if (i) *out++ = '.';
+            if (v >= 100) *out++ = static_cast<char>('0' + v / 100);
+            if (v >= 10)  *out++ = static_cast<char>('0' + v / 10 % 10);
+            *out++ = static_cast<char>('0' + v % 10);
+        }
+        return std::string(buf, out);
     }
 
     case TYPE_AAAA: {
@@ -271,11 +377,11 @@ static std::string parse_rdata(const std::vector<uint8_t>& pkt,
     case TYPE_NS:
     case TYPE_CNAME:
     case TYPE_PTR:
-        return decode_name(pkt, pos);
+        return decode_name(pkt, n, pos);
 
     case TYPE_MX: {
         uint16_t pref = rd16(&pkt[pos]); pos += 2;
-        return std::to_string(pref) + " " + decode_name(pkt, pos);
+        return std::to_string(pref) + " " + decode_name(pkt, n, pos);
     }
 
     case TYPE_TXT: {
@@ -291,9 +397,9 @@ static std::string parse_rdata(const std::vector<uint8_t>& pkt,
     }
 
     case TYPE_SOA: {
-        std::string mname = decode_name(pkt, pos);
-        std::string rname = decode_name(pkt, pos);
-        if (pos + 20 > pkt.size()) return mname + " " + rname;
+        std::string mname = decode_name(pkt, n, pos);
+        std::string rname = decode_name(pkt, n, pos);
+        if (pos + 20 > n) return mname + " " + rname;
         uint32_t serial  = rd32(&pkt[pos]); pos += 4;
         uint32_t refresh = rd32(&pkt[pos]); pos += 4;
         /* retry  */ rd32(&pkt[pos]); pos += 4;
@@ -320,55 +426,179 @@ static std::string parse_rdata(const std::vector<uint8_t>& pkt,
 // ─────────────────────────────────────────────────────────────────────────────
 //  Response parser  (RFC 1035 §4.1)
 // ─────────────────────────────────────────────────────────────────────────────
-static Record parse_record(const std::vector<uint8_t>& pkt, size_t& pos) {
-    Record rec;
-    rec.name = decode_name(pkt, pos);
-    if (pos + 10 > pkt.size())
-        throw std::runtime_error("DNS: record header truncated");
-    rec.type = rd16(&pkt[pos]); pos += 2;
-    rec.cls  = rd16(&pkt[pos]); pos += 2;
-    rec.ttl  = rd32(&pkt[pos]); pos += 4;
-    uint16_t rdlen = rd16(&pkt[pos]); pos += 2;
-    rec.data = parse_rdata(pkt, pos, rdlen, rec.type);
-    pos += rdlen;
-    return rec;
-}
-
-Response parse_response(const std::vector<uint8_t>& data) {
-    if (data.size() < 12)
+PacketView::PacketView(const uint8_t* data, size_t size) : p_(data), n_(size) {
+    if (n_ < 12)
         throw std::runtime_error("DNS: packet too short (< 12 bytes)");
+    if (n_ > 0xFFFF)
+        throw std::runtime_error("DNS: packet longer than 65535 bytes");
 
-    Response resp;
-    resp.id    = rd16(&data[0]);
-    resp.flags = rd16(&data[2]);
-    resp.rcode = static_cast<uint8_t>(resp.flags & RCODE_MASK);
-    resp.truncated     = (resp.flags & FLAG_TC) != 0;
-    resp.authoritative = (resp.flags & FLAG_AA) != 0;
-
-    uint16_t qdcount = rd16(&data[4]);
-    uint16_t ancount = rd16(&data[6]);
-    uint16_t nscount = rd16(&data[8]);
-    uint16_t arcount = rd16(&data[10]);
+    id_    = rd16(p_);
+    flags_ = rd16(p_ + 2);
+    size_t qdcount = rd16(p_ + 4);
+    counts_[0]     = rd16(p_ + 6);
+    counts_[1]     = rd16(p_ + 8);
+    counts_[2]     = rd16(p_ + 10);
 
     size_t pos = 12;
+    for (size_t i = 0; i < qdcount; ++i)
+        pos = skip_name(p_, n_, pos) + 4;           // QNAME, QTYPE + QCLASS
+
+    // A record takes at least 11 bytes: refuse counts no packet could hold
+    // before sizing anything by them.
+    size_t total = counts_[0] + counts_[1] + counts_[2];
+    if (total * 11 > n_ - 12)
+        throw std::runtime_error("DNS: record counts exceed packet size");
+    RecordView* out = inline_;
+    if (total > INLINE_RECORDS) {
+        spill_.resize(total);
+        out = spill_.data();
+    }
+
+    for (size_t i = 0; i < total; ++i) {
+        RecordView& r = out[i];
+        r.name = static_cast<uint16_t>(pos);
+        pos = skip_name(p_, n_, pos);
+        if (pos + 10 > n_)
+            throw std::runtime_error("DNS: record header truncated");
+        r.type  = rd16(p_ + pos);
+        r.cls   = rd16(p_ + pos + 2);
+        r.ttl   = rd32(p_ + pos + 4);
+        r.rdlen = rd16(p_ + pos + 8);
+        r.rdata = static_cast<uint16_t>(pos + 10);
+        pos += 10 + r.rdlen;
+        if (pos > n_)
+            throw std::runtime_error("DNS: RDATA extends past end of packet");
+
+        // EDNS0: at most one OPT, owned by the root, in the additional
+        // section (RFC 6891 §6.1.1); its CLASS is the sender's UDP size.
+        if (r.type == TYPE_OPT) {
+            if (i < counts_[0] + counts_[1] || p_[r.name] != 0 || edns_payload_)
+                throw std::runtime_error("DNS: misplaced or repeated OPT record");
+            edns_payload_ = std::max<uint16_t>(r.cls, MAX_UDP_PAYLOAD);
+        }
+
+        // Whatever the accessors may decode later must be sound now.
+        switch (r.type) {
+        case TYPE_A:
+            if (r.rdlen != 4)  throw std::runtime_error("DNS: A record bad RDLENGTH");
+            break;
+        case TYPE_AAAA:
+            if (r.rdlen != 16) throw std::runtime_error("DNS: AAAA record bad RDLENGTH");
+            break;
+        case TYPE_NS:
+        case TYPE_CNAME:
+        case TYPE_PTR:
+            skip_name(p_, n_, r.rdata);
+            break;
+        case TYPE_MX:
+            if (r.rdlen < 3) throw std::runtime_error("DNS: MX record bad RDLENGTH");
+            skip_name(p_, n_, r.rdata + 2u);
+            break;
+        case TYPE_SOA:
+            skip_name(p_, n_, skip_name(p_, n_, r.rdata));
+            break;
+        default:
+            break;
+        }
+    }
+}
+
+PacketView::Section PacketView::section(int i) const {
+    const RecordView* base = spill_.empty() ? inline_ : spill_.data();
+    for (int k = 0; k < i; ++k) base += counts_[k];
+    Section s;
+    s.begin_ = base;
+    s.end_   = base + counts_[i];
+    return s;
+}
+
+// Offset of the first label of the name at `off`, past any leading
+// pointers (bounded like LabelCursor; a bad chain is left for it to report).
+static size_t first_label(const uint8_t* p, size_t n, size_t off) {
+    for (int jumps = 0; off + 1 < n && (p[off] & 0xC0) == 0xC0 && jumps < MAX_JUMPS; ++jumps)
+        off = static_cast<size_t>((p[off] & 0x3F) << 8) | p[off + 1];
+    return off;
+}
 
-    // Skip question section
-    for (int i = 0; i < qdcount; ++i) {
-        decode_name(data, pos);   // QNAME
-        pos += 4;                 // QTYPE + QCLASS
+bool PacketView::same_name(uint16_t a, uint16_t b) const {
+    // Compressed replies point glue owners at the NS targets: often the
+    // very same bytes.
+    if (a == b || first_label(p_, n_, a) == first_label(p_, n_, b)) return true;
+    LabelCursor    x(p_, n_, a), y(p_, n_, b);
+    const uint8_t *la, *lb;
+    uint8_t        na, nb;
+    for (;;) {
+        bool more = x.next(la, na);
+        if (more != y.next(lb, nb)) return false;
+        if (!more)                  return true;
+        if (na != nb)               return false;
+        for (uint8_t i = 0; i < na; ++i)
+            if (fold(la[i]) != fold(lb[i])) return false;
     }
+}
+
+bool PacketView::name_is(uint16_t off, const std::string& name) const {
+    size_t end = name.size();
+    if (end && name[end - 1] == '.') --end;
+    LabelCursor    cur(p_, n_, off);
+    const uint8_t* label;
+    uint8_t        len;
+    size_t         i = 0;
+    while (cur.next(label, len)) {
+        if (i > 0) {
+            if (i >= end || name[i] != '.') return false;
+            ++i;
+        }
+        if (i + len > end) return false;
+        for (uint8_t k = 0; k < len; ++k)
+            if (fold(label[k]) != fold(static_cast<uint8_t>(name[i + k]))) return false;
+        i += len;
+    }
+    return i == end;
+}
+
+std::string PacketView::name(uint16_t off) const {
+    size_t pos = off;
+    return decode_name(p_, n_, pos);
+}
+
+const RecordView* PacketView::find(Section s, uint16_t type, uint16_t owner) const {
+    for (const auto& r : s)
+        if (r.type == type && same_name(r.name, owner)) return &r;
+    return nullptr;
+}
 
-    // Answer section
-    for (int i = 0; i < ancount; ++i)
-        resp.answers.push_back(parse_record(data, pos));
+std::string PacketView::data(const RecordView& r) const {
+    return parse_rdata(p_, n_, r.rdata, r.rdlen, r.type);
+}
 
-    // Authority section
-    for (int i = 0; i < nscount; ++i)
-        resp.authorities.push_back(parse_record(data, pos));
+Record PacketView::record(const RecordView& r) const {
+    Record rec;
+    rec.name = name(r.name);
+    rec.type = r.type;
+    rec.cls  = r.cls;
+    rec.ttl  = r.ttl;
+    rec.data = data(r);
+    return rec;
+}
 
-    // Additional section
-    for (int i = 0; i < arcount; ++i)
-        resp.additionals.push_back(parse_record(data, pos));
+Response PacketView::response() const {
+    Response resp;
+    resp.id            = id_;
+    resp.flags         = flags_;
+    resp.rcode         = rcode();
+    resp.truncated     = truncated();
+    resp.authoritative = authoritative();
+    resp.edns_payload  = edns_payload();
+
+    auto fill = [this](std::vector<Record>& out, Section s) {
+        out.reserve(s.size());
+        for (const auto& r : s)
+            if (r.type != TYPE_OPT) out.push_back(record(r));
+    };
+    fill(resp.answers,     answers());
+    fill(resp.authorities, authorities());
+    fill(resp.additionals, additionals());
 
     // Compute min TTL across all answers (used as cache TTL).
     resp.min_ttl = 300;
@@ -377,10 +607,41 @@ Response parse_response(const std::vector<uint8_t>& data) {
         for (const auto& a : resp.answers)
             resp.min_ttl = std::min(resp.min_ttl, a.ttl);
     }
-
     return resp;
 }
 
+Response parse_response(const std::vector<uint8_t>& data) {
+    return PacketView(data).response();
+}
+
+// ─────────────────────────────────────────────────────────────────────────────
+//  Socket-call accounting  (read by bench/bench_transport)
+// ─────────────────────────────────────────────────────────────────────────────
+static std::atomic<size_t> g_net_syscalls{0};
+
+// Counts one socket-API call; see net_syscalls().
+#define NET_CALL(expr) (g_net_syscalls.fetch_add(1, std::memory_order_relaxed), (expr))
+
+size_t net_syscalls() { return g_net_syscalls.load(std::memory_order_relaxed); }
+
+static void set_sock_timeouts(socket_t sock, double timeout_secs) {
+#ifdef _WIN32
+    DWORD tv_ms = static_cast<DWORD>(timeout_secs * 1000);
+    NET_CALL(::setsockopt(sock, SOL_SOCKET, SO_RCVTIMEO,
+        reinterpret_cast<const char*>(&tv_ms), sizeof(tv_ms)));
+    NET_CALL(::setsockopt(sock, SOL_SOCKET, SO_SNDTIMEO,
+        reinterpret_cast<const char*>(&tv_ms), sizeof(tv_ms)));
+#else
+    timeval tv{};
+    tv.tv_sec  = static_cast<long>(timeout_secs);
+    tv.tv_usec = static_cast<long>((timeout_secs - tv.tv_sec) * 1e6);
+    NET_CALL(::setsockopt(sock, SOL_SOCKET, SO_RCVTIMEO,
+        reinterpret_cast<const char*>(&tv), sizeof(tv)));
+    NET_CALL(::setsockopt(sock, SOL_SOCKET, SO_SNDTIMEO,
+        reinterpret_cast<const char*>(&tv), sizeof(tv)));
+#endif
+}
+
 // ─────────────────────────────────────────────────────────────────────────────
 //  UDP transport  (RFC 1035 §4.2.1)
 // ─────────────────────────────────────────────────────────────────────────────
@@ -389,7 +650,7 @@ SendResult send_udp(const std::vector<uint8_t>& query,
                     uint16_t port, double timeout_secs) {
     SendResult result;
 
-    socket_t sock = ::socket(AF_INET, SOCK_DGRAM, IPPROTO_UDP);
+    socket_t sock = NET_CALL(::socket(AF_INET, SOCK_DGRAM, IPPROTO_UDP));
     if (sock == SOCK_INVALID) return result;
 
     sockaddr_in addr{};
@@ -398,12 +659,12 @@ SendResult send_udp(const std::vector<uint8_t>& query,
     addr.sin_addr.s_addr = inet_addr(server_ip.c_str());
 
     // Send the query
-    int sent = ::sendto(sock,
+    int sent = NET_CALL(::sendto(sock,
         reinterpret_cast<const char*>(query.data()),
         static_cast<int>(query.size()), 0,
-        reinterpret_cast<sockaddr*>(&addr), sizeof(addr));
+        reinterpret_cast<sockaddr*>(&addr), sizeof(addr)));
 
-    if (sent == SOCK_ERR) { CLOSE_SOCK(sock); return result; }
+    if (sent == SOCK_ERR) { NET_CALL(CLOSE_SOCK(sock)); return result; }
 
     // Wait for response with select() timeout
     fd_set fds;
@@ -413,17 +674,17 @@ SendResult send_udp(const std::vector<uint8_t>& query,
     tv.tv_sec  = static_cast<long>(timeout_secs);
     tv.tv_usec = static_cast<long>((timeout_secs - tv.tv_sec) * 1e6);
 
-    int sel = ::select(static_cast<int>(sock) + 1, &fds, nullptr, nullptr, &tv);
-    if (sel <= 0) { CLOSE_SOCK(sock); return result; }   // timeout or error
+    int sel = NET_CALL(::select(static_cast<int>(sock) + 1, &fds, nullptr, nullptr, &tv));
+    if (sel <= 0) { NET_CALL(CLOSE_SOCK(sock)); return result; }   // timeout or error
 
-    // Receive (buffer up to 4096 — EDNS can exceed 512)
-    static constexpr int RECV_BUF = 4096;
+    // Receive (EDNS answers can exceed 512)
+    static constexpr int RECV_BUF = MAX_EDNS_PAYLOAD;
     std::vector<uint8_t> buf(RECV_BUF);
-    int received = ::recvfrom(sock,
+    int received = NET_CALL(::recvfrom(sock,
         reinterpret_cast<char*>(buf.data()),
-        RECV_BUF, 0, nullptr, nullptr);
+        RECV_BUF, 0, nullptr, nullptr));
 
-    CLOSE_SOCK(sock);
+    NET_CALL(CLOSE_SOCK(sock));
 
     if (received <= 0) return result;
 
@@ -442,8 +703,8 @@ SendResult send_udp(const std::vector<uint8_t>& query,
 static bool tcp_recv_exact(socket_t sock, uint8_t* buf, int n) {
     int received = 0;
     while (received < n) {
-        int r = ::recv(sock,
-            reinterpret_cast<char*>(buf + received), n - received, 0);
+        int r = NET_CALL(::recv(sock,
+            reinterpret_cast<char*>(buf + received), n - received, 0));
         if (r <= 0) return false;
         received += r;
     }
@@ -455,53 +716,38 @@ SendResult send_tcp(const std::vector<uint8_t>& query,
                     uint16_t port, double timeout_secs) {
     SendResult result;
 
-    socket_t sock = ::socket(AF_INET, SOCK_STREAM, IPPROTO_TCP);
+    socket_t sock = NET_CALL(::socket(AF_INET, SOCK_STREAM, IPPROTO_TCP));
     if (sock == SOCK_INVALID) return result;
 
-    // Set send/receive timeouts
-#ifdef _WIN32
-    DWORD tv_ms = static_cast<DWORD>(timeout_secs * 1000);
-    ::setsockopt(sock, SOL_SOCKET, SO_RCVTIMEO,
-        reinterpret_cast<const char*>(&tv_ms), sizeof(tv_ms));
-    ::setsockopt(sock, SOL_SOCKET, SO_SNDTIMEO,
-        reinterpret_cast<const char*>(&tv_ms), sizeof(tv_ms));
-#else
-    timeval tv{};
-    tv.tv_sec  = static_cast<long>(timeout_secs);
-    tv.tv_usec = 0;
-    ::setsockopt(sock, SOL_SOCKET, SO_RCVTIMEO,
-        reinterpret_cast<const char*>(&tv), sizeof(tv));
-    ::setsockopt(sock, SOL_SOCKET, SO_SNDTIMEO,
-        reinterpret_cast<const char*>(&tv), sizeof(tv));
-#endif
+    set_sock_timeouts(sock, timeout_secs);
 
     sockaddr_in addr{};
     addr.sin_family      = AF_INET;
     addr.sin_port        = htons(port);
     addr.sin_addr.s_addr = inet_addr(server_ip.c_str());
 
-    if (::connect(sock, reinterpret_cast<sockaddr*>(&addr), sizeof(addr)) != 0) {
-        CLOSE_SOCK(sock); return result;
+    if (NET_CALL(::connect(sock, reinterpret_cast<sockaddr*>(&addr), sizeof(addr))) != 0) {
+        NET_CALL(CLOSE_SOCK(sock)); return result;
     }
 
     // Prefix the query with a 2-byte big-endian length  (RFC 1035 §4.2.2)
     uint16_t qlen = htons(static_cast<uint16_t>(query.size()));
-    ::send(sock, reinterpret_cast<const char*>(&qlen), 2, 0);
-    ::send(sock, reinterpret_cast<const char*>(query.data()),
-           static_cast<int>(query.size()), 0);
+    NET_CALL(::send(sock, reinterpret_cast<const char*>(&qlen), 2, 0));
+    NET_CALL(::send(sock, reinterpret_cast<const char*>(query.data()),
+                    static_cast<int>(query.size()), 0));
 
     // Read 2-byte response length
     uint8_t len_buf[2];
-    if (!tcp_recv_exact(sock, len_buf, 2)) { CLOSE_SOCK(sock); return result; }
+    if (!tcp_recv_exact(sock, len_buf, 2)) { NET_CALL(CLOSE_SOCK(sock)); return result; }
     uint16_t resp_len = static_cast<uint16_t>((len_buf[0] << 8) | len_buf[1]);
 
     // Read full response
     std::vector<uint8_t> buf(resp_len);
     if (!tcp_recv_exact(sock, buf.data(), resp_len)) {
-        CLOSE_SOCK(sock); return result;
+        NET_CALL(CLOSE_SOCK(sock)); return result;
     }
 
-    CLOSE_SOCK(sock);
+    NET_CALL(CLOSE_SOCK(sock));
     result.data     = std::move(buf);
     result.ok       = true;
     result.used_tcp = true;
@@ -519,6 +765,303 @@ SendResult send_query(const std::vector<uint8_t>& query,
     return r;
 }
 
+// ─────────────────────────────────────────────────────────────────────────────
+//  Pooled transport  (source-port randomisation, RFC 5452; TCP reuse and
+//  pipelining, RFC 7766)
+// ─────────────────────────────────────────────────────────────────────────────
+// Does `reply` answer `query`?  Same ID, QR set and the same question (name
+// compared case-insensitively) — stray or spoofed datagrams are ignored.
+bool reply_matches(const std::vector<uint8_t>& query,
+                   const uint8_t* reply, size_t len) {
+    if (query.size() < 12 || len < 12) return false;
+    if (reply[0] != query[0] || reply[1] != query[1]) return false;
+    if (!(reply[2] & 0x80) || rd16(&reply[4]) != 1) return false;
+    size_t pos = 12;
+    while (pos < query.size() && query[pos] != 0) {
+        size_t label = query[pos];
+        if (pos + label >= len || reply[pos] != query[pos]) return false;
+        for (size_t i = 1; i <= label; ++i)
+            if (std::tolower(reply[pos + i]) != std::tolower(query[pos + i])) return false;
+        pos += label + 1;
+    }
+    if (pos + 5 > query.size() || pos + 5 > len) return false;
+    return std::memcmp(&reply[pos], &query[pos], 5) == 0;    // root label + type + class
+}
+
+// A pooled connection may have been closed by the server; writing to it must
+// fail with EPIPE, not kill the process with SIGPIPE.
+#ifdef MSG_NOSIGNAL
+static constexpr int SEND_FLAGS = MSG_NOSIGNAL;
+#else
+static constexpr int SEND_FLAGS = 0;
+#endif
+
+static sockaddr_in upstream_addr(const std::string& ip, uint16_t port) {
+    sockaddr_in addr{};
+    addr.sin_family      = AF_INET;
+    addr.sin_port        = htons(port);
+    addr.sin_addr.s_addr = inet_addr(ip.c_str());
+    return addr;
+}
+
+Transport::Transport(size_t udp_pool, uint16_t port)
+    : udp_pool_(udp_pool), port_(port) {}
+
+Transport::~Transport() { close_all(); }
+
+// Opens a UDP socket bound to a random port in 1024–65535 (a few tries,
+// then whatever the kernel picks — its ephemeral ports are random too).
+std::intptr_t Transport::open_udp(uint16_t& bound_port) {
+    socket_t sock = NET_CALL(::socket(AF_INET, SOCK_DGRAM, IPPROTO_UDP));
+    if (sock == SOCK_INVALID) return -1;
+    for (int attempt = 0; attempt < 4; ++attempt) {
+        sockaddr_in local{};
+        local.sin_family      = AF_INET;
+        local.sin_addr.s_addr = htonl(INADDR_ANY);
+        local.sin_port        = htons(static_cast<uint16_t>(
+            attempt < 3 ? 1024 + random_index(65536 - 1024) : 0));
+        if (NET_CALL(::bind(sock, reinterpret_cast<sockaddr*>(&local), sizeof(local))) == 0) {
+            sockaddr_in got{};
+            socklen_t   len = sizeof(got);
+            bound_port = NET_CALL(::getsockname(sock, reinterpret_cast<sockaddr*>(&got), &len)) == 0
+                             ? ntohs(got.sin_port) : 0;
+            return static_cast<std::intptr_t>(sock);
+        }
+    }
+    NET_CALL(CLOSE_SOCK(sock));
+    return -1;
+}
+
+void Transport::set_udp_pool(size_t n) {
+    std::lock_guard<std::mutex> lk(mtx_);
+    udp_pool_ = n;
+    while (udp_idle_.size() > n) {
+        if (udp_idle_.back()->fd >= 0)
+            NET_CALL(CLOSE_SOCK(static_cast<socket_t>(udp_idle_.back()->fd)));
+        udp_idle_.pop_back();
+    }
+}
+
+Transport::UdpSocket* Transport::lease_udp() {
+    std::unique_ptr<UdpSocket> s;
+    {
+        std::lock_guard<std::mutex> lk(mtx_);
+        ++stats_.udp_leases;
+        if (!udp_idle_.empty()) {
+            s = std::move(udp_idle_.back());
+            udp_idle_.pop_back();
+        }
+    }
+    if (!s) {
+        s.reset(new UdpSocket);
+        s->buf.resize(MAX_EDNS_PAYLOAD);            // EDNS answers can exceed 512
+    }
+    if (s->fd < 0) {
+        s->fd   = open_udp(s->port);
+        s->uses = 0;
+        if (s->fd < 0) return nullptr;
+        std::lock_guard<std::mutex> lk(mtx_);
+        ++stats_.udp_opened;
+    }
+    ++s->uses;
+    return s.release();
+}
+
+void Transport::release_udp(UdpSocket* s) {
+    if (!s) return;
+    std::unique_ptr<UdpSocket> owned(s);
+    // Re-bind to a fresh random port now and then, so a long-lived process
+    // doesn't sit on one guessable source port.
+    if (udp_pool_ == 0 || owned->uses >= UDP_SOCKET_MAX_USES) {
+        NET_CALL(CLOSE_SOCK(static_cast<socket_t>(owned->fd)));
+        owned->fd = -1;
+    }
+    std::lock_guard<std::mutex> lk(mtx_);
+    if (udp_pool_ > 0 && udp_idle_.size() < udp_pool_)
+        udp_idle_.push_back(std::move(owned));
+    else if (owned->fd >= 0)
+        NET_CALL(CLOSE_SOCK(static_cast<socket_t>(owned->fd)));
+}
+
+bool Transport::send_udp(UdpSocket& s, const std::vector<uint8_t>& query,
+                         const std::string& ip) {
+    sockaddr_in addr = upstream_addr(ip, port_);
+    int sent = NET_CALL(::sendto(static_cast<socket_t>(s.fd),
+        reinterpret_cast<const char*>(query.data()),
+        static_cast<int>(query.size()), 0,
+        reinterpret_cast<sockaddr*>(&addr), sizeof(addr)));
+    return sent != SOCK_ERR;
+}
+
+int Transport::recv_udp(UdpSocket& s, const std::vector<uint8_t>& query,
+                        double timeout_ms, std::string& from) {
+    using Clock = std::chrono::steady_clock;
+    socket_t sock     = static_cast<socket_t>(s.fd);
+    auto     deadline = Clock::now() + std::chrono::microseconds(
+                                           static_cast<long long>(timeout_ms * 1000));
+    for (;;) {
+        auto wait = std::chrono::duration_cast<std::chrono::microseconds>(
+                        deadline - Clock::now()).count();
+        if (wait < 0) wait = 0;
+        fd_set fds;
+        FD_ZERO(&fds);
+        FD_SET(sock, &fds);
+        timeval tv{};
+        tv.tv_sec  = static_cast<long>(wait / 1000000);
+        tv.tv_usec = static_cast<long>(wait % 1000000);
+        int sel = NET_CALL(::select(static_cast<int>(sock) + 1, &fds, nullptr, nullptr, &tv));
+        if (sel < 0) return -1;
+        if (sel == 0) return 0;
+
+        sockaddr_in peer{};
+        socklen_t   plen = sizeof(peer);
+        int n = NET_CALL(::recvfrom(sock, reinterpret_cast<char*>(s.buf.data()),
+                                    static_cast<int>(s.buf.size()), 0,
+                                    reinterpret_cast<sockaddr*>(&peer), &plen));
+        if (n <= 0) return -1;
+        if (ntohs(peer.sin_port) != port_ ||
+            !reply_matches(query, s.buf.data(), static_cast<size_t>(n)))
+            continue;                               // stray, late or spoofed
+        char ip[INET_ADDRSTRLEN];
+        from = inet_ntop(AF_INET, &peer.sin_addr, ip, sizeof(ip)) ? ip : "";
+        return n;
+    }
+}
+
+Transport::TcpConn Transport::lease_tcp(const std::string& ip, double timeout_secs,
+                                        bool& reused) {
+    using Clock = std::chrono::steady_clock;
+    auto now = Clock::now();
+    {
+        std::lock_guard<std::mutex> lk(mtx_);
+        auto it = tcp_idle_.find(ip);
+        while (it != tcp_idle_.end() && !it->second.empty()) {
+            TcpConn c = it->second.back();
+            it->second.pop_back();
+            if (std::chrono::duration<double>(now - c.last_used).count() < TCP_IDLE_TIMEOUT_S) {
+                reused = true;
+                return c;
+            }
+            NET_CALL(CLOSE_SOCK(static_cast<socket_t>(c.fd)));
+        }
+    }
+
+    reused = false;
+    TcpConn c;
+    socket_t sock = NET_CALL(::socket(AF_INET, SOCK_STREAM, IPPROTO_TCP));
+    if (sock == SOCK_INVALID) return c;
+    set_sock_timeouts(sock, timeout_secs);
+    sockaddr_in addr = upstream_addr(ip, port_);
+    if (NET_CALL(::connect(sock, reinterpret_cast<sockaddr*>(&addr), sizeof(addr))) != 0) {
+        NET_CALL(CLOSE_SOCK(sock));
+        return c;
+    }
+    c.fd = static_cast<std::intptr_t>(sock);
+    std::lock_guard<std::mutex> lk(mtx_);
+    ++stats_.tcp_connects;
+    return c;
+}
+
+void Transport::release_tcp(const std::string& ip, TcpConn c) {
+    c.last_used = std::chrono::steady_clock::now();
+    std::lock_guard<std::mutex> lk(mtx_);
+    auto& idle = tcp_idle_[ip];
+    if (idle.size() < TCP_IDLE_PER_SERVER) idle.push_back(c);
+    else NET_CALL(CLOSE_SOCK(static_cast<socket_t>(c.fd)));
+}
+
+// Reads exactly n bytes, counting each recv().
+static bool tcp_read(socket_t sock, uint8_t* buf, size_t n) {
+    size_t got = 0;
+    while (got < n) {
+        int r = NET_CALL(::recv(sock, reinterpret_cast<char*>(buf + got),
+                                static_cast<int>(n - got), 0));
+        if (r <= 0) return false;
+        got += static_cast<size_t>(r);
+    }
+    return true;
+}
+
+std::vector<SendResult> Transport::tcp_pipeline(
+        const std::vector<std::vector<uint8_t>>& queries,
+        const std::string& ip, double timeout_secs) {
+    std::vector<SendResult> out(queries.size());
+    size_t answered = 0;
+
+    for (int attempt = 0; attempt < 2 && answered < queries.size(); ++attempt) {
+        bool    reused = false;
+        TcpConn c      = lease_tcp(ip, timeout_secs, reused);
+        if (c.fd < 0) break;
+        socket_t sock = static_cast<socket_t>(c.fd);
+
+        // Every outstanding query goes out in a single write.
+        std::vector<uint8_t> wire;
+        for (size_t i = 0; i < queries.size(); ++i) {
+            if (out[i].ok) continue;
+            wr16(wire, static_cast<uint16_t>(queries[i].size()));
+            wire.insert(wire.end(), queries[i].begin(), queries[i].end());
+        }
+        size_t pending = queries.size() - answered;
+        if (reused) {
+            std::lock_guard<std::mutex> lk(mtx_);
+            stats_.tcp_reused += pending;
+        }
+        bool   ok   = true;
+        size_t sent = 0;
+        while (ok && sent < wire.size()) {
+            int n = NET_CALL(::send(sock, reinterpret_cast<const char*>(wire.data() + sent),
+                                    static_cast<int>(wire.size() - sent), SEND_FLAGS));
+            if (n <= 0) ok = false;
+            else        sent += static_cast<size_t>(n);
+        }
+
+        // Replies may come back in any order (RFC 7766 §7).
+        size_t before = answered;
+        while (ok && pending > 0) {
+            uint8_t len_buf[2];
+            if (!tcp_read(sock, len_buf, 2)) { ok = false; break; }
+            std::vector<uint8_t> msg(rd16(len_buf));
+            if (!tcp_read(sock, msg.data(), msg.size())) { ok = false; break; }
+            for (size_t i = 0; i < queries.size(); ++i) {
+                if (out[i].ok || !reply_matches(queries[i], msg.data(), msg.size())) continue;
+                out[i].data     = std::move(msg);
+                out[i].ok       = true;
+                out[i].used_tcp = true;
+                ++answered; --pending;
+                break;
+            }
+        }
+        if (ok) { release_tcp(ip, c); break; }
+
+        NET_CALL(CLOSE_SOCK(sock));
+        // A kept-alive connection the server has since closed fails on the
+        // first read; that is worth exactly one retry on a new connection.
+        if (!reused || answered != before) break;
+    }
+    return out;
+}
+
+SendResult Transport::tcp_query(const std::vector<uint8_t>& query,
+                                const std::string& ip, double timeout_secs) {
+    auto rs = tcp_pipeline({query}, ip, timeout_secs);
+    return std::move(rs[0]);
+}
+
+Transport::Stats Transport::stats() {
+    std::lock_guard<std::mutex> lk(mtx_);
+    return stats_;
+}
+
+void Transport::close_all() {
+    std::lock_guard<std::mutex> lk(mtx_);
+    for (auto& s : udp_idle_)
+        if (s->fd >= 0) NET_CALL(CLOSE_SOCK(static_cast<socket_t>(s->fd)));
+    udp_idle_.clear();
+    for (auto& kv : tcp_idle_)
+        for (auto& c : kv.second) NET_CALL(CLOSE_SOCK(static_cast<socket_t>(c.fd)));
+    tcp_idle_.clear();
+}
+
 // ─────────────────────────────────────────────────────────────────────────────
 //  LRU + TTL Cache implementation
 // ─────────────────────────────────────────────────────────────────────────────
@@ -545,10 +1088,22 @@ bool Cache::get(const std::string& key, Response& out) {
     lru_.splice(lru_.begin(), lru_, it->second);
     ++hits_;
     out = entry.resp;
+
+    // Hand out the remaining lifetime, not the TTL the record arrived with.
+    uint32_t age32 = static_cast<uint32_t>(age_s);
+    auto age_rec = [age32](std::vector<Record>& recs) {
+        for (auto& r : recs) r.ttl = (r.ttl > age32) ? r.ttl - age32 : 0;
+    };
+    age_rec(out.answers);
+    age_rec(out.authorities);
+    out.min_ttl = entry.ttl - age32;
     return true;
 }
 
 void Cache::put(const std::string& key, const Response& res) {
+    // TTL 0 means "use once, do not cache" (RFC 1035 §3.2.1).
+    if (res.min_ttl == 0) return;
+
     std::lock_guard<std::mutex> lk(mtx_);
     auto it = idx_.find(key);
     if (it != idx_.end()) {
@@ -564,7 +1119,7 @@ void Cache::put(const std::string& key, const Response& res) {
     Entry e;
     e.resp      = res;
     e.stored_at = std::chrono::steady_clock::now();
-    e.ttl       = (res.min_ttl > 0) ? res.min_ttl : 60;
+    e.ttl       = std::min(res.min_ttl, MAX_CACHE_TTL);
     lru_.push_front({key, std::move(e)});
     idx_[key] = lru_.begin();
 }
@@ -581,115 +1136,775 @@ Cache::Stats Cache::stats() const {
     return { lru_.size(), hits_, misses_ };
 }
 
+// ─────────────────────────────────────────────────────────────────────────────
+//  Delegation (zone-cut) cache implementation
+// ─────────────────────────────────────────────────────────────────────────────
+std::string normalize_name(const std::string& name) {
+    std::string out;
+    out.reserve(name.size());
+    for (char c : name)
+        out += static_cast<char>(std::tolower(static_cast<unsigned char>(c)));
+    while (!out.empty() && out.back() == '.') out.pop_back();
+    return out;
+}
+
+DelegationCache::DelegationCache(size_t max_entries) : max_(max_entries) {}
+
+void DelegationCache::make_room_locked(Clock::time_point now) {
+    if (zones_.size() + addrs_.size() < max_) return;
+    for (auto it = zones_.begin(); it != zones_.end();)
+        it = (it->second.expires <= now) ? zones_.erase(it) : std::next(it);
+    for (auto it = addrs_.begin(); it != addrs_.end();)
+        it = (it->second.expires <= now) ? addrs_.erase(it) : std::next(it);
+    // Still full of live entries — drop an arbitrary one of each kind.
+    if (zones_.size() + addrs_.size() >= max_) {
+        if (!zones_.empty()) zones_.erase(zones_.begin());
+        if (!addrs_.empty()) addrs_.erase(addrs_.begin());
+    }
+}
+
+void DelegationCache::put_zone(const std::string& zone,
+                               const std::vector<std::string>& ns_names,
+                               uint32_t ttl) {
+    std::string key = normalize_name(zone);
+    if (key.empty() || ns_names.empty() || ttl == 0) return;   // never cache the root
+    std::lock_guard<std::mutex> lk(mtx_);
+    auto now = Clock::now();
+    if (!zones_.count(key)) make_room_locked(now);
+    ZoneEntry& e = zones_[key];
+    e.ns_names.clear();
+    for (const auto& ns : ns_names) e.ns_names.push_back(normalize_name(ns));
+    e.expires = now + std::chrono::seconds(ttl);
+}
+
+void DelegationCache::put_address(const std::string& ns_name,
+                                  const std::string& ip, uint32_t ttl) {
+    if (ip.empty() || ttl == 0) return;
+    std::string key = normalize_name(ns_name);
+    std::lock_guard<std::mutex> lk(mtx_);
+    auto now = Clock::now();
+    if (!addrs_.count(key)) make_room_locked(now);
+    addrs_[key] = { ip, now + std::chrono::seconds(ttl) };
+}
+
+std::string DelegationCache::lookup_address_locked(const std::string& ns_name,
+                                                   Clock::time_point now) {
+    auto it = addrs_.find(ns_name);
+    if (it == addrs_.end()) return "";
+    if (it->second.expires <= now) { addrs_.erase(it); return ""; }
+    return it->second.ip;
+}
+
+std::string DelegationCache::address(const std::string& ns_name) {
+    std::lock_guard<std::mutex> lk(mtx_);
+    return lookup_address_locked(normalize_name(ns_name), Clock::now());
+}
+
+bool DelegationCache::closest(const std::string& qname, std::string& zone,
+                              std::vector<std::string>& server_ips) {
+    std::string name = normalize_name(qname);
+    std::lock_guard<std::mutex> lk(mtx_);
+    auto now = Clock::now();
+
+    // Try "a.b.github.com", "b.github.com", "github.com", "com" in turn.
+    size_t pos = 0;
+    while (pos != std::string::npos && pos < name.size()) {
+        std::string candidate = name.substr(pos);
+        auto it = zones_.find(candidate);
+        if (it != zones_.end()) {
+            if (it->second.expires <= now) {
+                zones_.erase(it);
+            } else {
+                std::vector<std::string> ips;
+                for (const auto& ns : it->second.ns_names) {
+                    std::string ip = lookup_address_locked(ns, now);
+                    if (!ip.empty()) ips.push_back(ip);
+                }
+                if (!ips.empty()) {
+                    zone       = candidate;
+                    server_ips = std::move(ips);
+                    ++hits_;
+                    return true;
+                }
+            }
+        }
+        pos = name.find('.', pos);
+        if (pos != std::string::npos) ++pos;
+    }
+    ++misses_;
+    return false;
+}
+
+void DelegationCache::export_live(std::vector<ZoneRecord>&    zones,
+                                  std::vector<AddressRecord>& addresses) const {
+    std::lock_guard<std::mutex> lk(mtx_);
+    auto now       = Clock::now();
+    auto remaining = [now](Clock::time_point expires) {
+        return static_cast<uint32_t>(
+            std::chrono::duration_cast<std::chrono::seconds>(expires - now).count());
+    };
+    zones.reserve(zones.size() + zones_.size());
+    for (const auto& kv : zones_) {
+        uint32_t ttl = kv.second.expires > now ? remaining(kv.second.expires) : 0;
+        if (ttl > 0) zones.push_back({ kv.first, kv.second.ns_names, ttl });
+    }
+    addresses.reserve(addresses.size() + addrs_.size());
+    for (const auto& kv : addrs_) {
+        uint32_t ttl = kv.second.expires > now ? remaining(kv.second.expires) : 0;
+        if (ttl > 0) addresses.push_back({ kv.first, kv.second.ip, ttl });
+    }
+}
+
+void DelegationCache::clear() {
+    std::lock_guard<std::mutex> lk(mtx_);
+    zones_.clear();
+    addrs_.clear();
+    hits_ = misses_ = 0;
+}
+
+DelegationCache::Stats DelegationCache::stats() const {
+    std::lock_guard<std::mutex> lk(mtx_);
+    return { zones_.size(), addrs_.size(), hits_, misses_ };
+}
+
+// ─────────────────────────────────────────────────────────────────────────────
+//  Server infrastructure cache implementation
+// ─────────────────────────────────────────────────────────────────────────────
+InfraCache::InfraCache(size_t max_entries) : max_(max_entries) {}
+
+InfraCache::Entry& InfraCache::entry_locked(const std::string& ip) {
+    auto now = Clock::now();
+    auto it  = servers_.find(ip);
+    if (it != servers_.end()) {
+        // History older than INFRA_TTL_S is stale — start over as unknown.
+        if (now - it->second.updated > std::chrono::seconds(INFRA_TTL_S)) {
+            it->second          = Entry{};
+            it->second.s.ip     = ip;
+        }
+        it->second.updated = now;
+        return it->second;
+    }
+    if (servers_.size() >= max_) {
+        auto oldest = servers_.begin();
+        for (auto i = servers_.begin(); i != servers_.end(); ++i)
+            if (i->second.updated < oldest->second.updated) oldest = i;
+        servers_.erase(oldest);
+    }
+    Entry& e  = servers_[ip];
+    e.s.ip    = ip;
+    e.updated = now;
+    return e;
+}
+
+double InfraCache::rto_locked(const Entry& e) const {
+    double base = e.measured ? e.s.srtt_ms + 4.0 * e.s.rttvar_ms : INFRA_INITIAL_RTO;
+    base = std::max(base, INFRA_MIN_RTO);
+    return std::min(base * e.s.backoff, INFRA_MAX_RTO);
+}
+
+void InfraCache::record_sent(const std::string& ip) {
+    std::lock_guard<std::mutex> lk(mtx_);
+    ++entry_locked(ip).s.queries;
+}
+
+void InfraCache::record_rtt(const std::string& ip, double ms) {
+    std::lock_guard<std::mutex> lk(mtx_);
+    Entry& e = entry_locked(ip);
+    if (!e.measured) {                      // RFC 6298 §2.2
+        e.s.srtt_ms   = ms;
+        e.s.rttvar_ms = ms / 2.0;
+        e.measured    = true;
+    } else {                                // RFC 6298 §2.3 (α = 1/8, β = 1/4)
+        e.s.rttvar_ms = 0.75 * e.s.rttvar_ms + 0.25 * std::fabs(e.s.srtt_ms - ms);
+        e.s.srtt_ms   = 0.875 * e.s.srtt_ms + 0.125 * ms;
+    }
+    e.s.backoff = 1;
+    ++e.s.responses;
+}
+
+void InfraCache::record_timeout(const std::string& ip) {
+    std::lock_guard<std::mutex> lk(mtx_);
+    Entry& e = entry_locked(ip);
+    e.s.backoff = std::min(e.s.backoff * 2, INFRA_MAX_BACKOFF);
+    ++e.s.timeouts;
+}
+
+void InfraCache::record_failure(const std::string& ip) {
+    std::lock_guard<std::mutex> lk(mtx_);
+    Entry& e = entry_locked(ip);
+    e.s.backoff = std::min(e.s.backoff * 2, INFRA_MAX_BACKOFF);
+    ++e.s.failures;
+}
+
+// Forgotten with the rest of the entry after INFRA_TTL_S, so a server that
+// has since been upgraded gets EDNS0 again (as Unbound's edns_lame does).
+void InfraCache::record_no_edns(const std::string& ip) {
+    std::lock_guard<std::mutex> lk(mtx_);
+    entry_locked(ip).s.no_edns = true;
+}
+
+bool InfraCache::no_edns(const std::string& ip) {
+    std::lock_guard<std::mutex> lk(mtx_);
+    auto it = servers_.find(ip);
+    return it != servers_.end() && it->second.s.no_edns &&
+           Clock::now() - it->second.updated <= std::chrono::seconds(INFRA_TTL_S);
+}
+
+double InfraCache::rto_ms(const std::string& ip) {
+    std::lock_guard<std::mutex> lk(mtx_);
+    auto it = servers_.find(ip);
+    if (it == servers_.end() ||
+        Clock::now() - it->second.updated > std::chrono::seconds(INFRA_TTL_S))
+        return INFRA_INITIAL_RTO;
+    return rto_locked(it->second);
+}
+
+std::vector<std::string> InfraCache::rank(const std::vector<std::string>& ips) {
+    std::vector<std::pair<double, std::string>> scored;
+    scored.reserve(ips.size());
+    for (const auto& ip : ips) scored.emplace_back(rto_ms(ip), ip);
+    // Shuffle first so equal RTOs (e.g. all-unknown root servers) rotate.
+    for (size_t i = scored.size(); i > 1; --i)
+        std::swap(scored[i - 1], scored[random_index(i)]);
+    std::stable_sort(scored.begin(), scored.end(),
+                     [](const auto& a, const auto& b) { return a.first < b.first; });
+    std::vector<std::string> out;
+    out.reserve(scored.size());
+    for (auto& sc : scored) out.push_back(std::move(sc.second));
+    return out;
+}
+
+std::vector<InfraCache::ServerStats> InfraCache::snapshot() {
+    std::lock_guard<std::mutex> lk(mtx_);
+    std::vector<ServerStats> out;
+    out.reserve(servers_.size());
+    for (const auto& kv : servers_) {
+        ServerStats s = kv.second.s;
+        s.rto_ms = rto_locked(kv.second);
+        out.push_back(s);
+    }
+    return out;
+}
+
+void InfraCache::clear() {
+    std::lock_guard<std::mutex> lk(mtx_);
+    servers_.clear();
+}
+
+// ─────────────────────────────────────────────────────────────────────────────
+//  Per-resolution budget
+// ─────────────────────────────────────────────────────────────────────────────
+double Trace::remaining_ms() {
+    double left = std::chrono::duration<double, std::milli>(deadline - Clock::now()).count();
+    if (left <= 0.0 && exhausted.empty()) exhausted = "deadline";
+    return left;
+}
+
+bool Trace::charge() {
+    if (remaining_ms() <= 0.0) return false;
+    if (queries >= max_queries) {
+        if (exhausted.empty()) exhausted = "query limit";
+        return false;
+    }
+    ++queries;
+    return true;
+}
+
+// ─────────────────────────────────────────────────────────────────────────────
+//  Per-zone statistics implementation
+// ─────────────────────────────────────────────────────────────────────────────
+ZoneStats::ZoneStats(size_t max_zones) : max_(max_zones) {}
+
+void ZoneStats::record(const TraceHop& hop) {
+    std::lock_guard<std::mutex> lk(mtx_);
+    auto it = zones_.find(hop.zone);
+    if (it == zones_.end()) {
+        if (zones_.size() >= max_) return;       // bounded; existing zones keep counting
+        it = zones_.emplace(hop.zone, Stats{}).first;
+        it->second.zone = hop.zone;
+    }
+    Stats& z = it->second;
+    ++z.queries;
+    if (hop.ns_lookup) ++z.ns_lookups;
+    const std::string& o = hop.outcome;
+    if      (o == "referral")                      ++z.referrals;
+    else if (o == "truncated")                     ++z.truncated;
+    else if (o == "timeout" || o == "superseded") { ++z.timeouts; return; }
+    else if (o == "error")                         ++z.errors;
+    else                                           ++z.answers;
+    if (hop.rtt_ms > 0.0) {
+        z.total_ms += hop.rtt_ms;
+        z.max_ms    = std::max(z.max_ms, hop.rtt_ms);
+    }
+}
+
+std::vector<ZoneStats::Stats> ZoneStats::snapshot() {
+    std::lock_guard<std::mutex> lk(mtx_);
+    std::vector<Stats> out;
+    out.reserve(zones_.size());
+    for (const auto& kv : zones_) out.push_back(kv.second);
+    return out;
+}
+
+void ZoneStats::clear() {
+    std::lock_guard<std::mutex> lk(mtx_);
+    zones_.clear();
+}
+
 // ─────────────────────────────────────────────────────────────────────────────
 //  Recursive Resolver implementation
 // ─────────────────────────────────────────────────────────────────────────────
-Resolver::Resolver(Cache* cache) : cache_(cache) {}
+Resolver::Resolver(Cache* cache) : cache_(cache) {
+    roots_.assign(ROOT_SERVERS, ROOT_SERVERS + NUM_ROOT_SERVERS);
+}
 
-// walk() — traverses the delegation chain from ns_ip down until an answer
-//           (or authoritative NXDOMAIN) is found.
-std::string Resolver::walk(const std::string& domain, uint16_t qtype,
-                            const std::string& ns_ip,
-                            std::vector<std::string>& path,
-                            bool& used_tcp, int depth) {
-    if (depth > MAX_REFERRALS) return "";
+void Resolver::set_root_hints(const std::vector<std::string>& ips) {
+    if (!ips.empty()) roots_ = ips;
+}
 
-    // Avoid revisiting the same server in a single resolution chain
-    for (const auto& p : path)
-        if (p == ns_ip) return "";
+void Resolver::set_upstream_port(uint16_t port) {
+    if (port != 0) transport_.set_port(port);
+}
 
-    auto query = build_query(domain, qtype, 0, false);  // RD=false for recursive walk
+void Resolver::set_limits(double deadline_s, int max_queries) {
+    if (deadline_s > 0.0) deadline_s_  = deadline_s;
+    if (max_queries > 0)  max_queries_ = max_queries;
+}
 
-    path.push_back(ns_ip);
-    auto sr = send_udp(query, ns_ip, 53, 2.0);  // 2-second timeout per hop
-    if (!sr.ok) return "";
-    if (sr.used_tcp) used_tcp = true;
+void Resolver::set_edns_payload(int bytes) {
+    edns_ = bytes <= 0 ? 0 : static_cast<uint16_t>(
+        std::min<int>(std::max<int>(bytes, MAX_UDP_PAYLOAD), MAX_EDNS_PAYLOAD));
+}
 
-    // If truncated, retry via TCP
-    if (sr.truncated) {
-        auto tr = send_tcp(query, ns_ip, 53, 5.0);
-        if (tr.ok) { sr = tr; used_tcp = true; }
+void Resolver::configure_from_env() {
+    if (const char* hints = std::getenv("DNS_ROOT_HINTS")) {
+        std::vector<std::string> ips;
+        std::string ip;
+        std::istringstream ss(hints);
+        while (std::getline(ss, ip, ','))
+            if (!ip.empty()) ips.push_back(ip);
+        set_root_hints(ips);
     }
+    if (const char* port = std::getenv("DNS_UPSTREAM_PORT"))
+        set_upstream_port(static_cast<uint16_t>(std::atoi(port)));
+    if (const char* secs = std::getenv("DNS_RESOLVE_DEADLINE"))
+        set_limits(std::atof(secs), 0);
+    if (const char* cap = std::getenv("DNS_MAX_UPSTREAM_QUERIES"))
+        set_limits(0.0, std::atoi(cap));
+    if (const char* edns = std::getenv("DNS_EDNS_PAYLOAD"))
+        set_edns_payload(std::atoi(edns));
+}
 
-    Response resp;
-    try {
-        resp = parse_response(sr.data);
-    } catch (...) { return ""; }
+std::vector<std::string> Resolver::start_servers(const std::string& name,
+                                                 std::string& zone) {
+    std::vector<std::string> ips;
+    if (deleg_.closest(name, zone, ips)) return ips;
 
-    // ── NXDOMAIN ─────────────────────────────────────────────────────────────
-    if (resp.rcode == 3) return "";   // NXDOMAIN
+    // No cached zone — the root hints (exchange() orders them by RTT).
+    zone = ".";
+    return roots_;
+}
 
-    // ── Answers ──────────────────────────────────────────────────────────────
-    if (!resp.answers.empty()) {
-        // Check for CNAME chain
-        std::string cname_target;
-        for (const auto& ans : resp.answers) {
-            if (ans.type == TYPE_CNAME && qtype != TYPE_CNAME) {
-                cname_target = ans.data;
-            }
-            if (ans.type == qtype) return ans.data;
+// Is `name` equal to or below `zone`?  (bailiwick check for referrals)
+static bool in_zone(const std::string& name, const std::string& zone) {
+    std::string n = normalize_name(name), z = normalize_name(zone);
+    if (z.empty()) return true;
+    if (n == z) return true;
+    return n.size() > z.size() &&
+           n.compare(n.size() - z.size(), z.size(), z) == 0 &&
+           n[n.size() - z.size() - 1] == '.';
+}
+
+// Trace label for a zone: the normalised name, "." for the root.
+static std::string zone_label(const std::string& zone) {
+    std::string z = normalize_name(zone);
+    return z.empty() ? "." : z;
+}
+
+SendResult Resolver::exchange(const std::vector<uint8_t>& query,
+                              const std::vector<std::string>& servers,
+                              std::string& winner,
+                              Trace& trace,
+                              const TraceHop& ask) {
+    using Clock = std::chrono::steady_clock;
+    using ms    = std::chrono::duration<double, std::milli>;
+
+    auto hop = [&](const std::string& ip, Clock::time_point sent, double rtt,
+                   const char* outcome, const std::string& detail = "") {
+        TraceHop h  = ask;
+        h.server    = ip;
+        h.start_ms  = ms(sent - trace.start).count();
+        h.rtt_ms    = rtt;
+        h.outcome   = outcome;
+        h.detail    = detail;
+        return h;
+    };
+
+    SendResult result;
+    auto order = infra_.rank(servers);
+    if (order.empty() || trace.remaining_ms() <= 0.0) return result;
+
+    Transport::UdpSocket* sock = transport_.lease_udp();
+    if (!sock) return result;
+
+    struct Attempt {
+        const std::string* ip;
+        Clock::time_point  sent;
+        bool               open;
+        bool               edns;             // sent with the OPT record
+    };
+    std::vector<Attempt> live;
+    live.reserve(order.size() * 2);          // each server at most twice (EDNS, plain)
+
+    const std::vector<uint8_t> plain = strip_edns(query);
+    const bool                 edns  = plain.size() != query.size();
+
+    // The hop gets HOP_TIMEOUT_S, or whatever is left of the resolution's.
+    auto   start       = Clock::now();
+    auto   deadline    = std::min(trace.deadline, start + std::chrono::milliseconds(
+                                                     static_cast<int>(HOP_TIMEOUT_S * 1000)));
+    auto   next_launch = start;
+    size_t next        = 0;
+    std::string from;
+    TraceHop    answer;                          // the winner's hop, logged last
+    bool        won_edns = false;                // the winner was sent the OPT record
+
+    // Servers known to reject EDNS0 get the plain query.
+    auto send = [&](const std::string& ip, bool with_opt) {
+        if (!transport_.send_udp(*sock, with_opt ? query : plain, ip)) {
+            infra_.record_failure(ip);
+            trace.hops.push_back(hop(ip, Clock::now(), 0.0, "error", "send failed"));
+            return;
         }
-        // Follow CNAME if found — try from current server first, then roots
-        if (!cname_target.empty()) {
-            // Try asking the same server about the CNAME target
-            auto r = walk(cname_target, qtype, ns_ip, path, used_tcp, depth + 1);
-            if (!r.empty()) return r;
-            // Fall back to root-servers for the CNAME target
-            for (int i = 0; i < 3; ++i) {
-                int idx = std::rand() % NUM_ROOT_SERVERS;
-                r = walk(cname_target, qtype, ROOT_SERVERS[idx], path, used_tcp, depth + 1);
-                if (!r.empty()) return r;
-            }
+        infra_.record_sent(ip);
+        auto now = Clock::now();
+        live.push_back({&ip, now, true, with_opt});
+        // Next-best server goes out if this one is silent for its RTO.
+        next_launch = now + std::chrono::microseconds(
+                                static_cast<long long>(infra_.rto_ms(ip) * 1000));
+    };
+    auto launch = [&]() {
+        if (!trace.charge()) { next = order.size(); return; }   // budget spent
+        const std::string& ip = order[next++];
+        send(ip, edns && !infra_.no_edns(ip));
+    };
+
+    while (!result.ok) {
+        auto now      = Clock::now();
+        bool any_open = std::any_of(live.begin(), live.end(),
+                                    [](const Attempt& a) { return a.open; });
+        if (next < order.size() && (now >= next_launch || !any_open)) { launch(); continue; }
+        if (!any_open || now >= deadline) break;
+
+        auto wake = (next < order.size()) ? std::min(deadline, next_launch) : deadline;
+        int  n    = transport_.recv_udp(*sock, query, ms(wake - now).count(), from);
+        if (n < 0) break;
+        if (n == 0) continue;
+
+        // Only a server we actually asked (and that is still pending) counts.
+        auto a = std::find_if(live.begin(), live.end(), [&](const Attempt& x) {
+            return x.open && *x.ip == from;
+        });
+        if (a == live.end()) continue;
+
+        const uint8_t* buf   = sock->buf.data();
+        uint8_t        rcode = buf[3] & RCODE_MASK;
+        if (rcode == RCODE_FORMERR && a->edns) {
+            // A pre-EDNS0 server: ask it again, plainly, right away
+            // (RFC 6891 §7).  It answered, so its RTT counts.
+            double rtt = ms(Clock::now() - a->sent).count();
+            const std::string* ip = a->ip;
+            a->open = false;
+            infra_.record_rtt(from, rtt);
+            infra_.record_no_edns(from);
+            trace.hops.push_back(hop(from, a->sent, rtt, "error", "FORMERR to EDNS0"));
+            if (trace.charge()) send(*ip, false);
+            continue;
+        }
+        if (rcode != RCODE_NOERROR && rcode != RCODE_NXDOMAIN) {
+            // Lame / refusing / broken server — try the next one now.
+            a->open = false;
+            infra_.record_failure(from);
+            trace.hops.push_back(hop(from, a->sent, ms(Clock::now() - a->sent).count(),
+                                     "error", rcode_to_str(rcode)));
+            next_launch = Clock::now();
+            continue;
         }
-        // If answers exist but none match qtype, return data of first answer
-        if (!resp.answers.empty()) return resp.answers[0].data;
+        double rtt = ms(Clock::now() - a->sent).count();
+        infra_.record_rtt(from, rtt);
+        a->open = false;
+        winner  = from;
+        answer  = hop(from, a->sent, rtt, "reply");
+        won_edns = a->edns;
+        result.data.assign(buf, buf + n);
+        result.ok        = true;
+        result.truncated = (rd16(&result.data[2]) & FLAG_TC) != 0;
     }
 
-    // ── NS referral (delegation) ──────────────────────────────────────────────
-    if (resp.authorities.empty()) return "";
+    // Anyone still outstanding past its RTO (or at all, if nobody answered)
+    // has timed out as far as the infra cache is concerned.
+    // Those still within their RTO were merely overtaken by the winner, or
+    // cut short by the resolution's deadline — neither is the server's fault.
+    auto end = Clock::now();
+    bool cut = !result.ok && trace.remaining_ms() <= 0.0;
+    for (auto& a : live) {
+        if (!a.open) continue;
+        double waited = ms(end - a.sent).count();
+        if (waited < infra_.rto_ms(*a.ip) && (result.ok || cut)) {
+            trace.hops.push_back(result.ok ? hop(*a.ip, a.sent, waited, "superseded")
+                                           : hop(*a.ip, a.sent, waited, "timeout", "deadline"));
+        } else {
+            infra_.record_timeout(*a.ip);
+            trace.hops.push_back(hop(*a.ip, a.sent, waited, "timeout"));
+        }
+    }
+    transport_.release_udp(sock);
+    if (!result.ok) return result;
+
+    // If truncated, retry via TCP (kept-alive connection to the same server),
+    // budget permitting; otherwise the truncated reply is all there is.
+    if (result.truncated && trace.charge()) {
+        auto sent = Clock::now();
+        auto tr   = transport_.tcp_query(won_edns ? query : plain, winner,
+                                         std::min(TCP_TIMEOUT_S, trace.remaining_ms() / 1000));
+        TraceHop retry = hop(winner, sent, ms(Clock::now() - sent).count(),
+                             tr.ok ? "reply" : "error", tr.ok ? "" : "TCP retry failed");
+        retry.tcp = true;
+        answer.outcome = "truncated";
+        if (tr.ok) {
+            result = std::move(tr);
+            trace.hops.push_back(std::move(answer));
+            answer = std::move(retry);
+        } else {
+            trace.hops.push_back(std::move(retry));
+        }
+    }
+    trace.hops.push_back(std::move(answer));
+    return result;
+}
 
-    // Build glue map: NS hostname → IP from additionals
-    std::map<std::string, std::string> glue;
-    for (const auto& add : resp.additionals)
-        if (add.type == TYPE_A) glue[add.name] = add.data;
+// walk() — traverses the delegation chain from a zone's servers down until an
+//          answer (or authoritative NXDOMAIN / NODATA) is found.
+//          Every query it sends is logged in `trace`.
+WalkResult Resolver::walk(const std::string& domain, uint16_t qtype,
+                          const std::vector<std::string>& servers,
+                          const std::string& zone_name,
+                          std::vector<std::string>& path,
+                          bool& used_tcp, Trace& trace, int depth) {
+    WalkResult res;
+    if (depth > MAX_REFERRALS || !trace.exhausted.empty()) return res;
 
-    // Try each NS in turn
-    for (const auto& auth : resp.authorities) {
-        if (auth.type != TYPE_NS) continue;
-        const std::string& ns_name = auth.data;
+    // Avoid revisiting the same server in a single resolution chain
+    std::vector<std::string> candidates;
+    for (const auto& ip : servers)
+        if (std::find(path.begin(), path.end(), ip) == path.end())
+            candidates.push_back(ip);
+    if (candidates.empty()) return res;
+
+    auto query = build_query(domain, qtype, 0, false, edns_);  // RD=false for recursive walk
+
+    TraceHop ask;
+    ask.zone      = zone_label(zone_name);
+    ask.qname     = normalize_name(domain);
+    ask.qtype     = type_to_str(qtype);
+    ask.ns_lookup = trace.ns_depth > 0;
+
+    std::string ns_ip;
+    auto sr = exchange(query, candidates, ns_ip, trace, ask);
+    if (!sr.ok) return res;
+    path.push_back(ns_ip);
+    if (sr.used_tcp) used_tcp = true;
 
-        std::string next_ip;
-        if (glue.count(ns_name)) {
-            next_ip = glue[ns_name];                             // use glue record
-        } else {
-            next_ip = resolve_ns_name(ns_name, used_tcp);       // glue-less: isolated lookup
+    // exchange() logged the reply last; label it once we know what it was
+    // (by index — the sub-walks below append to trace.hops).
+    const size_t reply = trace.hops.size() - 1;
+    auto outcome = [&](const char* o) { trace.hops[reply].outcome = o; };
+    outcome("error");
+
+    // Parsed in place: only records that end up in the result are decoded
+    // to text; referrals and glue are matched inside the packet.
+    std::optional<PacketView> parsed;
+    try {
+        parsed.emplace(sr.data);
+    } catch (...) {
+        infra_.record_failure(ns_ip);
+        trace.hops[reply].detail = "unparseable reply";
+        return res;
+    }
+    const PacketView& resp = *parsed;
+
+    // ── Answers: follow the CNAME chain as far as this response goes ─────────
+    // Only records owned by the current name count; the RRset is every
+    // record of qtype at the end of the chain.
+    std::string cur = normalize_name(domain);
+    for (size_t hop = 0; hop <= static_cast<size_t>(MAX_CNAME_DEPTH); ++hop) {
+        for (const auto& ans : resp.answers())
+            if (ans.type == qtype && resp.name_is(ans.name, cur))
+                res.answers.push_back(resp.record(ans));
+        if (!res.answers.empty() || qtype == TYPE_CNAME) break;
+
+        const RecordView* cname = nullptr;
+        for (const auto& ans : resp.answers())
+            if (ans.type == TYPE_CNAME && resp.name_is(ans.name, cur)) { cname = &ans; break; }
+        if (!cname) break;
+        res.chain.push_back(resp.record(*cname));
+        cur = normalize_name(res.chain.back().data);
+    }
+    uint32_t chain_ttl = UINT32_MAX;
+    for (const auto& c : res.chain) chain_ttl = std::min(chain_ttl, c.ttl);
+
+    // ── Negative answers (RFC 2308) ──────────────────────────────────────────
+    // NXDOMAIN, or NOERROR with no RRset and an SOA but no NS in the authority
+    // section (NODATA) — both apply to the last name in the chain.  Cacheable
+    // only when the SOA is present.
+    const RecordView* soa = nullptr;
+    const RecordView* first_ns = nullptr;
+    for (const auto& auth : resp.authorities()) {
+        if (auth.type == TYPE_SOA && !soa)      soa = &auth;
+        if (auth.type == TYPE_NS  && !first_ns) first_ns = &auth;
+    }
+    bool nodata = resp.rcode() == RCODE_NOERROR && res.answers.empty() && soa && !first_ns &&
+                  (res.chain.empty() || in_zone(cur, resp.name(soa->name)));
+    if (resp.rcode() == RCODE_NXDOMAIN || nodata) {
+        res.negative = true;
+        res.rcode    = resp.rcode();
+        res.ttl      = 0;
+        if (soa) {
+            res.authorities.push_back(resp.record(*soa));
+            res.ttl = std::min(negative_ttl(res.authorities.back()), chain_ttl);
         }
+        outcome(resp.rcode() == RCODE_NXDOMAIN ? "nxdomain" : "nodata");
+        return res;
+    }
+
+    if (res.ok()) {
+        res.ttl         = chain_ttl;
+        for (const auto& a : res.answers) res.ttl = std::min(res.ttl, a.ttl);
+        for (const auto& r : resp.authorities()) res.authorities.push_back(resp.record(r));
+        for (const auto& r : resp.additionals())
+            if (r.type != TYPE_OPT) res.additionals.push_back(resp.record(r));
+        outcome("answer");
+        return res;
+    }
 
-        if (!next_ip.empty()) {
-            auto result = walk(domain, qtype, next_ip, path, used_tcp, depth + 1);
-            if (!result.empty()) return result;
+    // ── CNAME leaves this response — resolve the target where it lives ────────
+    // Start at the closest cached zone for the target (or the roots), with a
+    // fresh loop-detection path: the same server may legitimately serve it.
+    if (!res.chain.empty()) {
+        outcome("cname");
+        std::vector<std::string> sub;
+        std::string              zone;
+        auto                     start = start_servers(cur, zone);
+        WalkResult tail = walk(cur, qtype, start, zone, sub, used_tcp, trace, depth + 1);
+        path.insert(path.end(), sub.begin(), sub.end());
+        if (!tail.done() ||
+            res.chain.size() + tail.chain.size() > static_cast<size_t>(MAX_CNAME_DEPTH))
+            return WalkResult{};
+        tail.chain.insert(tail.chain.begin(), res.chain.begin(), res.chain.end());
+        tail.ttl = std::min(tail.ttl, chain_ttl);
+        return tail;
+    }
+
+    // ── NS referral (delegation) ──────────────────────────────────────────────
+    // The first NS record names the delegated zone; its NS set is remembered
+    // for later walks.
+    if (!first_ns) {
+        trace.hops[reply].detail = "no answer and no referral";
+        return res;
+    }
+    outcome("referral");
+    std::string              zone = resp.name(first_ns->name);
+    std::vector<std::string> ns_names;
+    uint32_t                 ns_ttl = first_ns->ttl;
+    for (const auto& auth : resp.authorities()) {
+        if (auth.type != TYPE_NS || !resp.same_name(auth.name, first_ns->name)) continue;
+        ns_names.push_back(resp.name(resp.target(auth)));
+        ns_ttl = std::min(ns_ttl, auth.ttl);
+    }
+    bool cacheable = in_zone(domain, zone);
+    if (cacheable) deleg_.put_zone(zone, ns_names, ns_ttl);
+
+    // Glue: each NS target is looked up among the additional A records in
+    // the packet.  Query every NS that has glue together (staggered,
+    // fastest first); the glue-less ones are resolved one at a time only if
+    // that fails.
+    std::vector<std::string> next_ips, glueless;
+    for (const auto& auth : resp.authorities()) {
+        if (auth.type != TYPE_NS) continue;
+        const RecordView* glue = resp.find(resp.additionals(), TYPE_A, resp.target(auth));
+        if (!glue) {
+            glueless.push_back(resp.name(resp.target(auth)));
+            continue;
         }
+        next_ips.push_back(resp.data(*glue));
+        if (cacheable && resp.same_name(auth.name, first_ns->name))
+            deleg_.put_address(resp.name(glue->name), next_ips.back(), glue->ttl);
+    }
+    if (!next_ips.empty()) {
+        auto result = walk(domain, qtype, next_ips, zone, path, used_tcp, trace, depth + 1);
+        if (result.done()) return result;
+    }
+    for (const auto& ns_name : glueless) {
+        std::string next_ip = resolve_ns_name(ns_name, used_tcp, trace);   // isolated lookup
+        if (next_ip.empty()) continue;
+        auto result = walk(domain, qtype, {next_ip}, zone, path, used_tcp, trace, depth + 1);
+        if (result.done()) return result;
     }
 
-    return "";
+    return res;
 }
 
 // Resolve an NS hostname to an IP using a fresh, isolated resolution.
 // Uses a separate path vector to avoid polluting the main resolution path
 // and to avoid loop-detection false positives.
 std::string Resolver::resolve_ns_name(const std::string& ns_name,
-                                       bool& used_tcp) {
-    // Try up to 4 different root servers to find this NS's IP
-    for (int attempt = 0; attempt < 4; ++attempt) {
-        int idx = (attempt * 3) % NUM_ROOT_SERVERS;  // spread across root servers
-        std::vector<std::string> ns_path;
-        auto ip = walk(ns_name, TYPE_A, ROOT_SERVERS[idx], ns_path, used_tcp, 0);
-        if (!ip.empty()) return ip;
+                                       bool& used_tcp, Trace& trace) {
+    std::string ip = deleg_.address(ns_name);
+    if (!ip.empty()) return ip;
+
+    std::string              zone;
+    std::vector<std::string> ns_path;
+    auto start = start_servers(ns_name, zone);
+    ++trace.ns_depth;
+    auto wr = walk(ns_name, TYPE_A, start, zone, ns_path, used_tcp, trace, 0);
+    --trace.ns_depth;
+    if (!wr.ok()) return "";
+    deleg_.put_address(ns_name, wr.answers[0].data, wr.ttl);
+    return wr.answers[0].data;
+}
+
+void Resolver::cache_result(const std::string& key, uint16_t qtype,
+                            const WalkResult& wr) {
+    if (!cache_) return;
+    uint32_t base = UINT32_MAX;                  // TTL of what ends the chain
+    if (wr.negative)
+        base = wr.authorities.empty() ? 0 : negative_ttl(wr.authorities[0]);
+    for (const auto& a : wr.answers) base = std::min(base, a.ttl);
+
+    // Walk the chain backwards: the entry for each name is its own CNAME
+    // followed by the entry of the name it points to.
+    const std::string suffix = "/" + type_to_str(qtype);
+    uint32_t ttl = base;
+    for (size_t i = wr.chain.size() + 1; i-- > 0; ) {
+        Response r;
+        r.rcode       = wr.rcode;
+        r.answers.assign(wr.chain.begin() + i, wr.chain.end());
+        r.answers.insert(r.answers.end(), wr.answers.begin(), wr.answers.end());
+        r.authorities = wr.negative ? wr.authorities : std::vector<Record>{};
+        r.min_ttl     = ttl;
+        cache_->put(i == 0 ? key
+                           : normalize_name(wr.chain[i - 1].data) + suffix, r);
+        if (i > 0) ttl = std::min(ttl, wr.chain[i - 1].ttl);
     }
-    return "";
 }
 
-ResolveResult Resolver::resolve(const std::string& domain, uint16_t qtype) {
+static std::string negative_error(uint8_t rcode, const std::string& domain,
+                                  uint16_t qtype) {
+    if (rcode == RCODE_NXDOMAIN) return "NXDOMAIN — " + domain + " does not exist";
+    return "NODATA — no " + type_to_str(qtype) + " records for " + domain;
+}
+
+ResolveResult Resolver::resolve(const std::string& domain, uint16_t qtype, bool fresh) {
     ResolveResult out;
     out.domain    = domain;
     out.qtype_str = type_to_str(qtype);
@@ -698,137 +1913,353 @@ ResolveResult Resolver::resolve(const std::string& domain, uint16_t qtype) {
 
     // ── Cache check ───────────────────────────────────────────────────────────
     std::string cache_key = domain + "/" + type_to_str(qtype);
-    if (cache_) {
+    if (cache_ && !fresh) {
         Response cached_resp;
         if (cache_->get(cache_key, cached_resp)) {
-            out.success  = !cached_resp.answers.empty();
-            out.cached   = true;
-            out.answers  = cached_resp.answers;
-            auto t1      = std::chrono::steady_clock::now();
-            out.latency_ms = std::chrono::duration<double, std::milli>(t1 - t0).count();
-            if (!out.success) out.error = "No answer records (cached)";
+            out.success     = std::any_of(cached_resp.answers.begin(), cached_resp.answers.end(),
+                                          [qtype](const Record& r) { return r.type == qtype; });
+            out.cached      = true;
+            out.rcode       = cached_resp.rcode;
+            out.ttl         = cached_resp.min_ttl;
+            out.answers     = cached_resp.answers;
+            out.authorities = cached_resp.authorities;
+            auto t1         = std::chrono::steady_clock::now();
+            out.latency_ms  = std::chrono::duration<double, std::milli>(t1 - t0).count();
+            if (!out.success) out.error = negative_error(out.rcode, domain, qtype) + " (cached)";
             return out;
         }
     }
 
     // ── Recursive resolution ──────────────────────────────────────────────────
-    // Pick a random root server
-    std::srand(static_cast<unsigned>(
-        std::chrono::steady_clock::now().time_since_epoch().count()));
-    int root_idx = std::rand() % NUM_ROOT_SERVERS;
-
+    // Start at the deepest cached enclosing zone; fall back to the roots if
+    // every cached server for that zone fails.
+    // An authoritative negative answer ends the search.
     std::vector<std::string> path;
-    bool used_tcp = false;
-    std::string answer = walk(domain, qtype, ROOT_SERVERS[root_idx],
-                               path, used_tcp, 0);
+    bool        used_tcp = false;
+    std::string zone;
+    Trace       trace;
+    trace.start       = t0;
+    trace.deadline    = t0 + std::chrono::duration_cast<Trace::Clock::duration>(
+                                 std::chrono::duration<double>(deadline_s_));
+    trace.max_queries = max_queries_;
+    WalkResult  wr;
+    auto start  = start_servers(domain, zone);
+    wr = walk(domain, qtype, start, zone, path, used_tcp, trace, 0);
+
+    if (!wr.done() && zone != ".") {
+        zone = ".";
+        wr = walk(domain, qtype, roots_, zone, path, used_tcp, trace, 0);
+    }
+    for (const auto& h : trace.hops) zones_.record(h);
+    out.trace   = std::move(trace.hops);
+    out.queries = trace.queries;
 
     auto t1        = std::chrono::steady_clock::now();
     out.latency_ms = std::chrono::duration<double, std::milli>(t1 - t0).count();
     out.resolution_path = path;
     out.used_tcp   = used_tcp;
-
-    if (!answer.empty()) {
-        out.success = true;
-        Record r;
-        r.name = domain;
-        r.type = qtype;
-        r.data = answer;
-        out.answers.push_back(r);
-
-        // Store in cache
-        if (cache_) {
-            Response resp_to_cache;
-            resp_to_cache.answers = out.answers;
-            resp_to_cache.min_ttl = 300;
-            cache_->put(cache_key, resp_to_cache);
-        }
-    } else {
+    out.start_zone = (zone == ".") ? "." : zone + ".";
+    out.hops_saved = (zone == ".") ? 0 :
+        1 + static_cast<int>(std::count(zone.begin(), zone.end(), '.'));
+
+    if (!wr.done() && !trace.exhausted.empty()) {
+        // Out of budget: SERVFAIL, with the hops that were spent on it.
+        std::ostringstream why;
+        why << "Resolution budget exhausted (" << trace.exhausted << ") after "
+            << trace.queries << " upstream queries in "
+            << static_cast<long long>(out.latency_ms) << " ms — no answer for " << domain;
+        out.exhausted = trace.exhausted;
+        out.error     = why.str();
+        return out;
+    }
+    if (!wr.done()) {
         out.error = "Resolution failed — no authoritative answer for " + domain;
+        return out;                               // SERVFAIL is never cached
     }
 
+    // Answer section as a server would send it: CNAME chain, then the RRset.
+    out.success     = wr.ok();
+    out.rcode       = wr.rcode;
+    out.ttl         = wr.ttl;
+    out.answers     = wr.chain;
+    out.answers.insert(out.answers.end(), wr.answers.begin(), wr.answers.end());
+    out.authorities = wr.authorities;
+    out.additionals = wr.additionals;
+    if (wr.negative) out.error = negative_error(wr.rcode, domain, qtype);
+
+    // Store in cache (positive or RFC 2308 negative; TTL 0 is not stored)
+    cache_result(cache_key, qtype, wr);
     return out;
 }
 
 // ─────────────────────────────────────────────────────────────────────────────
 //  JSON serialiser
 // ─────────────────────────────────────────────────────────────────────────────
-std::string result_to_json(const ResolveResult& r) {
+std::string result_to_json(const ResolveResult& r, bool pretty, bool with_trace) {
+    // pretty=false emits a single line (no embedded newlines) so the result
+    // can be framed as one NDJSON record in --serve mode.
+    const char* nl  = pretty ? "\n"     : "";
+    const char* ind = pretty ? "  "     : "";
+    const char* sub = pretty ? "    "   : "";
+
     std::ostringstream o;
-    o << "{\n";
-    o << "  \"success\": "    << (r.success ? "true" : "false") << ",\n";
-    o << "  \"domain\": "     << json_str(r.domain)             << ",\n";
-    o << "  \"qtype\": "      << json_str(r.qtype_str)          << ",\n";
-    o << "  \"cached\": "     << (r.cached ? "true" : "false")  << ",\n";
-    o << "  \"used_tcp\": "   << (r.used_tcp ? "true" : "false")<< ",\n";
+    o << "{" << nl;
+    o << ind << "\"success\": "    << (r.success ? "true" : "false") << "," << nl;
+    o << ind << "\"domain\": "     << json_str(r.domain)             << "," << nl;
+    o << ind << "\"qtype\": "      << json_str(r.qtype_str)          << "," << nl;
+    o << ind << "\"cached\": "     << (r.cached ? "true" : "false")  << "," << nl;
+    o << ind << "\"used_tcp\": "   << (r.used_tcp ? "true" : "false")<< "," << nl;
     o << std::fixed << std::setprecision(3);
-    o << "  \"latency_ms\": " << r.latency_ms                   << ",\n";
-
-    // answers array
-    o << "  \"answers\": [\n";
-    for (size_t i = 0; i < r.answers.size(); ++i) {
-        const auto& a = r.answers[i];
-        o << "    {\"name\": " << json_str(a.name)
-          << ", \"type\": "    << json_str(type_to_str(a.type))
-          << ", \"ttl\": "     << a.ttl
-          << ", \"data\": "    << json_str(a.data) << "}";
-        if (i + 1 < r.answers.size()) o << ",";
-        o << "\n";
-    }
-    o << "  ],\n";
+    o << ind << "\"latency_ms\": " << r.latency_ms                   << "," << nl;
+
+    o << ind << "\"rcode\": "      << json_str(rcode_to_str(r.rcode)) << "," << nl;
+    o << ind << "\"ttl\": "        << r.ttl                          << "," << nl;
+
+    // answers / authorities arrays
+    auto records = [&](const char* key, const std::vector<Record>& recs) {
+        o << ind << "\"" << key << "\": [" << nl;
+        for (size_t i = 0; i < recs.size(); ++i) {
+            const auto& a = recs[i];
+            o << sub << "{\"name\": " << json_str(a.name)
+              << ", \"type\": "    << json_str(type_to_str(a.type))
+              << ", \"ttl\": "     << a.ttl
+              << ", \"data\": "    << json_str(a.data) << "}";
+            if (i + 1 < recs.size()) o << ",";
+            o << nl;
+        }
+        o << ind << "]," << nl;
+    };
+    records("answers", r.answers);
+    if (!r.authorities.empty()) records("authorities", r.authorities);
+    if (!r.additionals.empty()) records("additionals", r.additionals);
 
     // resolution_path array
-    o << "  \"resolution_path\": [";
+    o << ind << "\"resolution_path\": [";
     for (size_t i = 0; i < r.resolution_path.size(); ++i) {
         o << json_str(r.resolution_path[i]);
         if (i + 1 < r.resolution_path.size()) o << ", ";
     }
-    o << "]";
+    o << "]," << nl;
+    o << ind << "\"start_zone\": "  << json_str(r.start_zone) << "," << nl;
+    o << ind << "\"hops_saved\": "  << r.hops_saved;
+
+    // An exhausted budget always reports what it was spent on.
+    if (!r.exhausted.empty()) {
+        o << "," << nl << ind << "\"exhausted\": " << json_str(r.exhausted);
+        o << "," << nl << ind << "\"upstream_queries\": " << r.queries;
+    }
+    if (with_trace || !r.exhausted.empty()) {
+        o << "," << nl << ind << "\"trace\": [" << nl;
+        for (size_t i = 0; i < r.trace.size(); ++i) {
+            const auto& h = r.trace[i];
+            o << sub << "{\"server\": "    << json_str(h.server)
+              << ", \"zone\": "          << json_str(h.zone)
+              << ", \"qname\": "         << json_str(h.qname)
+              << ", \"qtype\": "         << json_str(h.qtype)
+              << ", \"start_ms\": "      << h.start_ms
+              << ", \"rtt_ms\": "        << h.rtt_ms
+              << ", \"outcome\": "       << json_str(h.outcome)
+              << ", \"detail\": "        << json_str(h.detail)
+              << ", \"tcp\": "           << (h.tcp ? "true" : "false")
+              << ", \"ns_lookup\": "     << (h.ns_lookup ? "true" : "false") << "}";
+            if (i + 1 < r.trace.size()) o << ",";
+            o << nl;
+        }
+        o << ind << "]";
+    }
 
     if (!r.error.empty())
-        o << ",\n  \"error\": " << json_str(r.error);
+        o << "," << nl << ind << "\"error\": " << json_str(r.error);
 
-    o << "\n}\n";
+    o << nl << "}" << nl;
     return o.str();
 }
 
+// ─────────────────────────────────────────────────────────────────────────────
+//  Worker mode  (--serve)
+//  Reads one JSON request per line on stdin, writes one JSON response per
+//  line on stdout.  The Cache and Resolver live for the whole process, so
+//  repeated lookups from the Python worker pool hit the warm C++ cache.
+//
+//  Request :  {"id": 7, "domain": "example.com", "qtype": "A"}
+//             {"id": 7, "domain": "example.com", "qtype": "A", "trace": 1}
+//             {"id": 8, "op": "ping"}      (also "servers", "zones")
+//  Response:  {"id": 7, "result": { ...result_to_json... }}
+//             {"id": 8, "pong": true, "cache_size": 42}
+//
+//  "trace": 1 skips the answer cache and adds the per-hop "trace" array.
+// ─────────────────────────────────────────────────────────────────────────────
+
+// Extracts a top-level string field from a flat JSON object.
+// The Python side always sends json.dumps() output, so a linear scan for
+// "key": "value" is sufficient — no nested objects are ever involved.
+static std::string json_field_str(const std::string& line, const std::string& key) {
+    std::string needle = "\"" + key + "\"";
+    size_t pos = line.find(needle);
+    if (pos == std::string::npos) return "";
+    pos = line.find(':', pos + needle.size());
+    if (pos == std::string::npos) return "";
+    pos = line.find('"', pos + 1);
+    if (pos == std::string::npos) return "";
+    std::string out;
+    for (++pos; pos < line.size() && line[pos] != '"'; ++pos) {
+        if (line[pos] == '\\' && pos + 1 < line.size()) ++pos;
+        out += line[pos];
+    }
+    return out;
+}
+
+static long long json_field_int(const std::string& line, const std::string& key) {
+    std::string needle = "\"" + key + "\"";
+    size_t pos = line.find(needle);
+    if (pos == std::string::npos) return 0;
+    pos = line.find(':', pos + needle.size());
+    if (pos == std::string::npos) return 0;
+    return std::strtoll(line.c_str() + pos + 1, nullptr, 10);
+}
+
+uint16_t str_to_type(const std::string& s) {
+    if (s == "A")     return TYPE_A;
+    if (s == "AAAA")  return TYPE_AAAA;
+    if (s == "NS")    return TYPE_NS;
+    if (s == "MX")    return TYPE_MX;
+    if (s == "CNAME") return TYPE_CNAME;
+    if (s == "TXT")   return TYPE_TXT;
+    if (s == "PTR")   return TYPE_PTR;
+    if (s == "SOA")   return TYPE_SOA;
+    return TYPE_A;
+}
+
+int serve_stdio(Resolver& resolver, Cache& cache) {
+    std::ios::sync_with_stdio(false);
+    std::string line;
+    while (std::getline(std::cin, line)) {
+        if (line.empty()) continue;
+        long long   id = json_field_int(line, "id");
+        std::string op = json_field_str(line, "op");
+
+        if (op == "ping") {
+            auto ds = resolver.delegations().stats();
+            auto ts = resolver.transport().stats();
+            std::cout << "{\"id\": " << id << ", \"pong\": true"
+                      << ", \"cache_size\": " << cache.stats().size
+                      << ", \"delegations\": {\"zones\": " << ds.zones
+                      << ", \"addresses\": " << ds.addresses
+                      << ", \"hits\": " << ds.hits
+                      << ", \"misses\": " << ds.misses << "}"
+                      << ", \"transport\": {\"udp_opened\": " << ts.udp_opened
+                      << ", \"udp_leases\": " << ts.udp_leases
+                      << ", \"tcp_connects\": " << ts.tcp_connects
+                      << ", \"tcp_reused\": " << ts.tcp_reused
+                      << ", \"syscalls\": " << net_syscalls() << "}}\n";
+        } else if (op == "servers") {
+            auto servers = resolver.infra().snapshot();
+            std::cout << "{\"id\": " << id << ", \"servers\": [";
+            std::cout << std::fixed << std::setprecision(3);
+            for (size_t i = 0; i < servers.size(); ++i) {
+                const auto& sv = servers[i];
+                std::cout << (i ? ", " : "")
+                          << "{\"ip\": "        << json_str(sv.ip)
+                          << ", \"srtt_ms\": "   << sv.srtt_ms
+                          << ", \"rttvar_ms\": " << sv.rttvar_ms
+                          << ", \"rto_ms\": "    << sv.rto_ms
+                          << ", \"backoff\": "   << sv.backoff
+                          << ", \"queries\": "   << sv.queries
+                          << ", \"responses\": " << sv.responses
+                          << ", \"timeouts\": "  << sv.timeouts
+                          << ", \"failures\": "  << sv.failures
+                          << ", \"no_edns\": "   << (sv.no_edns ? "true" : "false") << "}";
+            }
+            std::cout << "]}\n";
+        } else if (op == "zones") {
+            auto zones = resolver.zones().snapshot();
+            std::cout << "{\"id\": " << id << ", \"zones\": [";
+            std::cout << std::fixed << std::setprecision(3);
+            for (size_t i = 0; i < zones.size(); ++i) {
+                const auto& z = zones[i];
+                std::cout << (i ? ", " : "")
+                          << "{\"zone\": "        << json_str(z.zone)
+                          << ", \"queries\": "    << z.queries
+                          << ", \"answers\": "    << z.answers
+                          << ", \"referrals\": "  << z.referrals
+                          << ", \"truncated\": "  << z.truncated
+                          << ", \"timeouts\": "   << z.timeouts
+                          << ", \"errors\": "     << z.errors
+                          << ", \"ns_lookups\": " << z.ns_lookups
+                          << ", \"total_ms\": "   << z.total_ms
+                          << ", \"max_ms\": "     << z.max_ms << "}";
+            }
+            std::cout << "]}\n";
+        } else {
+            std::string domain = json_field_str(line, "domain");
+            uint16_t    qtype  = str_to_type(json_field_str(line, "qtype"));
+            bool        traced = json_field_int(line, "trace") != 0;
+            ResolveResult r;
+            try {
+                r = resolver.resolve(domain, qtype, traced);
+            } catch (const std::exception& e) {
+                r.domain    = domain;
+                r.qtype_str = type_to_str(qtype);
+                r.error     = e.what();
+            }
+            std::cout << "{\"id\": " << id << ", \"result\": "
+                      << result_to_json(r, false, traced) << "}\n";
+        }
+        std::cout.flush();
+    }
+    return 0;
+}
+
 } // namespace dns
 
 // ─────────────────────────────────────────────────────────────────────────────
 //  main() — CLI entry point
-//  Usage: dns_resolver <domain> [A|AAAA|NS|MX|CNAME|TXT]
+//  Usage: dns_resolver <domain> [A|AAAA|NS|MX|CNAME|TXT] [--trace]
+//  Compiled out with -DDNS_RESOLVER_NO_MAIN when linking the Python
+//  extension (core/dns_module.cpp).
 // ─────────────────────────────────────────────────────────────────────────────
+#ifndef DNS_RESOLVER_NO_MAIN
 int main(int argc, char* argv[]) {
     if (argc < 2) {
-        std::cerr << "Usage: dns_resolver <domain> [A|AAAA|NS|MX|CNAME|TXT]\n";
+        std::cerr << "Usage: dns_resolver <domain> [A|AAAA|NS|MX|CNAME|TXT] [--trace]\n"
+                  << "       dns_resolver --serve\n";
         return 1;
     }
 
     std::string domain   = argv[1];
-    std::string type_str = (argc >= 3) ? argv[2] : "A";
-
-    // Map type string to numeric
-    std::map<std::string, uint16_t> type_map = {
-        {"A",     dns::TYPE_A    },
-        {"AAAA",  dns::TYPE_AAAA },
-        {"NS",    dns::TYPE_NS   },
-        {"MX",    dns::TYPE_MX   },
-        {"CNAME", dns::TYPE_CNAME},
-        {"TXT",   dns::TYPE_TXT  },
-        {"PTR",   dns::TYPE_PTR  },
-        {"SOA",   dns::TYPE_SOA  }
-    };
+    std::string type_str = "A";
+    bool        traced   = false;
+    for (int i = 2; i < argc; ++i) {
+        if (std::string(argv[i]) == "--trace") traced = true;
+        else                                   type_str = argv[i];
+    }
+
+    if (domain == "--serve") {
+        try {
+            dns::net_init();
+            dns::Cache    cache(1000);
+            dns::Resolver resolver(&cache);
+            resolver.configure_from_env();
+            int rc = dns::serve_stdio(resolver, cache);
+            dns::net_cleanup();
+            return rc;
+        } catch (const std::exception& e) {
+            std::cerr << "dns_resolver --serve: " << e.what() << "\n";
+            dns::net_cleanup();
+            return 1;
+        }
+    }
 
-    uint16_t qtype = dns::TYPE_A;
-    auto it = type_map.find(type_str);
-    if (it != type_map.end()) qtype = it->second;
+    uint16_t qtype = dns::str_to_type(type_str);
 
     try {
         dns::net_init();
         dns::Cache  cache(1000);
         dns::Resolver resolver(&cache);
+        resolver.configure_from_env();
 
         auto result = resolver.resolve(domain, qtype);
-        std::cout << dns::result_to_json(result);
+        std::cout << dns::result_to_json(result, true, traced);
         dns::net_cleanup();
         return result.success ? 0 : 1;
     } catch (const std::exception& e) {
@@ -838,3 +2269,4 @@ int main(int argc, char* argv[]) {
         return 1;
     }
 }
+#endif // DNS_RESOLVER_NO_MAIN
@@ -14,6 +14,9 @@
 #include <list>
 #include <mutex>
 #include <chrono>
+#include <atomic>
+#include <memory>
+#include <cstddef>
 #include <stdexcept>
 
 namespace dns {
@@ -31,6 +34,7 @@ constexpr uint16_t TYPE_PTR   = 12;
 constexpr uint16_t TYPE_MX    = 15;
 constexpr uint16_t TYPE_TXT   = 16;
 constexpr uint16_t TYPE_AAAA  = 28;
+constexpr uint16_t TYPE_OPT   = 41;     // EDNS0 pseudo-record (RFC 6891)
 constexpr uint16_t CLASS_IN   =  1;
 
 // Header flag bits
@@ -41,12 +45,39 @@ constexpr uint16_t FLAG_RD   = 0x0100;   // Recursion Desired
 constexpr uint16_t FLAG_RA   = 0x0080;   // Recursion Available
 constexpr uint16_t RCODE_MASK= 0x000F;
 
+// Response codes
+constexpr uint8_t  RCODE_NOERROR  = 0;
+constexpr uint8_t  RCODE_FORMERR  = 1;
+constexpr uint8_t  RCODE_SERVFAIL = 2;
+constexpr uint8_t  RCODE_NXDOMAIN = 3;
+
 // Protocol limits
-constexpr int  MAX_UDP_PAYLOAD = 512;    // RFC 1035 §2.3.4
+constexpr int  MAX_UDP_PAYLOAD = 512;    // RFC 1035 §2.3.4, without EDNS0
+constexpr uint16_t EDNS_PAYLOAD     = 1232; // advertised UDP size (DNS Flag Day 2020)
+constexpr uint16_t MAX_EDNS_PAYLOAD = 4096; // = the UDP receive buffers
 constexpr int  MAX_JUMPS       = 128;    // compression-pointer loop guard
 constexpr int  MAX_REFERRALS   = 30;     // delegation depth guard
 constexpr int  MAX_CNAME_DEPTH = 10;
 
+// Upstream timing (milliseconds unless noted)
+constexpr double   HOP_TIMEOUT_S      = 2.0;    // per-hop deadline across all servers tried
+constexpr double   TCP_TIMEOUT_S      = 5.0;    // TCP retry of a truncated reply
+constexpr double   INFRA_INITIAL_RTO  = 376.0;  // unknown server (Unbound's default)
+constexpr double   INFRA_MIN_RTO      = 50.0;
+constexpr double   INFRA_MAX_RTO      = 12000.0;
+constexpr unsigned INFRA_MAX_BACKOFF  = 64;
+constexpr int      INFRA_TTL_S        = 900;    // forget a server's history after this
+
+// Per-resolution budget: every walk, CNAME follow-up and glue-less NS lookup
+// of one resolve() shares it.  The deadline stays below the API's 30 s
+// subprocess timeout so a runaway walk ends with a result, not a kill.
+constexpr double   RESOLVE_DEADLINE_S   = 10.0;
+constexpr int      MAX_UPSTREAM_QUERIES = 64;    // UDP sends and TCP retries together
+
+// Cache lifetime bounds
+constexpr uint32_t MAX_CACHE_TTL    = 604800;  // 7 days  (RFC 8767 §4)
+constexpr uint32_t MAX_NEGATIVE_TTL = 10800;   // 3 hours (RFC 2308 §5)
+
 // ═════════════════════════════════════════════════════════════════════════════
 //  Data structures
 // ═════════════════════════════════════════════════════════════════════════════
@@ -69,8 +100,9 @@ struct Response {
     bool                authoritative = false;
     std::vector<Record> answers;
     std::vector<Record> authorities;
-    std::vector<Record> additionals;
+    std::vector<Record> additionals;         // without the OPT pseudo-record
     uint32_t            min_ttl     = 300;   // minimum TTL across all answers
+    uint16_t            edns_payload = 0;    // sender's UDP size from OPT; 0 = no OPT
 };
 
 // ═════════════════════════════════════════════════════════════════════════════
@@ -84,9 +116,13 @@ public:
     explicit Cache(size_t max_entries = 1000);
 
     // Returns true and populates `out` on a valid (non-expired) hit.
+    // Record TTLs in `out` are reduced by the time spent in the cache, and
+    // out.min_ttl is the remaining lifetime of the entry.
     bool get(const std::string& key, Response& out);
 
-    // Stores a response; effective TTL = response.min_ttl.
+    // Stores a response; effective TTL = response.min_ttl (0 → not stored).
+    // Negative answers (RFC 2308) are stored with no answers, the rcode and
+    // the SOA in `authorities`.
     void put(const std::string& key, const Response& res);
 
     void  clear();
@@ -109,17 +145,217 @@ private:
     size_t             misses_ = 0;
 };
 
+// ═════════════════════════════════════════════════════════════════════════════
+//  Delegation (zone-cut) cache
+//  Remembers NS sets learned from referrals, plus NS-name → address mappings
+//  (glue and glue-less lookups), so a walk for github.com can start at the
+//  cached com. servers instead of a root server.
+// ═════════════════════════════════════════════════════════════════════════════
+
+class DelegationCache {
+public:
+    struct Stats { size_t zones, addresses, hits, misses; };
+    struct ZoneRecord    { std::string zone;    std::vector<std::string> ns_names; uint32_t ttl; };
+    struct AddressRecord { std::string ns_name; std::string ip;                    uint32_t ttl; };
+
+    explicit DelegationCache(size_t max_entries = 10000);
+
+    // Records a zone cut: `zone` is served by `ns_names` for `ttl` seconds.
+    void put_zone(const std::string&              zone,
+                  const std::vector<std::string>& ns_names,
+                  uint32_t                         ttl);
+
+    // Records an NS hostname's IPv4 address (glue or resolved).
+    void put_address(const std::string& ns_name,
+                     const std::string& ip,
+                     uint32_t           ttl);
+
+    // Cached address for an NS hostname, or "" if unknown/expired.
+    std::string address(const std::string& ns_name);
+
+    // Finds the deepest non-expired cached zone enclosing `qname` that has at
+    // least one NS with a known address.  Fills `zone` and `server_ips`.
+    bool closest(const std::string&        qname,
+                 std::string&              zone,
+                 std::vector<std::string>& server_ips);
+
+    // Every live entry with its remaining TTL (whole seconds, ≥ 1), for
+    // persisting across restarts; feed back through put_zone / put_address.
+    void export_live(std::vector<ZoneRecord>&    zones,
+                     std::vector<AddressRecord>& addresses) const;
+
+    void  clear();
+    Stats stats() const;
+
+private:
+    using Clock = std::chrono::steady_clock;
+    struct ZoneEntry {
+        std::vector<std::string> ns_names;
+        Clock::time_point        expires;
+    };
+    struct AddrEntry {
+        std::string       ip;
+        Clock::time_point expires;
+    };
+
+    std::string lookup_address_locked(const std::string& ns_name, Clock::time_point now);
+    void        make_room_locked(Clock::time_point now);
+
+    mutable std::mutex                   mtx_;
+    size_t                               max_;
+    std::map<std::string, ZoneEntry>     zones_;
+    std::map<std::string, AddrEntry>     addrs_;
+    size_t                               hits_   = 0;
+    size_t                               misses_ = 0;
+};
+
+// ═════════════════════════════════════════════════════════════════════════════
+//  Server infrastructure cache
+//  Smoothed RTT (RFC 6298 estimator), timeout backoff and failure counts per
+//  upstream IP, like the BIND / Unbound infra caches.  Used to order a zone's
+//  servers fastest-first and to pace staggered parallel queries.
+// ═════════════════════════════════════════════════════════════════════════════
+
+class InfraCache {
+public:
+    struct ServerStats {
+        std::string ip;
+        double      srtt_ms   = 0.0;
+        double      rttvar_ms = 0.0;
+        double      rto_ms    = 0.0;
+        unsigned    backoff   = 1;
+        size_t      queries   = 0;
+        size_t      responses = 0;
+        size_t      timeouts  = 0;
+        size_t      failures  = 0;     // SERVFAIL / REFUSED / malformed replies
+        bool        no_edns   = false; // answered FORMERR to EDNS0: asked without it
+    };
+
+    explicit InfraCache(size_t max_entries = 10000);
+
+    void record_sent(const std::string& ip);
+    void record_rtt(const std::string& ip, double ms);     // valid reply
+    void record_timeout(const std::string& ip);
+    void record_failure(const std::string& ip);            // unusable reply
+    void record_no_edns(const std::string& ip);            // FORMERR to an OPT query
+    bool no_edns(const std::string& ip);
+
+    // Retransmission timeout: srtt + 4·rttvar, times the backoff, clamped.
+    // Unknown (or forgotten) servers get INFRA_INITIAL_RTO.
+    double rto_ms(const std::string& ip);
+
+    // `ips` ordered by ascending RTO; ties are broken randomly.
+    std::vector<std::string> rank(const std::vector<std::string>& ips);
+
+    std::vector<ServerStats> snapshot();
+    void                     clear();
+
+private:
+    using Clock = std::chrono::steady_clock;
+    struct Entry {
+        ServerStats       s;
+        bool              measured = false;
+        Clock::time_point updated;
+    };
+
+    Entry& entry_locked(const std::string& ip);
+    double rto_locked(const Entry& e) const;
+
+    std::mutex                   mtx_;
+    size_t                       max_;
+    std::map<std::string, Entry> servers_;
+};
+
+// ═════════════════════════════════════════════════════════════════════════════
+//  Per-hop trace and per-zone statistics
+//  Every upstream query of a resolution is logged as a TraceHop: which server
+//  was asked for what, when, how long it took and what came back.  The hops
+//  are returned in ResolveResult::trace and folded into ZoneStats, so slow or
+//  flaky zones stand out without tracing individual queries.
+// ═════════════════════════════════════════════════════════════════════════════
+
+struct TraceHop {
+    std::string server;              // IP asked
+    std::string zone;                // zone it was asked as a server for ("." = root)
+    std::string qname;
+    std::string qtype;
+    double      start_ms  = 0.0;     // send time, from the start of the resolution
+    double      rtt_ms    = 0.0;     // until the reply, or until given up on
+    std::string outcome;             // answer, cname, referral, nxdomain, nodata,
+                                     // truncated, timeout, superseded, error
+    std::string detail;              // e.g. the RCODE of an error reply, or
+                                     // "deadline" for a timeout the budget cut short
+    bool        tcp       = false;   // reply came over TCP
+    bool        ns_lookup = false;   // part of resolving a glue-less NS name
+};
+
+// The hops of one resolution so far, and what is left of its budget.
+struct Trace {
+    using Clock = std::chrono::steady_clock;
+
+    Clock::time_point     start       = Clock::now();
+    Clock::time_point     deadline    = Clock::time_point::max();
+    int                   max_queries = MAX_UPSTREAM_QUERIES;
+    int                   queries     = 0;         // upstream queries sent
+    std::string           exhausted;               // "deadline" / "query limit" once out
+    std::vector<TraceHop> hops;
+    int                   ns_depth    = 0;         // > 0 inside resolve_ns_name()
+
+    // Milliseconds until the deadline; sets `exhausted` once it has passed.
+    double remaining_ms();
+    // Accounts for one more upstream query; false (and `exhausted` set)
+    // if the budget does not allow it.
+    bool   charge();
+};
+
+class ZoneStats {
+public:
+    struct Stats {
+        std::string zone;
+        size_t      queries    = 0;
+        size_t      answers    = 0;     // answer / cname / nxdomain / nodata
+        size_t      referrals  = 0;
+        size_t      truncated  = 0;
+        size_t      timeouts   = 0;
+        size_t      errors     = 0;
+        size_t      ns_lookups = 0;     // hops spent on glue-less NS names
+        double      total_ms   = 0.0;   // RTT sum over hops that got a reply
+        double      max_ms     = 0.0;
+    };
+
+    explicit ZoneStats(size_t max_zones = 10000);
+
+    void               record(const TraceHop& hop);
+    std::vector<Stats> snapshot();
+    void               clear();
+
+private:
+    std::mutex                   mtx_;
+    size_t                       max_;
+    std::map<std::string, Stats> zones_;
+};
+
+// Lower-cases a name and strips the trailing dot ("GitHub.COM." → "github.com").
+std::string normalize_name(const std::string& name);
+
 // ═════════════════════════════════════════════════════════════════════════════
 //  Packet builder
 // ═════════════════════════════════════════════════════════════════════════════
 
 // Builds a raw DNS query packet (RFC 1035 §4).
-// id == 0  →  a random 16-bit ID is generated.
-// rd       →  set the Recursion Desired bit.
+// id == 0    →  a random 16-bit ID is generated.
+// rd         →  set the Recursion Desired bit.
+// edns > 0   →  append an OPT record advertising that UDP payload size
+//               (RFC 6891 §6; values below 512 are raised to 512).
 std::vector<uint8_t> build_query(const std::string& domain,
                                   uint16_t           qtype,
-                                  uint16_t           id = 0,
-                                  bool               rd = false);
+                                  uint16_t           id   = 0,
+                                  bool               rd   = false,
+                                  uint16_t           edns = 0);
+
+// `query` without the OPT record build_query() appended (a copy of it if
+// there is none) — the plain query for servers that reject EDNS0.
+std::vector<uint8_t> strip_edns(const std::vector<uint8_t>& query);
 
 // Encodes a dotted domain name to DNS wire format (§3.1).
 std::vector<uint8_t> encode_name(const std::string& domain);
@@ -128,10 +364,92 @@ std::vector<uint8_t> encode_name(const std::string& domain);
 //  Packet parser
 // ═════════════════════════════════════════════════════════════════════════════
 
-// Parses a raw DNS response packet.
+// Parses a raw DNS response packet into records with text data
+// (PacketView(data).response()).
 // Throws std::runtime_error if the packet is malformed.
 Response parse_response(const std::vector<uint8_t>& data);
 
+// One resource record, located inside the packet it came from: the owner
+// name and RDATA are offsets, decoded only when asked for.
+struct RecordView {
+    uint16_t name  = 0;          // offset of the owner name
+    uint16_t type  = 0;
+    uint16_t cls   = CLASS_IN;
+    uint32_t ttl   = 0;
+    uint16_t rdata = 0;          // offset of the RDATA
+    uint16_t rdlen = 0;
+};
+
+// A response parsed in place.  The constructor checks the framing of every
+// record — names in bounds and free of pointer loops, RDATA inside the
+// packet, A / AAAA of the right length — and indexes the sections without
+// decoding a name or formatting an address; names are compared in the
+// packet, and text is produced only for records that leave the walk.  Up
+// to INLINE_RECORDS records are indexed without touching the heap.
+// The packet must outlive the view.
+class PacketView {
+public:
+    static constexpr size_t INLINE_RECORDS = 32;
+
+    class Section {
+    public:
+        const RecordView* begin() const { return begin_; }
+        const RecordView* end()   const { return end_; }
+        size_t            size()  const { return static_cast<size_t>(end_ - begin_); }
+        bool              empty() const { return begin_ == end_; }
+    private:
+        friend class PacketView;
+        const RecordView* begin_ = nullptr;
+        const RecordView* end_   = nullptr;
+    };
+
+    // Throws std::runtime_error if the packet is malformed.
+    PacketView(const uint8_t* data, size_t size);
+    explicit PacketView(const std::vector<uint8_t>& data)
+        : PacketView(data.data(), data.size()) {}
+    PacketView(const PacketView&)            = delete;
+    PacketView& operator=(const PacketView&) = delete;
+
+    uint16_t id()            const { return id_; }
+    uint16_t flags()         const { return flags_; }
+    uint8_t  rcode()         const { return static_cast<uint8_t>(flags_ & RCODE_MASK); }
+    bool     truncated()     const { return (flags_ & FLAG_TC) != 0; }
+    bool     authoritative() const { return (flags_ & FLAG_AA) != 0; }
+    // The sender's advertised UDP payload size from its OPT record; 0 if none.
+    uint16_t edns_payload()  const { return edns_payload_; }
+
+    Section answers()     const { return section(0); }
+    Section authorities() const { return section(1); }
+    Section additionals() const { return section(2); }   // OPT included
+
+    // Names by offset — an owner name, or an NS / CNAME / PTR target.
+    // Comparisons are ASCII case-insensitive and ignore a trailing dot.
+    bool        same_name(uint16_t a, uint16_t b) const;
+    bool        name_is(uint16_t off, const std::string& name) const;
+    std::string name(uint16_t off) const;                 // as spelled in the packet
+    uint16_t    target(const RecordView& r) const { return r.rdata; }   // NS / CNAME / PTR
+
+    // The first record of `type` in `s` owned by the name at `owner`.
+    const RecordView* find(Section s, uint16_t type, uint16_t owner) const;
+
+    // Text form of the RDATA, and the record / response as parse_response() builds them.
+    std::string data(const RecordView& r) const;
+    Record      record(const RecordView& r) const;
+    Response    response() const;
+
+private:
+    Section section(int i) const;
+
+    const uint8_t*          p_;
+    size_t                  n_;
+    uint16_t                id_     = 0;
+    uint16_t                flags_  = 0;
+    uint16_t                edns_payload_ = 0;
+    size_t                  counts_[3] = {0, 0, 0};
+    RecordView              inline_[INLINE_RECORDS];
+    std::vector<RecordView> spill_;          // used instead once a packet has more
+};
+
 // ═════════════════════════════════════════════════════════════════════════════
 //  Transport  (UDP + TCP)
 // ═════════════════════════════════════════════════════════════════════════════
@@ -160,6 +478,101 @@ SendResult send_query(const std::vector<uint8_t>& query,
                       const std::string&           server_ip,
                       uint16_t                     port = 53);
 
+// Number of socket-API calls (socket/bind/sendto/select/recv…/close) made by
+// this process's DNS transport so far — used by bench/bench_transport.
+size_t net_syscalls();
+
+// Does `reply` answer `query`?  Same ID, QR set and the same question (name
+// compared case-insensitively).
+bool reply_matches(const std::vector<uint8_t>& query,
+                   const uint8_t* reply, size_t len);
+
+// ═════════════════════════════════════════════════════════════════════════════
+//  Transport — pooled sockets owned by a Resolver
+//  UDP: a pool of sockets, each bound to a random source port and re-bound
+//  to a new one after UDP_SOCKET_MAX_USES exchanges.  A socket is leased
+//  for one exchange and may carry queries to several servers; replies are
+//  matched by transaction ID, question and source address, never by socket.
+//  Each pooled socket owns its receive buffer.
+//  TCP (RFC 7766): connections are kept open per server and reused, and
+//  several queries can be pipelined on one connection.
+// ═════════════════════════════════════════════════════════════════════════════
+
+constexpr unsigned UDP_SOCKET_MAX_USES = 100;
+constexpr double   TCP_IDLE_TIMEOUT_S  = 10.0;   // RFC 7766 §6.2.3 suggests seconds
+constexpr size_t   TCP_IDLE_PER_SERVER = 2;
+
+class Transport {
+public:
+    struct Stats {
+        size_t udp_opened   = 0;    // sockets created (incl. re-binds)
+        size_t udp_leases   = 0;
+        size_t tcp_connects = 0;
+        size_t tcp_reused   = 0;    // queries sent on an already-open connection
+    };
+
+    struct UdpSocket {
+        std::intptr_t        fd   = -1;
+        uint16_t             port = 0;      // local (source) port
+        unsigned             uses = 0;
+        std::vector<uint8_t> buf;           // reused receive buffer
+    };
+
+    // udp_pool == 0 disables reuse: every lease opens a socket and every
+    // release closes it (the pre-pool behaviour, kept for benchmarks).
+    explicit Transport(size_t udp_pool = 8, uint16_t port = 53);
+    ~Transport();
+    Transport(const Transport&)            = delete;
+    Transport& operator=(const Transport&) = delete;
+
+    void     set_port(uint16_t port) { port_ = port; }
+    uint16_t port() const            { return port_; }
+    void     set_udp_pool(size_t n);            // trims idle sockets beyond n
+
+    UdpSocket* lease_udp();                     // nullptr if no socket available
+    void       release_udp(UdpSocket* s);
+
+    bool send_udp(UdpSocket& s, const std::vector<uint8_t>& query,
+                  const std::string& ip);
+
+    // Waits up to timeout_ms for a datagram from the upstream port that
+    // answers `query`; anything else is discarded.  Returns its length (data
+    // in s.buf) and sets `from`; 0 on timeout, -1 on socket error.  The
+    // caller checks `from` against the servers it actually asked.
+    int  recv_udp(UdpSocket& s, const std::vector<uint8_t>& query,
+                  double timeout_ms, std::string& from);
+
+    // Sends all `queries` to `ip` on one kept-alive TCP connection, then
+    // reads the replies in whatever order they arrive, matching them by ID
+    // and question.  A connection found closed by the server is replaced once.
+    std::vector<SendResult> tcp_pipeline(const std::vector<std::vector<uint8_t>>& queries,
+                                         const std::string& ip,
+                                         double             timeout_secs = 5.0);
+    SendResult              tcp_query(const std::vector<uint8_t>& query,
+                                      const std::string&           ip,
+                                      double                       timeout_secs = 5.0);
+
+    Stats stats();
+    void  close_all();
+
+private:
+    struct TcpConn {
+        std::intptr_t                         fd = -1;
+        std::chrono::steady_clock::time_point last_used;
+    };
+
+    std::intptr_t open_udp(uint16_t& bound_port);
+    TcpConn       lease_tcp(const std::string& ip, double timeout_secs, bool& reused);
+    void          release_tcp(const std::string& ip, TcpConn c);
+
+    std::mutex                                  mtx_;
+    size_t                                      udp_pool_;
+    uint16_t                                    port_;
+    std::vector<std::unique_ptr<UdpSocket>>     udp_idle_;
+    std::map<std::string, std::vector<TcpConn>> tcp_idle_;
+    Stats                                       stats_;
+};
+
 // ═════════════════════════════════════════════════════════════════════════════
 //  Recursive resolver
 // ═════════════════════════════════════════════════════════════════════════════
@@ -168,12 +581,38 @@ struct ResolveResult {
     bool                     success     = false;
     std::string              domain;
     std::string              qtype_str;
-    std::vector<Record>      answers;
+    uint8_t                  rcode       = RCODE_SERVFAIL;
+    uint32_t                 ttl         = 0;    // cache lifetime (answer or negative)
+    std::vector<Record>      answers;           // CNAME chain, then the RRset
+    std::vector<Record>      authorities;       // SOA of a negative answer
+    std::vector<Record>      additionals;
     std::vector<std::string> resolution_path;   // IPs queried in order
+    std::string              start_zone  = ".";  // zone the walk started at
+    int                      hops_saved  = 0;    // delegation levels skipped
     bool                     cached      = false;
     bool                     used_tcp    = false;
     double                   latency_ms  = 0.0;
     std::string              error;
+    std::vector<TraceHop>    trace;              // every upstream query (empty if cached)
+    int                      queries     = 0;    // upstream queries sent
+    std::string              exhausted;          // budget that ended the walk, if any
+};
+
+// Outcome of one walk(): the complete answer RRset, every CNAME hop that led
+// to it, the final response's authority/additional data, and — for
+// authoritative NXDOMAIN / NODATA — the negative-cache data.
+struct WalkResult {
+    std::vector<Record> chain;           // CNAME records from the query name, in order
+    std::vector<Record> answers;         // full RRset of qtype at the final name
+    std::vector<Record> authorities;     // SOA for negative answers
+    std::vector<Record> additionals;
+    uint32_t            ttl      = 0;    // min TTL over chain + RRset,
+                                         // or the RFC 2308 negative TTL
+    uint8_t             rcode    = RCODE_NOERROR;
+    bool                negative = false;
+
+    bool ok()    const { return !answers.empty(); }
+    bool done()  const { return ok() || negative; }   // stop trying other servers
 };
 
 class Resolver {
@@ -181,25 +620,89 @@ public:
     // cache may be nullptr — resolver will then skip caching.
     explicit Resolver(Cache* cache = nullptr);
 
+    // fresh = true skips the answer-cache read, so the result (and its
+    // trace) comes from a real walk; the answer is still cached.
     ResolveResult resolve(const std::string& domain,
-                          uint16_t           qtype = TYPE_A);
+                          uint16_t           qtype = TYPE_A,
+                          bool               fresh = false);
+
+    // Replaces the 13 built-in root hints (e.g. a loopback stub hierarchy).
+    void set_root_hints(const std::vector<std::string>& ips);
+    // Destination port for upstream queries (default 53).
+    void set_upstream_port(uint16_t port);
+    // Per-resolution deadline (seconds) and upstream query cap; values
+    // <= 0 keep the current setting.
+    void set_limits(double deadline_s, int max_queries);
+    // UDP payload size advertised in an EDNS0 OPT record on every upstream
+    // query (clamped to 512 … MAX_EDNS_PAYLOAD); 0 sends plain RFC 1035
+    // queries.  Default EDNS_PAYLOAD.
+    void set_edns_payload(int bytes);
+    // Applies DNS_ROOT_HINTS (comma-separated IPs), DNS_UPSTREAM_PORT,
+    // DNS_RESOLVE_DEADLINE, DNS_MAX_UPSTREAM_QUERIES and DNS_EDNS_PAYLOAD.
+    void configure_from_env();
+
+    DelegationCache& delegations() { return deleg_; }
+    InfraCache&      infra()       { return infra_; }
+    Transport&       transport()   { return transport_; }
+    ZoneStats&       zones()       { return zones_; }
 
 private:
-    Cache* cache_;
-
-    // Walk the delegation chain starting from ns_ip; returns first answer IP
-    // found (or empty string on failure).
-    std::string walk(const std::string&        domain,
-                     uint16_t                   qtype,
-                     const std::string&         ns_ip,
-                     std::vector<std::string>&  path,
-                     bool&                      used_tcp,
-                     int                        depth = 0);
+    Cache*                   cache_;
+    DelegationCache          deleg_;
+    InfraCache               infra_;
+    Transport                transport_;
+    ZoneStats                zones_;
+    std::vector<std::string> roots_;
+    double                   deadline_s_  = RESOLVE_DEADLINE_S;
+    int                      max_queries_ = MAX_UPSTREAM_QUERIES;
+    uint16_t                 edns_        = EDNS_PAYLOAD;
+
+    // Servers to start a walk for `name` at: the closest cached zone's
+    // servers if any, else the root hints.  Sets `zone`.
+    std::vector<std::string> start_servers(const std::string& name,
+                                           std::string&       zone);
+
+    // Sends `query` to the fastest of `servers`, launching the next-best one
+    // each time the current one's RTO passes without a reply (staggered
+    // parallel queries), and returns the first valid reply.  `winner` is the
+    // server that supplied it.  All sends share one leased UDP socket.
+    // Falls back to (kept-alive) TCP on truncation.  Logs a hop (a copy of
+    // `ask` with the server, timing and outcome filled in) for every query
+    // sent; on success the winner's hop is last, for walk() to label.
+    // Every send is charged to the trace's budget, and the hop timeout is
+    // cut to whatever is left of its deadline.  `query` may carry an OPT
+    // record: a server that answers it with FORMERR is asked again at once
+    // without it, and remembered as one that does not speak EDNS0.
+    SendResult exchange(const std::vector<uint8_t>&     query,
+                        const std::vector<std::string>& servers,
+                        std::string&                    winner,
+                        Trace&                          trace,
+                        const TraceHop&                 ask);
+
+    // Walk the delegation chain starting from a zone's servers until an
+    // answer (or an authoritative negative answer) is found, following
+    // CNAMEs across zones.  A result that is not done() means it failed.
+    // `zone` is the zone `servers` serve, for the trace.  Returns at once
+    // once the trace's budget is exhausted.
+    WalkResult walk(const std::string&              domain,
+                    uint16_t                         qtype,
+                    const std::vector<std::string>& servers,
+                    const std::string&               zone,
+                    std::vector<std::string>&        path,
+                    bool&                            used_tcp,
+                    Trace&                           trace,
+                    int                              depth = 0);
+
+    // Caches a final walk result under the query name and under every
+    // intermediate CNAME target (each with the rest of the chain).
+    void cache_result(const std::string& key, uint16_t qtype, const WalkResult& wr);
 
     // Resolve an NS name to its IP (used when no glue record is available).
-    // Uses an isolated path vector internally to avoid loop-detection pollution.
+    // Checks the delegation cache first, then walks from the closest cached
+    // zone.  Uses an isolated path vector to avoid loop-detection pollution.
     std::string resolve_ns_name(const std::string& ns_name,
-                                bool&              used_tcp);
+                                bool&              used_tcp,
+                                Trace&             trace);
 };
 
 // ═════════════════════════════════════════════════════════════════════════════
@@ -207,7 +710,16 @@ private:
 // ═════════════════════════════════════════════════════════════════════════════
 
 std::string type_to_str(uint16_t type);
-std::string result_to_json(const ResolveResult& r);
+std::string rcode_to_str(uint8_t rcode);
+// RFC 2308 §5 negative-cache TTL from an SOA record: min(TTL, MINIMUM).
+uint32_t    negative_ttl(const Record& soa);
+uint16_t    str_to_type(const std::string& s);   // unknown → TYPE_A
+std::string result_to_json(const ResolveResult& r, bool pretty = true,
+                           bool with_trace = false);
+
+// Long-lived worker loop: newline-delimited JSON requests on stdin,
+// one JSON response line per request on stdout.  Returns at EOF.
+int serve_stdio(Resolver& resolver, Cache& cache);
 
 // Platform socket initialisation (WSAStartup on Windows, no-op on POSIX).
 void net_init();
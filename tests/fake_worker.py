@@ -0,0 +1,48 @@
+"""
+tests/fake_worker.py
+────────────────────
+Stand-in for `dns_resolver --serve` used by test_worker_pool.py.
+Speaks the same NDJSON protocol; a few magic domains trigger failures:
+  crash.test  → exit immediately (simulates a segfault)
+  slow.test   → sleep 5 s before answering (simulates a hung walk)
+  huge.test   → 4000 answers, a reply line over 256 KiB
+The "servers" and "zones" ops report one upstream / zone counting the
+lookups this process served.
+"""
+
+import sys
+import json
+import os
+import time
+
+served = 0
+for line in sys.stdin:
+    req = json.loads(line)
+    if req.get("op") == "ping":
+        reply = {"id": req["id"], "pong": True, "cache_size": served}
+    elif req.get("op") == "servers":
+        reply = {"id": req["id"], "servers": [{
+            "ip": "192.0.2.53", "srtt_ms": 10.0, "rttvar_ms": 2.0, "rto_ms": 50.0,
+            "queries": served, "responses": served, "timeouts": 0, "failures": 0,
+            "backoff": 0, "no_edns": False}]}
+    elif req.get("op") == "zones":
+        reply = {"id": req["id"], "zones": [{
+            "zone": "test", "queries": served, "timeouts": 0, "total_ms": 2.0 * served,
+            "max_ms": 3.0}]}
+    else:
+        domain = req.get("domain", "")
+        if domain == "crash.test":
+            os._exit(3)
+        if domain == "slow.test":
+            time.sleep(5)
+        served += 1
+        count = 4000 if domain == "huge.test" else 1
+        reply = {"id": req["id"], "result": {
+            "success": True, "domain": domain, "qtype": req.get("qtype", "A"),
+            "cached": False, "used_tcp": False, "latency_ms": 0.1,
+            "answers": [{"name": domain, "type": "A", "ttl": 60,
+                         "data": "192.0.2.1"}] * count,
+            "resolution_path": [], "pid": os.getpid(), "served": served,
+        }}
+    sys.stdout.write(json.dumps(reply) + "\n")
+    sys.stdout.flush()
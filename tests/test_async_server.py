@@ -0,0 +1,226 @@
+"""
+tests/test_async_server.py
+──────────────────────────
+The asyncio API server (api/async_server.py): same JSON as the Flask
+routes for the stub hierarchy, request deadlines (504), the concurrency
+limit (503), single-flight coalescing of concurrent misses, traced
+lookups, the isolated benchmark, 400 for a bad Content-Length, and
+/upstreams and /zones from the asyncio worker pool under the worker bridge.
+
+Run:  python -m pytest tests/test_async_server.py -v
+"""
+
+import os
+import sys
+import json
+import time
+import socket
+import asyncio
+import http.client
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(_ROOT, "api"))
+sys.path.insert(0, os.path.join(_ROOT, "bench"))
+sys.path.insert(0, os.path.join(_ROOT, "core"))
+
+import server                                                   # noqa: E402
+import benchmark                                                # noqa: E402
+from async_server import AsyncAPIServer, fallback_resolve_async  # noqa: E402
+from worker_pool import AsyncWorkerPool                           # noqa: E402
+from stub_dns import StubHierarchy                              # noqa: E402
+
+try:
+    import dnscore
+except ImportError:
+    dnscore = None
+
+FAKE_WORKER = os.path.join(_ROOT, "tests", "fake_worker.py")
+
+
+def _ok(domain):
+    return {"success": True, "domain": domain, "qtype": "A", "cached": False,
+            "used_tcp": False, "latency_ms": 1.0, "resolution_path": [],
+            "answers": [{"name": domain, "type": "A", "ttl": 60, "data": "192.0.2.9"}]}
+
+
+class _AsyncServerCase(unittest.TestCase):
+
+    def start(self, **kwargs):
+        mock.patch.object(server, "fallback_resolve", return_value=[]).start()
+        self.addCleanup(mock.patch.stopall)
+        server.cache.clear()
+        self.api = AsyncAPIServer("127.0.0.1", 0, **kwargs).start_in_thread()
+        self.addCleanup(self.api.stop_thread)
+
+    def get(self, path, method="GET", body=None) -> tuple:
+        conn = http.client.HTTPConnection("127.0.0.1", self.api.port, timeout=10)
+        try:
+            conn.request(method, path, body=body)
+            resp = conn.getresponse()
+            return resp.status, json.loads(resp.read()), dict(resp.getheaders())
+        finally:
+            conn.close()
+
+    def slow_bridge(self, delay, calls):
+        async def resolve(domain, qtype="A"):
+            calls.append(domain)
+            await asyncio.sleep(delay)
+            return _ok(domain)
+        mock.patch.object(self.api.bridge, "resolve", resolve).start()
+
+
+@unittest.skipIf(dnscore is None, "dnscore extension not built")
+class TestAsyncResolve(_AsyncServerCase):
+
+    def setUp(self):
+        self.stub = StubHierarchy().start()
+        self.addCleanup(self.stub.stop)
+        native = dnscore.Resolver(None, roots=self.stub.root_ips, port=self.stub.port)
+        mock.patch.object(server, "_native", native).start()
+        self.start()
+
+    def test_01_same_shape_as_flask(self):
+        status, body, headers = self.get("/resolve?domain=www.example.com")
+        self.assertEqual(status, 200)
+        self.assertEqual(headers["Access-Control-Allow-Origin"], "*")
+        self.assertEqual([a["data"] for a in body["answers"]], ["192.0.2.1"])
+        self.assertFalse(body["cached"])
+
+        server.cache.clear()
+        flask = server.app.test_client().get(
+            "/resolve", query_string={"domain": "www.example.com"}).get_json()
+        self.assertEqual(set(body), set(flask))
+
+    def test_02_cache_hit_and_metrics(self):
+        self.get("/resolve?domain=api.example.com")
+        self.stub.reset_counters()
+        _status, body, _h = self.get("/resolve?domain=api.example.com")
+        self.assertTrue(body["cached"])
+        self.assertEqual(self.stub.total_queries, 0)
+        _status, metrics, _h = self.get("/metrics")
+        self.assertEqual(metrics["coalescing"]["leaders"], 1)
+        self.assertGreaterEqual(metrics["cached_hits"], 1)
+
+    def test_03_errors(self):
+        self.assertEqual(self.get("/resolve?domain=")[0], 400)
+        self.assertEqual(self.get("/resolve?domain=www.example.com&type=XYZ")[0], 400)
+        status, body, _h = self.get("/resolve?domain=nope.example.com")
+        self.assertEqual((status, body["rcode"]), (404, "NXDOMAIN"))
+        self.assertEqual(self.get("/resolve", method="POST")[0], 405)
+
+    def test_04_cache_and_health(self):
+        self.get("/resolve?domain=www.example.com")
+        _status, body, _h = self.get("/cache")
+        self.assertEqual(body["stats"]["size"], len(body["entries"]))
+        self.assertEqual(self.get("/cache", method="DELETE")[0], 200)
+        self.assertEqual(self.get("/cache")[1]["stats"]["size"], 0)
+        status, health, _h = self.get("/health")
+        self.assertEqual((status, health["bridge"]), (200, "native"))
+
+    def test_05_trace_and_zones(self):
+        self.get("/resolve?domain=www.example.com")
+        status, body, _h = self.get("/resolve?domain=www.example.com&trace=1")
+        self.assertEqual(status, 200)
+        self.assertFalse(body["cached"])
+        self.assertEqual(body["trace"][-1]["outcome"], "answer")
+        self.assertNotIn("trace", self.get("/resolve?domain=www.example.com")[1])
+        _status, zones, _h = self.get("/zones")
+        self.assertEqual({z["zone"] for z in zones["zones"]}, {".", "com", "example.com"})
+
+    def test_06_async_fallback(self):
+        answers = asyncio.run(fallback_resolve_async(
+            "www.example.com", "A", server_ip="127.0.0.4", port=self.stub.port))
+        self.assertEqual([a["data"] for a in answers], ["192.0.2.1"])
+
+    def test_07_benchmark_leaves_the_cache_alone(self):
+        self.get("/resolve?domain=www.example.com")
+        with mock.patch.dict(os.environ, self.stub.env()), \
+                mock.patch.object(benchmark, "PUBLIC_RESOLVERS", {}):
+            status, body, _h = self.get("/benchmark", "POST",
+                                        json.dumps({"domains": ["www.example.com"], "runs": 2}))
+        self.assertEqual(status, 200)
+        row, = body["results"]
+        self.assertTrue(row["local_success"])
+        self.assertEqual(row["stats"]["local_cold"]["samples"], 2)
+        self.assertIsNotNone(server.cache.get("www.example.com/A"))
+        self.assertEqual(self.get("/benchmark", "POST", '{"runs": 0}')[0], 400)
+
+
+class TestAsyncLimits(_AsyncServerCase):
+
+    def test_deadline_returns_504(self):
+        self.start(deadline=0.3)
+        self.slow_bridge(2.0, [])
+        status, body, _h = self.get("/resolve?domain=slow.example.com")
+        self.assertEqual(status, 504)
+        self.assertIn("deadline", body["error"])
+
+    def test_concurrency_limit_returns_503(self):
+        self.start(max_concurrency=1)
+        self.slow_bridge(0.5, [])
+        with ThreadPoolExecutor(2) as ex:
+            first = ex.submit(self.get, "/resolve?domain=a.example.com")
+            while not self.api._flights:
+                time.sleep(0.01)
+            status, _body, headers = self.get("/resolve?domain=b.example.com")
+            self.assertEqual(first.result()[0], 200)
+        self.assertEqual(status, 503)
+        self.assertEqual(headers["Retry-After"], "1")
+
+    def test_concurrent_misses_coalesced(self):
+        self.start()
+        calls = []
+        self.slow_bridge(0.3, calls)
+        with ThreadPoolExecutor(8) as ex:
+            results = list(ex.map(lambda _: self.get("/resolve?domain=c.example.com"),
+                                  range(8)))
+        self.assertEqual([r[0] for r in results], [200] * 8)
+        self.assertEqual(calls, ["c.example.com"])
+        self.assertEqual(sum(r[1].get("coalesced", False) for r in results), 7)
+
+    def test_bad_content_length_returns_400(self):
+        self.start()
+        for length in ("abc", "-5"):
+            with socket.create_connection(("127.0.0.1", self.api.port), timeout=10) as s:
+                s.sendall(b"POST /resolve/batch HTTP/1.1\r\nHost: x\r\n"
+                          b"Content-Length: " + length.encode() + b"\r\n\r\n")
+                reply = b""
+                while chunk := s.recv(4096):
+                    reply += chunk
+            self.assertTrue(reply.startswith(b"HTTP/1.1 400 "), reply)
+            self.assertIn(b"bad Content-Length", reply)
+
+
+class TestAsyncWorkerBridge(_AsyncServerCase):
+    """DNS_NATIVE=0 with DNS_WORKERS: statistics come from the AsyncWorkerPool."""
+
+    def setUp(self):
+        mock.patch.object(server, "_native", None).start()
+        mock.patch.object(server, "WORKER_COUNT", 2).start()
+        mock.patch.object(server, "BINARY_PATH", FAKE_WORKER).start()
+        mock.patch.object(server, "get_worker_pool",
+                          side_effect=AssertionError("sync pool used")).start()
+        self.start()
+        self.api.bridge.pool = AsyncWorkerPool([sys.executable, FAKE_WORKER], size=2)
+
+    def test_upstreams_from_the_async_pool(self):
+        self.assertEqual(self.get("/upstreams")[1]["count"], 0)     # nothing started yet
+        for name in ("a.example.com", "b.example.com", "c.example.com"):
+            self.assertEqual(self.get(f"/resolve?domain={name}")[0], 200)
+        status, body, _h = self.get("/upstreams")
+        self.assertEqual((status, body["count"]), (200, 1))
+        self.assertEqual(body["servers"][0]["queries"], 3)
+
+    def test_zones_from_the_async_pool(self):
+        for name in ("a.example.com", "b.example.com"):
+            self.get(f"/resolve?domain={name}")
+        status, body, _h = self.get("/zones")
+        self.assertEqual((status, body["count"]), (200, 1))
+        self.assertEqual((body["zones"][0]["queries"], body["zones"][0]["avg_ms"]), (2, 2.0))
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
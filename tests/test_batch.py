@@ -0,0 +1,139 @@
+"""
+tests/test_batch.py
+───────────────────
+POST /resolve/batch on both front ends (Flask and api/async_server.py):
+dedupe, invalid items, cache hits before misses, the parallelism bound and
+the NDJSON summary line.  Also the `cli.py --batch` name-file reader.
+
+Run:  python -m pytest tests/test_batch.py -v
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import threading
+import http.client
+import unittest
+from unittest import mock
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, _ROOT)
+sys.path.insert(0, os.path.join(_ROOT, "api"))
+sys.path.insert(0, os.path.join(_ROOT, "bench"))
+sys.path.insert(0, os.path.join(_ROOT, "core"))
+
+import cli                                   # noqa: E402
+import server                                # noqa: E402
+from async_server import AsyncAPIServer      # noqa: E402
+from stub_dns import StubHierarchy           # noqa: E402
+
+try:
+    import dnscore
+except ImportError:
+    dnscore = None
+
+ITEMS = [
+    {"domain": "www.example.com"},
+    {"domain": "WWW.example.com.", "type": "a"},      # duplicate of the first
+    "api.example.com",
+    {"domain": "mail.example.com", "type": "A"},
+    {"domain": "nope.example.com"},
+    {"domain": "bad domain!"},
+    {"domain": "www.example.com", "type": "XYZ"},
+]
+
+
+def _lines(raw: bytes) -> list:
+    return [json.loads(line) for line in raw.splitlines() if line.strip()]
+
+
+@unittest.skipIf(dnscore is None, "dnscore extension not built")
+class TestBatchEndpoint(unittest.TestCase):
+
+    def setUp(self):
+        self.stub = StubHierarchy().start()
+        self.addCleanup(self.stub.stop)
+        native = dnscore.Resolver(None, roots=self.stub.root_ips, port=self.stub.port)
+        mock.patch.object(server, "_native", native).start()
+        mock.patch.object(server, "fallback_resolve", return_value=[]).start()
+        self.addCleanup(mock.patch.stopall)
+        server.cache.clear()
+        self.client = server.app.test_client()
+
+    def post(self, payload) -> list:
+        resp = self.client.post("/resolve/batch", json=payload)
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.mimetype, "application/x-ndjson")
+        return _lines(resp.data)
+
+    def check(self, lines):
+        *results, last = lines
+        by_name = {(r["domain"], r["type"]): r for r in results}
+        self.assertEqual(len(results), 6)                    # one duplicate dropped
+        self.assertEqual(by_name[("www.example.com", "A")]["ip"], "192.0.2.1")
+        self.assertEqual(by_name[("api.example.com", "A")]["status"], 200)
+        self.assertEqual(by_name[("nope.example.com", "A")]["rcode"], "NXDOMAIN")
+        self.assertEqual(by_name[("bad domain!", "A")]["status"], 400)
+        self.assertEqual(by_name[("www.example.com", "XYZ")]["status"], 400)
+        summary = last["summary"]
+        self.assertEqual((summary["items"], summary["unique"]), (7, 6))
+        self.assertEqual((summary["ok"], summary["negative"], summary["failed"]), (3, 1, 2))
+
+    def test_01_dedupe_validate_resolve(self):
+        self.check(self.post({"items": ITEMS}))
+
+    def test_02_cache_hits_streamed_before_misses(self):
+        self.client.get("/resolve", query_string={"domain": "mail.example.com"})
+        lines = self.post(["www.example.com", "mail.example.com"])
+        self.assertEqual(lines[0]["domain"], "mail.example.com")
+        self.assertTrue(lines[0]["cached"])
+        self.assertEqual(lines[-1]["summary"]["cache_hits"], 1)
+
+    def test_03_parallelism_bounds_concurrent_misses(self):
+        active, peak, lock = [0], [0], threading.Lock()
+
+        def slow_miss(domain, qtype, t0):
+            with lock:
+                active[0] += 1
+                peak[0] = max(peak[0], active[0])
+            time.sleep(0.05)
+            with lock:
+                active[0] -= 1
+            return {"domain": domain, "ip": "192.0.2.9"}, 200, {}
+
+        with mock.patch.object(server, "lookup_miss", slow_miss):
+            lines = self.post({"items": [f"h{i}.example.com" for i in range(20)],
+                               "parallelism": 3})
+        self.assertEqual(lines[-1]["summary"]["ok"], 20)
+        self.assertEqual(peak[0], 3)
+
+    def test_04_bad_body(self):
+        self.assertEqual(self.client.post("/resolve/batch", json={"x": 1}).status_code, 400)
+        self.assertEqual(self.client.post(
+            "/resolve/batch", json={"items": [], "parallelism": "many"}).status_code, 400)
+
+    def test_05_async_server_same_stream(self):
+        api = AsyncAPIServer("127.0.0.1", 0).start_in_thread()
+        self.addCleanup(api.stop_thread)
+        conn = http.client.HTTPConnection("127.0.0.1", api.port, timeout=10)
+        self.addCleanup(conn.close)
+        conn.request("POST", "/resolve/batch", body=json.dumps({"items": ITEMS}),
+                     headers={"Content-Type": "application/json"})
+        resp = conn.getresponse()
+        self.assertEqual(resp.getheader("Transfer-Encoding"), "chunked")
+        self.check(_lines(resp.read()))
+
+
+class TestCliBatchNames(unittest.TestCase):
+
+    def test_reads_names_types_and_skips_comments(self):
+        items = cli.read_batch_names(io.StringIO(
+            "# enrichment list\nexample.com\n\n  example.org mx  # comment\n"), "AAAA")
+        self.assertEqual(items, [{"domain": "example.com", "type": "AAAA"},
+                                 {"domain": "example.org", "type": "MX"}])
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,104 @@
+"""
+tests/test_bench_load.py
+────────────────────────
+The offline load harness (bench/bench_load.py): the query sequence is a
+pure function of the arguments, popularity follows the Zipf skew, the
+stub's loss / truncation knobs, and a short run against the native
+resolver produces a complete report.
+
+Run:  python -m pytest tests/test_bench_load.py -v
+"""
+
+import os
+import sys
+import socket
+import unittest
+from collections import Counter
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(_ROOT, "api"))
+sys.path.insert(0, os.path.join(_ROOT, "bench"))
+sys.path.insert(0, os.path.join(_ROOT, "core"))
+
+import bench_load                    # noqa: E402
+from stub_dns import StubHierarchy   # noqa: E402
+
+try:
+    import dnscore
+except ImportError:
+    dnscore = None
+
+
+class TestWorkload(unittest.TestCase):
+
+    def test_01_same_arguments_same_queries(self):
+        args = bench_load.parse_args(["--qps", "100", "--duration", "5", "--nxdomain", "0.1"])
+        first = bench_load.query_names(args)
+        self.assertEqual(first, bench_load.query_names(args))
+        self.assertEqual(len(first), 500)
+        self.assertTrue(any(n.startswith("missing") for n in first))
+        args.seed = 2
+        self.assertNotEqual(first, bench_load.query_names(args))
+
+    def test_02_zipf_skew(self):
+        zipf = bench_load.Zipf(1000, 1.0, bench_load.random.Random(3))
+        counts = Counter(zipf() for _ in range(20_000))
+        share = counts[0] / 20_000
+        self.assertAlmostEqual(share, 1 / sum(1 / k for k in range(1, 1001)), delta=0.02)
+        self.assertGreater(counts[0], 5 * counts[9])
+
+    def test_03_zones_cover_every_name(self):
+        spec = bench_load.load_zones(names=50, zones=5, servers=2)
+        self.assertEqual(sum(len(z.get("records", [])) for z in spec.values()), 50)
+        self.assertEqual(len(spec["zone1.net."]["servers"]), 2)
+
+
+@unittest.skipIf(dnscore is None, "dnscore extension not built")
+class TestStubKnobs(unittest.TestCase):
+
+    def test_loss_and_truncation_rates(self):
+        with StubHierarchy() as stub:
+            stub.seed(1).configure(loss=0.5)
+            query = dnscore.build_query("www.example.com", "A", id=7)
+            replies = 0
+            with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+                sock.settimeout(0.05)
+                for _ in range(40):
+                    sock.sendto(query, ("127.0.0.4", stub.port))
+                    try:
+                        sock.recv(512)
+                        replies += 1
+                    except socket.timeout:
+                        pass
+            lost = stub.servers["127.0.0.4"].lost
+            self.assertEqual(replies + lost, 40)
+            self.assertTrue(8 <= lost <= 32, lost)
+
+            stub.configure(loss=0.0, truncate=1.0)
+            resolver = dnscore.Resolver(None, roots=stub.root_ips, port=stub.port)
+            self.assertTrue(resolver.resolve("api.example.com")["used_tcp"])
+            with self.assertRaises(AttributeError):
+                stub.configure(latency=1)
+
+
+@unittest.skipIf(dnscore is None, "dnscore extension not built")
+class TestShortRun(unittest.TestCase):
+
+    def test_native_run_report(self):
+        args = bench_load.parse_args(["--target", "native", "--qps", "200", "--duration", "1",
+                                      "--names", "200", "--zones", "4", "--latency", "1",
+                                      "--jitter", "0", "--concurrency", "8"])
+        run = bench_load.run(args)
+        r = run["result"]
+        self.assertEqual((r["sent"], r["answered"], r["failures"]), (200, 200, 0))
+        self.assertGreater(r["hit_ratio"], 0.3)
+        up = r["upstream"]
+        self.assertEqual(up["queries"], up["root"] + up["tld"] + up["auth"])
+        # One referral per TLD, plus cold misses that raced to the root together.
+        self.assertTrue(3 <= up["root"] <= 8, up["root"])
+        self.assertLessEqual(r["latency_ms"]["p50"], r["latency_ms"]["p99"])
+        self.assertEqual(run["args"]["target"], "native")
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,103 @@
+"""
+tests/test_benchmark.py
+───────────────────────
+POST /benchmark on scratch state (api/benchmark.py): every cold sample walks
+from the root of the stub hierarchy, the serving caches are left as they
+were, the public resolvers are timed concurrently, and each measurement is
+reported as a median with its spread.
+
+Run:  python -m pytest tests/test_benchmark.py -v
+"""
+
+import os
+import sys
+import unittest
+from unittest import mock
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(_ROOT, "api"))
+sys.path.insert(0, os.path.join(_ROOT, "bench"))
+sys.path.insert(0, os.path.join(_ROOT, "core"))
+
+import server                        # noqa: E402
+import benchmark                     # noqa: E402
+from stub_dns import StubHierarchy   # noqa: E402
+
+try:
+    import dnscore
+except ImportError:
+    dnscore = None
+
+
+class TestSpreadAndRequest(unittest.TestCase):
+
+    def test_01_spread(self):
+        s = benchmark.spread([4.0, None, 1.0, 3.0, 2.0, 5.0])
+        self.assertEqual(s, {"samples": 6, "failures": 1, "median": 3.0, "min": 1.0,
+                             "q1": 2.0, "q3": 4.0, "max": 5.0})
+        self.assertEqual(benchmark.spread([7.0])["q3"], 7.0)
+        self.assertIsNone(benchmark.spread([None, None])["median"])
+
+    def test_02_parse_request(self):
+        self.assertEqual(benchmark.parse_request({"domains": ["a.test"], "type": "aaaa"}),
+                         (["a.test"], "AAAA", benchmark.DEFAULT_RUNS))
+        for bad in ({"runs": 0}, {"runs": 21}, {"runs": "3"}, {"runs": True},
+                    {"domains": "a.test"}, {"domains": ["x"] * 21}, {"domains": [1]}):
+            with self.assertRaises(ValueError, msg=bad):
+                benchmark.parse_request(bad)
+
+
+@unittest.skipIf(dnscore is None, "dnscore extension not built")
+class TestIsolatedBenchmark(unittest.TestCase):
+
+    def setUp(self):
+        self.stub = StubHierarchy().start()
+        self.addCleanup(self.stub.stop)
+        mock.patch.dict(os.environ, self.stub.env()).start()      # scratch resolvers
+        native = dnscore.Resolver(dnscore.Cache(100), roots=self.stub.root_ips,
+                                  port=self.stub.port)
+        mock.patch.object(server, "_native", native).start()
+        mock.patch.object(benchmark, "PUBLIC_RESOLVERS",
+                          {"google": "127.0.0.4", "cloudflare": "127.0.0.5"}).start()
+        mock.patch.object(benchmark, "PUBLIC_PORT", self.stub.port).start()
+        mock.patch.object(benchmark, "PUBLIC_TIMEOUT", 0.2).start()
+        self.addCleanup(mock.patch.stopall)
+        server.cache.clear()
+        self.addCleanup(server.cache.clear)
+        self.client = server.app.test_client()
+
+    def test_01_every_cold_sample_walks_from_the_root(self):
+        body = self.client.post("/benchmark", json={"domains": ["www.example.com"],
+                                                    "runs": 3}).get_json()
+        row, = body["results"]
+        self.assertTrue(row["local_success"])
+        self.assertEqual(self.stub.per_ip["127.0.0.2"], 3)        # no shared delegations
+        self.assertEqual(row["stats"]["local_cold"]["samples"], 3)
+        self.assertEqual(row["local_cold_ms"], row["stats"]["local_cold"]["median"])
+        self.assertLessEqual(row["stats"]["local_cold"]["min"], row["local_cold_ms"])
+        self.assertLess(row["local_warm_ms"], row["local_cold_ms"])
+        self.assertEqual(row["stats"]["local_warm"]["failures"], 0)
+
+    def test_02_serving_caches_are_untouched(self):
+        self.client.get("/resolve", query_string={"domain": "www.example.com"})
+        before = server.cache.stats()["size"]
+        self.stub.reset_counters()
+        self.client.post("/benchmark", json={"domains": ["www.example.com",
+                                                         "api.example.com"], "runs": 2})
+        self.assertEqual(server.cache.stats()["size"], before)
+        self.assertIsNotNone(server.cache.get("www.example.com/A"))
+        self.stub.reset_counters()
+        self.client.get("/resolve", query_string={"domain": "api.example.com"})
+        self.assertEqual(self.stub.per_ip.get("127.0.0.2", 0), 0)  # native cache still warm
+
+    def test_03_public_resolvers_and_failures(self):
+        row, = self.client.post("/benchmark", json={"domains": ["www.example.com"],
+                                                    "runs": 2}).get_json()["results"]
+        self.assertGreater(row["google_ms"], 0)                   # the stub's example.com NS
+        self.assertEqual(row["cloudflare_ms"], -1.0)              # nothing listens there
+        self.assertEqual(row["stats"]["cloudflare"]["failures"], 2)
+        self.assertEqual(self.client.post("/benchmark", json={"runs": 50}).status_code, 400)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,146 @@
+"""
+tests/test_budget.py
+────────────────────
+The per-resolution budget of the C++ walk (core/dns_resolver.cpp): one
+deadline and one upstream-query cap shared by the walk, its CNAME follow-ups
+and its glue-less NS lookups.  A chain of zones whose name servers can only
+be found through the next zone needs ever more queries; a capped resolver
+stops sending at the limit, a short deadline cuts the hop timeout down to
+what is left, and either way the result is a SERVFAIL carrying the hops it
+got through — natively, in the --serve worker, and in the API's 404 body.
+
+Run:  python -m pytest tests/test_budget.py -v
+"""
+
+import os
+import sys
+import json
+import time
+import subprocess
+import unittest
+from unittest import mock
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(_ROOT, "api"))
+sys.path.insert(0, os.path.join(_ROOT, "bench"))
+sys.path.insert(0, os.path.join(_ROOT, "core"))
+
+import server                        # noqa: E402
+from stub_dns import StubHierarchy   # noqa: E402
+
+try:
+    import dnscore
+except ImportError:
+    dnscore = None
+
+_BINARY = os.path.join(_ROOT, "core", "dns_resolver")
+
+# z0.test is served by ns.z1.test (127.0.1.1), whose address lives in z1.test,
+# served by ns.z2.test … down to z6.test, served by its own ns.z6.test (with
+# glue), which also serves z5.test.
+DEPTH = 6
+
+
+def _chain_zones() -> dict:
+    zones = {
+        ".":     {"servers": {"a.root.test.": "127.0.0.2"}},
+        "test.": {"servers": {"a.tld.test.": "127.0.0.3"}},
+        "cdn.test.": {"servers": {"ns.cdn.test.": "127.0.0.4"},
+                      "records": [("www.cdn.test.", "CNAME", 300, "www.z0.test.")]},
+    }
+    for i in range(DEPTH + 1):
+        if i < DEPTH:
+            servers = {f"ns.z{i + 1}.test.": f"127.0.1.{i + 1}"}
+        else:
+            servers = {f"ns.z{i}.test.": f"127.0.1.{i}"}
+        records = [(f"ns.z{i}.test.", "A", 300, f"127.0.1.{i}")] if 0 < i < DEPTH else []
+        if i == 0:
+            records.append(("www.z0.test.", "A", 300, "192.0.2.80"))
+        zones[f"z{i}.test."] = {"servers": servers, "glueless": i < DEPTH, "records": records}
+    return zones
+
+
+CHAIN_ZONES = _chain_zones()
+
+
+@unittest.skipIf(dnscore is None, "dnscore extension not built")
+class TestWalkBudget(unittest.TestCase):
+
+    def setUp(self):
+        self.stub = StubHierarchy(CHAIN_ZONES).start()
+        self.addCleanup(self.stub.stop)
+
+    def resolver(self, **limits):
+        return dnscore.Resolver(None, roots=self.stub.root_ips, port=self.stub.port, **limits)
+
+    def test_01_chain_resolves_within_the_default_budget(self):
+        r = self.resolver().resolve("www.z0.test", trace=True)
+        self.assertEqual([a["data"] for a in r["answers"]], ["192.0.2.80"])
+        self.assertNotIn("exhausted", r)
+        self.assertGreater(sum(h["ns_lookup"] for h in r["trace"]), DEPTH)
+        self.assertEqual(len(r["trace"]), self.stub.total_queries)
+
+    def test_02_query_limit_stops_the_ns_lookups(self):
+        r = self.resolver(max_queries=6).resolve("www.z0.test")
+        self.assertEqual((r["success"], r["rcode"], r["exhausted"]),
+                         (False, "SERVFAIL", "query limit"))
+        self.assertTrue(r["error"].startswith("Resolution budget exhausted (query limit) "
+                                              "after 6 upstream queries"))
+        self.assertEqual((r["upstream_queries"], len(r["trace"])), (6, 6))
+        self.assertEqual(self.stub.total_queries, 6)
+        self.assertTrue(all(h["ns_lookup"] for h in r["trace"][2:]))
+
+    def test_03_cname_follow_up_shares_the_budget(self):
+        r = self.resolver(max_queries=5).resolve("www.cdn.test", trace=True)
+        self.assertEqual(r["exhausted"], "query limit")
+        self.assertEqual([h["outcome"] for h in r["trace"][:3]], ["referral", "referral", "cname"])
+        self.assertEqual([h["qname"] for h in r["trace"][3:]], ["www.z0.test", "ns.z1.test"])
+        self.assertEqual(self.stub.total_queries, 5)
+
+    def test_04_deadline_cuts_the_hop_timeout(self):
+        self.stub.servers["127.0.1.1"].drop = True             # z0.test's only server
+        resolver = self.resolver(deadline=0.25)
+        t0 = time.perf_counter()
+        r = resolver.resolve("www.z0.test")
+        self.assertLess(time.perf_counter() - t0, 1.0)          # HOP_TIMEOUT_S is 2 s
+        self.assertEqual((r["rcode"], r["exhausted"]), ("SERVFAIL", "deadline"))
+        last = r["trace"][-1]
+        self.assertEqual((last["server"], last["outcome"], last["detail"]),
+                         ("127.0.1.1", "timeout", "deadline"))
+        self.assertLessEqual(last["start_ms"] + last["rtt_ms"], 300)
+        # Cut short by the budget within its 376 ms RTO: no timeout held against it.
+        stats = {s["ip"]: s for s in resolver.server_stats()}
+        self.assertEqual(stats["127.0.1.1"]["timeouts"], 0)
+
+
+@unittest.skipIf(dnscore is None, "dnscore extension not built")
+class TestServerBudget(unittest.TestCase):
+
+    def test_exhausted_walk_is_a_servfail_with_its_trace(self):
+        with StubHierarchy(CHAIN_ZONES) as stub:
+            native = dnscore.Resolver(None, roots=stub.root_ips, port=stub.port, max_queries=3)
+            with mock.patch.object(server, "_native", native), \
+                    mock.patch.object(server, "fallback_resolve", return_value=[]):
+                body, status, _h = server.lookup_miss("www.z0.test", "A", time.perf_counter())
+        self.assertEqual((status, body["rcode"], body["exhausted"]),
+                         (404, "SERVFAIL", "query limit"))
+        self.assertEqual((body["upstream_queries"], len(body["trace"])), (3, 3))
+        self.assertIsNone(server.cache.get("www.z0.test/A"))
+
+
+@unittest.skipUnless(os.path.isfile(_BINARY), "C++ binary not built")
+class TestWorkerBudget(unittest.TestCase):
+
+    def test_budget_from_the_environment(self):
+        with StubHierarchy(CHAIN_ZONES) as stub:
+            proc = subprocess.run(
+                [_BINARY, "--serve"], text=True, capture_output=True, timeout=20,
+                env=dict(os.environ, DNS_MAX_UPSTREAM_QUERIES="2", **stub.env()),
+                input='{"id": 1, "domain": "www.z0.test", "qtype": "A"}\n')
+        result = json.loads(proc.stdout)["result"]
+        self.assertEqual((result["rcode"], result["exhausted"]), ("SERVFAIL", "query limit"))
+        self.assertEqual([h["zone"] for h in result["trace"]], [".", "test"])
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,140 @@
+"""
+tests/test_cache.py
+───────────────────
+The API's lock-striped DNSCache (api/server.py): entry and byte limits,
+second-chance LRU eviction, monotonic expiry and concurrent use; and the
+pre-encoded CachedResponse bodies served on hits.
+
+Run:  python -m pytest tests/test_cache.py -v
+"""
+
+import os
+import sys
+import json
+import threading
+import unittest
+from unittest import mock
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(_ROOT, "api"))
+
+import server   # noqa: E402
+
+
+class TestShardedCache(unittest.TestCase):
+
+    def test_01_entry_capacity_is_global(self):
+        c = server.DNSCache(capacity=1000, shards=16)
+        for i in range(3000):
+            c.put(f"host{i}.example.com/A", {"i": i}, ttl=60)
+        stats = c.stats()
+        self.assertEqual(stats["size"], 1000)
+        self.assertEqual(stats["evictions"], 2000)
+        self.assertEqual(stats["shards"], 8)              # ≥ 64 entries a shard
+
+    def test_02_byte_capacity(self):
+        c = server.DNSCache(capacity=1000, max_bytes=20_000)
+        for i in range(200):
+            c.put(f"h{i}/A", {"pad": "x" * 300}, ttl=60)
+        stats = c.stats()
+        self.assertLessEqual(stats["bytes"], 20_000)
+        self.assertLess(stats["size"], 200)
+        self.assertIsNotNone(c.get("h199/A"))             # newest survives
+
+    def test_03_recently_read_entry_gets_second_chance(self):
+        c = server.DNSCache(capacity=3)
+        for k in ("a", "b", "c"):
+            c.put(k, {"k": k}, ttl=60)
+        c.get("a")                                        # oldest, but just read
+        c.put("d", {"k": "d"}, ttl=60)
+        self.assertIsNotNone(c.get("a"))
+        self.assertIsNone(c.get("b"))
+
+    def test_04_expiry_uses_monotonic_clock(self):
+        c = server.DNSCache()
+        now = [1000.0]
+        with mock.patch.object(server, "_monotonic", lambda: now[0]):
+            c.put("k", {"v": 1}, ttl=30)
+            with mock.patch.object(server.time, "time", return_value=0):   # wall clock jump
+                self.assertEqual(c.lookup("k")[1], 30)
+            now[0] += 30
+            self.assertIsNone(c.lookup("k"))
+        self.assertEqual(c.stats()["size"], 0)
+
+    def test_05_concurrent_put_and_get(self):
+        c = server.DNSCache(capacity=500)
+        errors = []
+
+        def worker(n):
+            try:
+                for i in range(2000):
+                    key = f"w{(n * 7919 + i) % 900}/A"
+                    if c.get(key) is None:
+                        c.put(key, {"i": i}, ttl=60)
+            except Exception as e:                        # pragma: no cover
+                errors.append(e)
+
+        threads = [threading.Thread(target=worker, args=(n,)) for n in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(errors, [])
+        stats = c.stats()
+        self.assertLessEqual(stats["size"], 500 + 8)      # racing inserts, never unbounded
+        self.assertEqual(stats["size"], len(c.all_entries()))
+
+
+BODY = {
+    "domain": "www.example.com", "ip": "192.0.2.1", "record_type": "A",
+    "cached": False, "latency_ms": 41.2, "ttl": 60,
+    "answers": [{"name": "www.example.com", "type": "CNAME", "ttl": 300,
+                 "data": "web.example.com"},
+                {"name": "web.example.com", "type": "A", "ttl": 60, "data": "192.0.2.1"}],
+    "resolution_path": ["198.41.0.4"], "note": "slot-like text: \"slot-1\"",
+}
+
+
+class TestCachedResponse(unittest.TestCase):
+
+    def test_01_spliced_json_matches_full_encoding(self):
+        resp = server.CachedResponse(dict(BODY))
+        for remaining in (60, 59.5, 12.2, 0.4):
+            self.assertEqual(resp.json(remaining, 0.012),
+                             server._encode(resp.render(remaining, 0.012)))
+        aged = json.loads(resp.json(12.2, 0.012))
+        self.assertEqual((aged["ttl"], aged["cached"], aged["latency_ms"]), (12, True, 0.012))
+        self.assertEqual([a["ttl"] for a in aged["answers"]], [253, 13])
+
+    def test_02_negative_entry(self):
+        neg = {"domain": "nope.example.com", "negative": True, "rcode": "NXDOMAIN",
+               "ttl": 900, "answers": [],
+               "authorities": [{"name": "example.com", "type": "SOA", "ttl": 3600,
+                                "data": "ns. host. serial=1 minimum=900"}]}
+        resp = server.CachedResponse(neg)
+        self.assertEqual(resp.status, 404)
+        self.assertEqual(json.loads(resp.json(450, 0.1))["authorities"][0]["ttl"], 3150)
+
+    def test_03_hits_never_touch_the_stored_body(self):
+        body = json.loads(json.dumps(BODY))
+        resp = server.CachedResponse(body)
+        server.cache.clear()
+        server.cache.put("www.example.com/A", resp, ttl=60)
+        for _ in range(3):
+            server.lookup_cached("www.example.com", "A", 0.0)
+            server.lookup_cached_json("www.example.com", "A", 0.0)
+        self.assertEqual(body, BODY)
+        self.assertIs(server.cache.get("www.example.com/A").body, body)
+
+    def test_04_flask_hit_serves_the_bytes(self):
+        server.cache.clear()
+        server.cache.put("www.example.com/A", server.CachedResponse(dict(BODY)), ttl=60)
+        r = server.app.test_client().get("/resolve", query_string={"domain": "www.example.com"})
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(r.mimetype, "application/json")
+        self.assertTrue(r.get_json()["cached"])
+        self.assertEqual(r.get_json()["answers"][1]["data"], "192.0.2.1")
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
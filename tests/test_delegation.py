@@ -0,0 +1,103 @@
+"""
+tests/test_delegation.py
+────────────────────────
+Delegation (zone-cut) cache tests: the C++ resolver is pointed at the
+loopback stub hierarchy in bench/stub_dns.py and the queries each stub
+server receives are counted.
+
+Run:  python -m pytest tests/test_delegation.py -v
+"""
+
+import os
+import sys
+import json
+import subprocess
+import unittest
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(_ROOT, "bench"))
+sys.path.insert(0, os.path.join(_ROOT, "core"))
+
+from stub_dns import StubHierarchy   # noqa: E402
+
+try:
+    import dnscore
+except ImportError:
+    dnscore = None
+
+_BINARY = os.path.join(_ROOT, "core", "dns_resolver")
+
+
+@unittest.skipIf(dnscore is None, "dnscore extension not built")
+class TestDelegationCache(unittest.TestCase):
+
+    def setUp(self):
+        self.stub = StubHierarchy().start()
+        self.addCleanup(self.stub.stop)
+        self.resolver = dnscore.Resolver(dnscore.Cache(100),
+                                         roots=self.stub.root_ips, port=self.stub.port)
+
+    def test_01_cold_walk_starts_at_root(self):
+        r = self.resolver.resolve("www.example.com", "A")
+        self.assertTrue(r["success"])
+        self.assertEqual(r["start_zone"], ".")
+        self.assertEqual(r["hops_saved"], 0)
+        self.assertEqual(r["resolution_path"], ["127.0.0.2", "127.0.0.3", "127.0.0.4"])
+
+    def test_02_sibling_name_starts_at_cached_zone(self):
+        self.resolver.resolve("www.example.com", "A")
+        self.stub.reset_counters()
+        r = self.resolver.resolve("api.example.com", "A")
+        self.assertEqual(r["answers"][0]["data"], "192.0.2.2")
+        self.assertEqual(r["start_zone"], "example.com.")
+        self.assertEqual(r["hops_saved"], 2)
+        self.assertEqual(r["resolution_path"], ["127.0.0.4"])
+        self.assertEqual(self.stub.per_ip["127.0.0.2"], 0, "root must not be asked")
+        self.assertEqual(self.stub.total_queries, 1)
+
+    def test_03_new_zone_under_cached_tld(self):
+        self.resolver.resolve("www.example.com", "A")
+        self.stub.reset_counters()
+        r = self.resolver.resolve("www.glueless.com", "A")
+        self.assertTrue(r["success"])
+        self.assertEqual(r["start_zone"], "com.")
+        self.assertEqual(self.stub.per_ip["127.0.0.2"], 0)
+
+    def test_04_glueless_ns_address_reused(self):
+        r = self.resolver.resolve("www.glueless.com", "A")
+        self.assertTrue(r["success"])
+        self.stub.reset_counters()
+        r = self.resolver.resolve("api.glueless.com", "A")
+        self.assertEqual(r["answers"][0]["data"], "192.0.2.51")
+        self.assertEqual(r["start_zone"], "glueless.com.")
+        # Only the authoritative server: no repeat of the glue-less NS lookup.
+        self.assertEqual(self.stub.total_queries, 1)
+
+    def test_05_delegation_stats(self):
+        self.resolver.resolve("www.example.com", "A")
+        self.resolver.resolve("api.example.com", "A")
+        s = self.resolver.delegation_stats()
+        self.assertGreaterEqual(s["zones"], 2)          # com, example.com
+        self.assertGreaterEqual(s["hits"], 1)
+
+
+@unittest.skipUnless(os.path.isfile(_BINARY), "C++ binary not built")
+class TestWorkerDelegation(unittest.TestCase):
+
+    def test_worker_keeps_delegations_across_requests(self):
+        with StubHierarchy() as stub:
+            env = dict(os.environ, **stub.env())
+            proc = subprocess.run(
+                [_BINARY, "--serve"], env=env, text=True, capture_output=True,
+                timeout=20,
+                input='{"id": 1, "domain": "www.example.com", "qtype": "A"}\n'
+                      '{"id": 2, "domain": "api.example.com", "qtype": "A"}\n'
+                      '{"id": 3, "op": "ping"}\n')
+        replies = [json.loads(line) for line in proc.stdout.splitlines()]
+        self.assertEqual(replies[0]["result"]["start_zone"], ".")
+        self.assertEqual(replies[1]["result"]["start_zone"], "example.com.")
+        self.assertGreaterEqual(replies[2]["delegations"]["zones"], 2)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
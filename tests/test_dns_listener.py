@@ -0,0 +1,156 @@
+"""
+tests/test_dns_listener.py
+──────────────────────────
+The native DNS front end (api/dns_listener.py): wire-format queries over
+UDP and TCP on loopback, resolved through server.py's cache and the C++
+resolver pointed at the stub hierarchy.
+
+Run:  python -m pytest tests/test_dns_listener.py -v
+"""
+
+import os
+import sys
+import socket
+import struct
+import unittest
+from unittest import mock
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(_ROOT, "api"))
+sys.path.insert(0, os.path.join(_ROOT, "bench"))
+sys.path.insert(0, os.path.join(_ROOT, "core"))
+
+import server                                       # noqa: E402
+import dnswire                                      # noqa: E402
+from dns_listener import DNSListener, reply_for     # noqa: E402
+from stub_dns import StubHierarchy, DEFAULT_ZONES   # noqa: E402
+
+try:
+    import dnscore
+except ImportError:
+    dnscore = None
+
+BIG = [f"192.0.2.{100 + i}" for i in range(40)]     # > 1232 bytes as an RRset
+MID = [f"192.0.2.{200 + i}" for i in range(24)]     # > 512, < 1232
+
+ZONES = {k: dict(v) for k, v in DEFAULT_ZONES.items()}
+ZONES["example.com."]["records"] = DEFAULT_ZONES["example.com."]["records"] + [
+    ("big.example.com.", "A", 300, ip) for ip in BIG
+] + [("mid.example.com.", "A", 300, ip) for ip in MID]
+
+
+def _rcode(reply: bytes) -> int:
+    return reply[3] & 0x0F
+
+
+@unittest.skipIf(dnscore is None, "dnscore extension not built")
+class TestDNSListener(unittest.TestCase):
+
+    def setUp(self):
+        self.stub = StubHierarchy(ZONES).start()
+        self.addCleanup(self.stub.stop)
+        native = dnscore.Resolver(None, roots=self.stub.root_ips, port=self.stub.port)
+        mock.patch.object(server, "_native", native).start()
+        mock.patch.object(server, "fallback_resolve", return_value=[]).start()
+        self.addCleanup(mock.patch.stopall)
+        server.cache.clear()
+        self.listener = DNSListener("127.0.0.1", 0).start_in_thread()
+        self.addCleanup(self.listener.stop_thread)
+
+    def udp(self, pkt: bytes) -> bytes:
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+            s.settimeout(5)
+            s.sendto(pkt, ("127.0.0.1", self.listener.port))
+            return s.recv(4096)
+
+    def query(self, name, qtype="A", msg_id=0x1234) -> tuple:
+        reply = self.udp(dnswire.build_query(name, dnswire.QTYPE_IDS[qtype], msg_id))
+        return reply, dnscore.parse_response(reply)
+
+    def test_01_answer_over_udp(self):
+        reply, msg = self.query("www.example.com")
+        self.assertEqual(reply[:2], b"\x12\x34")
+        flags = struct.unpack("!H", reply[2:4])[0]
+        self.assertTrue(flags & dnswire.FLAG_QR)
+        self.assertTrue(flags & dnswire.FLAG_RD)
+        self.assertTrue(flags & dnswire.FLAG_RA)
+        self.assertEqual(_rcode(reply), dnswire.RCODE_NOERROR)
+        self.assertEqual([a["data"] for a in msg["answers"]], ["192.0.2.1"])
+
+    def test_02_shares_cache_with_http(self):
+        self.query("www.example.com")
+        self.stub.reset_counters()
+        body = server.app.test_client().get(
+            "/resolve", query_string={"domain": "www.example.com"}).get_json()
+        self.assertTrue(body["cached"])
+        _reply, msg = self.query("www.example.com")
+        self.assertEqual(len(msg["answers"]), 1)
+        self.assertEqual(self.stub.total_queries, 0)
+
+    def test_03_nxdomain_with_soa(self):
+        reply, msg = self.query("nope.example.com")
+        self.assertEqual(_rcode(reply), dnswire.RCODE_NXDOMAIN)
+        self.assertEqual(msg["authorities"][0]["type"], "SOA")
+
+    def test_04_question_case_echoed(self):
+        reply = self.udp(struct.pack("!HHHHHH", 7, dnswire.FLAG_RD, 1, 0, 0, 0)
+                         + b"\x03WwW\x07ExAmPlE\x03CoM\x00\x00\x01\x00\x01")
+        self.assertIn(b"\x03WwW\x07ExAmPlE\x03CoM\x00", reply)
+        self.assertEqual(_rcode(reply), dnswire.RCODE_NOERROR)
+
+    def test_05_formerr_and_notimp(self):
+        self.assertEqual(_rcode(self.udp(b"\xab\xcd\x01\x00\x00\x01\x00\x00\x00\x00\x00\x00\x05ab")),
+                         dnswire.RCODE_FORMERR)
+        self.assertEqual(_rcode(self.udp(dnswire.build_query("www.example.com", 99, 5))),
+                         dnswire.RCODE_NOTIMP)
+
+    def test_06_large_answer_truncated_on_udp_full_on_tcp(self):
+        reply, _msg = self.query("big.example.com")
+        self.assertTrue(struct.unpack("!H", reply[2:4])[0] & dnswire.FLAG_TC)
+
+        with socket.create_connection(("127.0.0.1", self.listener.port), timeout=5) as s:
+            q = dnswire.build_query("big.example.com", 1, 77)
+            s.sendall(struct.pack("!H", len(q)) + q)
+            n = struct.unpack("!H", s.recv(2, socket.MSG_WAITALL))[0]
+            msg = dnscore.parse_response(s.recv(n, socket.MSG_WAITALL))
+        self.assertEqual(sorted(a["data"] for a in msg["answers"]), sorted(BIG))
+        self.assertEqual(self.listener.stats()["truncated"], 1)
+
+    def test_07_edns_raises_the_udp_limit(self):
+        reply, msg = self.query("mid.example.com")
+        self.assertTrue(struct.unpack("!H", reply[2:4])[0] & dnswire.FLAG_TC)
+        self.assertEqual(msg["edns_payload"], 0)
+        reply = self.udp(dnswire.build_query("mid.example.com", 1, 8, edns=4096))
+        msg = dnscore.parse_response(reply)
+        self.assertFalse(struct.unpack("!H", reply[2:4])[0] & dnswire.FLAG_TC)
+        self.assertEqual(sorted(a["data"] for a in msg["answers"]), sorted(MID))
+        self.assertEqual(msg["edns_payload"], dnswire.EDNS_PAYLOAD)
+        # Capped at EDNS_PAYLOAD whatever the client offers; TC replies keep the OPT.
+        reply = self.udp(dnswire.build_query("big.example.com", 1, 9, edns=4096))
+        self.assertTrue(struct.unpack("!H", reply[2:4])[0] & dnswire.FLAG_TC)
+        self.assertEqual(dnswire.edns_payload(reply), dnswire.EDNS_PAYLOAD)
+
+    def test_08_tcp_pipelining(self):
+        names = {11: "www.example.com", 12: "api.example.com", 13: "mail.example.com"}
+        with socket.create_connection(("127.0.0.1", self.listener.port), timeout=5) as s:
+            s.sendall(b"".join(struct.pack("!H", len(q)) + q for q in
+                               (dnswire.build_query(n, 1, i) for i, n in names.items())))
+            got = {}
+            for _ in names:
+                n = struct.unpack("!H", s.recv(2, socket.MSG_WAITALL))[0]
+                reply = s.recv(n, socket.MSG_WAITALL)
+                got[struct.unpack("!H", reply[:2])[0]] = dnscore.parse_response(reply)
+        self.assertEqual(set(got), set(names))
+        self.assertEqual(got[12]["answers"][0]["data"], "192.0.2.2")
+
+
+class TestReplyFor(unittest.TestCase):
+
+    def test_servfail_for_failed_lookup(self):
+        rcode, answers, _ = reply_for({"error": "x"}, 503)
+        self.assertEqual(rcode, dnswire.RCODE_SERVFAIL)
+        self.assertEqual(answers, [])
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
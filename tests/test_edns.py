@@ -0,0 +1,189 @@
+"""
+tests/test_edns.py
+──────────────────
+EDNS0 (RFC 6891) on both sides of the service: the OPT record written by the
+C++ build_query() and by api/dnswire.py, read back by dns::PacketView; a
+40-address RRset that comes back over UDP when the walk advertises 1232 bytes
+and needs a TCP retry without EDNS0; an old server that answers FORMERR to
+OPT, which the walk and the forwarder pool both ask again plainly and then
+remember; and the miss TCP-fallback rate /metrics reports.
+
+Run:  python -m pytest tests/test_edns.py -v
+"""
+
+import os
+import sys
+import time
+import unittest
+from unittest import mock
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(_ROOT, "api"))
+sys.path.insert(0, os.path.join(_ROOT, "bench"))
+sys.path.insert(0, os.path.join(_ROOT, "core"))
+
+import dnswire                       # noqa: E402
+import server                        # noqa: E402
+import forwarder                     # noqa: E402
+from stub_dns import StubHierarchy   # noqa: E402
+
+try:
+    import dnscore
+except ImportError:
+    dnscore = None
+
+BIG = [f"192.0.2.{i}" for i in range(1, 31)]      # 30 × 31 bytes: too big for 512
+ZONES = {
+    ".":            {"servers": {"a.root.test.": "127.0.0.2"}},
+    "com.":         {"servers": {"a.gtld.test.": "127.0.0.3"}},
+    "example.com.": {"servers": {"ns1.example.com.": "127.0.0.4"},
+                     "records": [("www.example.com.", "A", 300, "192.0.2.1")]
+                                + [("big.example.com.", "A", 300, ip) for ip in BIG]},
+}
+FORWARDER_IP    = "127.0.0.53"
+FORWARDER_ZONES = {".": {"servers": {"resolver.test.": FORWARDER_IP},
+                         "records": ZONES["example.com."]["records"]}}
+
+
+class TestWire(unittest.TestCase):
+
+    def test_opt_round_trip(self):
+        q = dnswire.build_query("www.example.com", 1, msg_id=7, edns=1232)
+        self.assertEqual(dnswire.edns_payload(q), 1232)
+        self.assertEqual(q[10:12], b"\x00\x01")
+        plain = dnswire.strip_opt(q)
+        self.assertEqual(plain, dnswire.build_query("www.example.com", 1, msg_id=7))
+        self.assertIsNone(dnswire.edns_payload(plain))
+        self.assertIs(dnswire.strip_opt(plain), plain)
+        # Sizes below 512 advertise 512 (RFC 6891 §6.2.5).
+        self.assertEqual(dnswire.edns_payload(dnswire.build_query("a.test", edns=100)), 512)
+
+    def test_fallback_query_carries_opt(self):
+        self.assertEqual(dnswire.edns_payload(server.fallback_query("www.example.com")),
+                         server.EDNS_PAYLOAD)
+        with mock.patch.object(server, "EDNS_PAYLOAD", 0):
+            self.assertIsNone(dnswire.edns_payload(server.fallback_query("www.example.com")))
+
+    @unittest.skipIf(dnscore is None, "dnscore extension not built")
+    def test_cpp_and_python_write_the_same_opt(self):
+        self.assertEqual(dnscore.build_query("www.example.com", "A", id=9, edns=1232),
+                         dnswire.build_query("www.example.com", 1, msg_id=9, rd=False,
+                                             edns=1232))
+        self.assertEqual(dnscore.build_query("www.example.com", "A", id=9, edns=0),
+                         dnswire.build_query("www.example.com", 1, msg_id=9, rd=False))
+
+    @unittest.skipIf(dnscore is None, "dnscore extension not built")
+    def test_cpp_parser_reads_opt(self):
+        plain = dnswire.build_message(1, dnswire.FLAG_QR, "www.example.com", 1,
+                                      [("www.example.com.", "A", 300, "192.0.2.1")])
+        parsed = dnscore.parse_response(dnswire.add_opt(plain, 4096))
+        self.assertEqual(parsed["edns_payload"], 4096)
+        self.assertEqual(parsed["additionals"], [])
+        self.assertEqual(dnscore.parse_response(plain)["edns_payload"], 0)
+        # An OPT record anywhere but the additional section is malformed.
+        misplaced = dnswire.build_message(1, dnswire.FLAG_QR, "www.example.com", 1)
+        misplaced = (misplaced[:6] + b"\x00\x01" + misplaced[8:]
+                     + dnswire.opt_record(1232))
+        with self.assertRaises(ValueError):
+            dnscore.parse_response(misplaced)
+
+
+@unittest.skipIf(dnscore is None, "dnscore extension not built")
+class TestWalk(unittest.TestCase):
+
+    def setUp(self):
+        self.stub = StubHierarchy(ZONES).start()
+        self.addCleanup(self.stub.stop)
+
+    def resolver(self, **kw):
+        return dnscore.Resolver(None, roots=self.stub.root_ips, port=self.stub.port, **kw)
+
+    def test_01_large_rrset_fits_the_advertised_size(self):
+        r = self.resolver().resolve("big.example.com")
+        self.assertEqual(sorted(a["data"] for a in r["answers"]), sorted(BIG))
+        self.assertFalse(r["used_tcp"])
+        self.assertEqual(self.stub.servers["127.0.0.4"].truncated, 0)
+
+    def test_02_plain_dns_needs_tcp(self):
+        r = self.resolver(edns=0).resolve("big.example.com")
+        self.assertEqual(len(r["answers"]), len(BIG))
+        self.assertTrue(r["used_tcp"])
+        self.assertEqual(self.stub.servers["127.0.0.4"].truncated, 1)
+
+    def test_03_formerr_falls_back_to_plain_dns(self):
+        old = self.stub.servers["127.0.0.4"]
+        old.edns = False
+        resolver = self.resolver()
+        r = resolver.resolve("www.example.com", trace=True)
+        self.assertEqual([a["data"] for a in r["answers"]], ["192.0.2.1"])
+        hops = [(h["server"], h["outcome"], h["detail"]) for h in r["trace"]
+                if h["server"] == "127.0.0.4"]
+        self.assertEqual(hops[0], ("127.0.0.4", "error", "FORMERR to EDNS0"))
+        self.assertEqual(hops[1][1], "answer")
+        stats = {s["ip"]: s for s in resolver.server_stats()}
+        self.assertTrue(stats["127.0.0.4"]["no_edns"])
+        self.assertFalse(stats["127.0.0.3"]["no_edns"])
+        # Remembered: the next name goes out plain straight away (and so truncates).
+        self.stub.reset_counters()
+        r = resolver.resolve("big.example.com")
+        self.assertEqual((len(r["answers"]), r["used_tcp"]), (len(BIG), True))
+        self.assertEqual(old.queries, 2)                     # UDP, then TCP
+
+
+class TestForwarder(unittest.TestCase):
+
+    def setUp(self):
+        self.fwd = StubHierarchy(FORWARDER_ZONES).start()
+        self.addCleanup(self.fwd.stop)
+        self.pool = forwarder.ForwarderPool([(FORWARDER_IP, self.fwd.port)], timeout=2.0)
+        self.addCleanup(self.pool.close)
+
+    def test_large_reply_over_udp(self):
+        got = self.pool.query(dnswire.build_query("big.example.com", edns=1232))
+        self.assertEqual(len(server.fallback_answers(got[0], "big.example.com")), len(BIG))
+        self.assertEqual(self.pool.stats()["tcp_retries"], 0)
+        got = self.pool.query(dnswire.build_query("big.example.com"))
+        self.assertEqual(len(server.fallback_answers(got[0], "big.example.com")), len(BIG))
+        self.assertEqual(self.pool.stats()["tcp_retries"], 1)
+
+    def test_formerr_falls_back_to_plain_dns(self):
+        self.fwd.configure(edns=False)
+        got = self.pool.query(dnswire.build_query("www.example.com", edns=1232))
+        self.assertEqual(server.fallback_answers(got[0], "www.example.com")[0]["data"],
+                         "192.0.2.1")
+        stats = self.pool.stats()
+        self.assertEqual(stats["edns_fallbacks"], 1)
+        self.assertTrue(stats["servers"][0]["no_edns"])
+        self.assertEqual(stats["servers"][0]["failures"], 0)
+        # Plain from now on: a big reply truncates, and its TCP retry has no OPT either.
+        got = self.pool.query(dnswire.build_query("big.example.com", edns=1232))
+        self.assertEqual(len(server.fallback_answers(got[0], "big.example.com")), len(BIG))
+        self.assertEqual((self.pool.stats()["edns_fallbacks"], self.pool.stats()["tcp_retries"]),
+                         (1, 1))
+
+
+@unittest.skipIf(dnscore is None, "dnscore extension not built")
+class TestMetrics(unittest.TestCase):
+
+    def tcp_fallback_rate(self, **kw) -> float:
+        with StubHierarchy(ZONES) as stub:
+            native = dnscore.Resolver(None, roots=stub.root_ips, port=stub.port, **kw)
+            with mock.patch.object(server, "_native", native), \
+                    mock.patch.object(server, "metrics", server.Metrics()):
+                for name in ("big.example.com", "www.example.com"):
+                    server.cache.clear()
+                    body, status, _h = server.lookup_miss(name, "A", time.perf_counter())
+                    self.assertEqual(status, 200)
+                    server.metrics.record(name, "A", 1.0, True, True, False)   # a hit
+                summary = server.metrics.summary()
+        server.cache.clear()
+        self.assertEqual(summary["tcp_fallbacks"], 0 if kw.get("edns") is None else 1)
+        return summary["tcp_fallback_rate"]
+
+    def test_tcp_fallback_rate_of_misses(self):
+        self.assertEqual(self.tcp_fallback_rate(edns=0), 50.0)
+        self.assertEqual(self.tcp_fallback_rate(), 0.0)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,197 @@
+"""
+tests/test_forwarder.py
+───────────────────────
+The forwarder pool (api/forwarder.py) against stub forwarders on loopback
+(bench/stub_dns.py) with injected latency, loss and truncation: a slow
+first forwarder is hedged, a silent one is failed over and held down, a
+truncated reply is retried over TCP, replies that do not match a pending
+query are dropped, and many concurrent queries share a few sockets.
+
+Run:  python -m pytest tests/test_forwarder.py -v
+"""
+
+import os
+import sys
+import time
+import socket
+import asyncio
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(_ROOT, "api"))
+sys.path.insert(0, os.path.join(_ROOT, "bench"))
+
+import dnswire                                   # noqa: E402
+import forwarder                                 # noqa: E402
+import server                                    # noqa: E402
+from async_server import fallback_resolve_async  # noqa: E402
+from stub_dns import StubHierarchy               # noqa: E402
+
+# Two servers answering example.com, standing in for two recursive resolvers.
+ZONES = {
+    ".":            {"servers": {"a.root.test.": "127.0.0.2"}},
+    "com.":         {"servers": {"a.gtld.test.": "127.0.0.3"}},
+    "example.com.": {"servers": {"ns1.example.com.": "127.0.0.4",
+                                 "ns2.example.com.": "127.0.0.5"},
+                     "records": [(f"h{i}.example.com.", "A", 300, f"192.0.2.{i}")
+                                 for i in range(1, 65)]},
+}
+A, B = "127.0.0.4", "127.0.0.5"
+
+
+def _query(name: str) -> bytes:
+    return dnswire.build_query(name, dnswire.QTYPE_IDS["A"], 0, rd=True)
+
+
+def _address(got) -> str:
+    reply, _up = got
+    return server.fallback_answers(reply, "")[0]["data"]
+
+
+class TestForwarderPool(unittest.TestCase):
+
+    def setUp(self):
+        self.stub = StubHierarchy(ZONES).start()
+        self.addCleanup(self.stub.stop)
+        self.pool = forwarder.ForwarderPool([(A, self.stub.port), (B, self.stub.port)],
+                                            sockets=2, hedge_after=0.05, timeout=2.0)
+        self.addCleanup(self.pool.close)
+
+    def server_stats(self, ip: str) -> dict:
+        return next(s for s in self.pool.stats()["servers"] if s["ip"] == ip)
+
+    def test_01_answer_from_the_first_forwarder(self):
+        got = self.pool.query(_query("h1.example.com"))
+        self.assertEqual(_address(got), "192.0.2.1")
+        self.assertEqual(got[1].ip, A)
+        self.assertEqual(self.stub.per_ip.get(B, 0), 0)           # fast enough: no hedge
+        self.assertEqual(self.server_stats(A)["responses"], 1)
+
+    def test_02_slow_forwarder_is_hedged(self):
+        self.stub.servers[A].delay = 0.5
+        t0 = time.monotonic()
+        got = self.pool.query(_query("h2.example.com"))
+        self.assertLess(time.monotonic() - t0, 0.4)
+        self.assertEqual((_address(got), got[1].ip), ("192.0.2.2", B))
+        stats = self.pool.stats()
+        self.assertEqual((stats["hedged"], stats["hedge_wins"]), (1, 1))
+        time.sleep(0.6)                                            # A's late reply is dropped
+        self.assertEqual(self.pool.stats()["mismatched"], 1)
+        self.assertEqual(self.pool.stats()["in_flight"], 0)
+
+    def test_03_silent_forwarder_is_failed_over_and_held_down(self):
+        self.stub.servers[A].drop = True
+        got = self.pool.query(_query("h1.example.com"))
+        self.assertEqual(got[1].ip, B)                             # hedged after 50 ms
+        a = self.pool.upstreams[0]
+        with mock.patch.object(forwarder, "MIN_RTO", 1.0), \
+                mock.patch.object(forwarder, "INITIAL_RTO", 10.0):
+            a.srtt, a.backoff = None, 1
+            self.pool.timeout = 0.2
+            self.assertIsNone(self.pool.query(_query("h2.example.com"), [a]))
+            time.sleep(0.2)                                        # the last send's RTO
+        stats = self.server_stats(A)
+        self.assertGreaterEqual(stats["timeouts"], forwarder.DOWN_AFTER)
+        self.assertTrue(stats["down"])
+        self.stub.reset_counters()
+        self.pool.timeout = 2.0
+        self.assertEqual(self.pool.query(_query("h3.example.com"))[1].ip, B)
+        self.assertEqual(self.stub.per_ip.get(A, 0), 0)            # B alone while A is down
+
+    def test_04_truncated_reply_is_retried_over_tcp(self):
+        self.stub.servers[A].truncate = True
+        got = self.pool.query(_query("h3.example.com"))
+        self.assertEqual((_address(got), got[1].ip), ("192.0.2.3", A))
+        self.assertEqual(self.stub.servers[A].tcp_connections, 1)
+        self.assertEqual((self.pool.stats()["tcp_retries"], self.server_stats(A)["tcp_retries"]),
+                         (1, 1))
+
+    def test_05_nobody_answers(self):
+        self.stub.configure(drop=True)
+        self.pool.timeout = 0.3
+        t0 = time.monotonic()
+        self.assertIsNone(self.pool.query(_query("h1.example.com")))
+        self.assertLess(time.monotonic() - t0, 0.5)
+        time.sleep(0.3)                                            # both sends' RTOs
+        self.assertEqual(self.pool.stats()["in_flight"], 0)
+        self.assertEqual([s["timeouts"] for s in self.pool.stats()["servers"]], [1, 1])
+
+    def test_06_concurrent_queries_share_the_sockets(self):
+        names = [f"h{i}.example.com" for i in range(1, 65)]
+        with ThreadPoolExecutor(max_workers=16) as ex:
+            got = list(ex.map(lambda n: self.pool.query(_query(n)), names * 3))
+        self.assertEqual([_address(g) for g in got],
+                         [f"192.0.2.{i}" for i in range(1, 65)] * 3)
+        self.assertEqual(len(self.pool._socks), 2)
+        self.assertEqual(self.pool.stats()["mismatched"], 0)
+
+
+class TestDemultiplexer(unittest.TestCase):
+    """A forwarder that answers every query twice: the wrong question first."""
+
+    def setUp(self):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind(("127.0.0.9", 0))
+        self.addCleanup(self.sock.close)
+        threading.Thread(target=self._serve, daemon=True).start()
+        self.pool = forwarder.ForwarderPool([("127.0.0.9", self.sock.getsockname()[1])],
+                                            sockets=1, timeout=1.0)
+        self.addCleanup(self.pool.close)
+
+    def _serve(self):
+        while True:
+            try:
+                pkt, addr = self.sock.recvfrom(512)
+            except OSError:
+                return
+            msg_id, *_ = dnswire.parse_question(pkt)
+            for qname, data in (("evil.example.com", "203.0.113.66"),
+                                ("www.example.com", "192.0.2.1")):
+                self.sock.sendto(dnswire.build_message(
+                    msg_id, dnswire.FLAG_QR | dnswire.FLAG_RD, qname, 1,
+                    [(qname + ".", "A", 60, data)]), addr)
+
+    def test_wrong_question_is_dropped(self):
+        got = self.pool.query(_query("www.example.com"))
+        self.assertEqual(_address(got), "192.0.2.1")
+        self.assertEqual(self.pool.stats()["mismatched"], 1)
+
+
+class TestServerFallback(unittest.TestCase):
+
+    def setUp(self):
+        self.stub = StubHierarchy(ZONES).start()
+        self.addCleanup(self.stub.stop)
+        pool = forwarder.ForwarderPool([(A, self.stub.port), (B, self.stub.port)],
+                                       hedge_after=0.05, timeout=2.0)
+        self.addCleanup(pool.close)
+        mock.patch.object(server, "forwarders", pool).start()
+        self.addCleanup(mock.patch.stopall)
+
+    def test_01_sync_and_async_fallback(self):
+        answers = server.fallback_resolve("h5.example.com", "A")
+        self.assertEqual(([a["data"] for a in answers], answers.via), (["192.0.2.5"], A))
+        self.stub.servers[A].drop = True
+        answers = asyncio.run(fallback_resolve_async("h6.example.com", "A"))
+        self.assertEqual(([a["data"] for a in answers], answers.via), (["192.0.2.6"], B))
+
+    def test_02_response_names_the_forwarder(self):
+        self.stub.servers[A].delay = 0.5
+        body, status, _h = server.fallback_response(
+            "h7.example.com", "A", "h7.example.com/A", time.perf_counter(),
+            server.fallback_resolve("h7.example.com", "A"),
+            cpp_result={"resolution_path": ["198.41.0.4"]})
+        server.cache.clear()
+        self.assertEqual(status, 200)
+        self.assertEqual(body["resolution_path"], ["198.41.0.4", B])
+        self.assertEqual(body["forwarder"], B)
+        self.assertEqual(server._source(body), "fallback")
+        upstreams = server.app.test_client().get("/upstreams").get_json()
+        self.assertEqual([s["ip"] for s in upstreams["forwarders"]["servers"]], [A, B])
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
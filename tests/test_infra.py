@@ -0,0 +1,151 @@
+"""
+tests/test_infra.py
+───────────────────
+Per-server RTT tracking and staggered parallel NS queries.  A zone served
+by two stub name servers has one of them silenced or slowed down; the
+resolver must route around it within one RTO instead of a full 2 s
+timeout, and report what it learned via server_stats() / GET /upstreams.
+
+Run:  python -m pytest tests/test_infra.py -v
+"""
+
+import os
+import sys
+import json
+import subprocess
+import unittest
+from unittest import mock
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(_ROOT, "api"))
+sys.path.insert(0, os.path.join(_ROOT, "bench"))
+sys.path.insert(0, os.path.join(_ROOT, "core"))
+
+import server                   # noqa: E402
+from stub_dns import StubHierarchy   # noqa: E402
+
+try:
+    import dnscore
+except ImportError:
+    dnscore = None
+
+_BINARY = os.path.join(_ROOT, "core", "dns_resolver")
+
+NS1, NS2 = "127.0.0.4", "127.0.0.6"
+ZONES = {
+    ".":    {"servers": {"a.root.test.": "127.0.0.2"}},
+    "com.": {"servers": {"a.gtld.test.": "127.0.0.3"}},
+    "example.com.": {
+        "servers": {"ns1.example.com.": NS1, "ns2.example.com.": NS2},
+        "records": [(f"{n}.example.com.", "A", 300, f"192.0.2.{i}")
+                    for i, n in enumerate(("www", "api", "mail", "ftp", "db"), 1)],
+    },
+}
+
+
+def _by_ip(stats):
+    return {s["ip"]: s for s in stats}
+
+
+@unittest.skipIf(dnscore is None, "dnscore extension not built")
+class TestStaggeredQueries(unittest.TestCase):
+
+    def setUp(self):
+        self.stub = StubHierarchy(ZONES).start()
+        self.addCleanup(self.stub.stop)
+        self.resolver = dnscore.Resolver(None, roots=self.stub.root_ips, port=self.stub.port)
+
+    def test_01_dead_server_costs_at_most_one_rto(self):
+        self.stub.servers[NS1].drop = True
+        for name in ("www", "api", "mail"):
+            r = self.resolver.resolve(f"{name}.example.com", "A")
+            self.assertTrue(r["success"], name)
+            self.assertLess(r["latency_ms"], 1000, name)       # was 2 s per dead NS
+            self.assertEqual(r["resolution_path"][-1], NS2)
+        # Once NS2 has a measured RTT the dead server is not asked again.
+        self.assertLessEqual(self.stub.servers[NS1].queries, 1)
+
+    def test_02_timeouts_are_recorded(self):
+        self.stub.servers[NS1].drop = True
+        for name in ("www", "api", "mail", "ftp", "db"):
+            self.resolver.resolve(f"{name}.example.com", "A")
+        stats = _by_ip(self.resolver.server_stats())
+        self.assertGreater(stats[NS2]["responses"], 0)
+        self.assertGreater(stats[NS2]["srtt_ms"], 0)
+        if NS1 in stats:
+            self.assertEqual(stats[NS1]["responses"], 0)
+            self.assertGreaterEqual(stats[NS1]["timeouts"], 1)
+            self.assertGreater(stats[NS1]["rto_ms"], stats[NS2]["rto_ms"])
+
+    def test_03_fastest_server_preferred(self):
+        self.stub.servers[NS1].delay = 0.3
+        for name in ("www", "api", "mail"):
+            self.resolver.resolve(f"{name}.example.com", "A")
+        r = self.resolver.resolve("ftp.example.com", "A")
+        self.assertEqual(r["resolution_path"][-1], NS2)
+        self.assertLess(r["latency_ms"], 250)
+
+    def test_04_all_servers_dead_bounded_by_hop_timeout(self):
+        self.stub.servers[NS1].drop = True
+        self.stub.servers[NS2].drop = True
+        r = self.resolver.resolve("www.example.com", "A")
+        self.assertFalse(r["success"])
+        self.assertLess(r["latency_ms"], 3000)                 # one 2 s hop, not 2 × 2 s
+
+
+@unittest.skipIf(dnscore is None, "dnscore extension not built")
+class TestUpstreamsEndpoint(unittest.TestCase):
+
+    def setUp(self):
+        self.stub = StubHierarchy(ZONES).start()
+        self.addCleanup(self.stub.stop)
+        native = dnscore.Resolver(None, roots=self.stub.root_ips, port=self.stub.port)
+        mock.patch.object(server, "_native", native).start()
+        self.addCleanup(mock.patch.stopall)
+        server.cache.clear()
+        self.client = server.app.test_client()
+
+    def test_upstreams_sorted_slowest_first(self):
+        self.stub.servers[NS1].drop = True
+        self.client.get("/resolve", query_string={"domain": "www.example.com"})
+        body = self.client.get("/upstreams").get_json()
+        self.assertEqual(body["count"], len(body["servers"]))
+        self.assertGreaterEqual(body["count"], 3)
+        rtos = [s["rto_ms"] for s in body["servers"]]
+        self.assertEqual(rtos, sorted(rtos, reverse=True))
+        self.assertTrue({"ip", "srtt_ms", "timeouts", "failures", "queries"}
+                        <= set(body["servers"][0]))
+
+
+class TestMergeServerStats(unittest.TestCase):
+
+    def test_counters_summed_rtt_weighted(self):
+        a = [{"ip": "192.0.2.53", "srtt_ms": 10.0, "rttvar_ms": 2.0, "rto_ms": 50.0,
+              "backoff": 1, "queries": 3, "responses": 3, "timeouts": 0, "failures": 0}]
+        b = [{"ip": "192.0.2.53", "srtt_ms": 30.0, "rttvar_ms": 6.0, "rto_ms": 400.0,
+              "backoff": 4, "queries": 2, "responses": 1, "timeouts": 1, "failures": 0}]
+        (m,) = server._merge_server_stats([a, b])
+        self.assertEqual(m["queries"], 5)
+        self.assertEqual(m["timeouts"], 1)
+        self.assertAlmostEqual(m["srtt_ms"], 15.0)
+        self.assertEqual(m["rto_ms"], 400.0)
+        self.assertEqual(m["backoff"], 4)
+
+
+@unittest.skipUnless(os.path.isfile(_BINARY), "C++ binary not built")
+class TestWorkerServersOp(unittest.TestCase):
+
+    def test_servers_op(self):
+        with StubHierarchy(ZONES) as stub:
+            proc = subprocess.run(
+                [_BINARY, "--serve"], env=dict(os.environ, **stub.env()),
+                text=True, capture_output=True, timeout=20,
+                input='{"id": 1, "domain": "www.example.com", "qtype": "A"}\n'
+                      '{"id": 2, "op": "servers"}\n')
+        replies = [json.loads(line) for line in proc.stdout.splitlines()]
+        ips = {s["ip"] for s in replies[1]["servers"]}
+        self.assertTrue({"127.0.0.2", "127.0.0.3"} <= ips)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,150 @@
+"""
+tests/test_metrics.py
+─────────────────────
+Streaming latency metrics in api/server.py: LatencyHistogram accuracy and
+bucket bounds, rolling windows and slot expiry, the per-label breakdown,
+concurrent recording, and /metrics as JSON and Prometheus text.
+
+Run:  python -m pytest tests/test_metrics.py -v
+"""
+
+import os
+import sys
+import random
+import threading
+import unittest
+from unittest import mock
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(_ROOT, "api"))
+
+import server   # noqa: E402
+
+
+class TestLatencyHistogram(unittest.TestCase):
+
+    def test_01_percentiles_within_bucket_error(self):
+        rng = random.Random(7)
+        samples = sorted(rng.lognormvariate(-4, 1.5) for _ in range(20_000))
+        h = server.LatencyHistogram()
+        for x in samples:
+            h.record(x)
+        for p in (50, 90, 99, 99.9):
+            exact = samples[min(len(samples) - 1, int(p / 100 * len(samples)))]
+            self.assertAlmostEqual(h.percentile(p) / exact, 1, delta=0.035, msg=f"p{p}")
+        self.assertLess(len(h.counts), 400)                   # sparse, not per sample
+
+    def test_02_power_of_two_bounds_are_exact(self):
+        h = server.LatencyHistogram()
+        for x in (0.0009, 0.0009765625, 0.001, 0.0039, 0.004, 0.2):
+            h.record(x)
+        self.assertEqual(h.count_le(2 ** -10), 1)             # buckets own their lower bound
+        self.assertEqual(h.count_le(2 ** -8), 4)
+        self.assertEqual(h.count_le(2 ** -2), 6)
+
+    def test_03_merge_and_empty(self):
+        a, b = server.LatencyHistogram(), server.LatencyHistogram()
+        self.assertEqual(a.percentile(99), 0.0)
+        a.record(0.010)
+        b.record(0.020)
+        a.merge(b)
+        self.assertEqual((a.n, a.min, a.max), (2, 0.010, 0.020))
+        self.assertAlmostEqual(a.percentile(100), 0.020, delta=0.001)
+
+
+class TestMetrics(unittest.TestCase):
+
+    def setUp(self):
+        self.now = [50_000.0]
+        mock.patch.object(server, "_monotonic", lambda: self.now[0]).start()
+        self.addCleanup(mock.patch.stopall)
+        self.m = server.Metrics()
+
+    def test_01_breakdown_by_label(self):
+        self.m.record("a.test", "A", 0.2, True, True, False)
+        self.m.record("b.test", "A", 40.0, True, False, False)
+        self.m.record("c.test", "MX", 90.0, True, False, True, source="fallback")
+        self.m.record("d.test", "A", 30.0, False, False, False)
+        s = self.m.summary()
+        self.assertEqual((s["total"], s["failures"], s["cached_hits"], s["tcp_fallbacks"]),
+                         (4, 1, 1, 1))
+        last = s["percentiles"]["1m"]
+        self.assertEqual(last["count"], 4)
+        self.assertEqual({k: v["count"] for k, v in last["by_cache"].items()},
+                         {"hit": 1, "miss": 3})
+        self.assertEqual({k: v["count"] for k, v in last["by_source"].items()},
+                         {"cache": 1, "walk": 2, "fallback": 1})
+        self.assertEqual(last["by_transport"]["tcp"]["count"], 1)
+        self.assertEqual(set(last["by_qtype"]), {"A", "MX"})
+        self.assertAlmostEqual(last["by_cache"]["hit"]["p50"], 0.2, delta=0.01)
+        self.assertEqual(set(last), {"count", "p50", "p90", "p99", "p999", "by_cache",
+                                     "by_source", "by_qtype", "by_transport"})
+
+    def test_02_rolling_windows(self):
+        self.m.record("old.test", "A", 500.0, True, False, False)
+        self.now[0] += 120
+        self.m.record("new.test", "A", 5.0, True, False, False)
+        s = self.m.summary()
+        self.assertEqual(s["percentiles"]["1m"]["count"], 1)
+        self.assertAlmostEqual(s["percentiles"]["1m"]["p99"], 5.0, delta=0.2)
+        self.assertEqual(s["percentiles"]["5m"]["count"], 2)
+        self.now[0] += 3600
+        s = self.m.summary()
+        self.assertEqual(s["percentiles"]["5m"]["count"], 0)
+        self.assertEqual(s["total"], 2)                       # since-start totals stay
+
+    def test_03_memory_is_bounded(self):
+        for _ in range(500):
+            self.m.record("x.test", "A", 1.0, True, True, False)
+            self.now[0] += server.METRICS_SLOT
+        keep = max(server.METRICS_WINDOWS.values()) // server.METRICS_SLOT + 1
+        self.assertLessEqual(sum(len(st.slots) for st in self.m._stripes), keep)
+        self.assertEqual(len(self.m.summary()["recent_queries"]), 20)
+
+    def test_04_concurrent_recording(self):
+        def worker():
+            for i in range(2000):
+                self.m.record("c.test", "A", float(i % 50), True, i % 2 == 0, False)
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        s = self.m.summary()
+        self.assertEqual((s["total"], s["cached_hits"]), (16_000, 8_000))
+
+
+class TestMetricsEndpoint(unittest.TestCase):
+
+    def setUp(self):
+        mock.patch.object(server, "metrics", server.Metrics()).start()
+        self.addCleanup(mock.patch.stopall)
+        server.metrics.record("a.test", "A", 12.0, True, False, False)
+        server.metrics.record("a.test", "A", 0.1, True, True, False)
+        self.client = server.app.test_client()
+
+    def test_json_keeps_dashboard_fields(self):
+        body = self.client.get("/metrics").get_json()
+        for key in ("total", "cache_hit_rate", "avg_latency_ms", "min_latency_ms",
+                    "max_latency_ms", "tcp_fallbacks", "recent_queries", "percentiles"):
+            self.assertIn(key, body)
+        self.assertEqual(body["cache_hit_rate"], 50.0)
+
+    def test_prometheus_text(self):
+        for resp in (self.client.get("/metrics?format=prometheus"),
+                     self.client.get("/metrics", headers={"Accept": "text/plain"})):
+            self.assertEqual(resp.status_code, 200)
+            self.assertTrue(resp.content_type.startswith("text/plain; version=0.0.4"))
+        lines = resp.get_data(as_text=True).splitlines()
+        self.assertIn("# TYPE dns_request_duration_seconds histogram", lines)
+        miss = 'cache="miss",source="walk",qtype="A",transport="udp"'
+        self.assertIn(f'dns_request_duration_seconds_bucket{{{miss},le="+Inf"}} 1', lines)
+        self.assertIn(f'dns_request_duration_seconds_bucket{{{miss},le="0.0078125"}} 0', lines)
+        self.assertIn(f'dns_request_duration_seconds_bucket{{{miss},le="0.015625"}} 1', lines)
+        self.assertIn(f'dns_requests_total{{{miss},outcome="ok"}} 1', lines)
+        self.assertTrue(any(l.startswith('dns_request_latency_seconds{window="1m",'
+                                         'quantile="0.99"}') for l in lines))
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
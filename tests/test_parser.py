@@ -0,0 +1,136 @@
+"""
+tests/test_parser.py
+────────────────────
+The in-place reply parser (dns::PacketView): malformed packets are refused
+before anything is decoded, compressed and uncompressed replies parse to the
+same records, walks work unchanged against a stub that compresses its
+replies, and the parse benchmark (bench/bench_parse.py) agrees with the
+parser it replaced on a captured corpus.
+
+Run:  python -m pytest tests/test_parser.py -v
+"""
+
+import os
+import sys
+import shutil
+import struct
+import tempfile
+import unittest
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(_ROOT, "api"))
+sys.path.insert(0, os.path.join(_ROOT, "bench"))
+sys.path.insert(0, os.path.join(_ROOT, "core"))
+
+import dnswire                       # noqa: E402
+from stub_dns import StubHierarchy   # noqa: E402
+
+try:
+    import dnscore
+except ImportError:
+    dnscore = None
+
+ANSWERS = [("shop.example.com.", "CNAME", 300, "www.example.com."),
+           ("www.example.com.", "A", 300, "192.0.2.1"),
+           ("www.example.com.", "AAAA", 300, "2001:db8::1")]
+AUTHORITIES = [("example.com.", "NS", 3600, "ns1.example.com."),
+               ("example.com.", "SOA", 3600,
+                "ns1.example.com. hostmaster.example.com. 7 3600 600 86400 60")]
+ADDITIONALS = [("ns1.example.com.", "A", 3600, "192.0.2.53"),
+               ("example.com.", "MX", 300, "10 mail.example.com.")]
+
+
+def _reply(compress: bool) -> bytes:
+    return dnswire.build_message(9, dnswire.FLAG_QR | dnswire.FLAG_AA, "shop.example.com", 1,
+                                 ANSWERS, AUTHORITIES, ADDITIONALS, compress=compress)
+
+
+def _header(an=0, ns=0, ar=0) -> bytes:
+    return struct.pack("!HHHHHH", 1, 0x8000, 0, an, ns, ar)
+
+
+@unittest.skipIf(dnscore is None, "dnscore extension not built")
+class TestPacketView(unittest.TestCase):
+
+    def test_01_compressed_and_plain_parse_alike(self):
+        plain, packed = _reply(False), _reply(True)
+        self.assertLess(len(packed), len(plain))
+        self.assertEqual(dnscore.parse_response(packed), dnscore.parse_response(plain))
+        d = dnscore.parse_response(packed)
+        self.assertEqual([a["data"] for a in d["answers"]],
+                         ["www.example.com", "192.0.2.1",
+                          "2001:0db8:0000:0000:0000:0000:0000:0001"])
+        self.assertEqual(d["additionals"][1]["data"], "10 mail.example.com")
+        self.assertIn("minimum=60", d["authorities"][1]["data"])
+
+    def test_02_dotted_quads(self):
+        for ip in ("0.0.0.0", "10.9.99.100", "255.255.255.255", "1.20.200.3"):
+            pkt = _header(an=1) + dnswire.pack_rr("a.test.", "A", 1, ip)
+            self.assertEqual(dnscore.parse_response(pkt)["answers"][0]["data"], ip)
+
+    def test_03_malformed_packets(self):
+        rr_tail = struct.pack("!HHIH", 1, 1, 60, 4) + b"\x7f\x00\x00\x01"
+        bad = {
+            "pointer loop":       _header(an=1) + b"\xc0\x0c" + rr_tail,
+            "label past end":     _header(an=1) + b"\x3fabc",
+            "unknown label type": _header(an=1) + b"\x41abc\x00" + rr_tail,
+            "short A rdata":      _header(an=1) + b"\x00" + struct.pack("!HHIH", 1, 1, 60, 3)
+                                  + b"\x7f\x00\x00",
+            "rdata past end":     _header(an=1) + b"\x00" + struct.pack("!HHIH", 16, 1, 60, 9)
+                                  + b"abc",
+            "bad NS target":      _header(ns=1) + b"\x00" + struct.pack("!HHIH", 2, 1, 60, 2)
+                                  + b"\xc0\xff",
+            "counts too large":   _header(an=0xFFFF, ns=0xFFFF, ar=0xFFFF) + b"\x00" * 64,
+        }
+        for what, pkt in bad.items():
+            with self.assertRaises(ValueError, msg=what):
+                dnscore.parse_response(pkt)
+
+    def test_04_more_records_than_inline(self):
+        recs = [(f"h{i}.example.com.", "A", 60, f"192.0.2.{i}") for i in range(1, 81)]
+        d = dnscore.parse_response(dnswire.build_message(3, dnswire.FLAG_QR, None, 1,
+                                                         recs[:40], [], recs[40:],
+                                                         compress=True))
+        self.assertEqual((len(d["answers"]), len(d["additionals"])), (40, 40))
+        self.assertEqual(d["additionals"][-1], {"name": "h80.example.com", "type": "A",
+                                                "ttl": 60, "data": "192.0.2.80"})
+
+
+@unittest.skipIf(dnscore is None, "dnscore extension not built")
+class TestCompressedWalk(unittest.TestCase):
+
+    def test_walk_against_compressing_servers(self):
+        with StubHierarchy() as stub:
+            stub.configure(compress=True)
+            resolver = dnscore.Resolver(None, roots=stub.root_ips, port=stub.port)
+            www  = resolver.resolve("www.example.com", "A")
+            mx   = resolver.resolve("example.com", "MX")
+            nope = resolver.resolve("nope.example.com", "A")
+            glue = resolver.resolve("www.glueless.com", "A")
+        self.assertEqual([a["data"] for a in www["answers"]], ["192.0.2.1"])
+        self.assertEqual(www["resolution_path"], ["127.0.0.2", "127.0.0.3", "127.0.0.4"])
+        self.assertEqual(mx["answers"][0]["data"], "10 mail.example.com")
+        self.assertEqual(nope["rcode"], "NXDOMAIN")
+        self.assertEqual([a["data"] for a in glue["answers"]], ["192.0.2.50"])
+
+
+@unittest.skipUnless(shutil.which("g++"), "g++ not available")
+class TestParseBenchmark(unittest.TestCase):
+
+    def test_captured_corpus_parses_alike(self):
+        import bench_parse
+        packets = bench_parse.capture(compress=True)
+        self.assertGreater(len(packets), 100)
+        with tempfile.TemporaryDirectory() as tmp:
+            binary, corpus = os.path.join(tmp, "bench_parse"), os.path.join(tmp, "corpus")
+            bench_parse.save(corpus, packets)
+            self.assertEqual(bench_parse.load(corpus), packets)
+            bench_parse.build(binary)
+            self.assertEqual(bench_parse.run(binary, "check", corpus)["mismatches"], 0)
+            legacy = bench_parse.run(binary, "legacy", corpus, 0.05)
+            view   = bench_parse.run(binary, "view", corpus, 0.05)
+        self.assertLess(view["allocs_per_packet"], legacy["allocs_per_packet"] / 2)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,127 @@
+"""
+tests/test_prefetch.py
+──────────────────────
+Background prefetch of hot entries and RFC 8767 serve-stale in the API
+cache (api/server.py Refresher), against the stub hierarchy with the
+cache clock driven by the test.
+
+Run:  python -m pytest tests/test_prefetch.py -v
+"""
+
+import os
+import sys
+import unittest
+from unittest import mock
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(_ROOT, "api"))
+sys.path.insert(0, os.path.join(_ROOT, "bench"))
+sys.path.insert(0, os.path.join(_ROOT, "core"))
+
+import server                        # noqa: E402
+from stub_dns import StubHierarchy   # noqa: E402
+
+try:
+    import dnscore
+except ImportError:
+    dnscore = None
+
+TTL = 300     # www/api.example.com in the default stub zones
+
+
+@unittest.skipIf(dnscore is None, "dnscore extension not built")
+class TestPrefetchAndServeStale(unittest.TestCase):
+
+    def setUp(self):
+        self.stub = StubHierarchy().start()
+        self.addCleanup(self.stub.stop)
+        native = dnscore.Resolver(None, roots=self.stub.root_ips, port=self.stub.port)
+        self.now = [10_000.0]
+        mock.patch.object(server, "_native", native).start()
+        mock.patch.object(server, "fallback_resolve", return_value=[]).start()
+        mock.patch.object(server, "_monotonic", lambda: self.now[0]).start()
+        mock.patch.object(server, "cache", server.DNSCache(stale_window=3600)).start()
+        mock.patch.object(server, "refresher", server.Refresher()).start()
+        self.addCleanup(mock.patch.stopall)
+        self.client = server.app.test_client()
+
+    def get(self, domain="www.example.com"):
+        r = self.client.get("/resolve", query_string={"domain": domain})
+        server.refresher.drain()
+        return r.status_code, r.get_json()
+
+    def remaining(self, key="www.example.com/A"):
+        return server.cache.lookup(key)[1]
+
+    def test_01_hot_entry_prefetched_before_expiry(self):
+        for _ in range(4):                               # miss + 3 hits: hot
+            self.get()
+        self.now[0] += TTL * 0.95
+        self.stub.reset_counters()
+        status, body = self.get()
+        self.assertEqual(status, 200)
+        self.assertTrue(body["cached"])                  # client didn't wait
+        self.assertGreater(self.stub.total_queries, 0)   # …but it was refreshed
+        self.assertEqual(self.remaining(), TTL)
+        self.assertEqual(server.refresher.stats()["prefetches"], 1)
+
+    def test_02_cold_entry_not_prefetched(self):
+        self.get("api.example.com")
+        self.now[0] += TTL * 0.95
+        self.stub.reset_counters()
+        self.get("api.example.com")
+        self.assertEqual(self.stub.total_queries, 0)
+        self.assertEqual(server.refresher.stats()["prefetches"], 0)
+
+    def test_03_not_before_prefetch_fraction(self):
+        for _ in range(5):
+            self.get()
+        self.now[0] += TTL * 0.5
+        self.stub.reset_counters()
+        self.get()
+        self.assertEqual(self.stub.total_queries, 0)
+
+    def test_04_expired_entry_served_stale_then_refreshed(self):
+        self.get()
+        self.now[0] += TTL + 60
+        status, body = self.get()
+        self.assertEqual(status, 200)
+        self.assertTrue(body["stale"])
+        self.assertEqual(body["ttl"], server.STALE_ANSWER_TTL)
+        self.assertEqual(body["answers"][0]["data"], "192.0.2.1")
+        _status, body = self.get()                       # refreshed in the background
+        self.assertNotIn("stale", body)
+        self.assertEqual(body["ttl"], TTL)
+        stats = server.refresher.stats()
+        self.assertEqual((stats["stale_served"], stats["refreshed"]), (1, 1))
+
+    def test_05_failed_refresh_keeps_stale_answer(self):
+        self.get()
+        self.now[0] += TTL + 60
+        for ip in self.stub.servers:
+            self.stub.servers[ip].drop = True
+        self.get()                                       # walk times out in the background
+        _status, body = self.get()
+        self.assertTrue(body["stale"])
+        self.assertGreaterEqual(server.refresher.stats()["refresh_failed"], 1)
+
+    def test_06_past_stale_window_is_a_miss(self):
+        self.get()
+        self.now[0] += TTL + 3600
+        self.stub.reset_counters()
+        _status, body = self.get()
+        self.assertFalse(body["cached"])
+        self.assertGreater(self.stub.total_queries, 0)
+
+    def test_07_metrics_report_prefetch(self):
+        self.get()
+        self.now[0] += TTL + 1
+        self.get()
+        prefetch = self.client.get("/metrics").get_json()["prefetch"]
+        self.assertEqual(prefetch["stale_served"], 1)
+        self.assertEqual(prefetch["stale_refreshes"], 1)
+        self.assertEqual(prefetch["in_flight"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,122 @@
+"""
+tests/test_rrsets.py
+────────────────────
+Full answer RRsets and CNAME chains from the C++ walk: every record of
+the RRset is returned, every CNAME hop keeps its own TTL, chains that
+cross zones are followed, and each intermediate name is cached in its
+own right (in dns::Cache and in the API's DNSCache).
+
+Run:  python -m pytest tests/test_rrsets.py -v
+"""
+
+import os
+import sys
+import unittest
+from unittest import mock
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(_ROOT, "api"))
+sys.path.insert(0, os.path.join(_ROOT, "bench"))
+sys.path.insert(0, os.path.join(_ROOT, "core"))
+
+import server                                       # noqa: E402
+from stub_dns import StubHierarchy, DEFAULT_ZONES   # noqa: E402
+
+try:
+    import dnscore
+except ImportError:
+    dnscore = None
+
+POOL = [f"192.0.2.{100 + i}" for i in range(8)]
+
+ZONES = {k: dict(v) for k, v in DEFAULT_ZONES.items()}
+ZONES["example.com."]["records"] = DEFAULT_ZONES["example.com."]["records"] + [
+    ("pool.example.com.",     "A",     60,  ip) for ip in POOL
+] + [
+    ("start.example.com.",    "CNAME", 600, "middle.glueless.com."),
+    ("end.example.com.",      "A",     300, "192.0.2.61"),
+    ("end.example.com.",      "A",     300, "192.0.2.62"),
+    ("dangling.example.com.", "CNAME", 120, "missing.example.com."),
+]
+ZONES["glueless.com."]["records"] = DEFAULT_ZONES["glueless.com."]["records"] + [
+    ("middle.glueless.com.",  "CNAME", 45,  "end.example.com."),
+]
+
+
+@unittest.skipIf(dnscore is None, "dnscore extension not built")
+class TestWalkRRsets(unittest.TestCase):
+
+    def setUp(self):
+        self.stub = StubHierarchy(ZONES).start()
+        self.addCleanup(self.stub.stop)
+        self.resolver = dnscore.Resolver(dnscore.Cache(100),
+                                         roots=self.stub.root_ips, port=self.stub.port)
+
+    def test_01_full_rrset(self):
+        r = self.resolver.resolve("pool.example.com", "A")
+        self.assertTrue(r["success"])
+        self.assertEqual(sorted(a["data"] for a in r["answers"]), sorted(POOL))
+        self.assertTrue(all(a["ttl"] == 60 for a in r["answers"]))
+
+    def test_02_cross_zone_cname_chain(self):
+        r = self.resolver.resolve("start.example.com", "A")
+        self.assertTrue(r["success"])
+        self.assertEqual([(a["name"], a["type"], a["ttl"]) for a in r["answers"]], [
+            ("start.example.com",  "CNAME", 600),
+            ("middle.glueless.com", "CNAME", 45),
+            ("end.example.com",    "A",     300),
+            ("end.example.com",    "A",     300),
+        ])
+        self.assertEqual(r["ttl"], 45)
+
+    def test_03_intermediate_names_cached(self):
+        self.resolver.resolve("start.example.com", "A")
+        self.stub.reset_counters()
+
+        mid = self.resolver.resolve("middle.glueless.com", "A")
+        self.assertTrue(mid["cached"])
+        self.assertEqual([a["type"] for a in mid["answers"]], ["CNAME", "A", "A"])
+
+        end = self.resolver.resolve("end.example.com", "A")
+        self.assertTrue(end["cached"])
+        self.assertEqual(len(end["answers"]), 2)
+        self.assertGreater(end["ttl"], 45)          # not limited by the chain
+        self.assertEqual(self.stub.total_queries, 0)
+
+    def test_04_dangling_chain_is_negative(self):
+        r = self.resolver.resolve("dangling.example.com", "A")
+        self.assertFalse(r["success"])
+        self.assertEqual(r["rcode"], "NXDOMAIN")
+        self.assertEqual([a["type"] for a in r["answers"]], ["CNAME"])
+        self.assertTrue(self.resolver.resolve("missing.example.com", "A")["cached"])
+
+
+@unittest.skipIf(dnscore is None, "dnscore extension not built")
+class TestApiChains(unittest.TestCase):
+
+    def setUp(self):
+        self.stub = StubHierarchy(ZONES).start()
+        self.addCleanup(self.stub.stop)
+        native = dnscore.Resolver(None, roots=self.stub.root_ips, port=self.stub.port)
+        mock.patch.object(server, "_native", native).start()
+        mock.patch.object(server, "fallback_resolve", return_value=[]).start()
+        self.addCleanup(mock.patch.stopall)
+        server.cache.clear()
+        self.client = server.app.test_client()
+
+    def test_chain_targets_cached_by_api(self):
+        body = self.client.get("/resolve", query_string={"domain": "start.example.com"}).get_json()
+        self.assertEqual(body["ip"], "192.0.2.61")
+        self.assertEqual(len(body["answers"]), 4)
+
+        self.stub.reset_counters()
+        for name, n in (("middle.glueless.com", 3), ("end.example.com", 2)):
+            r = self.client.get("/resolve", query_string={"domain": name}).get_json()
+            self.assertTrue(r["cached"], name)
+            self.assertEqual(r["domain"], name)
+            self.assertEqual(len(r["answers"]), n)
+        self.assertEqual(self.stub.total_queries, 0)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
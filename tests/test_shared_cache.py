@@ -0,0 +1,200 @@
+"""
+tests/test_shared_cache.py
+──────────────────────────
+SharedDNSCache (api/shm_cache.py): the DNSCache interface on a memory-mapped
+table that several processes open at once.  Two handles on one file stand in
+for two workers where the point is the table; forked children check what
+only separate processes show — their own counter rows, and that lock-free
+readers never see a value torn by a concurrent writer.  Also: expiry and
+serve-stale, second-chance eviction within a bucket, entries too large for
+a slot, geometry checks, snapshot export / restore, and server.py serving a
+hit that another worker stored.
+
+Run:  python -m pytest tests/test_shared_cache.py -v
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import tempfile
+import unittest
+import multiprocessing
+from unittest import mock
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(_ROOT, "api"))
+
+import server      # noqa: E402
+import shm_cache   # noqa: E402
+from shm_cache import SharedDNSCache   # noqa: E402
+
+
+def _body(domain: str, ttl: int = 300, ip: str = "192.0.2.1") -> dict:
+    return {"domain": domain, "qtype": "A", "ip": ip, "ttl": ttl, "rcode": "NOERROR",
+            "answers": [{"name": domain, "type": "A", "ttl": ttl, "data": ip}]}
+
+
+def _hammer(path: str, seconds: float, out):
+    """Child: rewrites and reads 32 keys; reports reads whose value is not its own key's."""
+    cache = SharedDNSCache(path, 64)
+    bad = reads = 0
+    deadline, n = time.monotonic() + seconds, 0
+    while time.monotonic() < deadline:
+        n += 1
+        key = f"k{n % 32}"
+        cache.put(key, {"key": key, "pid": os.getpid(), "pad": "x" * (n % 700)}, 60)
+        got = cache.get(f"k{(n * 7) % 32}")
+        if got is not None:
+            reads += 1
+            bad += got["key"] != f"k{(n * 7) % 32}"
+    out.put((reads, bad))
+
+
+def _count_hits(path: str, out):
+    cache = SharedDNSCache(path, 64)
+    out.put([cache.get(f"k{i}") is not None for i in range(10)])
+
+
+class _TempFile(unittest.TestCase):
+
+    def setUp(self):
+        tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp)
+        self.path = os.path.join(tmp, "cache")
+
+    def open(self, capacity: int = 64, **kw) -> SharedDNSCache:
+        cache = SharedDNSCache(self.path, capacity, server.CachedResponse, **kw)
+        self.addCleanup(cache.close)
+        return cache
+
+
+class TestSharedTable(_TempFile):
+
+    def test_01_one_table_behind_two_handles(self):
+        a, b = self.open(), self.open()
+        a.put("www.example.com/A", server.CachedResponse(_body("www.example.com")), 300)
+        a.put("plain", {"v": [1, 2]}, 60)
+        value, remaining = b.lookup("www.example.com/A")
+        self.assertIsInstance(value, server.CachedResponse)
+        self.assertEqual(value.body, _body("www.example.com"))
+        self.assertEqual(json.loads(value.json(remaining, 0.1))["answers"][0]["ttl"], 300)
+        self.assertAlmostEqual(remaining, 300, delta=1)
+        self.assertEqual(b.get("plain"), {"v": [1, 2]})
+        self.assertEqual(a.popularity("www.example.com/A"), 1)
+        b.put("plain", {"v": 3}, 60)                       # replaced under a's feet
+        self.assertEqual(a.get("plain"), {"v": 3})
+        stats = a.stats()
+        self.assertEqual((stats["size"], stats["hits"], stats["misses"]), (2, 3, 0))
+        self.assertEqual(stats["capacity"], 64)
+        self.assertEqual(stats["shared"]["processes"], 1)
+
+    def test_02_expiry_and_serve_stale(self):
+        now = [1000.0]
+        with mock.patch.object(shm_cache, "_monotonic", lambda: now[0]):
+            c = self.open(stale_window=60)
+            c.put("k", {"v": 1}, ttl=30)
+            self.assertEqual(c.lookup("k")[1], 30)
+            now[0] += 40
+            self.assertIsNone(c.lookup("k"))
+            self.assertEqual(c.lookup("k", stale=True), ({"v": 1}, -10))
+            self.assertEqual(c.all_entries()[0]["status"], "stale")
+            now[0] += 60
+            self.assertIsNone(c.lookup("k", stale=True))
+            self.assertEqual(c.stats()["size"], 0)        # dropped once past the window
+        c.put("zero", {"v": 0}, ttl=0)
+        self.assertIsNone(c.get("zero"))
+
+    def test_03_second_chance_within_a_bucket(self):
+        c = self.open(capacity=8)                          # one bucket of 8 ways
+        for i in range(8):
+            c.put(f"k{i}", {"i": i}, 60)
+        c.get("k0")                                        # oldest, but just read
+        c.put("k8", {"i": 8}, 60)
+        self.assertIsNotNone(c.get("k0"))
+        self.assertIsNone(c.get("k1"))
+        for i in range(9, 20):
+            c.put(f"k{i}", {"i": i}, 60)
+        stats = c.stats()
+        self.assertEqual((stats["size"], stats["evictions"]), (8, 12))
+
+    def test_04_entry_too_large_for_a_slot(self):
+        c = self.open(slot_size=512)
+        c.put("k", {"v": "small"}, 60)
+        c.put("k", {"v": "x" * 600}, 60)
+        self.assertIsNone(c.get("k"))                      # not the stale small one
+        self.assertEqual(c.stats()["shared"]["too_large"], 1)
+        self.assertEqual(c.stats()["size"], 0)
+
+    def test_05_geometry_must_match(self):
+        self.open(capacity=64)
+        with self.assertRaises(ValueError):
+            SharedDNSCache(self.path, 1024)
+        with self.assertRaises(ValueError):
+            SharedDNSCache(self.path, 64, slot_size=1024)
+
+    def test_06_export_restore_and_clear(self):
+        a, b = self.open(), self.open()
+        a.put("a/A", server.CachedResponse(_body("a")), 300)
+        a.put("b/A", server.CachedResponse(_body("b", ip="192.0.2.2")), 60)
+        items = a.export()
+        self.assertEqual(sorted(k for k, _v, _t in items), ["a/A", "b/A"])
+        a.clear()
+        self.assertEqual(b.stats()["size"], 0)
+        self.assertEqual(b.stats()["hits"], 0)
+        b.put("a/A", server.CachedResponse(_body("a", ip="192.0.2.99")), 300)
+        self.assertEqual(b.restore(items), 1)             # the newer a/A stays
+        self.assertEqual(a.get("a/A").body["ip"], "192.0.2.99")
+        self.assertEqual(a.get("b/A").body["ip"], "192.0.2.2")
+
+    def test_07_server_hit_from_another_worker(self):
+        other = self.open(stale_window=3600)
+        other.put("www.example.com/A", server.CachedResponse(_body("www.example.com")), 300)
+        with mock.patch.object(server, "cache", self.open(stale_window=3600)), \
+                mock.patch.object(server, "metrics", server.Metrics()):
+            raw, status = server.lookup_cached_json("www.example.com", "A", time.perf_counter())
+            self.assertEqual((status, json.loads(raw)["ip"]), (200, "192.0.2.1"))
+            self.assertTrue(json.loads(raw)["cached"])
+            with server.app.test_client() as client:
+                body = client.get("/cache").get_json()
+        self.assertEqual(body["stats"]["shared"]["path"], self.path)
+        self.assertEqual(body["entries"][0]["domain"], "www.example.com")
+
+
+@unittest.skipUnless(hasattr(os, "fork"), "needs fork")
+class TestSharedAcrossProcesses(_TempFile):
+
+    def test_01_children_share_the_table_and_keep_their_own_counters(self):
+        c = self.open()
+        for i in range(5):
+            c.put(f"k{i}", {"i": i}, 60)
+        ctx = multiprocessing.get_context("fork")
+        out = ctx.Queue()
+        procs = [ctx.Process(target=_count_hits, args=(self.path, out)) for _ in range(2)]
+        for p in procs:
+            p.start()
+        results = [out.get(timeout=20) for _ in procs]
+        for p in procs:
+            p.join()
+        self.assertEqual(results, [[True] * 5 + [False] * 5] * 2)
+        stats = c.stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (10, 10))
+        self.assertEqual(stats["shared"]["processes"], 1)   # the children are gone
+
+    def test_02_concurrent_writers_never_tear_a_read(self):
+        self.open()
+        ctx = multiprocessing.get_context("fork")
+        out = ctx.Queue()
+        procs = [ctx.Process(target=_hammer, args=(self.path, 1.0, out)) for _ in range(4)]
+        for p in procs:
+            p.start()
+        results = [out.get(timeout=30) for _ in procs]
+        for p in procs:
+            p.join()
+        self.assertGreater(sum(r[0] for r in results), 1000)
+        self.assertEqual(sum(r[1] for r in results), 0)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
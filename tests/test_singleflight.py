@@ -0,0 +1,128 @@
+"""
+tests/test_singleflight.py
+──────────────────────────
+Concurrency tests for request coalescing on the /resolve miss path.
+The C++ bridge is replaced by a slow counting stub, so no binary or
+network access is needed.
+
+Run:  python -m pytest tests/test_singleflight.py -v
+"""
+
+import os
+import sys
+import time
+import threading
+import unittest
+from unittest import mock
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(_ROOT, "api"))
+
+import server   # noqa: E402
+
+N_CLIENTS = 16
+
+
+class SlowResolver:
+    """Counts upstream resolutions; each takes long enough for callers to pile up."""
+
+    def __init__(self, delay: float = 0.3):
+        self.delay = delay
+        self.calls = 0
+        self.lock  = threading.Lock()
+
+    def __call__(self, domain, qtype="A"):
+        with self.lock:
+            self.calls += 1
+        time.sleep(self.delay)
+        return {
+            "success": True, "domain": domain, "qtype": qtype, "cached": False,
+            "used_tcp": False, "latency_ms": self.delay * 1000,
+            "answers": [{"name": domain, "type": "A", "ttl": 60, "data": "192.0.2.7"}],
+            "resolution_path": ["198.41.0.4"],
+        }
+
+
+class TestSingleFlight(unittest.TestCase):
+
+    def setUp(self):
+        server.cache.clear()
+        server.inflight = server.SingleFlight()
+
+    def test_01_parallel_identical_requests_resolve_once(self):
+        stub = SlowResolver()
+        results = []
+        barrier = threading.Barrier(N_CLIENTS)
+
+        def client():
+            c = server.app.test_client()
+            barrier.wait()
+            r = c.get("/resolve", query_string={"domain": "popular.example", "type": "A"})
+            results.append((r.status_code, r.get_json()))
+
+        with mock.patch.object(server, "run_cpp_resolver", stub):
+            threads = [threading.Thread(target=client) for _ in range(N_CLIENTS)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+
+        self.assertEqual(stub.calls, 1, "exactly one upstream resolution")
+        self.assertEqual(len(results), N_CLIENTS)
+        for status, body in results:
+            self.assertEqual(status, 200)
+            self.assertEqual(body["ip"], "192.0.2.7")
+
+        stats = server.inflight.stats()
+        coalesced = sum(1 for _, b in results if b.get("coalesced"))
+        cached    = sum(1 for _, b in results if b.get("cached"))
+        self.assertEqual(stats["leaders"], 1)
+        self.assertEqual(stats["coalesced"], coalesced)
+        self.assertEqual(coalesced + cached, N_CLIENTS - 1)
+        self.assertEqual(stats["in_flight"], 0)
+
+        m = server.app.test_client().get("/metrics").get_json()
+        self.assertEqual(m["coalescing"]["coalesced"], coalesced)
+
+    def test_02_distinct_keys_not_coalesced(self):
+        stub = SlowResolver(delay=0.1)
+        with mock.patch.object(server, "run_cpp_resolver", stub):
+            threads = [threading.Thread(
+                target=lambda d=d: server.app.test_client().get(
+                    "/resolve", query_string={"domain": d}))
+                for d in ("a.example", "b.example", "c.example")]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+        self.assertEqual(stub.calls, 3)
+        self.assertEqual(server.inflight.stats()["coalesced"], 0)
+
+    def test_03_error_propagates_to_waiters(self):
+        sf = server.SingleFlight()
+        gate = threading.Event()
+        errors = []
+
+        def boom():
+            gate.wait()
+            raise RuntimeError("upstream failed")
+
+        def waiter():
+            try:
+                sf.do("k", boom)
+            except RuntimeError as e:
+                errors.append(str(e))
+
+        threads = [threading.Thread(target=waiter) for _ in range(4)]
+        for t in threads:
+            t.start()
+        time.sleep(0.1)
+        gate.set()
+        for t in threads:
+            t.join()
+        self.assertEqual(errors, ["upstream failed"] * 4)
+        self.assertEqual(sf.stats(), {"in_flight": 0, "leaders": 1, "coalesced": 3})
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,167 @@
+"""
+tests/test_snapshot.py
+──────────────────────
+Warm-restart snapshots (api/snapshot.py): round trip of the API cache,
+TTLs aged by the wall time between save and load, expired and damaged
+records, the periodic saver, the native delegation cache against the stub
+hierarchy, and DNS_SNAPSHOT honoured by the asyncio entry point too.
+
+Run:  python -m pytest tests/test_snapshot.py -v
+"""
+
+import os
+import sys
+import json
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(_ROOT, "api"))
+sys.path.insert(0, os.path.join(_ROOT, "bench"))
+sys.path.insert(0, os.path.join(_ROOT, "core"))
+
+import server                        # noqa: E402
+import snapshot                      # noqa: E402
+from stub_dns import StubHierarchy   # noqa: E402
+
+try:
+    import dnscore
+except ImportError:
+    dnscore = None
+
+
+def _body(name: str, ttl: int, ip: str = "192.0.2.1") -> dict:
+    return {"domain": name, "ip": ip, "record_type": "A", "cached": False,
+            "latency_ms": 30.0, "ttl": ttl,
+            "answers": [{"name": name, "type": "A", "ttl": ttl, "data": ip}]}
+
+
+class TestSnapshot(unittest.TestCase):
+
+    def setUp(self):
+        tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp)
+        self.path = os.path.join(tmp, "cache.snap")
+        self.src  = server.DNSCache()
+        self.dst  = server.DNSCache()
+        self.src.put("a.example.com/A", server.CachedResponse(_body("a.example.com", 300)), 300)
+        self.src.put("b.example.com/A", server.CachedResponse(_body("b.example.com", 60)), 60)
+        neg = {"domain": "nope.example.com", "negative": True, "rcode": "NXDOMAIN",
+               "ttl": 900, "answers": []}
+        self.src.put("nope.example.com/A", server.CachedResponse(neg), 900)
+
+    def save(self, wall: float = 1_000_000.0) -> dict:
+        with mock.patch.object(snapshot.time, "time", return_value=wall):
+            return snapshot.save(self.path, self.src, resolver=False)
+
+    def load(self, wall: float = 1_000_000.0) -> dict:
+        with mock.patch.object(snapshot.time, "time", return_value=wall):
+            return snapshot.load(self.path, self.dst, resolver=False)
+
+    def test_01_round_trip(self):
+        self.assertEqual(self.save()["entries"], 3)
+        stats = self.load()
+        self.assertEqual((stats["entries"], stats["expired"], stats["error"]), (3, 0, None))
+        for key in ("a.example.com/A", "nope.example.com/A"):
+            (old, old_left), (new, new_left) = self.src.lookup(key), self.dst.lookup(key)
+            self.assertEqual(new.status, old.status)
+            self.assertEqual(json.loads(new.json(old_left, 1.0)),
+                             json.loads(old.json(old_left, 1.0)))
+            self.assertAlmostEqual(new_left, old_left, delta=1)
+
+    def test_02_ttls_aged_by_wall_time(self):
+        self.save()
+        stats = self.load(wall=1_000_000.0 + 100)          # restarted 100 s later
+        self.assertEqual((stats["entries"], stats["expired"]), (2, 1))
+        self.assertIsNone(self.dst.lookup("b.example.com/A"))
+        resp, remaining = self.dst.lookup("a.example.com/A")
+        self.assertAlmostEqual(remaining, 200, delta=1)
+        body = json.loads(resp.json(remaining, 1.0))
+        self.assertAlmostEqual(body["answers"][0]["ttl"], 200, delta=1)
+
+    def test_03_clock_behind_save_time_does_not_extend_ttls(self):
+        self.save()
+        self.load(wall=1_000_000.0 - 3600)
+        self.assertLessEqual(self.dst.lookup("a.example.com/A")[1], 300)
+
+    def test_04_restore_keeps_newer_entries(self):
+        self.save()
+        fresh = server.CachedResponse(_body("a.example.com", 300, ip="192.0.2.99"))
+        self.dst.put("a.example.com/A", fresh, 300)
+        self.load()
+        self.assertIs(self.dst.get("a.example.com/A"), fresh)
+
+    def test_05_truncated_and_foreign_files(self):
+        self.save()
+        with open(self.path, "rb") as f:
+            data = f.read()
+        with open(self.path, "wb") as f:
+            f.write(data[:-40])                              # cut inside the last record
+        stats = self.load()
+        self.assertIn("truncated", stats["error"])
+        self.assertEqual(stats["entries"], 2)
+        with open(self.path, "wb") as f:
+            f.write(b'{"not": "a snapshot"}')
+        self.assertIn("not a DNS cache snapshot", self.load()["error"])
+        os.remove(self.path)
+        self.assertEqual(self.load()["entries"], 0)          # no file: cold start
+
+    def test_06_snapshotter_saves_on_stop(self):
+        saver = snapshot.Snapshotter(self.path, interval=3600, cache=self.src,
+                                     resolver=False).start()
+        saver.stop()
+        self.assertEqual(saver.stats()["saves"], 1)
+        self.assertEqual(self.load()["entries"], 3)
+
+    def test_07_async_entry_point_loads_the_snapshot(self):
+        import async_server
+        self.save()
+        with mock.patch.object(server, "SNAPSHOT_PATH", self.path), \
+                mock.patch.object(server, "_background_started", False), \
+                mock.patch.object(server, "snapshotter", None), \
+                mock.patch.object(server, "cache", self.dst), \
+                mock.patch.object(server, "_native", None), \
+                mock.patch.object(snapshot.time, "time", return_value=1_000_000.0), \
+                mock.patch.object(snapshot, "Snapshotter") as saver, \
+                mock.patch.object(async_server.asyncio, "run", lambda coro: coro.close()), \
+                mock.patch.dict(os.environ, {"DNS_LISTEN_PORT": "0"}), \
+                mock.patch("builtins.print"):
+            saver.return_value.start.return_value = saver.return_value
+            saver.return_value.stats.return_value = {"saves": 0, "path": self.path}
+            async_server.main(["--port", "0"])
+            async_server.main(["--port", "0"])             # started once only
+            self.assertIs(server.snapshotter, saver.return_value)
+            metrics = server.app.test_client().get("/metrics").get_json()
+            self.assertEqual(metrics["snapshot"], {"saves": 0, "path": self.path})
+        self.assertEqual(self.dst.stats()["size"], 3)
+        saver.assert_called_once_with(self.path, server.SNAPSHOT_EVERY)
+        saver.return_value.start.assert_called_once_with()
+
+
+@unittest.skipIf(dnscore is None, "dnscore extension not built")
+class TestDelegationSnapshot(unittest.TestCase):
+
+    def test_zone_cuts_survive_a_restart(self):
+        stub = StubHierarchy().start()
+        self.addCleanup(stub.stop)
+        tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp)
+        path = os.path.join(tmp, "cache.snap")
+
+        before = dnscore.Resolver(None, roots=stub.root_ips, port=stub.port)
+        before.resolve("www.example.com")
+        saved = snapshot.save(path, server.DNSCache(), before)
+        self.assertEqual((saved["zones"], saved["addresses"]), (2, 2))
+
+        after = dnscore.Resolver(None, roots=stub.root_ips, port=stub.port)
+        self.assertEqual(snapshot.load(path, server.DNSCache(), after)["zones"], 2)
+        stub.reset_counters()
+        result = after.resolve("api.example.com")
+        self.assertEqual(result["start_zone"], "example.com.")
+        self.assertEqual(stub.total_queries, 1)              # straight to example.com
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
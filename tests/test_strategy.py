@@ -0,0 +1,136 @@
+"""
+tests/test_strategy.py
+──────────────────────
+DNS_STRATEGY (api/server.py, api/async_server.py): with "race" a fast walk
+answers before the forwarders are asked at all, a slow one loses to them
+once the grace period is over, and an authoritative NXDOMAIN still wins;
+"forward" never walks.  The winner shows in the body, in /metrics and in
+the Prometheus text.  The walk runs on the stub hierarchy, the forwarder is
+a second stub answering every name itself (with different addresses, so the
+answer tells which path won).
+
+Run:  python -m pytest tests/test_strategy.py -v
+"""
+
+import os
+import sys
+import time
+import asyncio
+import unittest
+from unittest import mock
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(_ROOT, "api"))
+sys.path.insert(0, os.path.join(_ROOT, "bench"))
+sys.path.insert(0, os.path.join(_ROOT, "core"))
+
+import server                        # noqa: E402
+import forwarder                     # noqa: E402
+from async_server import AsyncAPIServer   # noqa: E402
+from stub_dns import StubHierarchy   # noqa: E402
+
+try:
+    import dnscore
+except ImportError:
+    dnscore = None
+
+FORWARDER_IP = "127.0.0.53"
+FORWARDER_ZONES = {
+    ".": {"servers": {"resolver.test.": FORWARDER_IP},
+          "records": [("www.example.com.", "A", 300, "198.51.100.1"),
+                      ("api.example.com.", "A", 300, "198.51.100.2")]},
+}
+
+
+@unittest.skipIf(dnscore is None, "dnscore extension not built")
+class TestStrategies(unittest.TestCase):
+
+    def setUp(self):
+        self.stub = StubHierarchy().start()
+        self.addCleanup(self.stub.stop)
+        self.fwd = StubHierarchy(FORWARDER_ZONES).start()
+        self.addCleanup(self.fwd.stop)
+        pool = forwarder.ForwarderPool([(FORWARDER_IP, self.fwd.port)], timeout=2.0)
+        self.addCleanup(pool.close)
+        native = dnscore.Resolver(None, roots=self.stub.root_ips, port=self.stub.port)
+        for name, value in (("_native", native), ("forwarders", pool),
+                            ("metrics", server.Metrics()), ("RESOLVE_STRATEGY", "race"),
+                            ("RACE_GRACE", 0.1)):
+            mock.patch.object(server, name, value).start()
+        self.addCleanup(mock.patch.stopall)
+        server.cache.clear()
+        self.addCleanup(server.cache.clear)
+
+    def resolve(self, domain: str) -> tuple:
+        return server.lookup_miss(domain, "A", time.perf_counter())
+
+    def test_01_fast_walk_wins_without_forwarding(self):
+        body, status, _h = self.resolve("www.example.com")
+        self.assertEqual((status, body["ip"]), (200, "192.0.2.1"))
+        self.assertEqual((body["strategy"], body["winner"]), ("race", "walk"))
+        self.assertEqual(self.fwd.total_queries, 0)
+        self.assertNotIn("strategy", server.cache.get("www.example.com/A").body)
+
+    def test_02_slow_walk_loses_to_the_forwarder(self):
+        self.stub.servers["127.0.0.4"].delay = 0.5
+        t0 = time.perf_counter()
+        body, status, _h = self.resolve("www.example.com")
+        self.assertLess(time.perf_counter() - t0, 0.4)
+        self.assertEqual((status, body["ip"], body["winner"]), (200, "198.51.100.1", "forward"))
+        self.assertEqual(body["forwarder"], FORWARDER_IP)
+        summary = server.metrics.summary()
+        self.assertEqual(summary["race_wins"], {"walk": 0, "forward": 1, "none": 0})
+        self.assertEqual(list(summary["percentiles"]["1m"]["by_source"]), ["forward"])
+        self.assertIn('dns_race_wins_total{winner="forward"} 1', server.metrics.prometheus())
+
+    def test_03_authoritative_nxdomain_wins(self):
+        self.stub.servers["127.0.0.4"].delay = 0.05
+        mock.patch.object(server, "RACE_GRACE", 1.0).start()
+        body, status, _h = self.resolve("nope.example.com")
+        self.assertEqual((status, body["rcode"], body["winner"]), (404, "NXDOMAIN", "walk"))
+        self.assertEqual(self.fwd.total_queries, 0)
+
+    def test_04_failed_walk_forwards_at_once(self):
+        mock.patch.object(server, "run_cpp_resolver",
+                          side_effect=RuntimeError("walk failed")).start()
+        mock.patch.object(server, "RACE_GRACE", 5.0).start()
+        t0 = time.perf_counter()
+        body, status, _h = self.resolve("api.example.com")
+        self.assertLess(time.perf_counter() - t0, 1.0)
+        self.assertEqual((status, body["ip"], body["winner"]), (200, "198.51.100.2", "forward"))
+
+    def test_05_forward_only_never_walks(self):
+        mock.patch.object(server, "RESOLVE_STRATEGY", "forward").start()
+        mock.patch.object(server, "fallback_resolve",
+                          lambda d, q: server.forwarded_answers(
+                              server.forwarders.query(server.fallback_query(d, q)), d)).start()
+        body, status, _h = self.resolve("api.example.com")
+        self.assertEqual((status, body["ip"], body["strategy"]), (200, "198.51.100.2", "forward"))
+        self.assertNotIn("winner", body)
+        self.assertEqual(self.stub.total_queries, 0)
+        body, status, _h = self.resolve("mail.example.com")
+        self.assertEqual(status, 404)
+        self.assertEqual(server.metrics.summary()["race_wins"]["forward"], 0)
+
+    def test_06_async_race(self):
+        self.stub.servers["127.0.0.4"].delay = 0.5
+        api = AsyncAPIServer("127.0.0.1", 0)
+
+        async def go():
+            t0 = time.perf_counter()
+            fast = await api._resolve_miss("api.example.com", "A", "api.example.com/A", t0)
+            self.stub.servers["127.0.0.4"].delay = 0
+            server.cache.clear()
+            walk = await api._resolve_miss("www.example.com", "A", "www.example.com/A",
+                                           time.perf_counter())
+            return fast, walk, time.perf_counter() - t0
+
+        (body, status, _h), (walk, _s, _h2), elapsed = asyncio.run(go())
+        self.assertLess(elapsed, 0.45)
+        self.assertEqual((status, body["ip"], body["winner"]), (200, "198.51.100.2", "forward"))
+        self.assertEqual((walk["ip"], walk["winner"]), ("192.0.2.1", "walk"))
+        self.assertEqual(server.metrics.races(), {"walk": 1, "forward": 1, "none": 0})
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,212 @@
+"""
+tests/test_trace.py
+───────────────────
+Per-hop traces of the C++ walk against the stub hierarchy: one hop per
+upstream query with its zone, timing and outcome (referral, answer,
+truncated → TCP, timeout, glue-less NS lookups), the per-zone statistics
+built from them, and their exposure through /resolve?trace=1, /zones and
+the --serve worker protocol.
+
+Run:  python -m pytest tests/test_trace.py -v
+"""
+
+import os
+import sys
+import json
+import subprocess
+import unittest
+from unittest import mock
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(_ROOT, "api"))
+sys.path.insert(0, os.path.join(_ROOT, "bench"))
+sys.path.insert(0, os.path.join(_ROOT, "core"))
+
+import server                        # noqa: E402
+from stub_dns import StubHierarchy   # noqa: E402
+
+try:
+    import dnscore
+except ImportError:
+    dnscore = None
+
+_BINARY = os.path.join(_ROOT, "core", "dns_resolver")
+
+NS1, NS2 = "127.0.0.4", "127.0.0.6"
+TWO_NS_ZONES = {
+    ".":    {"servers": {"a.root.test.": "127.0.0.2"}},
+    "com.": {"servers": {"a.gtld.test.": "127.0.0.3"}},
+    "example.com.": {
+        "servers": {"ns1.example.com.": NS1, "ns2.example.com.": NS2},
+        "records": [("www.example.com.", "A", 300, "192.0.2.1"),
+                    ("api.example.com.", "A", 300, "192.0.2.2")],
+    },
+}
+
+
+def _outcomes(trace):
+    return [(h["zone"], h["outcome"]) for h in trace]
+
+
+@unittest.skipIf(dnscore is None, "dnscore extension not built")
+class TestNativeTrace(unittest.TestCase):
+
+    def setUp(self):
+        self.stub = StubHierarchy().start()
+        self.addCleanup(self.stub.stop)
+        self.resolver = dnscore.Resolver(None, roots=self.stub.root_ips, port=self.stub.port)
+
+    def test_01_one_hop_per_zone(self):
+        r = self.resolver.resolve("www.example.com", "A", trace=True)
+        self.assertTrue(r["success"])
+        self.assertEqual(_outcomes(r["trace"]), [(".", "referral"), ("com", "referral"),
+                                                 ("example.com", "answer")])
+        self.assertEqual([h["server"] for h in r["trace"]], r["resolution_path"])
+        starts = [h["start_ms"] for h in r["trace"]]
+        self.assertEqual(starts, sorted(starts))
+        for h in r["trace"]:
+            self.assertEqual((h["qname"], h["qtype"], h["tcp"], h["ns_lookup"]),
+                             ("www.example.com", "A", False, False))
+            self.assertGreater(h["rtt_ms"], 0)
+            self.assertLessEqual(h["start_ms"] + h["rtt_ms"], r["latency_ms"] + 0.01)
+        self.assertNotIn("trace", self.resolver.resolve("api.example.com"))
+
+    def test_02_traced_lookup_skips_the_answer_cache(self):
+        cache = dnscore.Cache(100)
+        resolver = dnscore.Resolver(cache, roots=self.stub.root_ips, port=self.stub.port)
+        resolver.resolve("www.example.com")
+        self.assertTrue(resolver.resolve("www.example.com")["cached"])
+        r = resolver.resolve("www.example.com", trace=True)
+        self.assertFalse(r["cached"])
+        self.assertEqual(_outcomes(r["trace"]), [("example.com", "answer")])
+
+    def test_03_glueless_ns_lookup_is_marked(self):
+        r = self.resolver.resolve("www.glueless.com", "A", trace=True)
+        self.assertTrue(r["success"])
+        nested = [h for h in r["trace"] if h["ns_lookup"]]
+        self.assertTrue(nested)
+        self.assertEqual({h["qname"] for h in nested}, {"ns1.example.com"})
+        self.assertEqual(nested[-1]["outcome"], "answer")
+        self.assertEqual(r["trace"][-1]["zone"], "glueless.com")
+        self.assertFalse(r["trace"][-1]["ns_lookup"])
+
+    def test_04_truncated_reply_then_tcp(self):
+        self.stub.servers["127.0.0.4"].truncate = True
+        r = self.resolver.resolve("www.example.com", "A", trace=True)
+        self.assertTrue(r["used_tcp"])
+        self.assertEqual(_outcomes(r["trace"][-2:]), [("example.com", "truncated"),
+                                                      ("example.com", "answer")])
+        self.assertEqual([h["tcp"] for h in r["trace"][-2:]], [False, True])
+
+    def test_05_zone_stats(self):
+        self.resolver.resolve("www.example.com", "A")
+        self.resolver.resolve("nope.example.com", "A")
+        zones = {z["zone"]: z for z in self.resolver.zone_stats()}
+        self.assertEqual(set(zones), {".", "com", "example.com"})
+        self.assertEqual((zones["."]["queries"], zones["."]["referrals"]), (1, 1))
+        self.assertEqual((zones["example.com"]["queries"], zones["example.com"]["answers"]),
+                         (2, 2))
+        self.assertGreater(zones["example.com"]["total_ms"], 0)
+        self.assertGreaterEqual(zones["example.com"]["max_ms"],
+                                zones["example.com"]["total_ms"] / 2)
+
+
+@unittest.skipIf(dnscore is None, "dnscore extension not built")
+class TestTimeoutHops(unittest.TestCase):
+
+    def test_silent_server_shows_as_timeout(self):
+        with StubHierarchy(TWO_NS_ZONES) as stub:
+            resolver = dnscore.Resolver(None, roots=stub.root_ips, port=stub.port)
+            stub.servers[NS2].delay = 0.2            # NS1 measures fastest → asked first
+            resolver.resolve("www.example.com")
+            stub.servers[NS2].delay = 0.0
+            stub.servers[NS1].drop = True
+            r = resolver.resolve("api.example.com", trace=True)
+        self.assertTrue(r["success"])
+        by_server = {h["server"]: h for h in r["trace"]}
+        self.assertEqual(by_server[NS1]["outcome"], "timeout")
+        self.assertEqual(by_server[NS2]["outcome"], "answer")
+        self.assertLess(by_server[NS1]["start_ms"], by_server[NS2]["start_ms"])
+        zones = {z["zone"]: z for z in resolver.zone_stats()}
+        self.assertGreaterEqual(zones["example.com"]["timeouts"], 1)
+
+
+@unittest.skipIf(dnscore is None, "dnscore extension not built")
+class TestTraceEndpoints(unittest.TestCase):
+
+    def setUp(self):
+        self.stub = StubHierarchy().start()
+        self.addCleanup(self.stub.stop)
+        native = dnscore.Resolver(None, roots=self.stub.root_ips, port=self.stub.port)
+        mock.patch.object(server, "_native", native).start()
+        mock.patch.object(server, "fallback_resolve", return_value=[]).start()
+        self.addCleanup(mock.patch.stopall)
+        server.cache.clear()
+        self.addCleanup(server.cache.clear)
+        self.client = server.app.test_client()
+
+    def get(self, **params):
+        return self.client.get("/resolve", query_string=dict(domain="www.example.com", **params))
+
+    def test_01_trace_walks_even_when_cached(self):
+        self.assertNotIn("trace", self.get().get_json())
+        body = self.get(trace=1).get_json()
+        self.assertFalse(body["cached"])
+        self.assertEqual(_outcomes(body["trace"])[-1], ("example.com", "answer"))
+        self.assertEqual(body["ip"], "192.0.2.1")
+        cached = self.get().get_json()                 # the trace is never cached
+        self.assertTrue(cached["cached"])
+        self.assertNotIn("trace", cached)
+
+    def test_02_negative_answer_is_traced(self):
+        resp = self.client.get("/resolve", query_string={"domain": "nope.example.com",
+                                                         "trace": "true"})
+        self.assertEqual(resp.status_code, 404)
+        self.assertEqual(resp.get_json()["trace"][-1]["outcome"], "nxdomain")
+
+    def test_03_zones(self):
+        self.get()
+        body = self.client.get("/zones").get_json()
+        self.assertEqual(body["count"], 3)
+        z = {z["zone"]: z for z in body["zones"]}["com"]
+        self.assertEqual((z["queries"], z["referrals"], z["timeout_rate"]), (1, 1, 0.0))
+        self.assertGreater(z["avg_ms"], 0)
+        self.assertNotIn("total_ms", z)
+
+
+class TestZoneSummary(unittest.TestCase):
+
+    def test_merge_and_summary(self):
+        a = [{"zone": "com", "queries": 4, "answers": 0, "referrals": 3, "truncated": 0,
+              "timeouts": 1, "errors": 0, "ns_lookups": 0, "total_ms": 30.0, "max_ms": 20.0}]
+        b = [dict(a[0], queries=2, referrals=2, timeouts=0, total_ms=10.0, max_ms=6.0),
+             dict(a[0], zone=".", queries=1, timeouts=1, referrals=0, total_ms=0.0,
+                  max_ms=0.0)]
+        merged = server._merge_zone_stats([a, b])
+        body = server.zone_summary(merged)
+        self.assertEqual([z["zone"] for z in body["zones"]], ["com", "."])
+        com, root = body["zones"]
+        self.assertEqual((com["queries"], com["timeouts"], com["max_ms"]), (6, 1, 20.0))
+        self.assertEqual((com["avg_ms"], com["timeout_rate"]), (8.0, 0.1667))
+        self.assertIsNone(root["avg_ms"])
+
+
+@unittest.skipUnless(os.path.isfile(_BINARY), "C++ binary not built")
+class TestWorkerTrace(unittest.TestCase):
+
+    def test_trace_flag_and_zones_op(self):
+        with StubHierarchy() as stub:
+            proc = subprocess.run(
+                [_BINARY, "--serve"], env=dict(os.environ, **stub.env()),
+                text=True, capture_output=True, timeout=20,
+                input='{"id": 1, "domain": "www.example.com", "qtype": "A"}\n'
+                      '{"id": 2, "domain": "www.example.com", "qtype": "A", "trace": 1}\n'
+                      '{"id": 3, "op": "zones"}\n')
+        first, traced, zones = [json.loads(line) for line in proc.stdout.splitlines()]
+        self.assertNotIn("trace", first["result"])
+        self.assertEqual(_outcomes(traced["result"]["trace"]), [("example.com", "answer")])
+        self.assertEqual({z["zone"] for z in zones["zones"]}, {".", "com", "example.com"})
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,86 @@
+"""
+tests/test_transport.py
+───────────────────────
+Pooled transport in the C++ resolver: UDP sockets are leased from a pool
+and re-used across exchanges (re-bound to a new random port periodically),
+and truncated answers are retried over a kept-alive TCP connection instead
+of a fresh connect per query (RFC 7766).
+
+Run:  python -m pytest tests/test_transport.py -v
+"""
+
+import os
+import sys
+import json
+import subprocess
+import unittest
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(_ROOT, "bench"))
+sys.path.insert(0, os.path.join(_ROOT, "core"))
+
+from stub_dns import StubHierarchy   # noqa: E402
+
+try:
+    import dnscore
+except ImportError:
+    dnscore = None
+
+_BINARY = os.path.join(_ROOT, "core", "dns_resolver")
+AUTH = "127.0.0.4"
+
+
+@unittest.skipIf(dnscore is None, "dnscore extension not built")
+class TestTransport(unittest.TestCase):
+
+    def setUp(self):
+        self.stub = StubHierarchy().start()
+        self.addCleanup(self.stub.stop)
+        self.resolver = dnscore.Resolver(None, roots=self.stub.root_ips, port=self.stub.port)
+
+    def test_01_udp_sockets_are_reused(self):
+        for _ in range(10):
+            for name in ("www", "api", "mail"):
+                self.assertTrue(self.resolver.resolve(f"{name}.example.com", "A")["success"])
+        ts = self.resolver.transport_stats()
+        self.assertGreaterEqual(ts["udp_leases"], 30)
+        self.assertLessEqual(ts["udp_opened"], 2)              # not one per exchange
+        self.assertEqual(ts["tcp_connects"], 0)
+
+    def test_02_truncation_uses_one_kept_alive_connection(self):
+        self.stub.servers[AUTH].truncate = True
+        for name in ("www", "api", "mail", "www", "api"):
+            r = self.resolver.resolve(f"{name}.example.com", "A")
+            self.assertTrue(r["success"], name)
+            self.assertEqual(len(r["answers"]), 1)
+        self.assertEqual(self.stub.servers[AUTH].tcp_connections, 1)
+        ts = self.resolver.transport_stats()
+        self.assertEqual(ts["tcp_connects"], 1)
+        self.assertEqual(ts["tcp_reused"], 4)
+
+    def test_03_server_closing_idle_connection_is_survived(self):
+        self.stub.servers[AUTH].truncate = True
+        self.assertTrue(self.resolver.resolve("www.example.com", "A")["success"])
+        self.stub.servers[AUTH].drop_tcp_connections()
+        self.assertTrue(self.resolver.resolve("api.example.com", "A")["success"])
+        self.assertEqual(self.resolver.transport_stats()["tcp_connects"], 2)
+
+
+@unittest.skipUnless(os.path.isfile(_BINARY), "C++ binary not built")
+class TestWorkerTransportStats(unittest.TestCase):
+
+    def test_ping_reports_transport(self):
+        with StubHierarchy() as stub:
+            proc = subprocess.run(
+                [_BINARY, "--serve"], env=dict(os.environ, **stub.env()),
+                text=True, capture_output=True, timeout=20,
+                input='{"id": 1, "domain": "www.example.com", "qtype": "A"}\n'
+                      '{"id": 2, "op": "ping"}\n')
+        pong = [json.loads(line) for line in proc.stdout.splitlines()][1]
+        self.assertEqual(pong["transport"]["udp_opened"], 1)
+        self.assertGreaterEqual(pong["transport"]["udp_leases"], 3)
+        self.assertGreater(pong["transport"]["syscalls"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
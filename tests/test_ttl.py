@@ -0,0 +1,185 @@
+"""
+tests/test_ttl.py
+─────────────────
+TTL propagation and RFC 2308 negative caching, end to end: the C++
+resolver walks the loopback stub hierarchy (bench/stub_dns.py), and the
+Flask API is tested with its native bridge pointed at the same stub.
+
+Run:  python -m pytest tests/test_ttl.py -v
+"""
+
+import os
+import sys
+import time
+import unittest
+from unittest import mock
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(_ROOT, "api"))
+sys.path.insert(0, os.path.join(_ROOT, "bench"))
+sys.path.insert(0, os.path.join(_ROOT, "core"))
+
+import server                                  # noqa: E402
+from stub_dns import StubHierarchy, DEFAULT_ZONES   # noqa: E402
+
+try:
+    import dnscore
+except ImportError:
+    dnscore = None
+
+ZONES = dict(DEFAULT_ZONES)
+ZONES["ttl.test."] = {
+    "servers":     {"ns1.ttl.test.": "127.0.0.5"},
+    "soa_ttl":     3600,
+    "soa_minimum": 5,
+    "records": [
+        ("short.ttl.test.", "A",     1,     "192.0.2.21"),
+        ("long.ttl.test.",  "A",     86400, "192.0.2.22"),
+        ("zero.ttl.test.",  "A",     0,     "192.0.2.23"),
+        ("multi.ttl.test.", "A",     120,   "192.0.2.24"),
+        ("multi.ttl.test.", "A",     40,    "192.0.2.25"),
+        ("alias.ttl.test.", "CNAME", 30,    "long.ttl.test."),
+    ],
+}
+ZONES["test."] = {"servers": {"a.nic.test.": "127.0.0.3"}}
+
+
+def _queries(stub, qname):
+    return sum(n for (name, _t), n in stub.servers["127.0.0.5"].by_qname.items()
+               if name == qname)
+
+
+@unittest.skipIf(dnscore is None, "dnscore extension not built")
+class TestCoreTTL(unittest.TestCase):
+
+    def setUp(self):
+        self.stub = StubHierarchy(ZONES).start()
+        self.addCleanup(self.stub.stop)
+        self.resolver = dnscore.Resolver(dnscore.Cache(100),
+                                         roots=self.stub.root_ips, port=self.stub.port)
+
+    def test_01_answer_ttl_is_real(self):
+        r = self.resolver.resolve("long.ttl.test", "A")
+        self.assertEqual(r["rcode"], "NOERROR")
+        self.assertEqual(r["ttl"], 86400)
+        self.assertEqual(r["answers"][0]["ttl"], 86400)
+
+    def test_02_rrset_minimum(self):
+        r = self.resolver.resolve("multi.ttl.test", "A")
+        self.assertEqual(r["ttl"], 40)
+
+    def test_03_cname_chain_minimum(self):
+        r = self.resolver.resolve("alias.ttl.test", "A")
+        self.assertTrue(r["success"])
+        self.assertEqual(r["ttl"], 30)
+
+    def test_04_short_ttl_expires(self):
+        self.resolver.resolve("short.ttl.test", "A")
+        self.assertTrue(self.resolver.resolve("short.ttl.test", "A")["cached"])
+        time.sleep(1.1)
+        r = self.resolver.resolve("short.ttl.test", "A")
+        self.assertFalse(r["cached"])
+        self.assertEqual(_queries(self.stub, "short.ttl.test"), 2)
+
+    def test_05_zero_ttl_not_cached(self):
+        self.resolver.resolve("zero.ttl.test", "A")
+        r = self.resolver.resolve("zero.ttl.test", "A")
+        self.assertFalse(r["cached"])
+        self.assertEqual(_queries(self.stub, "zero.ttl.test"), 2)
+
+    def test_06_cached_ttl_counts_down(self):
+        self.resolver.resolve("long.ttl.test", "A")
+        time.sleep(1.1)
+        r = self.resolver.resolve("long.ttl.test", "A")
+        self.assertTrue(r["cached"])
+        self.assertLess(r["answers"][0]["ttl"], 86400)
+
+    def test_07_nxdomain_cached_for_soa_minimum(self):
+        r = self.resolver.resolve("typo.ttl.test", "A")
+        self.assertFalse(r["success"])
+        self.assertEqual(r["rcode"], "NXDOMAIN")
+        self.assertEqual(r["ttl"], 5)                     # min(SOA TTL, MINIMUM)
+        self.assertEqual(r["authorities"][0]["type"], "SOA")
+        self.stub.reset_counters()
+        r = self.resolver.resolve("typo.ttl.test", "A")
+        self.assertTrue(r["cached"])
+        self.assertEqual(r["rcode"], "NXDOMAIN")
+        self.assertEqual(self.stub.total_queries, 0)
+
+    def test_08_nodata_cached(self):
+        r = self.resolver.resolve("long.ttl.test", "AAAA")
+        self.assertEqual(r["rcode"], "NOERROR")
+        self.assertEqual(r["answers"], [])
+        self.assertEqual(r["ttl"], 5)
+        self.stub.reset_counters()
+        self.assertTrue(self.resolver.resolve("long.ttl.test", "AAAA")["cached"])
+        self.assertEqual(self.stub.total_queries, 0)
+
+    def test_09_nxdomain_does_not_fall_back_to_roots(self):
+        self.resolver.resolve("long.ttl.test", "A")       # cache the ttl.test. zone
+        self.stub.reset_counters()
+        self.resolver.resolve("other-typo.ttl.test", "A")
+        self.assertEqual(self.stub.per_ip["127.0.0.2"], 0)
+
+
+@unittest.skipIf(dnscore is None, "dnscore extension not built")
+class TestApiNegativeCache(unittest.TestCase):
+
+    def setUp(self):
+        self.stub = StubHierarchy(ZONES).start()
+        self.addCleanup(self.stub.stop)
+        native = dnscore.Resolver(None, roots=self.stub.root_ips, port=self.stub.port)
+        patcher = mock.patch.object(server, "_native", native)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.fallback = mock.patch.object(server, "fallback_resolve", return_value=[]).start()
+        self.addCleanup(mock.patch.stopall)
+        server.cache.clear()
+        self.client = server.app.test_client()
+
+    def get(self, domain, qtype="A"):
+        return self.client.get("/resolve", query_string={"domain": domain, "type": qtype})
+
+    def test_01_positive_ttl_from_answer(self):
+        body = self.get("multi.ttl.test").get_json()
+        self.assertEqual(body["ttl"], 40)
+        self.assertEqual(server.cache.lookup("multi.ttl.test/A")[1] // 1, 39)
+
+    def test_02_nxdomain_cached_in_python_layer(self):
+        r = self.get("typo.ttl.test")
+        self.assertEqual(r.status_code, 404)
+        self.assertEqual(r.get_json()["rcode"], "NXDOMAIN")
+        self.fallback.assert_not_called()                  # authoritative: no 8.8.8.8
+        self.stub.reset_counters()
+        r = self.get("typo.ttl.test")
+        self.assertEqual(r.status_code, 404)
+        self.assertTrue(r.get_json()["cached"])
+        self.assertEqual(self.stub.total_queries, 0)
+
+    def test_03_nodata_cached_in_python_layer(self):
+        self.assertEqual(self.get("long.ttl.test", "AAAA").status_code, 404)
+        r = self.get("long.ttl.test", "AAAA")
+        self.assertTrue(r.get_json()["cached"])
+        self.assertEqual(r.get_json()["rcode"], "NOERROR")
+
+    def test_04_zero_ttl_not_cached(self):
+        self.get("zero.ttl.test")
+        self.assertIsNone(server.cache.get("zero.ttl.test/A"))
+
+
+class TestDNSCacheTTL(unittest.TestCase):
+
+    def test_zero_ttl_is_not_stored(self):
+        c = server.DNSCache()
+        c.put("k", {"ttl": 0}, ttl=0)
+        self.assertIsNone(c.get("k"))
+
+    def test_lookup_reports_remaining(self):
+        c = server.DNSCache()
+        c.put("k", {"ttl": 60}, ttl=60)
+        _value, remaining = c.lookup("k")
+        self.assertTrue(59 < remaining <= 60)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,164 @@
+"""
+tests/test_worker_pool.py
+─────────────────────────
+Unit tests for the persistent C++ resolver worker pool (api/worker_pool.py).
+Uses tests/fake_worker.py, so neither the compiled binary nor network
+access is required.
+
+Run:  python -m pytest tests/test_worker_pool.py -v
+"""
+
+import os
+import sys
+import time
+import asyncio
+import threading
+import unittest
+from unittest import mock
+
+_HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(_HERE), "api"))
+
+import worker_pool                                                    # noqa: E402
+from worker_pool import WorkerPool, AsyncWorkerPool, PoolBusyError   # noqa: E402
+
+FAKE_CMD = [sys.executable, os.path.join(_HERE, "fake_worker.py")]
+
+
+class TestWorkerPool(unittest.TestCase):
+
+    def make_pool(self, **kwargs):
+        opts = {"size": 2, "request_timeout": 2.0, "acquire_timeout": 0.5,
+                "health_interval": 0}
+        opts.update(kwargs)
+        pool = WorkerPool(FAKE_CMD, **opts)
+        self.addCleanup(pool.close)
+        return pool
+
+    def test_01_resolve_reuses_process(self):
+        pool = self.make_pool(size=1)
+        first  = pool.resolve("example.com", "A")
+        second = pool.resolve("example.org", "A")
+        self.assertTrue(first["success"])
+        self.assertEqual(first["pid"], second["pid"], "worker should stay alive")
+        self.assertEqual(second["served"], 2)
+
+    def test_02_crash_restarts_worker(self):
+        pool = self.make_pool(size=1)
+        pid = pool.resolve("example.com")["pid"]
+        with self.assertRaises(RuntimeError):
+            pool.resolve("crash.test")
+        after = pool.resolve("example.com")
+        self.assertNotEqual(after["pid"], pid)
+        self.assertEqual(pool.stats()["crashes"], 1)
+        self.assertEqual(pool.stats()["restarts"], 1)
+
+    def test_03_timeout_replaces_worker(self):
+        pool = self.make_pool(size=1, request_timeout=0.3)
+        t0 = time.monotonic()
+        with self.assertRaises(RuntimeError) as ctx:
+            pool.resolve("slow.test")
+        self.assertLess(time.monotonic() - t0, 2.0)
+        self.assertIn("timed out", str(ctx.exception))
+        self.assertTrue(pool.resolve("example.com")["success"])
+        self.assertEqual(pool.stats()["timeouts"], 1)
+
+    def test_04_backpressure_when_all_busy(self):
+        pool = self.make_pool(size=1, request_timeout=3.0, acquire_timeout=0.2)
+        t = threading.Thread(target=lambda: self.assertRaises(
+            RuntimeError, pool.resolve, "slow.test"))
+        t.start()
+        time.sleep(0.2)               # let the slow request claim the worker
+        with self.assertRaises(PoolBusyError):
+            pool.resolve("example.com")
+        self.assertEqual(pool.stats()["rejected"], 1)
+        t.join()
+
+    def test_05_health_check_replaces_dead_worker(self):
+        pool = self.make_pool(size=1, health_interval=0.1)
+        worker = pool._idle.queue[0]
+        worker._proc.kill()
+        deadline = time.monotonic() + 3
+        while pool.stats()["restarts"] == 0 and time.monotonic() < deadline:
+            time.sleep(0.05)
+        self.assertEqual(pool.stats()["restarts"], 1)
+        self.assertTrue(pool.resolve("example.com")["success"])
+
+
+class TestAsyncWorkerPool(unittest.TestCase):
+
+    def run_with_pool(self, body, **kwargs):
+        opts = {"size": 1, "request_timeout": 2.0, "acquire_timeout": 0.5}
+        opts.update(kwargs)
+
+        async def main():
+            pool = AsyncWorkerPool(FAKE_CMD, **opts)
+            try:
+                return await body(pool)
+            finally:
+                await pool.close()
+        return asyncio.run(main())
+
+    def test_01_resolve_reuses_process(self):
+        async def body(pool):
+            return await pool.resolve("example.com"), await pool.resolve("example.org")
+        first, second = self.run_with_pool(body)
+        self.assertEqual(first["pid"], second["pid"])
+        self.assertEqual(second["served"], 2)
+
+    def test_02_crash_and_timeout_replace_worker(self):
+        async def body(pool):
+            pid = (await pool.resolve("example.com"))["pid"]
+            with self.assertRaises(RuntimeError):
+                await pool.resolve("crash.test")
+            with self.assertRaises(RuntimeError) as ctx:
+                await pool.resolve("slow.test")
+            self.assertIn("timed out", str(ctx.exception))
+            self.assertNotEqual((await pool.resolve("example.com"))["pid"], pid)
+            return pool.stats()
+        stats = self.run_with_pool(body, request_timeout=0.3)
+        self.assertEqual((stats["crashes"], stats["timeouts"], stats["restarts"]), (1, 1, 2))
+
+    def test_03_backpressure_when_all_busy(self):
+        async def body(pool):
+            slow = asyncio.ensure_future(pool.resolve("slow.test"))
+            await asyncio.sleep(0.2)
+            with self.assertRaises(PoolBusyError):
+                await pool.resolve("example.com")
+            slow.cancel()
+            await asyncio.gather(slow, return_exceptions=True)
+            return pool.stats()
+        stats = self.run_with_pool(body, acquire_timeout=0.2)
+        self.assertEqual(stats["rejected"], 1)
+        self.assertEqual(stats["restarts"], 1)          # cancelled mid-request
+
+    def test_04_long_reply_lines(self):
+        async def body(pool):
+            answers = len((await pool.resolve("huge.test"))["answers"])
+            # A worker spawned under asyncio's default 64 KiB line limit.
+            with mock.patch.object(worker_pool, "REPLY_LINE_LIMIT", 64 << 10):
+                pool._idle.put_nowait(await pool._replace(await pool._acquire()))
+                with self.assertRaises(RuntimeError) as ctx:
+                    await pool.resolve("huge.test")
+            self.assertIn("too long", str(ctx.exception))
+            return answers, (await pool.resolve("example.com"))["served"], pool.stats()
+        answers, served, stats = self.run_with_pool(body)
+        self.assertEqual(answers, 4000)
+        self.assertEqual(served, 1)                     # a fresh worker, in sync
+        self.assertEqual((stats["crashes"], stats["restarts"]), (1, 2))
+
+    def test_05_broadcast_to_idle_workers(self):
+        async def body(pool):
+            before = await pool.broadcast({"op": "servers"})   # nothing spawned for it
+            for name in ("a.test", "b.test", "c.test"):
+                await pool.resolve(name)
+            return before, await pool.broadcast({"op": "servers"}), pool.stats()
+        before, replies, stats = self.run_with_pool(body, size=2)
+        self.assertEqual(before, [])
+        self.assertEqual(len(replies), 2)
+        self.assertEqual(sum(r["servers"][0]["queries"] for r in replies), 3)
+        self.assertEqual((stats["idle"], stats["requests"]), (2, 3))
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
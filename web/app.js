@@ -132,7 +132,7 @@ async function renderPath() {
   out.innerHTML = '<div class="placeholder"><span class="spinner"></span><p>Resolving trace…</p></div>';
 
   try {
-    const resp = await fetch(`${API}/resolve?domain=${encodeURIComponent(domain)}&type=${qtype}`);
+    const resp = await fetch(`${API}/resolve?domain=${encodeURIComponent(domain)}&type=${qtype}&trace=1`);
     const data = await resp.json();
 
     if (!resp.ok || data.error) {
@@ -140,7 +140,7 @@ async function renderPath() {
     }
 
     const path = data.resolution_path || [];
-    const hops = path.map((ip, i) => {
+    const hops = data.trace && data.trace.length ? traceHops(data.trace) : path.map((ip, i) => {
       const role = i === 0 ? 'Root Server'
                  : i === path.length - 1 ? 'Authoritative NS'
                  : 'TLD / Intermediate NS';
@@ -197,6 +197,27 @@ async function renderPath() {
   }
 }
 
+// One row per upstream query: when it was sent and how long it took, drawn
+// to scale against the whole walk, with its outcome.
+function traceHops(trace) {
+  const span = Math.max(...trace.map(h => h.start_ms + h.rtt_ms), 0.001);
+  return trace.map((h, i) => {
+    const left  = (h.start_ms / span * 100).toFixed(1);
+    const width = Math.max(h.rtt_ms / span * 100, 0.5).toFixed(1);
+    const tags  = [h.zone === '.' ? 'root' : h.zone,
+                   h.ns_lookup ? `NS lookup: ${h.qname}` : '',
+                   h.tcp ? 'TCP' : '', h.detail].filter(Boolean).join(' · ');
+    return `
+      <div class="hop-item hop-${esc(h.outcome)}">
+        <span class="hop-num">${i + 1}</span>
+        <span class="hop-ip">${esc(h.server)}</span>
+        <span class="hop-bar"><span style="left:${left}%;width:${width}%"></span></span>
+        <span class="hop-rtt">${h.rtt_ms.toFixed(1)} ms</span>
+        <span class="hop-role">${esc(h.outcome)} — ${esc(tags)}</span>
+      </div>`;
+  }).join('');
+}
+
 // ─────────────────────────────────────────────────────────────────────────────
 //  Cache
 // ─────────────────────────────────────────────────────────────────────────────